@@ -0,0 +1,525 @@
+__author__ = 'Constantin'
+
+# Follows all testbed log directories (the ~/logs/<component> dirs the start_*.sh scripts tee
+# into) and keeps an on-disk index of their lines, so that questions about the logs are answered
+# from the index instead of re-reading (or tail -f'ing) gigabytes of logs:
+#   python log_service.py follow --print --tail 50       (last 50 lines, then index and follow via inotify)
+#   python log_service.py query --level ERROR --dpid 00:00:00:00:00:01:11:00 --since 5m
+#   python log_service.py latency createNetwork --since 1h
+# The index is an SQLite database holding one row per line: timestamp, level, DPID and tenant id
+# (if the line names one), the operation marker of OPERATIONS and the line's position in its file.
+# The text itself stays in the log files and is only read back for the lines a query returns.
+# Every file is read once: its consumed offset is kept in the index, so a restarted service
+# continues where it stopped (and starts over on files that were truncated or replaced).
+# Lines without a timestamp of their own (stack traces, multi-line messages) inherit the
+# timestamp, level and ids of the line they continue.
+
+#Python system imports:
+import argparse
+import ctypes
+import ctypes.util
+import os
+import re
+import select
+import sqlite3
+import struct
+import sys
+import time
+
+
+
+## LOG SOURCES ##
+#################
+
+LOG_ROOT = os.path.expanduser('~/logs')
+
+# Log dirs of the start_*.sh scripts, the dir name is the component of its lines:
+DEFAULT_DIRS = ['floodlight', 'ovx', 'ovx-dev', 'cloud-agent', 'fedbroker']
+
+LOG_SUFFIXES = ('.log',)
+
+DEFAULT_INDEX = os.path.join(LOG_ROOT, '.log_index.db')
+
+
+
+## LINE PARSING ##
+##################
+
+LEVELS = ['TRACE', 'DEBUG', 'INFO', 'WARN', 'ERROR']
+LEVEL_CODES = dict((level.encode(), code) for code, level in enumerate(LEVELS))
+LEVEL_CODES.update({b'WARNING': LEVELS.index('WARN'), b'SEVERE': LEVELS.index('ERROR'),
+                    b'FATAL': LEVELS.index('ERROR')})
+
+# Akka (cloud-agent, fedbroker): [INFO] [05/21/2015 12:00:00.123] [thread] [akka://path] message
+AKKA_LINE = re.compile(rb'^\[(\w+)\] \[(\d\d)/(\d\d)/(\d{4}) (\d\d):(\d\d):(\d\d)(?:\.(\d+))?\]')
+# Logback/log4j (Floodlight, OVX): 12:00:00.123 INFO [logger] message / 12:00:00.123 [thread] INFO logger - message
+TIME_LINE = re.compile(rb'^(\d\d):(\d\d):(\d\d)[.,](\d+) +(?:\[[^\]]*\] +)?(\w+)')
+# Anything else with an ISO timestamp: 2015-05-21 12:00:00,123 LEVEL message
+ISO_LINE = re.compile(rb'^(\d{4})-(\d\d)-(\d\d)[ T](\d\d):(\d\d):(\d\d)(?:[.,](\d+))?(?: +\[[^\]]*\])? +(\w+)?')
+
+# DPIDs in colon form anywhere in the line (as OVX and Floodlight print them), else a bare hex
+# number after 'dpid' (which must not be the first byte of a colon form):
+DPID_RE = re.compile(rb'\b([0-9a-fA-F]{2}(?::[0-9a-fA-F]{2}){7})\b')
+DPID_HEX_RE = re.compile(rb'dpid\W{0,3}(?:0x)?([0-9a-fA-F]{1,16})\b(?!:)', re.I)
+TENANT_RE = re.compile(rb'tenant(?:_?id)?\W{0,3}(\d+)', re.I)
+
+# Log file names of the start_*.sh scripts: yy-mm-dd_HH-MM-SS.log, giving the date of lines with a time only
+FILE_DATE_RE = re.compile(r'(\d\d)-(\d\d)-(\d\d)_(\d\d)-(\d\d)-(\d\d)')
+
+# Operations whose latency is measured from its start to its end line (per tenant), as
+# name -> (start pattern, end patterns). The marker of a line is 2 * operation index + (0: start, 1: end).
+OPERATIONS = [
+    ('createNetwork', (rb'Creating Network for tenant', (rb'Created virtual Network', rb'Virtual Network .* was not started correctly'))),
+]
+# All markers in one pattern, group n matching marker n - 1:
+OPERATION_RE = re.compile(b'|'.join(b'(%s)' % pattern for _, (start, ends) in OPERATIONS
+                                    for pattern in (start, b'|'.join(ends))))
+
+
+def parse_dpid(text):
+    # '00:00:00:00:00:01:11:00', '0x11100' or '11100' -> int
+    if isinstance(text, str):
+        text = text.encode()
+    return int(text.replace(b':', b''), 16)
+
+
+def sql_dpid(dpid):
+    # DPIDs are unsigned 64 bit, SQLite integers signed:
+    return dpid - (1 << 64) if dpid >= 1 << 63 else dpid
+
+
+def file_base_date(path):
+    # Midnight of the day a log file was started (from its name, else its mtime):
+    match = FILE_DATE_RE.search(os.path.basename(path))
+    if match is not None:
+        year, month, day = (int(value) for value in match.groups()[:3])
+        return time.mktime((2000 + year, month, day, 0, 0, 0, 0, 0, -1))
+    mtime = time.localtime(os.stat(path).st_mtime)
+    return time.mktime((mtime.tm_year, mtime.tm_mon, mtime.tm_mday, 0, 0, 0, 0, 0, -1))
+
+
+def _fraction(value):
+    return float(b'0.' + value) if value else 0.0
+
+
+class LineParser(object):
+    # Parses the lines of one file. Its state (the day of time-only timestamps and the last
+    # line's fields for continuation lines) is kept in the index between runs.
+
+    def __init__(self, base_date, last=None):
+        self.base_date = base_date
+        if last is None or last[0] is None:
+            self.last, self._last_clock = (base_date, LEVELS.index('INFO'), None, None), None
+        else:
+            self.last, self._last_clock = tuple(last), last[0] - base_date
+
+    def parse(self, line):
+        # -> (ts, level, dpid, tenant, marker)
+        level = None
+        match = AKKA_LINE.match(line)
+        if match is not None:
+            level, month, day, year, hour, minute, second, fraction = match.groups()
+            ts = time.mktime((int(year), int(month), int(day), int(hour), int(minute), int(second), 0, 0, -1))
+            ts += _fraction(fraction)
+        else:
+            match = TIME_LINE.match(line)
+            if match is not None:
+                hour, minute, second, fraction, level = match.groups()
+                clock = int(hour) * 3600 + int(minute) * 60 + int(second) + _fraction(fraction)
+                if self._last_clock is not None and clock < self._last_clock - 3600:
+                    self.base_date += 86400         # past midnight
+                self._last_clock = clock
+                ts = self.base_date + clock
+            else:
+                match = ISO_LINE.match(line)
+                if match is None:
+                    # Continuation of the previous line:
+                    ts, level, dpid, tenant = self.last
+                    return ts, level, dpid, tenant, None
+                year, month, day, hour, minute, second, fraction, level = match.groups()
+                ts = time.mktime((int(year), int(month), int(day), int(hour), int(minute), int(second), 0, 0, -1))
+                ts += _fraction(fraction)
+        level = LEVEL_CODES.get((level or b'').upper(), LEVELS.index('INFO'))
+        dpid = tenant = marker = None
+        match = DPID_RE.search(line) or DPID_HEX_RE.search(line)
+        if match is not None:
+            dpid = sql_dpid(parse_dpid(match.group(1)))
+        match = TENANT_RE.search(line)
+        if match is not None:
+            tenant = int(match.group(1))
+        match = OPERATION_RE.search(line)
+        if match is not None:
+            marker = match.lastindex - 1
+        self.last = (ts, level, dpid, tenant)
+        return ts, level, dpid, tenant, marker
+
+
+
+## INDEX ##
+###########
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY, path TEXT UNIQUE, component TEXT, inode INTEGER,
+    offset INTEGER, base_date REAL, last_ts REAL, last_level INTEGER, last_dpid INTEGER, last_tenant INTEGER);
+CREATE TABLE IF NOT EXISTS lines (
+    ts REAL, file INTEGER, offset INTEGER, length INTEGER,
+    level INTEGER, dpid INTEGER, tenant INTEGER, marker INTEGER);
+CREATE INDEX IF NOT EXISTS lines_ts ON lines (ts);
+CREATE INDEX IF NOT EXISTS lines_level ON lines (level, ts);
+CREATE INDEX IF NOT EXISTS lines_dpid ON lines (dpid, ts) WHERE dpid IS NOT NULL;
+CREATE INDEX IF NOT EXISTS lines_tenant ON lines (tenant, ts) WHERE tenant IS NOT NULL;
+CREATE INDEX IF NOT EXISTS lines_marker ON lines (marker, ts) WHERE marker IS NOT NULL;
+'''
+
+READ_SIZE = 1 << 20
+
+
+class LogIndex(object):
+
+    def __init__(self, path=DEFAULT_INDEX):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def _file_state(self, path, component, stat):
+        row = self.db.execute('SELECT id, inode, offset, base_date, last_ts, last_level, last_dpid, last_tenant '
+                              'FROM files WHERE path = ?', (path,)).fetchone()
+        if row is not None and row[1] == stat.st_ino and row[2] <= stat.st_size:
+            return row[0], row[2], LineParser(row[3], row[4:])
+        if row is not None:
+            # Truncated or replaced by a new file of the same name:
+            self.db.execute('DELETE FROM lines WHERE file = ?', (row[0],))
+            self.db.execute('DELETE FROM files WHERE id = ?', (row[0],))
+        base_date = file_base_date(path)
+        cursor = self.db.execute('INSERT INTO files (path, component, inode, offset, base_date) VALUES (?, ?, ?, 0, ?)',
+                                 (path, component, stat.st_ino, base_date))
+        return cursor.lastrowid, 0, LineParser(base_date)
+
+    def update_file(self, path, component, on_line=None):
+        # Indexes the complete lines appended to path since its last update, returns their count.
+        # on_line(component, line) is called with every new line (e.g. to print them).
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return 0
+        file_id, offset, parser = self._file_state(path, component, stat)
+        if offset == stat.st_size:
+            return 0
+        count = 0
+        with self.db, open(path, 'rb') as log_file:
+            log_file.seek(offset)
+            rest = b''
+            while True:
+                data = log_file.read(READ_SIZE)
+                if not data:
+                    break
+                data = rest + data
+                end = data.rfind(b'\n') + 1
+                rest = data[end:]
+                rows = []
+                position = 0
+                for line in data[:end].split(b'\n')[:-1]:
+                    ts, level, dpid, tenant, marker = parser.parse(line)
+                    rows.append((ts, file_id, offset + position, len(line), level, dpid, tenant, marker))
+                    position += len(line) + 1
+                    if on_line is not None:
+                        on_line(component, line)
+                self.db.executemany('INSERT INTO lines VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+                offset += end
+                count += len(rows)
+            self.db.execute('UPDATE files SET offset = ?, base_date = ?, last_ts = ?, last_level = ?, last_dpid = ?, '
+                            'last_tenant = ? WHERE id = ?', (offset, parser.base_date) + tuple(parser.last) + (file_id,))
+        return count
+
+    def file_offset(self, path):
+        # The consumed offset of path, None for files not indexed yet:
+        row = self.db.execute('SELECT offset FROM files WHERE path = ?', (path,)).fetchone()
+        return row[0] if row is not None else None
+
+    def update_dir(self, log_dir, on_line=None):
+        if not os.path.isdir(log_dir):
+            return 0
+        component = os.path.basename(os.path.normpath(log_dir))
+        return sum(self.update_file(os.path.join(log_dir, name), component, on_line)
+                   for name in sorted(os.listdir(log_dir)) if name.endswith(LOG_SUFFIXES))
+
+    ## QUERIES ##
+
+    def query(self, since=None, until=None, level=None, dpid=None, tenant=None, component=None,
+              grep=None, limit=1000):
+        # Lines matching all given filters (level: the minimal level), oldest first, as
+        # (ts, component, level name, text) tuples. grep is matched on the text of the selected lines.
+        where, args = [], []
+        for clause, value in (('lines.ts >= ?', since), ('lines.ts <= ?', until), ('lines.level >= ?', level),
+                              ('lines.dpid = ?', dpid), ('lines.tenant = ?', tenant), ('files.component = ?', component)):
+            if value is not None:
+                where.append(clause)
+                args.append(value)
+        sql = ('SELECT lines.ts, files.component, lines.level, files.path, lines.offset, lines.length '
+               'FROM lines JOIN files ON files.id = lines.file')
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY lines.ts, lines.file, lines.offset'
+        pattern = re.compile(grep.encode()) if grep else None
+        results, handles = [], {}
+        try:
+            for ts, component_name, level_code, path, offset, length in self.db.execute(sql, args):
+                if path not in handles:
+                    handles[path] = open(path, 'rb')
+                handles[path].seek(offset)
+                text = handles[path].read(length)
+                if pattern is not None and not pattern.search(text):
+                    continue
+                results.append((ts, component_name, LEVELS[level_code], text.decode('utf-8', 'replace')))
+                if limit and len(results) >= limit:
+                    break
+        finally:
+            for handle in handles.values():
+                handle.close()
+        return results
+
+    def latency(self, operation, since=None, until=None):
+        # tenant -> [durations in s] of an operation of OPERATIONS, pairing each start line of a
+        # tenant with its next end line.
+        code = [name for name, _ in OPERATIONS].index(operation)
+        sql = 'SELECT ts, tenant, marker FROM lines WHERE marker IN (?, ?)'
+        args = [2 * code, 2 * code + 1]
+        for clause, value in (('ts >= ?', since), ('ts <= ?', until)):
+            if value is not None:
+                sql += ' AND ' + clause
+                args.append(value)
+        started, durations = {}, {}
+        for ts, tenant, marker in self.db.execute(sql + ' ORDER BY ts', args):
+            if marker == 2 * code:
+                started[tenant] = ts
+            elif tenant in started:
+                durations.setdefault(tenant, []).append(ts - started.pop(tenant))
+        return durations
+
+
+
+## FOLLOWING ##
+###############
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class Inotify(object):
+    # Minimal inotify binding via ctypes (Linux only, see follow() for the fallback).
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.dirs = {}
+
+    def watch(self, path):
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed for " + path)
+        self.dirs[wd] = path
+
+    def read(self, timeout):
+        # -> {dir: set of changed file names}, None for all files of a dir (after a queue overflow).
+        changed = {}
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return changed
+        try:
+            data = os.read(self.fd, 1 << 16)
+        except BlockingIOError:
+            return changed
+        position = 0
+        while position + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, position)
+            name = data[position + EVENT_HEADER.size:position + EVENT_HEADER.size + length].rstrip(b'\0')
+            position += EVENT_HEADER.size + length
+            if mask & IN_Q_OVERFLOW:
+                return dict((path, None) for path in self.dirs.values())
+            if wd in self.dirs and changed.get(self.dirs[wd], set()) is not None:
+                changed.setdefault(self.dirs[wd], set()).add(os.fsdecode(name))
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def newest_log(log_dirs):
+    # The most recently modified log file of the dirs, None if there is none:
+    paths = [os.path.join(log_dir, name) for log_dir in log_dirs if os.path.isdir(log_dir)
+             for name in os.listdir(log_dir) if name.endswith(LOG_SUFFIXES)]
+    return max(paths, key=os.path.getmtime) if paths else None
+
+
+def read_lines(path, start, end):
+    # The complete lines of path between the offsets start and end:
+    with open(path, 'rb') as log_file:
+        log_file.seek(start)
+        data = log_file.read(max(end - start, 0))
+    return data[:data.rfind(b'\n') + 1].split(b'\n')[:-1]
+
+
+def tail_lines(path, count, end):
+    # The last count complete lines of path before the offset end, read backwards from end:
+    start = end
+    with open(path, 'rb') as log_file:
+        while start > 0:
+            start = max(start - READ_SIZE, 0)
+            log_file.seek(start)
+            if log_file.read(end - start).count(b'\n') > count:
+                break
+    lines = read_lines(path, start, end)
+    return lines[-count:] if count else []
+
+
+def follow(index, log_dirs, on_line=None, interval=1.0, tail=0):
+    # Indexes the dirs (not passing the lines indexed so far to on_line), then follows them until
+    # interrupted. With inotify, only the changed files are read; without it (or for dirs that do
+    # not exist yet) all dirs are re-checked every interval.
+    # With tail, on_line first gets the last tail lines of the newest log file (as tail -n does)
+    # right away, and after the indexing the lines that file got in the meantime.
+    newest = newest_log(log_dirs) if on_line is not None and tail else None
+    if newest is not None:
+        component, tail_end = os.path.basename(os.path.dirname(newest)), os.path.getsize(newest)
+        for line in tail_lines(newest, tail, tail_end):
+            on_line(component, line)
+    for log_dir in log_dirs:
+        index.update_dir(log_dir)
+    if newest is not None:
+        for line in read_lines(newest, tail_end, index.file_offset(newest) or 0):
+            on_line(component, line)
+    try:
+        inotify = Inotify()
+    except (OSError, AttributeError):
+        inotify = None
+        print("inotify not available, polling the log dirs every %.1fs" % interval)
+    try:
+        while True:
+            if inotify is None:
+                time.sleep(interval)
+                for log_dir in log_dirs:
+                    index.update_dir(log_dir, on_line)
+                continue
+            unwatched = [log_dir for log_dir in log_dirs if log_dir not in inotify.dirs.values()]
+            for log_dir in unwatched:
+                if os.path.isdir(log_dir):
+                    inotify.watch(log_dir)
+                    index.update_dir(log_dir, on_line)
+            for log_dir, names in inotify.read(interval).items():
+                if names is None:
+                    index.update_dir(log_dir, on_line)
+                    continue
+                component = os.path.basename(os.path.normpath(log_dir))
+                for name in sorted(names):
+                    if name.endswith(LOG_SUFFIXES):
+                        index.update_file(os.path.join(log_dir, name), component, on_line)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if inotify is not None:
+            inotify.close()
+
+
+
+## COMMAND LINE ##
+##################
+
+DURATION_UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_since(value):
+    # '5m', '2h', '30s' -> the timestamp that long ago, else an absolute epoch timestamp
+    if value is None:
+        return None
+    if value[-1] in DURATION_UNITS:
+        return time.time() - float(value[:-1]) * DURATION_UNITS[value[-1]]
+    return float(value)
+
+
+def _print_line(component, line):
+    print('%-12s %s' % (component, line.decode('utf-8', 'replace')))
+    sys.stdout.flush()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='log_service.py', description="Indexes and queries the testbed logs.")
+    parser.add_argument('--index', default=DEFAULT_INDEX, help="index database (default: %(default)s)")
+    commands = parser.add_subparsers(dest='command')
+    for name in ('follow', 'update'):
+        command = commands.add_parser(name, help="index the log dirs and follow them" if name == 'follow'
+                                      else "index the log dirs once")
+        command.add_argument('dirs', nargs='*', help="log dirs (default: %s under %s)" % (', '.join(DEFAULT_DIRS), LOG_ROOT))
+        if name == 'follow':
+            command.add_argument('--print', action='store_true', help="print the lines appended from now on (as tail -f)")
+            command.add_argument('--tail', type=int, default=0, metavar='N',
+                                 help="with --print, first print the last N lines of the newest log file")
+            command.add_argument('--interval', type=float, default=1.0)
+    query = commands.add_parser('query', help="print the indexed lines matching all filters")
+    query.add_argument('--since', help="e.g. 5m, 2h or an epoch timestamp")
+    query.add_argument('--until')
+    query.add_argument('--level', choices=LEVELS, type=str.upper, help="minimal level")
+    query.add_argument('--dpid', help="e.g. 00:00:00:00:00:01:11:00 or 0x11100")
+    query.add_argument('--tenant', type=int)
+    query.add_argument('--component', help="log dir name, e.g. ovx")
+    query.add_argument('--grep', help="regular expression on the line text")
+    query.add_argument('--limit', type=int, default=1000, help="0 for all")
+    latency = commands.add_parser('latency', help="per tenant latency of an operation")
+    latency.add_argument('operation', choices=[name for name, _ in OPERATIONS])
+    latency.add_argument('--since')
+    latency.add_argument('--until')
+    args = parser.parse_args(argv)
+    if args.command is None:
+        parser.print_help()
+        return 2
+
+    index = LogIndex(args.index)
+    try:
+        if args.command in ('follow', 'update'):
+            log_dirs = [os.path.abspath(path) for path in args.dirs] or \
+                       [os.path.join(LOG_ROOT, name) for name in DEFAULT_DIRS]
+            if args.command == 'follow':
+                follow(index, log_dirs, _print_line if args.print else None, args.interval, args.tail)
+            else:
+                start = time.time()
+                count = sum(index.update_dir(log_dir) for log_dir in log_dirs)
+                print("Indexed %d new lines in %.2fs" % (count, time.time() - start))
+        elif args.command == 'query':
+            start = time.time()
+            lines = index.query(parse_since(args.since), parse_since(args.until),
+                                LEVELS.index(args.level) if args.level else None,
+                                sql_dpid(parse_dpid(args.dpid)) if args.dpid else None, args.tenant, args.component,
+                                args.grep, args.limit)
+            for ts, component, level, text in lines:
+                print('%s %-12s %-5s %s' % (time.strftime('%y-%m-%d %H:%M:%S', time.localtime(ts)),
+                                            component, level, text))
+            print("(%d lines in %.1fms)" % (len(lines), (time.time() - start) * 1000))
+        else:
+            durations = index.latency(args.operation, parse_since(args.since), parse_since(args.until))
+            print('%-8s %6s %10s %10s %10s' % ('tenant', 'count', 'min [ms]', 'median', 'max'))
+            for tenant in sorted(durations, key=lambda tenant: (tenant is None, tenant)):
+                values = sorted(durations[tenant])
+                print('%-8s %6d %10.1f %10.1f %10.1f' % (tenant, len(values), values[0] * 1000,
+                                                         values[len(values) // 2] * 1000, values[-1] * 1000))
+    finally:
+        index.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
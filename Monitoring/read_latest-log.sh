@@ -1,5 +1,15 @@
 #!/bin/bash
+# Prints the last 50 lines of the latest log file of the given log dir (or, without one, of all
+# testbed log dirs under ~/logs) and follows the dir(s) via the indexing log service, see
+# log_service.py for the queries on the index it builds.
+# Without python3, falls back to tail -f on the latest log file of the given dir.
 LOGPATH=$1
+SCRIPT_DIR=$(dirname "$0")
+
+if [[ -x `which python3` ]]; then
+	exec python3 ${SCRIPT_DIR}/log_service.py follow --print --tail 50 ${LOGPATH}
+fi
+
 LATEST_LOG=$(ls -t ${LOGPATH} | head -1)
 
-tail -n 50 -f ${LATEST_LOG}
+tail -n 50 -f ${LOGPATH}/${LATEST_LOG}
@@ -0,0 +1,86 @@
+__author__ = 'Constantin'
+
+#Python system imports:
+import os
+import time
+
+import pytest
+
+#Own Imports:
+from log_service import LEVELS, LineParser, LogIndex, parse_dpid, sql_dpid
+
+
+
+## LINE PARSING ##
+##################
+
+# Midnight of 2015-05-21, the day of the log files:
+BASE_DATE = time.mktime((2015, 5, 21, 0, 0, 0, 0, 0, -1))
+DPID = parse_dpid('00:00:00:00:00:01:11:00')
+
+
+def parse(*lines):
+    parser = LineParser(BASE_DATE)
+    return [parser.parse(line) for line in lines]
+
+
+def test_akka_line():
+    (ts, level, dpid, tenant, marker), = parse(
+        b'[WARN] [05/21/2015 12:00:01.250] [thread] [akka://cloudAgentSystem/user/pubSub] tenant 3 lost switch 00:00:00:00:00:01:11:00')
+    assert ts == BASE_DATE + 12 * 3600 + 1.25
+    assert (LEVELS[level], dpid, tenant, marker) == ('WARN', DPID, 3, None)
+
+
+@pytest.mark.parametrize('line', [b'12:00:01.250 ERROR [OVXSwitch] switch dpid 00:00:00:00:00:01:11:00 failed',
+                                  b'12:00:01,250 [main] ERROR n.f.c.Controller - dpid 0x11100 disconnected',
+                                  b'12:00:01.250 ERROR [OVXSwitch] dpid=11100 failed'])
+def test_logback_line(line):
+    (ts, level, dpid, tenant, marker), = parse(line)
+    assert ts == BASE_DATE + 12 * 3600 + 1.25
+    assert (LEVELS[level], dpid) == ('ERROR', DPID)
+
+
+def test_iso_line():
+    (ts, level, dpid, tenant, marker), = parse(b'2015-05-21 12:00:01,250 DEBUG Creating Network for tenant 7')
+    assert ts == BASE_DATE + 12 * 3600 + 1.25
+    assert (LEVELS[level], dpid, tenant, marker) == ('DEBUG', None, 7, 0)
+
+
+def test_continuation_lines():
+    # Stack traces inherit the time, level and ids of the line they continue:
+    first, trace, other = parse(b'12:00:01.250 ERROR [OVXSwitch] switch dpid 00:00:00:00:00:01:11:00 failed',
+                                b'\tat net.onrc.openvirtex.elements.datapath.OVXSwitch.boot(OVXSwitch.java:42)',
+                                b'12:00:02.000 INFO [OVXSwitch] dpid 00:01 is no dpid')
+    assert trace[:4] == first[:4] and first[2] == DPID
+    assert other[2] is None
+
+
+def test_past_midnight():
+    before, after = parse(b'23:59:59.000 INFO [a] x', b'00:00:01.000 INFO [a] y')
+    assert after[0] - before[0] == 2
+
+
+def test_high_dpids():
+    (_, _, dpid, _, _), = parse(b'12:00:00.000 INFO [a] switch ff:00:00:00:00:00:00:01 up')
+    assert dpid == sql_dpid(0xff00000000000001) < 0
+
+
+
+## INDEX QUERIES ##
+###################
+
+def test_query_by_dpid(tmpdir):
+    log_dir = tmpdir.mkdir('ovx')
+    log_dir.join('15-05-21_12-00-00.log').write_binary(
+        b'12:00:00.000 INFO [OVXSwitch] switch dpid 00:00:00:00:00:01:12:00 up\n'
+        b'12:00:01.250 ERROR [OVXSwitch] switch dpid 00:00:00:00:00:01:11:00 failed\n'
+        b'\tat net.onrc.openvirtex.elements.datapath.OVXSwitch.boot(OVXSwitch.java:42)\n')
+    index = LogIndex(str(tmpdir.join('index.db')))
+    try:
+        assert index.update_dir(str(log_dir)) == 3
+        for text in ('00:00:00:00:00:01:11:00', '0x11100'):
+            lines = index.query(dpid=sql_dpid(parse_dpid(text)))
+            assert [(component, level) for _, component, level, _ in lines] == [('ovx', 'ERROR'), ('ovx', 'ERROR')]
+        assert index.query(dpid=0) == []
+    finally:
+        index.close()
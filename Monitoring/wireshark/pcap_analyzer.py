@@ -0,0 +1,557 @@
+__author__ = 'Constantin'
+
+# Offline analysis of the (multi-GB) captures of tshark_dump.sh, without opening them in Wireshark:
+#   python pcap_analyzer.py ~/logs/tshark/15-05-21_12-00-00.GW-eth1.host.pcap --json report.json
+# - per-flow packets, bytes and throughput (innermost IPv4 5-tuple, also inside GRE),
+# - per GRE tunnel traffic and LLDP frames inside it (leaking past the GW's dl_type=0x88CC drop rule),
+# - OpenFlow message timelines (type, xid, direction) of the control channel ports.
+# The capture is mmap'ed and split into chunks analysed by separate processes. Each process walks
+# the record headers of its chunk, gathers a fixed-size prefix of BATCH records at a time and
+# decodes the headers of the whole batch at once via NumPy arrays over the mapped file, so memory
+# stays bounded by the batch size, whatever the size of the capture. Without NumPy, the same
+# decoding runs record by record via struct (much slower).
+# Classic pcap (Ethernet or Linux cooked 'any' captures) only, see tshark_dump.sh's '-F pcap'.
+# OpenFlow headers are decoded at the start of each TCP segment (and the messages following it
+# in the same segment), messages split over segments are not reassembled.
+
+#Python system imports:
+import argparse
+from array import array
+import json
+import mmap
+import multiprocessing
+import os
+import socket
+import struct
+import sys
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+
+## PCAP FILES ##
+################
+
+PCAP_MAGIC_US = 0xa1b2c3d4
+PCAP_MAGIC_NS = 0xa1b23c4d
+PCAPNG_MAGIC = 0x0a0d0d0a
+GLOBAL_HEADER_LEN = 24
+RECORD_HEADER_LEN = 16
+
+LINKTYPE_ETHERNET = 1
+LINKTYPE_LINUX_SLL = 113
+# Offset of the (outer) ethertype per link type:
+_ETHERTYPE_OFFSETS = {LINKTYPE_ETHERNET: 12, LINKTYPE_LINUX_SLL: 14}
+
+
+class PcapError(ValueError):
+    pass
+
+
+class PcapLayout(object):
+    # Global header facts every chunk worker needs: byte order, time resolution, link type.
+
+    def __init__(self, path):
+        with open(path, 'rb') as pcap_file:
+            header = pcap_file.read(GLOBAL_HEADER_LEN)
+            first = pcap_file.read(RECORD_HEADER_LEN)
+        if len(header) < GLOBAL_HEADER_LEN:
+            raise PcapError("Not a pcap file (too short): "+ path)
+        magic, = struct.unpack('<I', header[:4])
+        if magic == PCAPNG_MAGIC:
+            raise PcapError("%s is pcapng, convert it first: editcap -F pcap %s out.pcap" % (path, path))
+        for endian in '<>':
+            magic, = struct.unpack(endian + 'I', header[:4])
+            if magic in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+                break
+        else:
+            raise PcapError("Not a pcap file (magic %08x): %s" % (magic, path))
+        self.endian = endian
+        self.ts_divisor = 1e9 if magic == PCAP_MAGIC_NS else 1e6
+        _, _, _, _, self.snaplen, self.linktype = struct.unpack(endian + 'HHiIII', header[4:])
+        if self.linktype not in _ETHERTYPE_OFFSETS:
+            raise PcapError("Unsupported link type %d (Ethernet and Linux cooked captures only)" % self.linktype)
+        self.ethertype_offset = _ETHERTYPE_OFFSETS[self.linktype]
+        self.record_header = struct.Struct(endian + 'IIII')
+        self.first_ts_sec = self.record_header.unpack(first)[0] if len(first) == RECORD_HEADER_LEN else 0
+        self.size = os.path.getsize(path)
+
+    def plausible(self, data, offset, end):
+        # Whether a record header starts at offset: sane lengths and timestamp.
+        if offset + RECORD_HEADER_LEN > end:
+            return False
+        ts_sec, ts_frac, incl_len, orig_len = self.record_header.unpack_from(data, offset)
+        return (ts_frac < self.ts_divisor and incl_len <= orig_len and incl_len <= max(self.snaplen, 65535)
+                and orig_len <= 262144 and ts_sec >= self.first_ts_sec and offset + RECORD_HEADER_LEN + incl_len <= end)
+
+    def resync(self, data, start, chain=8):
+        # First record boundary at or after start: a plausible header followed by chain more
+        # plausible ones (or by the end of the file).
+        end = len(data)
+        for offset in range(start, min(end, start + 2 * 262144)):
+            position, ok = offset, True
+            for _ in range(chain):
+                if position == end:
+                    break
+                if not self.plausible(data, position, end):
+                    ok = False
+                    break
+                position += RECORD_HEADER_LEN + self.record_header.unpack_from(data, position)[2]
+            if ok:
+                return offset
+        return end
+
+
+def chunk_ranges(size, chunk_bytes):
+    return [(start, min(start + chunk_bytes, size)) for start in range(GLOBAL_HEADER_LEN, size, chunk_bytes)]
+
+
+
+## HEADER DECODING ##
+#####################
+
+ETH_IPV4 = 0x0800
+ETH_VLAN = 0x8100
+ETH_LLDP = 0x88cc
+GRE_TEB = 0x6558            # transparent ethernet bridging, as OVS' GRE ports send
+IPPROTO_TCP = 6
+IPPROTO_UDP = 17
+IPPROTO_GRE = 47
+# Decoded bytes per record, enough for Ethernet/VLAN/IPv4/GRE/Ethernet/VLAN/IPv4/TCP/OpenFlow headers:
+PREFIX_LEN = 160
+BATCH = 65536
+MAX_OF_MESSAGES = 200000
+
+OF_HEADER = struct.Struct('!BBHI')
+_OF_TYPES = ('HELLO', 'ERROR', 'ECHO_REQUEST', 'ECHO_REPLY', 'EXPERIMENTER', 'FEATURES_REQUEST',
+             'FEATURES_REPLY', 'GET_CONFIG_REQUEST', 'GET_CONFIG_REPLY', 'SET_CONFIG', 'PACKET_IN',
+             'FLOW_REMOVED', 'PORT_STATUS', 'PACKET_OUT', 'FLOW_MOD')
+
+
+def of_type_name(msg_type):
+    return _OF_TYPES[msg_type] if msg_type < len(_OF_TYPES) else 'TYPE_%d' % msg_type
+
+
+def _decode_numpy(prefix, caplen, layout, of_ports):
+    # Vectorized decoding of a batch: prefix is a (records x PREFIX_LEN) uint8 array, caplen the
+    # captured length of each record. Returns a dict of equally long column arrays.
+    np = numpy
+    rows = np.arange(len(prefix))
+    limit = np.minimum(caplen, PREFIX_LEN)
+
+    def field(offset, size, valid=True):
+        ok = valid & (offset + size <= limit)
+        position = np.where(ok, offset, 0)
+        value = prefix[rows, position].astype(np.int64)
+        for byte in range(1, size):
+            value = (value << 8) | prefix[rows, np.minimum(position + byte, PREFIX_LEN - 1)]
+        return np.where(ok, value, 0), ok
+
+    def ethernet(type_offset, valid):
+        ethertype, valid = field(type_offset, 2, valid)
+        vlan = ethertype == ETH_VLAN
+        inner_type, _ = field(type_offset + 4, 2, valid & vlan)
+        return np.where(vlan, inner_type, ethertype), type_offset + 2 + 4 * vlan
+
+    def ipv4(net, valid):
+        version_ihl, valid = field(net, 1, valid)
+        valid &= (version_ihl >> 4) == 4
+        proto, _ = field(net + 9, 1, valid)
+        total, _ = field(net + 2, 2, valid)
+        src, _ = field(net + 12, 4, valid)
+        dst, _ = field(net + 16, 4, valid)
+        return valid, proto, total, src, dst, net + (version_ihl & 0xf) * 4
+
+    all_rows = np.ones(len(prefix), dtype=bool)
+    ethertype, net = ethernet(np.full(len(prefix), layout.ethertype_offset, dtype=np.int64), all_rows)
+    outer_ip, outer_proto, _, outer_src, outer_dst, outer_l4 = ipv4(net, ethertype == ETH_IPV4)
+
+    # GRE: flags (checksum, key, sequence number present) give the header length.
+    gre = outer_ip & (outer_proto == IPPROTO_GRE)
+    gre_flags, _ = field(outer_l4, 2, gre)
+    gre_proto, _ = field(outer_l4 + 2, 2, gre)
+    gre_payload = (outer_l4 + 4 + 4 * ((gre_flags & 0x8000) > 0) + 4 * ((gre_flags & 0x2000) > 0)
+                   + 4 * ((gre_flags & 0x1000) > 0))
+    teb = gre & (gre_proto == GRE_TEB)
+    inner_type, inner_net = ethernet(gre_payload + 12, teb)
+    inner_type = np.where(teb, inner_type, np.where(gre & (gre_proto == ETH_IPV4), ETH_IPV4, 0))
+    inner_net = np.where(teb, inner_net, gre_payload)
+
+    # Innermost IPv4 and TCP/UDP:
+    final_type = np.where(gre, inner_type, ethertype)
+    ip, proto, total, src, dst, l4 = ipv4(np.where(gre, inner_net, net), final_type == ETH_IPV4)
+    ports = ip & ((proto == IPPROTO_TCP) | (proto == IPPROTO_UDP))
+    sport, _ = field(l4, 2, ports)
+    dport, _ = field(l4 + 2, 2, ports)
+    tcp = ip & (proto == IPPROTO_TCP)
+    data_offset, _ = field(l4 + 12, 1, tcp)
+    payload = l4 + (data_offset >> 4) * 4
+    payload_len = np.where(tcp, total - (l4 - np.where(gre, inner_net, net)) - (data_offset >> 4) * 4, 0)
+
+    of_candidate = tcp & (np.isin(sport, of_ports) | np.isin(dport, of_ports)) & (payload_len >= 8)
+    of_version, of_ok = field(payload, 1, of_candidate)
+    of_ok &= (of_version >= 1) & (of_version <= 6)
+    of_type, _ = field(payload + 1, 1, of_ok)
+    of_len, _ = field(payload + 2, 2, of_ok)
+    of_xid, _ = field(payload + 4, 4, of_ok)
+    return {'gre': gre, 'outer_src': outer_src, 'outer_dst': outer_dst, 'lldp': final_type == ETH_LLDP,
+            'ip': ip, 'src': src, 'dst': dst, 'proto': proto, 'sport': sport, 'dport': dport,
+            'of': of_ok, 'of_version': of_version, 'of_type': of_type, 'of_len': of_len, 'of_xid': of_xid,
+            'payload': payload, 'payload_len': payload_len}
+
+
+def _decode_python(data, offset, caplen, layout, of_ports):
+    # The same columns as _decode_numpy, of one record at offset (struct based fallback).
+    end = offset + caplen
+
+    def u16(position):
+        return struct.unpack_from('!H', data, position)[0] if position + 2 <= end else None
+
+    def ethernet(type_offset):
+        ethertype = u16(type_offset)
+        if ethertype == ETH_VLAN:
+            return u16(type_offset + 4), type_offset + 6
+        return ethertype, type_offset + 2
+
+    def ipv4(net):
+        if net + 20 > end or data[net] >> 4 != 4:
+            return None
+        total, proto, src, dst = struct.unpack_from('!2xH5xB2xII', data, net)
+        return proto, total, src, dst, net + (data[net] & 0xf) * 4
+
+    record = {'gre': False, 'outer_src': 0, 'outer_dst': 0, 'lldp': False, 'ip': False, 'src': 0, 'dst': 0,
+              'proto': 0, 'sport': 0, 'dport': 0, 'of': False, 'of_version': 0, 'of_type': 0, 'of_len': 0,
+              'of_xid': 0, 'payload': 0, 'payload_len': 0}
+    ethertype, net = ethernet(offset + layout.ethertype_offset)
+    outer = ipv4(net) if ethertype == ETH_IPV4 else None
+    if outer is not None and outer[0] == IPPROTO_GRE and outer[4] + 4 <= end:
+        flags, gre_proto = struct.unpack_from('!HH', data, outer[4])
+        gre_payload = outer[4] + 4 + 4 * bool(flags & 0x8000) + 4 * bool(flags & 0x2000) + 4 * bool(flags & 0x1000)
+        record.update(gre=True, outer_src=outer[2], outer_dst=outer[3])
+        if gre_proto == GRE_TEB:
+            ethertype, net = ethernet(gre_payload + 12)
+        else:
+            ethertype, net = (ETH_IPV4 if gre_proto == ETH_IPV4 else 0), gre_payload
+    record['lldp'] = ethertype == ETH_LLDP
+    inner = ipv4(net) if ethertype == ETH_IPV4 else None
+    if inner is None:
+        return record
+    proto, total, src, dst, l4 = inner
+    record.update(ip=True, src=src, dst=dst, proto=proto)
+    if proto in (IPPROTO_TCP, IPPROTO_UDP) and l4 + 4 <= end:
+        record['sport'], record['dport'] = struct.unpack_from('!HH', data, l4)
+    if proto == IPPROTO_TCP and l4 + 13 <= end:
+        payload = l4 + (data[l4 + 12] >> 4) * 4
+        record.update(payload=payload - offset, payload_len=total - (l4 - net) - (data[l4 + 12] >> 4) * 4)
+        if (record['sport'] in of_ports or record['dport'] in of_ports) and record['payload_len'] >= 8 \
+                and payload + 8 <= end and 1 <= data[payload] <= 6:
+            version, msg_type, length, xid = OF_HEADER.unpack_from(data, payload)
+            record.update(of=True, of_version=version, of_type=msg_type, of_len=length, of_xid=xid)
+    return record
+
+
+
+## CHUNK ANALYSIS ##
+####################
+
+def _new_partial():
+    return {'packets': 0, 'bytes': 0, 'first_ts': None, 'last_ts': None, 'lldp': 0,
+            'flows': {}, 'tunnels': {}, 'of_counts': {}, 'of_messages': [], 'of_dropped': 0}
+
+
+def _add_of_message(partial, message):
+    partial['of_counts'][message[5]] = partial['of_counts'].get(message[5], 0) + 1
+    if len(partial['of_messages']) < MAX_OF_MESSAGES:
+        partial['of_messages'].append(message)
+    else:
+        partial['of_dropped'] += 1
+
+
+def _of_messages(data, ts, record, offset):
+    # All OpenFlow headers of a TCP segment whose payload starts with one:
+    # (ts, src, sport, dst, dport, type, xid, version)
+    position, remaining = offset + record['payload'], record['payload_len']
+    messages = []
+    while remaining >= 8 and position + 8 <= len(data):
+        version, msg_type, length, xid = OF_HEADER.unpack_from(data, position)
+        if length < 8 or not 1 <= version <= 6:
+            break
+        messages.append((ts, record['src'], record['sport'], record['dst'], record['dport'], msg_type, xid, version))
+        position += length
+        remaining -= length
+    return messages
+
+
+def _aggregate_record(partial, record, ts, orig_len):
+    if record['lldp']:
+        partial['lldp'] += 1
+    if record['gre']:
+        tunnel = partial['tunnels'].setdefault((record['outer_src'], record['outer_dst']), [0, 0, 0])
+        tunnel[0] += 1
+        tunnel[1] += orig_len
+        tunnel[2] += record['lldp']
+    if record['ip']:
+        key = (record['src'], record['dst'], record['proto'], record['sport'], record['dport'])
+        flow = partial['flows'].get(key)
+        if flow is None:
+            partial['flows'][key] = [1, orig_len, ts, ts]
+        else:
+            flow[0] += 1
+            flow[1] += orig_len
+            flow[3] = ts
+
+
+class _Headers(object):
+    # Record headers of one batch, as arrays (shared with NumPy without copies).
+
+    def __init__(self):
+        self.offsets = array('q')       # of the record data
+        self.ts = array('d')
+        self.caplen = array('q')
+        self.orig_len = array('q')
+
+    def __len__(self):
+        return len(self.offsets)
+
+
+def _analyze_batch_numpy(data, headers, layout, of_ports, partial):
+    np = numpy
+    offsets = np.frombuffer(headers.offsets, dtype=np.int64)
+    ts = np.frombuffer(headers.ts, dtype=np.float64)
+    caplen = np.frombuffer(headers.caplen, dtype=np.int64)
+    orig_len = np.frombuffer(headers.orig_len, dtype=np.int64)
+
+    # Prefix gather straight out of the mapped file (past the file end, indices are clipped):
+    mapped = np.frombuffer(data, dtype=np.uint8)
+    index = np.minimum(offsets[:, None] + np.arange(PREFIX_LEN), len(mapped) - 1)
+    cols = _decode_numpy(mapped[index], caplen, layout, np.array(sorted(of_ports)))
+
+    lldp = cols['lldp']
+    partial['lldp'] += int(lldp.sum())
+    gre = cols['gre']
+    if gre.any():
+        keys = np.stack([cols['outer_src'][gre], cols['outer_dst'][gre]], axis=1)
+        unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        packets = np.bincount(inverse, minlength=len(unique))
+        octets = np.bincount(inverse, weights=orig_len[gre], minlength=len(unique))
+        leaked = np.bincount(inverse, weights=lldp[gre], minlength=len(unique))
+        for (src, dst), p, b, l in zip(unique.tolist(), packets.tolist(), octets.tolist(), leaked.tolist()):
+            tunnel = partial['tunnels'].setdefault((src, dst), [0, 0, 0])
+            tunnel[0] += p
+            tunnel[1] += int(b)
+            tunnel[2] += int(l)
+    ip = cols['ip']
+    if ip.any():
+        keys = np.stack([cols[column][ip] for column in ('src', 'dst', 'proto', 'sport', 'dport')], axis=1)
+        unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        packets = np.bincount(inverse, minlength=len(unique))
+        octets = np.bincount(inverse, weights=orig_len[ip], minlength=len(unique))
+        first = np.full(len(unique), np.inf)
+        last = np.full(len(unique), -np.inf)
+        np.minimum.at(first, inverse, ts[ip])
+        np.maximum.at(last, inverse, ts[ip])
+        flows = partial['flows']
+        for key, p, b, f, l in zip(map(tuple, unique.tolist()), packets.tolist(), octets.tolist(),
+                                   first.tolist(), last.tolist()):
+            flow = flows.get(key)
+            if flow is None:
+                flows[key] = [p, int(b), f, l]
+            else:
+                flow[0] += p
+                flow[1] += int(b)
+                flow[2] = min(flow[2], f)
+                flow[3] = max(flow[3], l)
+    of = cols['of']
+    if of.any():
+        # Segments holding exactly one message are taken from the columns, the others are walked:
+        single = of & (cols['of_len'] == cols['payload_len'])
+        columns = [ts] + [cols[column] for column in ('src', 'sport', 'dst', 'dport', 'of_type', 'of_xid', 'of_version')]
+        for message in zip(*[column[single].tolist() for column in columns]):
+            _add_of_message(partial, message)
+        for row in np.nonzero(of & ~single)[0].tolist():
+            record = dict((column, cols[column][row].item()) for column in cols)
+            for message in _of_messages(data, ts[row].item(), record, int(offsets[row])):
+                _add_of_message(partial, message)
+
+
+def _analyze_batch_python(data, headers, layout, of_ports, partial):
+    for offset, ts, caplen, orig_len in zip(headers.offsets, headers.ts, headers.caplen, headers.orig_len):
+        record = _decode_python(data, offset, caplen, layout, of_ports)
+        _aggregate_record(partial, record, ts, orig_len)
+        if record['of']:
+            for message in _of_messages(data, ts, record, offset):
+                _add_of_message(partial, message)
+
+
+def analyze_chunk(task):
+    # Analyses all records starting in [start, end) of the capture.
+    path, start, end, of_ports, use_numpy = task
+    layout = PcapLayout(path)
+    analyze_batch = _analyze_batch_numpy if use_numpy and numpy is not None else _analyze_batch_python
+    partial = _new_partial()
+    with open(path, 'rb') as pcap_file:
+        with mmap.mmap(pcap_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if hasattr(data, 'madvise'):
+                data.madvise(mmap.MADV_SEQUENTIAL)
+            offset = start if start == GLOBAL_HEADER_LEN else layout.resync(data, start)
+            unpack_header, divisor, size = layout.record_header.unpack_from, layout.ts_divisor, len(data)
+            headers = _Headers()
+            while offset < end and offset + RECORD_HEADER_LEN <= size:
+                ts_sec, ts_frac, incl_len, orig_len = unpack_header(data, offset)
+                if offset + RECORD_HEADER_LEN + incl_len > size:
+                    break           # capture cut off while writing
+                ts = ts_sec + ts_frac / divisor
+                headers.offsets.append(offset + RECORD_HEADER_LEN)
+                headers.ts.append(ts)
+                headers.caplen.append(incl_len)
+                headers.orig_len.append(orig_len)
+                if partial['first_ts'] is None:
+                    partial['first_ts'] = ts
+                partial['last_ts'] = ts
+                partial['packets'] += 1
+                partial['bytes'] += orig_len
+                offset += RECORD_HEADER_LEN + incl_len
+                if len(headers) == BATCH:
+                    analyze_batch(data, headers, layout, of_ports, partial)
+                    headers = _Headers()
+            if len(headers):
+                analyze_batch(data, headers, layout, of_ports, partial)
+    return partial
+
+
+
+## REPORT ##
+############
+
+def merge_partials(partials):
+    result = _new_partial()
+    for partial in partials:
+        for counter in ('packets', 'bytes', 'lldp', 'of_dropped'):
+            result[counter] += partial[counter]
+        for ts_key, pick in (('first_ts', min), ('last_ts', max)):
+            values = [ts for ts in (result[ts_key], partial[ts_key]) if ts is not None]
+            result[ts_key] = pick(values) if values else None
+        for key, (packets, octets, first, last) in partial['flows'].items():
+            flow = result['flows'].setdefault(key, [0, 0, first, last])
+            flow[0] += packets
+            flow[1] += octets
+            flow[2] = min(flow[2], first)
+            flow[3] = max(flow[3], last)
+        for key, values in partial['tunnels'].items():
+            tunnel = result['tunnels'].setdefault(key, [0, 0, 0])
+            for field, value in enumerate(values):
+                tunnel[field] += value
+        for msg_type, count in partial['of_counts'].items():
+            result['of_counts'][msg_type] = result['of_counts'].get(msg_type, 0) + count
+        room = MAX_OF_MESSAGES - len(result['of_messages'])
+        result['of_messages'].extend(partial['of_messages'][:room])
+        result['of_dropped'] += max(0, len(partial['of_messages']) - room)
+    result['of_messages'].sort()
+    return result
+
+
+def _ip(value):
+    return socket.inet_ntoa(struct.pack('!I', value))
+
+
+def build_report(result, top=20):
+    flows = []
+    for (src, dst, proto, sport, dport), (packets, octets, first, last) in result['flows'].items():
+        seconds = last - first
+        flows.append({'src': '%s:%d' % (_ip(src), sport), 'dst': '%s:%d' % (_ip(dst), dport), 'proto': proto,
+                      'packets': packets, 'bytes': octets, 'seconds': seconds,
+                      'mbps': octets * 8 / seconds / 1e6 if seconds > 0 else None})
+    flows.sort(key=lambda flow: -flow['bytes'])
+    tunnels = [{'src': _ip(src), 'dst': _ip(dst), 'packets': packets, 'bytes': octets, 'lldp_leaked': lldp}
+               for (src, dst), (packets, octets, lldp) in sorted(result['tunnels'].items())]
+    timeline = {}
+    for ts, _, _, _, _, msg_type, _, _ in result['of_messages']:
+        second = timeline.setdefault(str(int(ts)), {})
+        second[of_type_name(msg_type)] = second.get(of_type_name(msg_type), 0) + 1
+    messages = [{'ts': ts, 'src': '%s:%d' % (_ip(src), sport), 'dst': '%s:%d' % (_ip(dst), dport),
+                 'type': of_type_name(msg_type), 'xid': xid, 'version': version}
+                for ts, src, sport, dst, dport, msg_type, xid, version in result['of_messages']]
+    return {'packets': result['packets'], 'bytes': result['bytes'],
+            'first_ts': result['first_ts'], 'last_ts': result['last_ts'], 'lldp_frames': result['lldp'],
+            'flows': len(flows), 'top_flows': flows[:top], 'tunnels': tunnels,
+            'openflow': {'counts': dict((of_type_name(msg_type), count)
+                                        for msg_type, count in sorted(result['of_counts'].items())),
+                         'per_second': timeline, 'messages': messages, 'messages_dropped': result['of_dropped']}}
+
+
+def format_report(report):
+    lines = ["%d packets, %d bytes, %d flows, %d LLDP frames"
+             % (report['packets'], report['bytes'], report['flows'], report['lldp_frames'])]
+    lines.append("\nTop flows:")
+    lines.extend("  %-21s -> %-21s proto %-3d %10d pkts %14d bytes %s"
+                 % (flow['src'], flow['dst'], flow['proto'], flow['packets'], flow['bytes'],
+                    '%10.3f Mbit/s' % flow['mbps'] if flow['mbps'] is not None else '')
+                 for flow in report['top_flows'])
+    if report['tunnels']:
+        lines.append("\nGRE tunnels:")
+        lines.extend("  %-15s -> %-15s %10d pkts %14d bytes %8d LLDP leaked%s"
+                     % (tunnel['src'], tunnel['dst'], tunnel['packets'], tunnel['bytes'], tunnel['lldp_leaked'],
+                        '  <-- LLDP drop rule missing?' if tunnel['lldp_leaked'] else '')
+                     for tunnel in report['tunnels'])
+    if report['openflow']['counts']:
+        lines.append("\nOpenFlow messages:")
+        lines.extend("  %-20s %10d" % item for item in sorted(report['openflow']['counts'].items()))
+    return '\n'.join(lines)
+
+
+
+## COMMAND LINE ##
+##################
+
+def analyze(path, workers=None, chunk_mb=256, of_ports=(6633, 6653), use_numpy=True):
+    layout = PcapLayout(path)
+    tasks = [(path, start, end, frozenset(of_ports), use_numpy)
+             for start, end in chunk_ranges(layout.size, chunk_mb * 1024 * 1024)]
+    if len(tasks) > 1 and workers != 1:
+        pool = multiprocessing.Pool(min(workers or os.cpu_count() or 1, len(tasks)))
+        try:
+            partials = pool.map(analyze_chunk, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        partials = [analyze_chunk(task) for task in tasks]
+    return merge_partials(partials)
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='pcap_analyzer.py', description="Analyse tshark_dump.sh captures.")
+    parser.add_argument('pcap')
+    parser.add_argument('--json', help="write the full report (incl. the OpenFlow timeline) to this file")
+    parser.add_argument('--workers', type=int, help="analysing processes (default: one per CPU)")
+    parser.add_argument('--chunk-mb', type=int, default=256, help="capture bytes per chunk (and process task)")
+    parser.add_argument('--of-ports', default='6633,6653', help="TCP ports of the OpenFlow control channel")
+    parser.add_argument('--top', type=int, default=20, help="number of flows to report")
+    parser.add_argument('--no-numpy', action='store_true', help="decode record by record, without NumPy")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    try:
+        result = analyze(args.pcap, args.workers, args.chunk_mb,
+                         [int(port) for port in args.of_ports.split(',')], not args.no_numpy)
+    except (PcapError, OSError) as e:
+        print("Cannot analyse capture: %s" % e)
+        return 2
+    report = build_report(result, args.top)
+    print(format_report(report))
+    print("\nAnalysed in %.2fs%s" % (time.time() - start, '' if numpy is not None and not args.no_numpy
+                                     else ' (without NumPy)'))
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(report, json_file, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
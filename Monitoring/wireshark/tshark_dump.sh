@@ -44,7 +44,7 @@ if [[ -x `which tshark` ]]; then
 	echo "Logfile: ${LOGFILE_DIR}/${LOGFILE_NAME}"
 	su -c "touch ${LOGFILE_DIR}/${LOGFILE_NAME}" ${SUDO_USER}
 	chmod o+rw ${LOGFILE_DIR}/${LOGFILE_NAME}
-	tshark -i ${IFACE} -w ${LOGFILE_DIR}/${LOGFILE_NAME}
+	tshark -i ${IFACE} -F pcap -w ${LOGFILE_DIR}/${LOGFILE_NAME}
 	exit 0
 else
 	echo "tshark not found!"
@@ -0,0 +1,266 @@
+__author__ = 'Constantin'
+
+#Python system imports:
+from array import array
+
+
+
+## ADDRESS ERRORS ##
+####################
+
+class AddressError(ValueError):
+    pass
+
+
+class AddressCollision(AddressError):
+    pass
+
+
+class AddressExhausted(AddressError):
+    pass
+
+
+
+## ADDRESS PARSING AND FORMATTING ##
+####################################
+
+# Pre-rendered octet and hex-byte strings, so that bulk formatting is a join per address:
+_OCTETS = [str(i) for i in range(256)]
+_HEX_BYTES = ['%02x' % i for i in range(256)]
+
+
+def parse_ip(ip_str):
+    octets = ip_str.strip().split('.')
+    if len(octets) != 4:
+        raise AddressError("Not an IPv4 address: "+ ip_str)
+    try:
+        values = [int(octet) for octet in octets]
+    except ValueError:
+        raise AddressError("Not an IPv4 address: "+ ip_str)
+    if any(value < 0 or value > 255 for value in values):
+        raise AddressError("IPv4 octet out of range in: "+ ip_str)
+    return (values[0] << 24) | (values[1] << 16) | (values[2] << 8) | values[3]
+
+
+def format_ip(ip_int):
+    o = _OCTETS
+    return o[(ip_int >> 24) & 0xff] +'.'+ o[(ip_int >> 16) & 0xff] +'.'+ o[(ip_int >> 8) & 0xff] +'.'+ o[ip_int & 0xff]
+
+
+def format_ips(ip_ints):
+    # Bulk variant of format_ip for a whole allocation (array, list or any int iterable):
+    o = _OCTETS
+    return ['%s.%s.%s.%s' % (o[ip >> 24], o[(ip >> 16) & 0xff], o[(ip >> 8) & 0xff], o[ip & 0xff])
+            for ip in ip_ints]
+
+
+def parse_hex_addr(readable_addr):
+    # Parses colon separated (00:00:00:00:00:01:10:00) or plain hex (0000000000011000)
+    # dpids and macs into their integer value:
+    try:
+        return int(readable_addr.replace(':', ''), 16)
+    except ValueError:
+        raise AddressError("Not a hex address: "+ readable_addr)
+
+
+def _format_hex_addr(addr_int, byte_count):
+    h = _HEX_BYTES
+    return ':'.join([h[(addr_int >> shift) & 0xff] for shift in range(8 * (byte_count - 1), -1, -8)])
+
+
+def format_dpid(dpid_int):
+    return _format_hex_addr(dpid_int, 8)
+
+
+def format_mac(mac_int):
+    return _format_hex_addr(mac_int, 6)
+
+
+def format_dpids(dpid_ints):
+    return [_format_hex_addr(dpid, 8) for dpid in dpid_ints]
+
+
+def format_macs(mac_ints):
+    return [_format_hex_addr(mac, 6) for mac in mac_ints]
+
+
+def dpid_to_hex(dpid_int):
+    # Mininet (and ovs-vsctl other-config:datapath-id) expect dpids without colons:
+    return '%016x' % dpid_int
+
+
+
+## SUBNETS ##
+#############
+
+MIN_PREFIX_LEN = 8
+MAX_PREFIX_LEN = 30
+
+
+class Subnet(object):
+    # An IPv4 subnet between /8 and /30. The network and broadcast address are never
+    # handed out, so a subnet holds 2^(32-prefix_len) - 2 usable host addresses.
+    # The base address is kept as given (e.g. 10.0.1.0 in 10.0.0.0/16), as host ip
+    # offsets ('+11') are counted from it.
+
+    def __init__(self, base, prefix_len):
+        if not MIN_PREFIX_LEN <= prefix_len <= MAX_PREFIX_LEN:
+            raise AddressError("Subnet prefix /%d is outside of /%d - /%d"
+                               % (prefix_len, MIN_PREFIX_LEN, MAX_PREFIX_LEN))
+        self.prefix_len = prefix_len
+        self.mask = (0xffffffff << (32 - prefix_len)) & 0xffffffff
+        self.base = base
+        self.network = base & self.mask
+        self.broadcast = self.network | (~self.mask & 0xffffffff)
+
+    @classmethod
+    def parse(cls, net_ip, default_prefix_len=16):
+        # Accepts '10.1.0.0/16' as well as a bare '10.1.0.0' (with the default prefix):
+        if '/' in net_ip:
+            addr, prefix = net_ip.split('/', 1)
+            try:
+                prefix_len = int(prefix)
+            except ValueError:
+                raise AddressError("Invalid subnet prefix in: "+ net_ip)
+        else:
+            addr, prefix_len = net_ip, default_prefix_len
+        return cls(parse_ip(addr), prefix_len)
+
+    @property
+    def cidr(self):
+        return format_ip(self.base) +'/'+ str(self.prefix_len)
+
+    @property
+    def first_host(self):
+        return self.network + 1
+
+    @property
+    def last_host(self):
+        return self.broadcast - 1
+
+    @property
+    def size(self):
+        return self.broadcast - self.network - 1
+
+    def __contains__(self, ip_int):
+        return (ip_int & self.mask) == self.network
+
+    def __str__(self):
+        return format_ip(self.network) +'/'+ str(self.prefix_len)
+
+    def __repr__(self):
+        return 'Subnet(%s)' % self
+
+
+
+## ADDRESS POOLS ##
+###################
+
+class _AddressPool(object):
+    # Integer address range [first, last], handed out in ascending blocks by a cursor.
+    # Explicitly reserved addresses are kept in a set and skipped by the bulk allocation,
+    # so a bulk allocation costs O(count + reserved) and not a check per address.
+
+    def __init__(self, kind, first, last, typecode, formatter):
+        self.kind = kind
+        self.formatter = formatter
+        self.first = first
+        self.last = last
+        self.typecode = typecode
+        self.cursor = first
+        self.reserved = set()
+
+    def is_taken(self, addr):
+        return addr < self.cursor or addr in self.reserved
+
+    def reserve(self, addr):
+        if not self.first <= addr <= self.last:
+            raise AddressError(self.kind +" "+ self.formatter(addr) +" is outside of the pool range")
+        if self.is_taken(addr):
+            raise AddressCollision(self.kind +" "+ self.formatter(addr) +" is already allocated")
+        self.reserved.add(addr)
+        return addr
+
+    def skip_to(self, addr):
+        # Moves the cursor up to addr, so that allocations continue there instead of filling
+        # the gaps between the addresses reserved below it:
+        if addr > self.cursor:
+            self.cursor = min(addr, self.last + 1)
+            self.reserved = set(reserved for reserved in self.reserved if reserved >= self.cursor)
+
+    def allocate(self, count):
+        allocated = array(self.typecode)
+        while count > 0:
+            end = self.cursor + count
+            if end - 1 > self.last:
+                raise AddressExhausted("%s pool exhausted: %d more addresses requested than available"
+                                       % (self.kind, end - 1 - self.last))
+            # Reserved addresses inside the next block split it into free runs:
+            skipped = sorted(addr for addr in self.reserved if self.cursor <= addr < end)
+            run_start = self.cursor
+            for addr in skipped:
+                allocated.extend(range(run_start, addr))
+                run_start = addr + 1
+            allocated.extend(range(run_start, end))
+            self.reserved.difference_update(skipped)
+            self.cursor = end
+            count = len(skipped)
+        return allocated
+
+
+
+## ADDRESS PLAN ##
+##################
+
+class AddressPlan(object):
+    # Hands out host IPs, host MACs and switch DPIDs for one mininet (one subnet).
+    # Explicitly configured addresses (the HOSTS/SWITCHES tables) are reserved one by one,
+    # generated fabrics allocate whole blocks at once as packed integer arrays.
+    # Every address can be handed out only once; duplicates raise an AddressCollision.
+
+    def __init__(self, net_ip, dpid_base=0, mac_base=0):
+        self.subnet = net_ip if isinstance(net_ip, Subnet) else Subnet.parse(net_ip)
+        self.ips = _AddressPool('IP', self.subnet.first_host, self.subnet.last_host, 'I', format_ip)
+        self.macs = _AddressPool('MAC', mac_base + 1, 0xffffffffffff, 'Q', format_mac)
+        self.dpids = _AddressPool('DPID', dpid_base + 1, 0xffffffffffffffff, 'Q', format_dpid)
+
+    @property
+    def prefix_len(self):
+        return self.subnet.prefix_len
+
+    def resolve_ip(self, ip_input):
+        # Translates a host ip definition, either an offset from the subnet base ('+11')
+        # or a full address ('10.1.0.11'), into its integer value (without reserving it).
+        ip_input = ip_input.strip()
+        if ip_input.startswith('+'):
+            try:
+                ip_int = self.subnet.base + int(ip_input[1:])
+            except ValueError:
+                raise AddressError("Invalid IP offset: "+ ip_input)
+        else:
+            ip_int = parse_ip(ip_input)
+        if not self.subnet.first_host <= ip_int <= self.subnet.last_host:
+            raise AddressError("Host IP "+ format_ip(ip_int) +" is not a host address of "+ str(self.subnet))
+        return ip_int
+
+    def reserve_ip(self, ip_input):
+        return self.ips.reserve(self.resolve_ip(ip_input))
+
+    def reserve_mac(self, mac):
+        return self.macs.reserve(parse_hex_addr(mac) if isinstance(mac, str) else mac)
+
+    def reserve_dpid(self, dpid):
+        return self.dpids.reserve(parse_hex_addr(dpid) if isinstance(dpid, str) else dpid)
+
+    def allocate_ips(self, count):
+        return self.ips.allocate(count)
+
+    def allocate_macs(self, count):
+        return self.macs.allocate(count)
+
+    def allocate_dpids(self, count):
+        return self.dpids.allocate(count)
+
+    def allocate_hosts(self, count):
+        # IPs and MACs for count hosts at once, as two index aligned arrays:
+        return self.ips.allocate(count), self.macs.allocate(count)
@@ -0,0 +1,244 @@
+__author__ = 'Constantin'
+
+# Scripted, non-interactive measurements on a running mininet (see TopologyRunner.run):
+# - time to first packet after bring-up (intra-cloud and across the GWs),
+# - flow setup against the (remote) controller: first packet RTTs and flows installed per second,
+# - ping latency distributions of intra-cloud and cross-GW host pairs,
+# - an iperf throughput matrix of sampled host pairs.
+# Results are written as JSON (nested, with percentiles) or CSV (one workload,metric,value row each).
+
+#Python system imports:
+import csv
+import json
+import random
+import re
+import subprocess
+import time
+
+#Own Imports:
+from bringup import DEFAULT_WORKERS, run_parallel
+
+
+
+## STATISTICS ##
+################
+
+def percentile(sorted_values, fraction):
+    # Linear interpolation between the closest ranks of an already sorted list.
+    if not sorted_values:
+        return None
+    rank = (len(sorted_values) - 1) * fraction
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (rank - low)
+
+
+def summarize(values):
+    values = sorted(values)
+    if not values:
+        return {'count': 0}
+    return {'count': len(values), 'min': values[0], 'max': values[-1],
+            'mean': sum(values) / len(values), 'p50': percentile(values, 0.5),
+            'p90': percentile(values, 0.9), 'p99': percentile(values, 0.99)}
+
+
+
+## OUTPUT PARSING ##
+####################
+
+_PING_RTT = re.compile(r'time=([0-9.]+) ms')
+_FLOW_COUNT = re.compile(r'flow_count=(\d+)')
+
+
+def parse_ping_rtts(output):
+    return [float(rtt) for rtt in _PING_RTT.findall(output)]
+
+
+def parse_iperf_bps(output):
+    # iperf2 CSV report (-y C): ...,interval,transferred_bytes,bits_per_second
+    for line in reversed(output.strip().splitlines()):
+        fields = line.strip().split(',')
+        if len(fields) >= 9 and fields[-1].isdigit():
+            return int(fields[-1])
+    return None
+
+
+
+## BENCHMARK ##
+###############
+
+class Benchmark(object):
+    # groups maps host names to their cloud (or any other grouping); pairs within a group are
+    # 'intra', pairs of different groups 'cross' (their traffic passes the GWs).
+
+    def __init__(self, net, groups=None, ping_count=20, ping_interval=0.01, ping_pairs=32,
+                 iperf_time=5, iperf_pairs=4, flow_pairs=64, seed=0, workers=DEFAULT_WORKERS):
+        self.net = net
+        self.groups = groups or {}
+        self.ping_count = ping_count
+        self.ping_interval = ping_interval
+        self.ping_pairs = ping_pairs
+        self.iperf_time = iperf_time
+        self.iperf_pairs = iperf_pairs
+        self.flow_pairs = flow_pairs
+        self.random = random.Random(seed)
+        self.workers = workers
+
+    ## Host pairs ##
+    def _group(self, host):
+        return self.groups.get(host.name)
+
+    def pairs(self, kind, count):
+        # Up to count random distinct (src, dst) host pairs of the given kind ('intra' or 'cross'),
+        # sampled instead of enumerated, as there are O(hosts^2) pairs.
+        hosts = self.net.hosts
+        pairs, seen = [], set()
+        if len(hosts) < 2:
+            return pairs
+        for _ in range(count * 50):
+            src, dst = self.random.sample(hosts, 2)
+            if (self._group(src) == self._group(dst)) == (kind == 'intra') and (src.name, dst.name) not in seen:
+                seen.add((src.name, dst.name))
+                pairs.append((src, dst))
+                if len(pairs) == count:
+                    break
+        return pairs
+
+    def _rounds(self, pairs):
+        # Splits pairs into rounds with every host sourcing at most one command per round,
+        # as each mininet host runs its commands in a single shell.
+        rounds = []
+        for src, dst in pairs:
+            for round_pairs in rounds:
+                if all(src is not other for other, _ in round_pairs):
+                    round_pairs.append((src, dst))
+                    break
+            else:
+                rounds.append([(src, dst)])
+        return rounds
+
+    def _run_pairs(self, pairs, command):
+        results = []
+        for round_pairs in self._rounds(pairs):
+            results.extend(run_parallel(lambda pair: (pair, pair[0].cmd(command(*pair))), round_pairs, self.workers))
+        return results
+
+    ## Workloads ##
+    def time_to_first_packet(self, started_at, kind, timeout=30.0):
+        # Seconds from started_at until a first ping of a host pair succeeds.
+        pairs = self.pairs(kind, 1)
+        if not pairs:
+            return None
+        src, dst = pairs[0]
+        while time.time() - started_at < timeout:
+            if parse_ping_rtts(src.cmd('ping -c1 -W1 '+ dst.IP())):
+                return time.time() - started_at
+        return None
+
+    def flow_setup(self, kind='intra'):
+        # First pings of fresh host pairs, all sources in parallel: the first packet RTT
+        # contains the controller's flow setup, the second one does not.
+        pairs = self.pairs(kind, self.flow_pairs)
+        if not pairs:
+            return None
+        flows_before = self.flow_count()
+        start = time.time()
+        results = self._run_pairs(pairs, lambda src, dst: 'ping -c2 -i0.2 -W2 '+ dst.IP())
+        elapsed = time.time() - start
+        flows_after = self.flow_count()
+        first, second = [], []
+        for _, output in results:
+            rtts = parse_ping_rtts(output)
+            if len(rtts) == 2:
+                first.append(rtts[0])
+                second.append(rtts[1])
+        return {'pairs': len(pairs), 'established': len(first), 'seconds': elapsed,
+                'pairs_per_second': len(first) / elapsed if elapsed else None,
+                'flows_installed': flows_after - flows_before if None not in (flows_before, flows_after) else None,
+                'flows_per_second': (flows_after - flows_before) / elapsed
+                if elapsed and None not in (flows_before, flows_after) else None,
+                'first_rtt_ms': summarize(first), 'second_rtt_ms': summarize(second)}
+
+    def flow_count(self):
+        # Total number of flows of all switches (via 'ovs-ofctl dump-aggregate'), None without OVS.
+        def switch_flows(switch):
+            try:
+                output = subprocess.run(['ovs-ofctl', 'dump-aggregate', switch.name], stdout=subprocess.PIPE,
+                                        stderr=subprocess.DEVNULL, universal_newlines=True).stdout
+            except OSError:
+                return None
+            match = _FLOW_COUNT.search(output)
+            return int(match.group(1)) if match else None
+        counts = run_parallel(switch_flows, self.net.switches, self.workers)
+        return None if None in counts else sum(counts)
+
+    def ping_latency(self, kind):
+        pairs = self.pairs(kind, self.ping_pairs)
+        if not pairs:
+            return None
+        rtts, lost = [], 0
+        # Not quiet (-q), as the per reply times make up the distribution:
+        command = lambda src, dst: 'ping -c%d -i%s -W1 %s' % (self.ping_count, self.ping_interval, dst.IP())
+        for _, output in self._run_pairs(pairs, command):
+            pair_rtts = parse_ping_rtts(output)
+            rtts.extend(pair_rtts)
+            lost += self.ping_count - len(pair_rtts)
+        result = summarize(rtts)
+        result['pairs'] = len(pairs)
+        result['loss'] = lost / float(len(pairs) * self.ping_count)
+        return result
+
+    def iperf_matrix(self, kind, port=5201):
+        # Throughput of the sampled pairs in Mbit/s, measured one pair after another.
+        matrix = {}
+        for src, dst in self.pairs(kind, self.iperf_pairs):
+            server = dst.popen(['iperf', '-s', '-p', str(port)])
+            try:
+                time.sleep(0.2)
+                output = src.cmd('iperf -c %s -p %d -t %d -y C' % (dst.IP(), port, self.iperf_time))
+            finally:
+                server.terminate()
+                server.wait()
+            bps = parse_iperf_bps(output)
+            matrix.setdefault(src.name, {})[dst.name] = bps / 1e6 if bps is not None else None
+        values = [mbps for row in matrix.values() for mbps in row.values() if mbps is not None]
+        return {'mbps': matrix, 'summary': summarize(values)} if matrix else None
+
+    def run(self, started_at):
+        # Runs all workloads, the ones depending on empty flow tables first.
+        kinds = ['intra', 'cross'] if len(set(self.groups.values())) > 1 else ['intra']
+        results = {'time_to_first_packet_s': {}, 'flow_setup': {}, 'ping_ms': {}, 'iperf': {}}
+        for kind in kinds:
+            results['time_to_first_packet_s'][kind] = self.time_to_first_packet(started_at, kind)
+        for kind in kinds:
+            results['flow_setup'][kind] = self.flow_setup(kind)
+        for kind in kinds:
+            results['ping_ms'][kind] = self.ping_latency(kind)
+        for kind in kinds:
+            results['iperf'][kind] = self.iperf_matrix(kind)
+        return results
+
+
+
+## RESULT FILES ##
+##################
+
+def _flatten(prefix, value, rows):
+    if isinstance(value, dict):
+        for key in sorted(value):
+            _flatten(prefix + [str(key)], value[key], rows)
+    else:
+        rows.append((prefix[0], '.'.join(prefix[1:]), value))
+    return rows
+
+
+def write_results(results, path):
+    # JSON for *.json paths, CSV rows of (workload, metric, value) otherwise.
+    if path.endswith('.json'):
+        with open(path, 'w') as results_file:
+            json.dump(results, results_file, indent=1, sort_keys=True)
+        return
+    with open(path, 'w') as results_file:
+        writer = csv.writer(results_file)
+        writer.writerow(('workload', 'metric', 'value'))
+        writer.writerows(_flatten([], results, []))
@@ -0,0 +1,396 @@
+__author__ = 'Constantin'
+
+#Python system imports:
+import os
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from itertools import groupby
+
+#Own Imports:
+from shaping import tc_commands
+from topology import gre_port_numbers
+
+#Mininet API imports (only BatchMininet needs them, the timing and batching helpers work without):
+try:
+    from mininet.link import Link
+    from mininet.log import info
+    from mininet.net import Mininet
+    from mininet.node import OVSSwitch
+except ImportError:
+    Link = Mininet = object
+    OVSSwitch = ()
+    info = None
+
+
+
+## PHASE TIMING ##
+##################
+
+class PhaseTimer(object):
+    # Collects wall clock durations of the named bring-up phases, in execution order.
+
+    def __init__(self):
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.time() - start))
+
+    def as_dict(self):
+        return dict(self.phases)
+
+    def report(self):
+        total = sum(duration for _, duration in self.phases)
+        lines = ["%-16s %8.3fs" % (name, duration) for name, duration in self.phases]
+        lines.append("%-16s %8.3fs" % ('total', total))
+        print("\n*** Bring-up timings:\n" + '\n'.join(lines) + '\n')
+        return self.as_dict()
+
+
+
+## PARALLEL EXECUTION ##
+########################
+
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+
+def run_parallel(function, items, workers=DEFAULT_WORKERS):
+    # Runs function on every item from a thread pool and returns the results in item order.
+    # Mininet nodes each own a separate shell, so commands on different nodes may overlap.
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [function(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(workers, len(items))) as pool:
+        return list(pool.map(function, items))
+
+
+
+## OVS-VSCTL BATCHING ##
+########################
+
+def _run_cmd(args, stdin_data=None):
+    return subprocess.run(args, input=stdin_data, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                          universal_newlines=True, check=True).stdout
+
+
+class OVSBatch(object):
+    # Collects ovs-vsctl commands and runs them as few '--' separated transactions,
+    # instead of one ovs-vsctl process (and ovsdb round trip) per command.
+    # Chains are split, before they would exceed the command line length limit.
+
+    ARG_MAX = 128 * 1024
+
+    def __init__(self, run=_run_cmd):
+        self.run = run
+        self.commands = []
+
+    def add(self, *args):
+        self.commands.append([str(arg) for arg in args])
+        return self
+
+    def __len__(self):
+        return len(self.commands)
+
+    def chains(self):
+        chain, chain_len = ['ovs-vsctl'], 0
+        for command in self.commands:
+            command_len = sum(len(arg) + 1 for arg in command) + 3
+            if chain_len and chain_len + command_len > self.ARG_MAX:
+                yield chain
+                chain, chain_len = ['ovs-vsctl'], 0
+            chain.append('--')
+            chain.extend(command)
+            chain_len += command_len
+        if chain_len:
+            yield chain
+
+    def flush(self):
+        outputs = [self.run(chain) for chain in self.chains()]
+        self.commands = []
+        return outputs
+
+
+def add_gateway_config(batch, gateway, graph=None):
+    # Queues the gateway switch setup: its managing controllers (e.g. both OVX hypervisors)
+    # and its GRE tunnel ports. If the topology graph is given, GRE ports get the next free
+    # port numbers after the graph's links, so they are known before OVS assigns them.
+    # An optional 'local_ip' pins the tunnels' source address (e.g. for several GWs on one host).
+    switch = gateway['switch']
+    if gateway.get('controllers'):
+        batch.add('set-controller', switch, *gateway['controllers'])
+
+    port_numbers = gre_port_numbers(gateway, graph) if graph is not None else {}
+    for port_name in sorted(gateway.get('gre_ports', {})):
+        settings = ['type=gre', 'options:remote_ip=' + gateway['gre_ports'][port_name]]
+        if gateway.get('local_ip'):
+            settings.append('options:local_ip=' + gateway['local_ip'])
+        if port_name in port_numbers:
+            settings.append('ofport_request=%d' % port_numbers[port_name])
+        batch.add('--may-exist', 'add-port', switch, port_name)
+        batch.add('set', 'interface', port_name, *settings)
+    return batch
+
+
+
+## TC BATCHING ##
+###################
+
+# Link parameters, which BatchMininet sets up as traffic shaping (see shaping.py):
+SHAPING_PARAMS = ('bw', 'delay', 'loss')
+
+
+class TCBatch(object):
+    # Collects the tc commands of interfaces per network namespace and runs them as one
+    # 'tc -batch' per namespace: directly for the root namespace (switch ports), through the
+    # node's shell for nodes in a namespace of their own (hosts), those in parallel.
+
+    def __init__(self, run=_run_cmd, workers=DEFAULT_WORKERS):
+        self.run = run
+        self.workers = workers
+        self.commands = {}      # node (None for the root namespace) -> tc lines
+
+    def shape(self, intf, **shaping):
+        node = intf.node if intf.node.inNamespace else None
+        self.commands.setdefault(node, []).extend(tc_commands(intf.name, **shaping))
+        return self
+
+    def __len__(self):
+        return sum(len(lines) for lines in self.commands.values())
+
+    def flush(self):
+        commands, self.commands = self.commands, {}
+        if not commands:
+            return
+        with tempfile.TemporaryDirectory(prefix='mn-tc-') as batch_dir:
+            batch_files = []
+            for number, (node, lines) in enumerate(commands.items()):
+                batch_files.append((node, os.path.join(batch_dir, '%d.batch' % number)))
+                with open(batch_files[-1][1], 'w') as batch_file:
+                    batch_file.writelines(lines)
+            for node, path in batch_files:
+                if node is None:
+                    self.run(['tc', '-force', '-batch', path])
+
+            # tc prints nothing, unless a command failed:
+            def run_node(item):
+                node, path = item
+                return node.name, node.cmd('tc -force -batch', path).strip()
+            errors = [(name, output) for name, output in
+                      run_parallel(run_node, [item for item in batch_files if item[0] is not None], self.workers)
+                      if output]
+            if errors:
+                raise RuntimeError("tc failed on %d nodes, e.g. %s: %s" % (len(errors), errors[0][0], errors[0][1]))
+
+
+
+## BATCHED MININET ##
+#####################
+
+class _PrebuiltLink(Link):
+    # Link whose veth pair was already created by BatchMininet's 'ip -batch' run.
+
+    @classmethod
+    def makeIntfPair(cls, *args, **kwargs):
+        return ''
+
+
+class BatchMininet(Mininet):
+    # Mininet with a bulk bring-up path for large topologies:
+    # - all veth pairs are created by a single 'ip -batch' run, directly in their namespaces,
+    # - hosts are configured and switches started from a worker pool,
+    # - OVS switches are still started through their batchStartup (one ovs-vsctl chain),
+    # - links with TCLink parameters (bw, delay, loss) are shaped by one 'tc -batch' run per namespace,
+    # and every phase is timed in self.timer.
+
+    def __init__(self, *args, **kwargs):
+        if Mininet is object:
+            raise ImportError("BatchMininet needs Mininet (see mininet.org)")
+        self.timer = PhaseTimer()
+        self.workers = kwargs.pop('workers', DEFAULT_WORKERS)
+        super(BatchMininet, self).__init__(*args, **kwargs)
+
+    def buildFromTopo(self, topo=None):
+        info('*** Creating network\n')
+        if not self.controllers and self.controller:
+            classes = self.controller if isinstance(self.controller, list) else [self.controller]
+            for i, cls in enumerate(classes):
+                self.addController('c%d' % i, cls)
+
+        with self.timer.phase('hosts'):
+            for host_name in topo.hosts():
+                self.addHost(host_name, **topo.nodeInfo(host_name))
+
+        with self.timer.phase('switches'):
+            for switch_name in topo.switches():
+                params = topo.nodeInfo(switch_name)
+                cls = params.get('cls', self.switch)
+                if hasattr(cls, 'batchStartup'):
+                    params.setdefault('batch', True)
+                self.addSwitch(switch_name, **params)
+
+        with self.timer.phase('links'):
+            links = self.add_links(params for _, _, params in topo.links(sort=True, withInfo=True))
+
+        with self.timer.phase('shaping'):
+            self.shape_links(links)
+
+        info('*** Built %d hosts, %d switches, %d links\n'
+             % (len(self.hosts), len(self.switches), len(self.links)))
+
+    def _create_intf_pairs(self, links):
+        # One 'ip link add ... type veth peer ...' line per link, each end created directly
+        # in the namespace of its node (root namespace nodes share pid 1's namespace):
+        lines = []
+        for params in links:
+            node1, node2 = self[params['node1']], self[params['node2']]
+            intf1 = params.get('intfName1') or node1.intfName(params['port1'])
+            intf2 = params.get('intfName2') or node2.intfName(params['port2'])
+            lines.append('link add name %s netns %d type veth peer name %s netns %d\n'
+                         % (intf1, node1.pid, intf2, node2.pid))
+            params['intfName1'], params['intfName2'] = intf1, intf2
+
+        with tempfile.NamedTemporaryFile('w', prefix='mn-links-', suffix='.batch') as batch_file:
+            batch_file.writelines(lines)
+            batch_file.flush()
+            _run_cmd(['ip', '-force', '-batch', batch_file.name])
+
+    def configHosts(self):
+        with self.timer.phase('host-config'):
+            self.config_hosts(self.hosts)
+
+    def config_hosts(self, hosts):
+        def config_host(host):
+            if host.defaultIntf():
+                host.configDefault()
+            else:
+                host.configDefault(ip=None, mac=None)
+        run_parallel(config_host, hosts, self.workers)
+
+    def start(self):
+        if not self.built:
+            self.build()
+
+        with self.timer.phase('controllers'):
+            for controller in self.controllers:
+                controller.start()
+
+        with self.timer.phase('switch-start'):
+            info('*** Starting %s switches\n' % len(self.switches))
+            self.start_switches(self.switches)
+
+        if getattr(self, 'waitConn', False):
+            with self.timer.phase('connect-wait'):
+                self.waitConnected()
+
+    def start_switches(self, switches):
+        run_parallel(lambda switch: switch.start(self.controllers), switches, self.workers)
+        for switch_cls, cls_switches in groupby(sorted(switches, key=lambda s: str(type(s))), type):
+            cls_switches = tuple(cls_switches)
+            if hasattr(switch_cls, 'batchStartup'):
+                switch_cls.batchStartup(cls_switches)
+
+    ## LIVE CHANGES ##
+    # Used by live_topology.py to add and remove nodes and links of the running network, touching
+    # only the affected namespaces, veths and OVS ports (in bulk, as the initial bring-up does).
+
+    def add_nodes(self, hosts=(), switches=()):
+        # hosts, switches: (name, params) pairs as for addHost/addSwitch. The node shells are
+        # spawned in parallel. Returns the new (hosts, switches).
+        switch_items = []
+        for name, params in switches:
+            params = dict(params, inNamespace=params.get('inNamespace', self.inNamespace))
+            if self.listenPort:
+                params.setdefault('listenPort', self.listenPort)
+                self.listenPort += 1
+            if hasattr(params.get('cls', self.switch), 'batchStartup'):
+                params.setdefault('batch', True)
+            switch_items.append((name, params))
+
+        def make_node(item):
+            name, params, default_cls = item
+            params = dict(params)
+            cls = params.pop('cls', None) or default_cls
+            return cls(name, **params)
+        new_hosts = run_parallel(make_node, [(name, params, self.host) for name, params in hosts], self.workers)
+        new_switches = run_parallel(make_node, [(name, params, self.switch) for name, params in switch_items],
+                                    self.workers)
+        for node in new_hosts + new_switches:
+            self.nameToNode[node.name] = node
+        self.hosts.extend(new_hosts)
+        self.switches.extend(new_switches)
+        return new_hosts, new_switches
+
+    def add_links(self, links):
+        # links: dicts of addLink parameters (node names, ports and TCLink parameters, which
+        # shape_links applies). All veth pairs are created by one 'ip -batch' run. Returns the new Link objects.
+        links = [dict(params) for params in links]
+        if not links:
+            return []
+        self._create_intf_pairs(links)
+        new_links = []
+        for params in links:
+            params.setdefault('cls', _PrebuiltLink)
+            new_links.append(self.addLink(**params))
+        return new_links
+
+    def delete_links(self, links):
+        # Removes the OVS ports of the links (one ovs-vsctl transaction), their veth pairs (one
+        # 'ip -batch' run on the root namespace ends, which takes the peers along) and mininet's
+        # bookkeeping of both ends.
+        batch, lines = OVSBatch(), []
+        for link in links:
+            for intf in (link.intf1, link.intf2):
+                if isinstance(intf.node, OVSSwitch):
+                    batch.add('--if-exists', 'del-port', intf.node.name, intf.name)
+            root_intfs = [intf for intf in (link.intf1, link.intf2) if not intf.node.inNamespace]
+            if root_intfs:
+                lines.append('link del dev %s\n' % root_intfs[0].name)
+            else:
+                link.intf1.delete()
+        batch.flush()
+        if lines:
+            with tempfile.NamedTemporaryFile('w', prefix='mn-links-', suffix='.batch') as batch_file:
+                batch_file.writelines(lines)
+                batch_file.flush()
+                _run_cmd(['ip', '-force', '-batch', batch_file.name])
+        for link in links:
+            for intf in (link.intf1, link.intf2):
+                intf.node.delIntf(intf)
+        deleted = set(id(link) for link in links)
+        self.links = [link for link in self.links if id(link) not in deleted]
+
+    def shape_links(self, links):
+        # Sets up the traffic shaping of all links with TCLink parameters (kept in the params of
+        # their interfaces, as for TCIntf), on both ends. Returns the number of shaped links.
+        batch, shaped = TCBatch(workers=self.workers), 0
+        for link in links:
+            shaping = dict((param, link.intf1.params[param]) for param in SHAPING_PARAMS
+                           if link.intf1.params.get(param))
+            if shaping:
+                batch.shape(link.intf1, **shaping)
+                batch.shape(link.intf2, **shaping)
+                shaped += 1
+        batch.flush()
+        return shaped
+
+    def delete_nodes(self, nodes):
+        # Removes hosts and switches whose links were deleted before: all OVS bridges in one
+        # ovs-vsctl transaction, the node shells in parallel.
+        batch = OVSBatch()
+        for node in nodes:
+            if isinstance(node, OVSSwitch):
+                batch.add('--if-exists', 'del-br', node.name)
+        batch.flush()
+        run_parallel(lambda node: node.terminate(), nodes, self.workers)
+        deleted = set(id(node) for node in nodes)
+        self.hosts = [host for host in self.hosts if id(host) not in deleted]
+        self.switches = [switch for switch in self.switches if id(switch) not in deleted]
+        for node in nodes:
+            del self.nameToNode[node.name]
@@ -0,0 +1,465 @@
+__author__ = 'Constantin'
+
+# Offline capacity planning: can a topology (and a federated placement on it) carry a traffic
+# matrix? Answered from the topology graph alone, without root, OVS or mininet:
+#   python topoctl.py simulate cloud1.ovx --traffic random:200:50 --hosts-dir <...>/cloudconf1/hosts
+#   python topoctl.py simulate leafspine:4,32,20 --traffic all-to-all:5 --scenarios whatif.json
+#   python topoctl.py simulate cloud1.ovx --traffic random:8:0 --calibrate results.json
+# Every link is a pair of directed edges with the link's shaping bandwidth as capacity (see
+# shaping.py, default_bw for unshaped links), every GRE port of a GW an extra endpoint behind
+# a tunnel edge of tunnel_bw. Traffic takes one shortest path per pair (the lowest-numbered of
+# equal-cost next hops, like the single BFS tree per destination of proactive_flows.py), found
+# for all destination switches at once by a BFS over NumPy edge incidence arrays.
+# Results are both the offered link utilisation (demands summed per edge) and the max-min fair
+# rates of all flows (progressive filling), with demand 'inf' for elastic (TCP-like) flows.
+# Scenarios apply live_topology.GraphEdit operations (more hosts, extra GRE tunnels, ...) to
+# the graph before simulating, calibration compares single-pair rates with the iperf matrix
+# measured by benchmark.py on the real network.
+
+#Python system imports:
+import csv
+import itertools
+import json
+import random
+import time
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+#Own Imports:
+from topology import SWITCH
+
+
+
+## NETWORK MODEL ##
+###################
+
+DEFAULT_BW = 1000.0         # Mbit/s of unshaped links, as mininet's TCLink supports at most
+BFS_BLOCK = 512             # destination switches per BFS block, bounds its (edges x block) masks
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImportError("capacity_sim.py needs NumPy (pip install numpy)")
+    return numpy
+
+
+class CapacityModel(object):
+    # Directed edges (capacity in Mbit/s, delay in ms) between the graph's nodes, and endpoints
+    # (hosts and GRE ports) attached to a switch via an up and a down edge.
+    # efficiency: the share of the nominal capacities actually reached (see calibrate()).
+
+    def __init__(self, graph, gateways=(), default_bw=DEFAULT_BW, tunnel_bw=None, tunnel_delay=0.0, efficiency=1.0):
+        np = _require_numpy()
+        self.graph = graph
+        names, node_count = graph.names, graph.node_count
+        is_switch = np.frombuffer(bytes(graph.kinds), dtype=np.uint8) == SWITCH
+        src = np.array(graph.link_src, dtype=np.int64)
+        dst = np.array(graph.link_dst, dtype=np.int64)
+        bw = np.array(graph.link_bw, dtype=np.float64)
+        bw[bw == 0] = default_bw
+        delay = np.array(graph.link_delay, dtype=np.float64)
+        links = np.arange(graph.link_count)
+
+        switches = np.flatnonzero(is_switch)
+        self.switch_names = [names[idx] for idx in switches]
+        local = np.full(node_count, -1, dtype=np.int64)
+        local[switches] = np.arange(len(switches))
+
+        # Switch links, both directions:
+        both = is_switch[src] & is_switch[dst]
+        sw_src = np.concatenate((src[both], dst[both]))
+        sw_dst = np.concatenate((dst[both], src[both]))
+        edge_src, edge_dst = [sw_src], [sw_dst]
+        capacity, edge_delay = [np.tile(bw[both], 2)], [np.tile(delay[both], 2)]
+        self.edge_link = [np.tile(links[both], 2)]
+
+        # Host links (the first switch link of every host), up and down:
+        one = is_switch[src] != is_switch[dst]
+        host = np.where(is_switch[src[one]], dst[one], src[one])
+        switch = np.where(is_switch[src[one]], src[one], dst[one])
+        host, first = np.unique(host, return_index=True)
+        switch, host_links = switch[first], links[one][first]
+        host_count = len(host)
+        edge_src += [host, switch]
+        edge_dst += [switch, host]
+        capacity += [bw[host_links]] * 2
+        edge_delay += [delay[host_links]] * 2
+        self.edge_link += [host_links] * 2
+        first_up = len(sw_src)
+
+        # GRE ports, as endpoints of their own behind the GW (node indices from node_count on):
+        tunnels = [(gateway['switch'], port_name) for gateway in gateways
+                   for port_name in sorted(gateway.get('gre_ports', {}))]
+        gw = np.array([graph.index[switch_name] for switch_name, _ in tunnels], dtype=np.int64)
+        tunnel_nodes = np.arange(node_count, node_count + len(tunnels))
+        edge_src += [tunnel_nodes, gw]
+        edge_dst += [gw, tunnel_nodes]
+        capacity += [np.full(len(tunnels), tunnel_bw or default_bw)] * 2
+        edge_delay += [np.full(len(tunnels), tunnel_delay)] * 2
+        self.edge_link += [np.full(len(tunnels), -1, dtype=np.int64)] * 2
+
+        self.edge_src = np.concatenate(edge_src)
+        self.edge_dst = np.concatenate(edge_dst)
+        self.capacity = np.concatenate(capacity) * efficiency
+        self.delay = np.concatenate(edge_delay)
+        self.edge_link = np.concatenate(self.edge_link)
+        self.node_names = list(names) + [port_name for _, port_name in tunnels]
+        self.switch_edges = len(sw_src)
+
+        # Endpoints: hosts, then GRE ports.
+        up = np.concatenate((first_up + np.arange(host_count), first_up + 2 * host_count + np.arange(len(tunnels))))
+        self.endpoint_names = [names[idx] for idx in host] + [port_name for _, port_name in tunnels]
+        self.endpoint_index = dict((name, number) for number, name in enumerate(self.endpoint_names))
+        self.endpoint_up = up
+        self.endpoint_down = up + np.where(up < first_up + 2 * host_count, host_count, len(tunnels))
+        self.endpoint_switch = local[np.concatenate((switch, gw))]
+        self.local = local
+        self._routes = {}
+
+    @property
+    def edge_count(self):
+        return len(self.edge_src)
+
+    def edge_name(self, edge):
+        return '%s->%s' % (self.node_names[self.edge_src[edge]], self.node_names[self.edge_dst[edge]])
+
+    def routes(self, dest_switches):
+        # Next hop edge (or -1 at the destination, edge_count if unreachable) of every switch
+        # towards every destination switch: a (switches x destinations) matrix, by BFS levels over
+        # the switch edges for BFS_BLOCK destinations at a time.
+        np = numpy
+        dest_switches = np.asarray(dest_switches, dtype=np.int64)
+        switch_count = len(self.switch_names)
+        sw_src = self.local[self.edge_src[:self.switch_edges]]
+        sw_dst = self.local[self.edge_dst[:self.switch_edges]]
+        edge_ids = np.arange(self.switch_edges)
+        next_edge = np.full((switch_count, len(dest_switches)), self.edge_count, dtype=np.int64)
+        for start in range(0, len(dest_switches), BFS_BLOCK):
+            block = dest_switches[start:start + BFS_BLOCK]
+            columns = np.arange(len(block))
+            reached = np.zeros((switch_count, len(block)), dtype=bool)
+            reached[block, columns] = True
+            frontier = reached.copy()
+            hops = next_edge[:, start:start + len(block)]
+            hops[block, columns] = -1
+            while True:
+                # Switch u is reached via its edge u->v, if v is on the frontier:
+                edges, cols = np.nonzero(frontier[sw_dst] & ~reached[sw_src])
+                if not len(edges):
+                    break
+                np.minimum.at(hops, (sw_src[edges], cols), edge_ids[edges])
+                frontier = np.zeros_like(reached)
+                frontier[sw_src[edges], cols] = True
+                reached |= frontier
+        return next_edge
+
+    def paths(self, src, dst):
+        # Edge incidence of the pairs' paths (endpoint numbers), as (pair, edge) arrays sorted by
+        # pair, and the mask of routable pairs. Pairs of one switch only take their host edges.
+        np = numpy
+        src, dst = np.asarray(src, dtype=np.int64), np.asarray(dst, dtype=np.int64)
+        dest_switches, columns = np.unique(self.endpoint_switch[dst], return_inverse=True)
+        next_edge = self.routes(dest_switches)
+        pairs = np.arange(len(src))
+        incidence = [(pairs, self.endpoint_up[src])]
+        current = self.endpoint_switch[src].copy()
+        routable = src != dst
+        walking = pairs[routable & (current != self.endpoint_switch[dst])]
+        # At most one hop per switch, as paths are shortest:
+        for _ in range(len(self.switch_names)):
+            if not len(walking):
+                break
+            edges = next_edge[current[walking], columns[walking]]
+            lost = edges >= self.edge_count
+            routable[walking[lost]] = False
+            walking, edges = walking[~lost], edges[~lost]
+            incidence.append((walking, edges))
+            current[walking] = self.local[self.edge_dst[edges]]
+            walking = walking[current[walking] != self.endpoint_switch[dst[walking]]]
+        incidence.append((pairs, self.endpoint_down[dst]))
+        flow_of = np.concatenate([pair for pair, _ in incidence])
+        edge_of = np.concatenate([edge for _, edge in incidence])
+        keep = routable[flow_of]
+        order = np.argsort(flow_of[keep], kind='stable')
+        return flow_of[keep][order], edge_of[keep][order], routable
+
+
+
+## TRAFFIC MATRICES ##
+######################
+
+class TrafficMatrix(object):
+    # Flows between endpoints (host or GRE port names) with their demand in Mbit/s (inf: elastic).
+
+    def __init__(self, src=(), dst=(), demand=()):
+        self.src = list(src)
+        self.dst = list(dst)
+        self.demand = list(demand)
+
+    def add(self, src, dst, demand):
+        self.src.append(src)
+        self.dst.append(dst)
+        self.demand.append(float('inf') if demand in (None, 'inf', 'elastic') else float(demand))
+
+    def __len__(self):
+        return len(self.src)
+
+
+def load_traffic(path):
+    # JSON ([[src, dst, mbps], ...] or [{"src", "dst", "mbps"}, ...]) or CSV (src,dst,mbps rows).
+    # A missing, null or 'elastic' demand makes an elastic flow.
+    traffic = TrafficMatrix()
+    with open(path) as traffic_file:
+        if path.endswith('.json'):
+            rows = json.load(traffic_file)
+        else:
+            rows = [row for row in csv.reader(traffic_file) if row and not row[0].startswith('#')]
+    for row in rows:
+        if isinstance(row, dict):
+            traffic.add(row['src'], row['dst'], row.get('mbps'))
+        else:
+            traffic.add(row[0], row[1], row[2] if len(row) > 2 and row[2] != '' else None)
+    return traffic
+
+
+def generate_traffic(model, spec, seed=0):
+    # Generated matrices, demand 0 for elastic flows:
+    #   all-to-all:MBPS         every host to every other host,
+    #   random:PAIRS:MBPS       PAIRS random host pairs,
+    #   gateway:MBPS            every host to every GRE port and back (federation traffic),
+    #   permutation:MBPS        every host to another one, each receiving once.
+    kind, _, args = spec.partition(':')
+    args = args.split(':') if args else []
+    hosts = [name for name in model.endpoint_names if name in model.graph.index]
+    tunnels = [name for name in model.endpoint_names if name not in model.graph.index]
+    demand = lambda value: float(value) or None
+    rng = random.Random(seed)
+    traffic = TrafficMatrix()
+    if kind == 'all-to-all' and len(args) == 1:
+        for src, dst in itertools.permutations(hosts, 2):
+            traffic.add(src, dst, demand(args[0]))
+    elif kind == 'random' and len(args) == 2:
+        for _ in range(int(args[0])):
+            src, dst = rng.sample(hosts, 2)
+            traffic.add(src, dst, demand(args[1]))
+    elif kind == 'gateway' and len(args) == 1:
+        if not tunnels:
+            raise ValueError("Topology "+ model.graph.name +" has no GRE ports for gateway traffic")
+        for host in hosts:
+            for tunnel in tunnels:
+                traffic.add(host, tunnel, demand(args[0]))
+                traffic.add(tunnel, host, demand(args[0]))
+    elif kind == 'permutation' and len(args) == 1:
+        targets = hosts[:]
+        rng.shuffle(targets)
+        for src, dst in zip(hosts, targets[1:] + targets[:1]):
+            traffic.add(src, dst, demand(args[0]))
+    else:
+        raise ValueError("Unknown traffic %r, use a file or one of all-to-all:MBPS, random:PAIRS:MBPS, "
+                         "gateway:MBPS, permutation:MBPS (MBPS 0 for elastic flows)" % spec)
+    return traffic
+
+
+def resolve_traffic(model, traffic, seed=0):
+    if isinstance(traffic, TrafficMatrix):
+        return traffic
+    if traffic.endswith(('.json', '.csv')):
+        return load_traffic(traffic)
+    return generate_traffic(model, traffic, seed)
+
+
+
+## SIMULATION ##
+################
+
+class SimulationResult(object):
+    # Offered load and max-min fair rates of a traffic matrix on a CapacityModel.
+
+    def __init__(self, model, traffic, rates, routable, path_delay, offered, carried, iterations, elapsed):
+        self.model = model
+        self.traffic = traffic
+        self.rates = rates              # flow -> max-min fair rate (Mbit/s)
+        self.routable = routable        # flow -> has a path
+        self.path_delay = path_delay    # flow -> one-way delay of its links (ms)
+        self.offered = offered          # edge -> summed finite demands (Mbit/s)
+        self.carried = carried          # edge -> summed fair rates (Mbit/s)
+        self.iterations = iterations
+        self.elapsed = elapsed
+
+    def top_edges(self, count=10, by=None):
+        # (edge name, load, capacity, utilisation) of the most utilised edges, by offered load
+        # or (by default with elastic flows, which offer no fixed load) by carried load:
+        np = numpy
+        if by is None:
+            by = 'offered' if np.isfinite(self.traffic.demand).all() else 'carried'
+        load = self.offered if by == 'offered' else self.carried
+        utilisation = load / self.model.capacity
+        order = np.argsort(-utilisation, kind='stable')[:count]
+        return [(self.model.edge_name(edge), float(load[edge]), float(self.model.capacity[edge]),
+                 float(utilisation[edge])) for edge in order if load[edge] > 0]
+
+    def summary(self):
+        np = numpy
+        demand = np.asarray(self.traffic.demand, dtype=np.float64)
+        finite = np.isfinite(demand) & self.routable
+        offered_util = self.offered / self.model.capacity
+        satisfied = finite & (self.rates >= demand * (1 - 1e-9))
+        return {
+            'topology': self.model.graph.name,
+            'flows': len(demand), 'unroutable': int((~self.routable).sum()),
+            'elastic': int((~np.isfinite(demand)).sum()),
+            'demand_mbps': float(demand[finite].sum()),
+            'throughput_mbps': float(self.rates.sum()),
+            'satisfied': int(satisfied.sum()), 'throttled': int((finite & ~satisfied).sum()),
+            'min_rate_mbps': float(self.rates[self.routable].min()) if self.routable.any() else None,
+            'max_path_delay_ms': float(self.path_delay[self.routable].max()) if self.routable.any() else None,
+            'overloaded_edges': int((offered_util > 1 + 1e-9).sum()),
+            'max_offered_utilisation': float(offered_util.max()) if len(offered_util) else 0.0,
+            'max_carried_utilisation': float((self.carried / self.model.capacity).max()) if len(offered_util) else 0.0,
+            'fill_iterations': self.iterations, 'elapsed_s': self.elapsed,
+        }
+
+
+def max_min_rates(capacity, flow_of, edge_of, demand, active):
+    # Progressive filling: all active flows grow at the same rate, until their demand is met
+    # or one of their edges is full. Returns (rates, iterations), at most one iteration per
+    # saturated edge or satisfied flow.
+    np = numpy
+    rates = np.zeros(len(demand))
+    remaining = capacity.astype(np.float64)
+    active = active & (demand > 0)
+    epsilon = 1e-9 * capacity.max() if len(capacity) else 0.0
+    iterations = 0
+    while active.any():
+        iterations += 1
+        on = active[flow_of]
+        flows = np.bincount(edge_of[on], minlength=len(capacity))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            share = np.where(flows > 0, remaining / flows, np.inf)
+        bottleneck = np.full(len(demand), np.inf)
+        np.minimum.at(bottleneck, flow_of[on], share[edge_of[on]])
+        increment = np.where(active, np.minimum(bottleneck, demand - rates), np.inf).min()
+        rates[active] += increment
+        remaining -= increment * flows
+        full = remaining <= epsilon
+        frozen = np.zeros(len(demand), dtype=bool)
+        frozen[flow_of[on & full[edge_of]]] = True
+        active &= ~frozen & (rates < demand - epsilon)
+    return rates, iterations
+
+
+def simulate(model, traffic, seed=0):
+    # Routes the traffic matrix (a TrafficMatrix, traffic file or generator spec) and computes
+    # its offered link load and max-min fair rates.
+    np = numpy
+    start = time.perf_counter()
+    traffic = resolve_traffic(model, traffic, seed)
+    try:
+        src = [model.endpoint_index[name] for name in traffic.src]
+        dst = [model.endpoint_index[name] for name in traffic.dst]
+    except KeyError as e:
+        raise ValueError("Unknown traffic endpoint %s, neither a host nor a GRE port of %s" % (e, model.graph.name))
+    flow_of, edge_of, routable = model.paths(src, dst)
+    demand = np.asarray(traffic.demand, dtype=np.float64)
+    finite = np.where(np.isfinite(demand), demand, 0.0)
+    offered = np.bincount(edge_of, weights=finite[flow_of], minlength=model.edge_count)
+    path_delay = np.bincount(flow_of, weights=model.delay[edge_of], minlength=len(demand))
+    rates, iterations = max_min_rates(model.capacity, flow_of, edge_of, demand, routable.copy())
+    carried = np.bincount(edge_of, weights=rates[flow_of], minlength=model.edge_count)
+    return SimulationResult(model, traffic, rates, routable, path_delay, offered, carried, iterations,
+                            time.perf_counter() - start)
+
+
+
+## SCENARIOS ##
+###############
+
+def expand_scenarios(description):
+    # Scenario records ({"name", "ops", "traffic", "default_bw", "tunnel_bw"}) of a scenario file:
+    #   {"traffic": "random:200:0", "scenarios": [{"name": "more-hosts", "ops": [...]}, ...],
+    #    "grid": {"add_hosts": [0, 10, 20], "gre_ports": [1, 2], "tunnel_bw": [100, 1000]}}
+    # Top-level keys are the defaults of all scenarios. The grid adds one scenario per combination:
+    # add_hosts more hosts on every switch that has hosts, gre_ports GRE ports on every GW in total.
+    defaults = dict((key, value) for key, value in description.items() if key not in ('scenarios', 'grid'))
+    scenarios = [dict(defaults, **scenario) for scenario in description.get('scenarios', [])]
+    grid = description.get('grid', {})
+    if grid:
+        keys = sorted(grid)
+        for values in itertools.product(*[grid[key] for key in keys]):
+            scenario = dict(defaults, **dict(zip(keys, values)))
+            scenario['name'] = ','.join('%s=%s' % item for item in zip(keys, values))
+            scenarios.append(scenario)
+    return scenarios
+
+
+def scenario_topology(graph, gateways, scenario):
+    # The graph and gateways of a scenario: its ops, add_hosts and gre_ports applied to a GraphEdit.
+    from live_topology import GraphEdit
+    edit = GraphEdit(graph, gateways)
+    for op in scenario.get('ops', ()):
+        edit.apply(op)
+    if scenario.get('add_hosts'):
+        adj = graph.adjacency()
+        host_switches = set(neighbour for idx in graph.hosts() for neighbour, _, _, _ in adj[idx]
+                            if graph.kinds[neighbour] == SWITCH)
+        for switch in sorted(host_switches):
+            edit.add_hosts(graph.names[switch], scenario['add_hosts'])
+    if scenario.get('gre_ports'):
+        for gateway in edit.gateways:
+            ports = gateway['gre_ports']
+            number = 1
+            while len(ports) < scenario['gre_ports']:
+                port_name = '%s-gre%d' % (gateway['switch'], number)
+                if port_name not in ports:
+                    # Tunnel ends are endpoints of their own, their remote ip does not matter here:
+                    edit.set_gre_port(gateway['switch'], port_name, '172.31.255.%d' % min(number, 254))
+                number += 1
+    return edit.build()
+
+
+def run_scenarios(graph, gateways, scenarios, default_bw=DEFAULT_BW, tunnel_bw=None, efficiency=1.0, seed=0,
+                  prepare=None):
+    # Simulates every scenario, returns their summaries (with the scenario name). prepare(graph)
+    # may shape the changed graph, e.g. after the host descriptors.
+    results = []
+    for scenario in scenarios:
+        scenario_graph, scenario_gateways = scenario_topology(graph, gateways, scenario)
+        if prepare is not None:
+            prepare(scenario_graph)
+        model = CapacityModel(scenario_graph, scenario_gateways, scenario.get('default_bw', default_bw),
+                              scenario.get('tunnel_bw', tunnel_bw), efficiency=efficiency)
+        if 'traffic' not in scenario:
+            raise ValueError("Scenario %s has no traffic" % scenario.get('name'))
+        summary = simulate(model, scenario['traffic'], scenario.get('seed', seed)).summary()
+        summary['scenario'] = scenario.get('name', str(len(results)))
+        results.append(summary)
+    return results
+
+
+
+## CALIBRATION ##
+#################
+
+def calibrate(model, benchmark_results):
+    # Compares the iperf matrix of a benchmark.py run (pairs measured one after another) with
+    # the simulated rate of every pair alone. Returns per pair (src, dst, measured, simulated,
+    # ratio) rows and the median ratio, a factor for the capacities of later simulations.
+    traffic = TrafficMatrix()
+    measured = []
+    for kind_results in (benchmark_results.get('iperf') or {}).values():
+        for src, row in ((kind_results or {}).get('mbps') or {}).items():
+            for dst, mbps in row.items():
+                if mbps is not None and src in model.endpoint_index and dst in model.endpoint_index:
+                    traffic.add(src, dst, None)
+                    measured.append(mbps)
+    rows = []
+    for flow in range(len(traffic)):
+        single = TrafficMatrix([traffic.src[flow]], [traffic.dst[flow]], [traffic.demand[flow]])
+        simulated = float(simulate(model, single).rates[0])
+        rows.append((traffic.src[flow], traffic.dst[flow], measured[flow], simulated,
+                     measured[flow] / simulated if simulated else None))
+    ratios = sorted(row[4] for row in rows if row[4] is not None)
+    return rows, ratios[len(ratios) // 2] if ratios else None
@@ -0,0 +1,223 @@
+__author__ = 'Constantin'
+
+# Pool of OpenFlow controller endpoints (OVX or Floodlight instances) the switches are spread over:
+# - a policy orders the pool per switch DPID, the first healthy endpoint is the switch's master,
+#   the next (replicas - 1) ones are its slaves,
+# - connect='master' points each switch at its master only (slaves are standbys that take over
+#   on failover), connect='all' at master and slaves (for controllers negotiating OpenFlow roles),
+# - ControllerMonitor health checks all endpoints via TCP connects and moves the switches of a
+#   failed endpoint to their next healthy one (and back once it recovered).
+# New policies are added to POLICIES: classes built with the endpoint list, whose order(dpid)
+# returns all endpoints in the preference order of that switch.
+
+#Python system imports:
+import bisect
+import hashlib
+import socket
+import threading
+import time
+
+
+
+## ENDPOINTS ##
+###############
+
+DEFAULT_OFC_PORT = 6633
+
+
+def parse_endpoint(value, default_port=DEFAULT_OFC_PORT):
+    # 'ip', 'ip:port' or 'tcp:ip:port' -> 'tcp:ip:port'
+    parts = value.split(':')
+    if parts[0] in ('tcp', 'ssl'):
+        protocol, parts = parts[0], parts[1:]
+    else:
+        protocol = 'tcp'
+    if len(parts) == 1:
+        parts.append(str(default_port))
+    if len(parts) != 2 or not parts[0] or not parts[1].isdigit():
+        raise ValueError("Invalid controller endpoint: "+ value)
+    return '%s:%s:%d' % (protocol, parts[0], int(parts[1]))
+
+
+def endpoint_address(url):
+    # 'tcp:ip:port' -> (ip, port)
+    _, host, port = url.split(':')
+    return host, int(port)
+
+
+
+## POLICIES ##
+##############
+
+class ConsistentHashPolicy(object):
+    # Hash ring with vnodes points per endpoint: adding or removing an endpoint only moves
+    # the switches of its ring segments, all others keep their master.
+
+    def __init__(self, endpoints, vnodes=64):
+        self.endpoints = list(endpoints)
+        ring = sorted((self._hash('%s#%d' % (url, vnode)), url) for url in self.endpoints for vnode in range(vnodes))
+        self._points = [point for point, _ in ring]
+        self._owners = [url for _, url in ring]
+
+    @staticmethod
+    def _hash(key):
+        return int(hashlib.md5(key.encode('utf-8')).hexdigest()[:16], 16)
+
+    def order(self, dpid):
+        # The distinct endpoints met walking the ring clockwise from the DPID's point:
+        order, start = [], bisect.bisect(self._points, self._hash('%016x' % dpid))
+        for step in range(len(self._owners)):
+            url = self._owners[(start + step) % len(self._owners)]
+            if url not in order:
+                order.append(url)
+                if len(order) == len(self.endpoints):
+                    break
+        return order
+
+
+class ModuloPolicy(object):
+    # DPID modulo pool size, the following endpoints as slaves. Even spread, but a changed
+    # pool size moves almost every switch.
+
+    def __init__(self, endpoints):
+        self.endpoints = list(endpoints)
+
+    def order(self, dpid):
+        first = dpid % len(self.endpoints)
+        return self.endpoints[first:] + self.endpoints[:first]
+
+
+POLICIES = {
+    'hash': ConsistentHashPolicy,
+    'modulo': ModuloPolicy,
+}
+
+
+
+## CONTROLLER POOL ##
+#####################
+
+class ControllerPool(object):
+
+    CONNECT_MODES = ('master', 'all')
+
+    def __init__(self, endpoints, policy='hash', replicas=2, connect='master'):
+        if not endpoints:
+            raise ValueError("A controller pool needs at least one endpoint")
+        if connect not in self.CONNECT_MODES:
+            raise ValueError("Unknown connect mode "+ connect +", choose one of: "+ ', '.join(self.CONNECT_MODES))
+        self.endpoints = [parse_endpoint(endpoint) for endpoint in endpoints]
+        if policy in POLICIES:
+            policy = POLICIES[policy]
+        elif not callable(policy):
+            raise ValueError("Unknown controller policy "+ str(policy) +", choose one of: "+ ', '.join(sorted(POLICIES)))
+        self.policy = policy(self.endpoints)
+        self.replicas = max(1, replicas)
+        self.connect = connect
+
+    @property
+    def primary(self):
+        # (ip, port) of the first endpoint, e.g. for mininet's initial RemoteController:
+        return endpoint_address(self.endpoints[0])
+
+    def roles(self, dpid, healthy=None):
+        # (master, [slaves]) of a switch, among the healthy endpoints (all if None).
+        order = [url for url in self.policy.order(dpid) if healthy is None or url in healthy]
+        if not order:
+            return None, []
+        return order[0], order[1:self.replicas]
+
+    def targets(self, dpid, healthy=None):
+        # The controllers a switch is connected to:
+        master, slaves = self.roles(dpid, healthy)
+        if master is None:
+            return []
+        return [master] + slaves if self.connect == 'all' else [master]
+
+    def assignments(self, graph, healthy=None):
+        # Switch name -> its controller targets.
+        return dict((graph.names[idx], self.targets(graph.dpid[idx], healthy)) for idx in graph.switches())
+
+    def load(self, graph, healthy=None):
+        # Endpoint -> number of switches it is master of.
+        load = dict((url, 0) for url in self.endpoints)
+        for idx in graph.switches():
+            master, _ = self.roles(graph.dpid[idx], healthy)
+            if master is not None:
+                load[master] += 1
+        return load
+
+    def configure(self, batch, graph, skip=(), healthy=None, url=None):
+        # Queues 'set-controller' of all switches (but the ones in skip, e.g. a GW with its own
+        # controllers). url optionally maps endpoints to the urls to connect to (e.g. proxies).
+        for switch, targets in sorted(self.assignments(graph, healthy).items()):
+            if switch not in skip and targets:
+                batch.add('set-controller', switch, *[url(target) if url else target for target in targets])
+        return batch
+
+
+
+## HEALTH CHECKS ##
+###################
+
+def check_endpoint(url, timeout=1.0):
+    try:
+        socket.create_connection(endpoint_address(url), timeout=timeout).close()
+        return True
+    except OSError:
+        return False
+
+
+class ControllerMonitor(object):
+    # Background thread health checking the pool every interval seconds. Whenever the set of
+    # healthy endpoints changes, the switches whose targets changed are re-pointed in one
+    # ovs-vsctl transaction (queued into a fresh batch from make_batch, then flushed).
+
+    def __init__(self, pool, graph, make_batch, skip=(), url=None, interval=2.0, timeout=1.0):
+        self.pool = pool
+        self.graph = graph
+        self.make_batch = make_batch
+        self.skip = skip
+        self.url = url
+        self.interval = interval
+        self.timeout = timeout
+        self.healthy = set(pool.endpoints)
+        self.failovers = []         # (time, failed endpoints, recovered endpoints, moved switches)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def check(self):
+        healthy = set(url for url in self.pool.endpoints if check_endpoint(url, self.timeout))
+        if healthy == self.healthy:
+            return 0
+        before = self.pool.assignments(self.graph, self.healthy)
+        after = self.pool.assignments(self.graph, healthy)
+        moved = [switch for switch in sorted(after) if after[switch] != before[switch] and switch not in self.skip]
+        batch = self.make_batch()
+        for switch in moved:
+            if after[switch]:
+                batch.add('set-controller', switch, *[self.url(target) if self.url else target
+                                                      for target in after[switch]])
+        batch.flush()
+        failed, recovered = sorted(self.healthy - healthy), sorted(healthy - self.healthy)
+        self.failovers.append((time.time(), failed, recovered, len(moved)))
+        print("*** Controllers failed: %s, recovered: %s - %d switches re-pointed"
+              % (', '.join(failed) or '-', ', '.join(recovered) or '-', len(moved)))
+        self.healthy = healthy
+        return len(moved)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.check()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='controller-monitor')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
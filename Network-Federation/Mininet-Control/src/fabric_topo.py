@@ -0,0 +1,51 @@
+__author__ = 'Constantin'
+
+#Mininet API imports:
+from mininet.topo import Topo
+
+#Own Imports:
+from shaping import host_params
+from topology import FABRICS
+
+
+
+## MININET TOPOLOGY ADAPTER ##
+##############################
+
+class FabricTopo(Topo):
+    # Mininet Topo, built from a topology.TopologyGraph.
+    # Links are added with the ports assigned by the graph, so that the mininet port
+    # numbering always matches the one used for OVX mappings and flow rules.
+    # Link and host shaping of the graph is passed on as TCLink/CPULimitedHost parameters.
+
+    def build(self, graph):
+        self.graph = graph
+        names = graph.names
+
+        for idx in graph.switches():
+            self.addSwitch(names[idx], dpid=graph.dpid_hex(idx))
+        hosts = graph.hosts()
+        for idx, ip in zip(hosts, graph.host_ips(hosts)):
+            self.addHost(names[idx], ip=ip +'/'+ str(graph.prefix_len), mac=graph.mac_str(idx),
+                         **host_params(graph, idx))
+
+        link_src, link_src_port = graph.link_src, graph.link_src_port
+        link_dst, link_dst_port = graph.link_dst, graph.link_dst_port
+        for l in range(graph.link_count):
+            self.addLink(names[link_src[l]], names[link_dst[l]],
+                         port1=link_src_port[l], port2=link_dst_port[l], **graph.link_shaping(l))
+
+        print("Built topology "+ graph.name +": %d switches, %d hosts, %d links."
+              % (len(graph.switches()), len(graph.hosts()), graph.link_count))
+
+
+def _fabric_factory(fabric):
+    def build_fabric(*args):
+        return FabricTopo(FABRICS[fabric](*args))
+    return build_fabric
+
+
+# Generated fabrics for the mininet command line, e.g.:
+# sudo mn --custom fabric_topo.py --topo fattree,8 --controller remote,ip=192.168.1.41
+# sudo mn --custom fabric_topo.py --topo leafspine,4,32,20 --controller remote,ip=192.168.1.41
+topos = dict((fabric, _fabric_factory(fabric)) for fabric in FABRICS)
@@ -0,0 +1,309 @@
+__author__ = 'Constantin'
+
+# Runs several federated clouds side by side in one mininet on a single Linux box:
+#   sudo python federation_launcher.py topologies/federations/cloud1-cloud2.json
+#   sudo python federation_launcher.py --clouds 12 --interconnect ring --mode gre --ofc tcp:127.0.0.1:6633
+#   python federation_launcher.py --clouds 12 --dry-run
+# Every cloud is loaded from its topology file, its nodes get the cloud name as prefix
+# (c1GW, c1SWITCH1, c1h1_1_1, ...), and all clouds are merged into one graph, which is brought
+# up by a single batched BatchMininet run. The GW switches are interconnected either by veth
+# links or by GRE tunnels over local underlay addresses (one per cloud on a dummy device), in
+# place of the hard-coded GRE peers and OVX controllers of the per-cloud scripts.
+
+#Python system imports:
+import argparse
+import json
+import os
+import sys
+from itertools import combinations
+
+#Own Imports:
+from address_plan import Subnet, format_ip, parse_ip
+from proactive_flows import MODES as PROACTIVE_MODES
+from runner import TopologyRunner
+from topology import TopologyGraph
+from topology_loader import TOPOLOGY_DIR, FileTopology
+
+
+
+## FEDERATION DESCRIPTION ##
+############################
+
+INTERCONNECTS = ('star', 'line', 'ring', 'mesh')
+MODES = ('veth', 'gre')
+DEFAULT_TEMPLATE = os.path.join(TOPOLOGY_DIR, 'cloud.ovx.template.json')
+
+# GRE underlay: cloud i (from 1 on) gets UNDERLAY_BASE + i on the dummy device UNDERLAY_DEV.
+UNDERLAY_BASE = parse_ip('172.31.0.0')
+UNDERLAY_DEV = 'fed0'
+
+
+def underlay_ip(cloud_no):
+    return format_ip(UNDERLAY_BASE + cloud_no)
+
+
+class CloudSpec(object):
+    # One cloud of a federation: its name (also the node name prefix), topology file and
+    # variables, and the controllers of all its switches (None: mininet's default controller).
+
+    def __init__(self, name, topology_path, variables=None, controllers=None):
+        self.name = name
+        self.topology = FileTopology(topology_path, **(variables or {}))
+        self.controllers = controllers
+        self.offset = None          # index of the cloud's first node in the merged graph
+        self.node_count = 0
+
+
+class Federation(object):
+
+    def __init__(self, name, net_ip, clouds, interconnect='star', mode='veth'):
+        if interconnect not in INTERCONNECTS:
+            raise ValueError("Unknown interconnect "+ interconnect +", choose one of: "+ ', '.join(INTERCONNECTS))
+        if mode not in MODES:
+            raise ValueError("Unknown interconnect mode "+ mode +", choose one of: "+ ', '.join(MODES))
+        if len(set(cloud.name for cloud in clouds)) != len(clouds):
+            raise ValueError("Cloud names of a federation have to be unique")
+        self.name = name
+        self.net_ip = net_ip
+        self.clouds = clouds
+        self.interconnect = interconnect
+        self.mode = mode
+
+
+def load_federation(path):
+    # {"name": ..., "net_ip": "10.0.0.0/8", "interconnect": "star", "mode": "gre",
+    #  "controllers": ["tcp:127.0.0.1:6633"],
+    #  "clouds": [{"name": "c1", "topology": "../cloud1.ovx.json", "vars": {...}, "controllers": [...]}, ...]}
+    # Topology paths are relative to the federation file, cloud controllers override the federation's.
+    with open(path) as federation_file:
+        description = json.load(federation_file)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    clouds = []
+    for cloud in description['clouds']:
+        clouds.append(CloudSpec(cloud['name'], os.path.join(base_dir, cloud['topology']), cloud.get('vars'),
+                                cloud.get('controllers', description.get('controllers'))))
+    return Federation(description.get('name', os.path.splitext(os.path.basename(path))[0]),
+                      description.get('net_ip', '10.0.0.0/8'), clouds,
+                      description.get('interconnect', 'star'), description.get('mode', 'veth'))
+
+
+def generate_federation(count, template=DEFAULT_TEMPLATE, interconnect='star', mode='veth', controllers=None):
+    # count clouds c1..cN of one cloud template, with cloud i in 10.i.0.0/16 and DPID/MAC prefix %02x.
+    if not 1 <= count <= 255:
+        raise ValueError("A generated federation has 1 to 255 clouds, got %d" % count)
+    clouds = [CloudSpec('c%d' % i, template,
+                        {'cloud': str(i), 'cloud_id': '%02x' % i, 'net_ip': '10.%d.0.0/16' % i,
+                         'remote_gw': underlay_ip(i % count + 1)}, controllers)
+              for i in range(1, count + 1)]
+    return Federation('federation-%d' % count, '10.0.0.0/8', clouds, interconnect, mode)
+
+
+def interconnect_pairs(count, interconnect):
+    # Cloud index pairs whose GWs get interconnected:
+    if interconnect == 'star':
+        return [(0, i) for i in range(1, count)]
+    if interconnect == 'mesh':
+        return list(combinations(range(count), 2))
+    pairs = [(i, i + 1) for i in range(count - 1)]
+    if interconnect == 'ring' and count > 2:
+        pairs.append((count - 1, 0))
+    return pairs
+
+
+
+## FEDERATION GRAPH ##
+######################
+
+def merge_clouds(federation):
+    # Builds the merged graph of all clouds (node names prefixed, ports kept) and interconnects
+    # their GWs. Returns (graph, gateways) with gateways holding a gateway definition per cloud.
+    subnet = Subnet.parse(federation.net_ip)
+    graph = TopologyGraph(federation.name, subnet.prefix_len)
+    seen = {}
+    gw_indices = []
+
+    for cloud in federation.clouds:
+        cloud_graph = cloud.topology.build_graph()
+        cloud.offset, cloud.node_count = graph.node_count, cloud_graph.node_count
+        for idx, name in enumerate(cloud_graph.names):
+            name = cloud.name + name
+            if cloud_graph.is_switch(idx):
+                graph.add_switch(name, cloud_graph.dpid[idx])
+                addrs = [(('DPID', cloud_graph.dpid[idx]), cloud_graph.dpid_str(idx))]
+            else:
+                if cloud_graph.ip[idx] not in subnet:
+                    raise ValueError("Host %s (%s) is outside of the federation network %s"
+                                     % (name, cloud_graph.ip_str(idx), subnet.cidr))
+                graph.add_host(name, cloud_graph.ip[idx], cloud_graph.mac[idx])
+                addrs = [(('IP', cloud_graph.ip[idx]), cloud_graph.ip_str(idx)),
+                         (('MAC', cloud_graph.mac[idx]), cloud_graph.mac_str(idx))]
+            for addr, addr_str in addrs:
+                if addr in seen:
+                    raise ValueError("%s %s of %s is already used by %s" % (addr[0], addr_str, name, seen[addr]))
+                seen[addr] = name
+            graph.next_port[cloud.offset + idx] = cloud_graph.next_port[idx]
+            graph.cpu[cloud.offset + idx] = cloud_graph.cpu[idx]
+        for l in range(cloud_graph.link_count):
+            src, src_port, dst, dst_port = cloud_graph.link(l)
+            graph.add_link(cloud.offset + src, cloud.offset + dst, src_port, dst_port, cloud_graph.link_bw[l],
+                           cloud_graph.link_delay[l], cloud_graph.link_loss[l])
+
+        gateway = cloud.topology.gateway
+        if gateway is None:
+            raise ValueError("Cloud "+ cloud.name +" has no gateway switch to interconnect")
+        gw_indices.append(graph.index[cloud.name + gateway['switch']])
+
+    gateways = [{'switch': graph.names[gw_idx], 'gre_ports': {}} for gw_idx in gw_indices]
+    for a, b in interconnect_pairs(len(federation.clouds), federation.interconnect):
+        if federation.mode == 'veth':
+            graph.add_link(gw_indices[a], gw_indices[b])
+        else:
+            # GRE ports are numbered by add_gateway_config, after the GW's links:
+            gateways[a]['gre_ports']['%s-gre%d' % (federation.clouds[a].name, b + 1)] = underlay_ip(b + 1)
+            gateways[b]['gre_ports']['%s-gre%d' % (federation.clouds[b].name, a + 1)] = underlay_ip(a + 1)
+    if federation.mode == 'gre':
+        for cloud_no, gateway in enumerate(gateways, 1):
+            gateway['local_ip'] = underlay_ip(cloud_no)
+    return graph, gateways
+
+
+
+## FEDERATION RUNNER ##
+#######################
+
+class FederationRunner(TopologyRunner):
+    # Brings up the merged federation graph and configures, in one ovs-vsctl transaction,
+    # the controllers of every cloud and the interconnects of all GWs.
+
+    def __init__(self, federation, proactive=None, of_proxy=None, stats=None, arp=None):
+        self.federation = federation
+        graph, gateways = merge_clouds(federation)
+        super(FederationRunner, self).__init__(graph, proactive=proactive, of_proxy=of_proxy, stats=stats, arp=arp)
+        self.gateways = gateways
+
+    def start(self):
+        if self.federation.mode == 'gre':
+            from bringup import _run_cmd
+            lines = ['link add %s type dummy\n' % UNDERLAY_DEV, 'link set %s up\n' % UNDERLAY_DEV]
+            lines.extend('addr add %s/32 dev %s\n' % (underlay_ip(cloud_no), UNDERLAY_DEV)
+                         for cloud_no in range(1, len(self.federation.clouds) + 1))
+            _run_cmd(['ip', '-force', '-batch', '-'], ''.join(lines))
+        return super(FederationRunner, self).start()
+
+    def configure(self, batch):
+        from bringup import add_gateway_config
+        names = self.graph.names
+        for cloud in self.federation.clouds:
+            if cloud.controllers:
+                for idx in range(cloud.offset, cloud.offset + cloud.node_count):
+                    if self.graph.is_switch(idx):
+                        batch.add('set-controller', names[idx],
+                                  *[self.proxied_url(url) for url in cloud.controllers])
+        for gateway in self.gateways:
+            add_gateway_config(batch, gateway, self.graph)
+
+    def controller_urls(self):
+        urls = super(FederationRunner, self).controller_urls()
+        for cloud in self.federation.clouds:
+            urls.extend(cloud.controllers or ())
+        return urls
+
+    def tunnels(self):
+        # The GRE ports of two GWs facing each other, as ((gw, port), (peer gw, peer port)) once per tunnel:
+        from topology import gre_port_numbers
+        gw_of_ip = dict((gateway.get('local_ip'), self.graph.index[gateway['switch']]) for gateway in self.gateways)
+        ends = {}
+        for gateway in self.gateways:
+            gw = self.graph.index[gateway['switch']]
+            port_numbers = gre_port_numbers(gateway, self.graph)
+            for port_name, remote_ip in gateway['gre_ports'].items():
+                ends[(gw, gw_of_ip[remote_ip])] = port_numbers[port_name]
+        return [((a, port), (b, ends[(b, a)])) for (a, b), port in sorted(ends.items()) if a < b]
+
+    def host_groups(self):
+        names = self.graph.names
+        return dict((names[idx], cloud.name) for cloud in self.federation.clouds
+                    for idx in range(cloud.offset, cloud.offset + cloud.node_count) if not self.graph.is_switch(idx))
+
+    def stop(self):
+        super(FederationRunner, self).stop()
+        if self.federation.mode == 'gre':
+            import subprocess
+            subprocess.call(['ip', 'link', 'del', UNDERLAY_DEV])
+
+
+def describe(federation, graph, gateways):
+    lines = ["%s: %d clouds, %s interconnect over %s - %d switches, %d hosts, %d links"
+             % (federation.name, len(federation.clouds), federation.interconnect, federation.mode,
+                len(graph.switches()), len(graph.hosts()), graph.link_count)]
+    for cloud, gateway in zip(federation.clouds, gateways):
+        lines.append("  %-6s %-12s %4d nodes, gateway %s%s%s"
+                     % (cloud.name, cloud.topology.net_ip, cloud.node_count, gateway['switch'],
+                        ' (local %s, GRE to %s)' % (gateway['local_ip'], ', '.join(sorted(gateway['gre_ports'].values())))
+                        if gateway['gre_ports'] else '',
+                        ', controllers '+ ' '.join(cloud.controllers) if cloud.controllers else ''))
+    return '\n'.join(lines)
+
+
+
+## COMMAND LINE ##
+##################
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='federation_launcher.py', description="Run federated clouds in one mininet.")
+    parser.add_argument('federation', nargs='?', help="federation description file")
+    parser.add_argument('--clouds', type=int, help="generate a federation of this many clouds instead")
+    parser.add_argument('--template', default=DEFAULT_TEMPLATE, help="cloud template of generated federations")
+    parser.add_argument('--interconnect', choices=INTERCONNECTS, help="GW interconnect topology")
+    parser.add_argument('--mode', choices=MODES, help="GW interconnects via veth links or GRE tunnels")
+    parser.add_argument('--ofc', action='append', help="controller url of all clouds (repeatable)")
+    parser.add_argument('--proactive', choices=PROACTIVE_MODES,
+                        help="pre-install all host-to-host flows; 'only' also detaches the controllers")
+    parser.add_argument('--of-proxy', metavar='STATS', help="proxy all controller connections through of_proxy.py "
+                                                             "and write its statistics to STATS")
+    parser.add_argument('--stats', metavar='FILE', help="poll the port and flow counters of all switches every "
+                                                        "second and write their time series to FILE when stopping")
+    parser.add_argument('--static-arp', action='store_true', help="install static ARP entries of all hosts of "
+                                                                  "the federation on every host")
+    parser.add_argument('--arp-responder', action='store_true', help="also answer ARP requests for all hosts "
+                                                                     "at the GWs")
+    parser.add_argument('--dry-run', action='store_true', help="only build and describe the federation")
+    parser.add_argument('--benchmark', metavar='RESULTS', help="run the benchmark workloads and write their "
+                                                               "results to RESULTS (.json or .csv), then exit")
+    args = parser.parse_args(argv)
+
+    if args.clouds:
+        federation = generate_federation(args.clouds, args.template, args.interconnect or 'star',
+                                         args.mode or 'veth', args.ofc)
+    elif args.federation:
+        federation = load_federation(args.federation)
+        federation.interconnect = args.interconnect or federation.interconnect
+        federation.mode = args.mode or federation.mode
+        for cloud in federation.clouds:
+            cloud.controllers = args.ofc or cloud.controllers
+    else:
+        parser.error("either a federation file or --clouds is needed")
+
+    runner = FederationRunner(federation, args.proactive, args.of_proxy,
+                              {'output': args.stats} if args.stats else None,
+                              {'responder': args.arp_responder} if args.static_arp or args.arp_responder else None)
+    print(describe(federation, runner.graph, runner.gateways))
+    # GRE interconnects are no graph links, so clouds only need to be connected within themselves:
+    from topoctl import TopologySource, validate_topology
+    errors = validate_topology(TopologySource(runner.graph, None, federation.net_ip),
+                               check_connectivity=federation.mode == 'veth')
+    for error in errors:
+        print("ERROR: "+ error)
+    if args.dry_run or errors:
+        return 1 if errors else 0
+
+    if federation.interconnect in ('ring', 'mesh') and args.proactive != 'only' \
+            and not all(cloud.controllers for cloud in federation.clouds):
+        print("WARNING: a %s interconnect has loops, which mininet's learning switch controller "
+              "floods forever. Use the star/line interconnect or remote controllers." % federation.interconnect)
+    runner.run(interactive=not args.benchmark, benchmark={'output': args.benchmark} if args.benchmark else None)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
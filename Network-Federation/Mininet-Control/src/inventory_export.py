@@ -0,0 +1,208 @@
+__author__ = 'Constantin'
+
+# Host inventory of the Cloud-Agents (cloudconfN/hosts/Host<n>.xml, read by CloudConfigurator),
+# generated from a topology graph instead of being kept in sync by hand:
+#   python topoctl.py inventory cloud1.ovx --out <cloud-agents resources>/cloudconf1 --profiles SMALL,SMALL,MEDIUM,LARGE
+# Endpoint (DPID and port of the host's switch), IP and MAC come from the graph, the hardware
+# from HARDWARE_PROFILES (assigned round-robin in host order) and the SLA from HOST_SLA.
+# Next to the hosts/ dir, hosts.xml indexes all hosts in one file (it must not be put into
+# hosts/, as CloudConfigurator loads every file in there as a host).
+# Both are written while walking the hosts, so memory stays constant whatever the number of
+# hosts. The XML of a host (and of an index entry) is rendered once per hardware profile by
+# the SAX XMLGenerator, with {field} placeholders that are then filled in per host, as a
+# writer call per element and host would make 100k hosts take ten times as long.
+
+#Python system imports:
+import io
+import os
+import re
+from xml.sax.saxutils import XMLGenerator, escape, quoteattr
+
+#Own Imports:
+from address_plan import Subnet
+
+
+
+## HOST DEFINITIONS ##
+######################
+
+# CPU unit -> (RAM, storage), as of the hand-written cloudconf hosts:
+HARDWARE_PROFILES = {
+    'SMALL':  ('8.0 GiB', '50.0 GiB'),
+    'MEDIUM': ('16.0 GiB', '320.0 GiB'),
+    'LARGE':  ('24.0 GiB', '500.0 GiB'),
+}
+BANDWIDTH = '100.0 MB'
+LATENCY = '10.0'
+
+HOST_SLA = {
+    'RelOnlineTime': '0.95',
+    'ImgFormats': 'BOCHS CLOOP COW DMG IMG QCOW QCOW2 RAW',
+    'maxResPerCPU': ['SMALL,10', 'MEDIUM,5', 'LARGE,2'],
+}
+
+HOST_FILE = 'Host%d.xml'
+HOST_FILE_RE = re.compile(r'^Host(\d+)\.xml$')
+INDEX_FILE = 'hosts.xml'
+
+
+
+## STREAMING XML ##
+###################
+
+class _XMLWriter(object):
+    # XMLGenerator with the tab indentation of the hand-written files.
+
+    def __init__(self, out):
+        self.xml = XMLGenerator(out, 'utf-8', short_empty_elements=True)
+        self.depth = 0
+
+    def _indent(self):
+        self.xml.ignorableWhitespace('\n' + '\t' * self.depth)
+
+    def start(self, name, attrs=None):
+        if self.depth:
+            self._indent()
+        self.xml.startElement(name, attrs or {})
+        self.depth += 1
+
+    def end(self, name):
+        self.depth -= 1
+        self._indent()
+        self.xml.endElement(name)
+
+    def element(self, name, text, attrs=None):
+        self._indent()
+        self.xml.startElement(name, attrs or {})
+        self.xml.characters(text)
+        self.xml.endElement(name)
+
+    def close(self):
+        self.xml.ignorableWhitespace('\n')
+
+
+
+## EXPORT ##
+############
+
+def host_records(graph, profiles=('SMALL',), net_ip=None):
+    # Yields (host name, resource id, dpid, port, ip, mac, cpu, links) per host, in graph order.
+    # The resource id is the host's offset from the topology's net_ip (as '+11' in the topology
+    # files; the hosts' interface prefix may be wider, as the /8 of the clouds), links the ordinal
+    # of its switch among the switches (GW = 0), as the hand-written files number them.
+    switch_ordinal = dict((idx, ordinal) for ordinal, idx in enumerate(graph.switches()))
+    hosts = graph.hosts()
+    if net_ip is not None:
+        subnet = Subnet.parse(net_ip)
+        base = subnet.base
+    else:
+        subnet = Subnet(graph.ip[hosts[0]] if hosts else 0, graph.prefix_len)
+        base = subnet.network
+    for number, (idx, ip) in enumerate(zip(hosts, graph.host_ips(hosts))):
+        switch, port = graph.host_attachment(idx)
+        if switch is None:
+            raise ValueError("Host "+ graph.names[idx] +" is not attached to any switch")
+        if graph.ip[idx] not in subnet:
+            raise ValueError("Host "+ graph.names[idx] +" ("+ ip +") is outside of "+ str(subnet))
+        yield (graph.names[idx], graph.ip[idx] - base, graph.dpid_str(switch), port, ip,
+               graph.mac_str(idx), profiles[number % len(profiles)], switch_ordinal[switch])
+
+
+def write_host(out, record):
+    # One Host XML, as Host.fromXML of the Cloud-Agents reads it:
+    _, res_id, dpid, port, ip, mac, cpu, links = record
+    ram, storage = HARDWARE_PROFILES[cpu]
+    writer = _XMLWriter(out)
+    writer.start('Host')
+    writer.start('Hardware')
+    writer.start('Resource')
+    writer.element('ID', str(res_id))
+    writer.element('CPU', cpu)
+    for name, size in (('RAM', ram), ('Storage', storage), ('Bandwidth', BANDWIDTH)):
+        writer.start(name)
+        writer.element('ByteSize', size)
+        writer.end(name)
+    writer.element('Latency', LATENCY)
+    writer.element('Links', str(links))
+    writer.end('Resource')
+    writer.end('Hardware')
+    writer.start('Endpoint')
+    writer.element('DPID', dpid)
+    writer.element('Port', str(port))
+    writer.end('Endpoint')
+    writer.element('IP', ip)
+    writer.element('MAC', mac)
+    writer.element('ResourceAllocs', '')
+    writer.start('HostSLA')
+    writer.start('HostSLA')
+    writer.element('RelOnlineTime', HOST_SLA['RelOnlineTime'])
+    writer.element('ImgFormats', HOST_SLA['ImgFormats'])
+    writer.start('maxResPerCPU')
+    for entry in HOST_SLA['maxResPerCPU']:
+        writer.element('t2', entry)
+    writer.end('maxResPerCPU')
+    writer.end('HostSLA')
+    writer.end('HostSLA')
+    writer.element('Federateable', 'true')
+    writer.end('Host')
+    writer.close()
+
+
+def write_index_entry(writer, record, file_name):
+    name, res_id, dpid, port, ip, mac, cpu, _ = record
+    writer.start('Host', {'name': name, 'file': 'hosts/' + file_name})
+    for element, text in (('ID', str(res_id)), ('DPID', dpid), ('Port', str(port)),
+                          ('IP', ip), ('MAC', mac), ('CPU', cpu)):
+        writer.element(element, text)
+    writer.end('Host')
+
+
+# Placeholder record, rendered into the per profile templates:
+_FIELDS = ('{name}', '{res_id}', '{dpid}', '{port}', '{ip}', '{mac}', None, '{links}')
+
+
+def _templates(profile):
+    # (host file, index entry) templates of a profile, as str.format() strings:
+    record = _FIELDS[:6] + (profile,) + _FIELDS[7:]
+    host_out = io.BytesIO()
+    write_host(host_out, record)
+    index_out = io.BytesIO()
+    writer = _XMLWriter(index_out)
+    writer.depth = 1
+    write_index_entry(writer, record, '{file_name}')
+    return host_out.getvalue().decode('utf-8'), index_out.getvalue().decode('utf-8')
+
+
+def export_inventory(graph, out_dir, profiles=('SMALL',), net_ip=None):
+    # Writes out_dir/hosts/Host<n>.xml for every host and the out_dir/hosts.xml index, and
+    # deletes Host<n>.xml files of former exports beyond the current hosts. Returns the host count.
+    for profile in profiles:
+        if profile not in HARDWARE_PROFILES:
+            raise ValueError("Unknown hardware profile "+ profile +", choose one of: "+ ', '.join(sorted(HARDWARE_PROFILES)))
+    templates = dict((profile, _templates(profile)) for profile in set(profiles))
+    host_dir = os.path.join(out_dir, 'hosts')
+    os.makedirs(host_dir, exist_ok=True)
+    count = 0
+    with open(os.path.join(out_dir, INDEX_FILE), 'w', encoding='utf-8') as index_file:
+        index_file.write('<?xml version="1.0" encoding="utf-8"?>\n<Hosts topology=%s>' % quoteattr(graph.name))
+        for count, record in enumerate(host_records(graph, profiles, net_ip), 1):
+            name, res_id, dpid, port, ip, mac, cpu, links = record
+            file_name = HOST_FILE % count
+            host_template, index_template = templates[cpu]
+            # Host names are the only free text (node names of the topology), all other fields are addresses:
+            fields = {'name': escape(name, {'"': '&quot;'}), 'res_id': res_id, 'dpid': dpid, 'port': port,
+                      'ip': ip, 'mac': mac, 'links': links, 'file_name': file_name}
+            # One open/write/close per file, without the buffered file object around it:
+            fd = os.open(os.path.join(host_dir, file_name), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+            try:
+                os.write(fd, host_template.format(**fields).encode('utf-8'))
+            finally:
+                os.close(fd)
+            index_file.write(index_template.format(**fields))
+        index_file.write('\n</Hosts>\n')
+
+    for file_name in os.listdir(host_dir):
+        match = HOST_FILE_RE.match(file_name)
+        if match is not None and int(match.group(1)) > count:
+            os.remove(os.path.join(host_dir, file_name))
+    return count
@@ -0,0 +1,542 @@
+__author__ = 'Constantin'
+
+# Live changes of a running topology, without net.stop() and a rebuild (which would drop every
+# tenant's state in OVX). The running graph is compared with the changed one by node name:
+# - nodes whose kind, addresses or cpu share changed are removed and added again,
+# - links are compared with their ports and shaping, so only renumbered or reshaped links are re-created,
+# - GRE ports of the GWs are compared with their remote ip and port number,
+# and only the affected namespaces, veths and OVS ports are touched, each kind in bulk (see
+# bringup.BatchMininet's live changes). Growing a cloud from 4 to 400 hosts is thereby one
+# 'ip -batch' run, one ovs-vsctl transaction and 396 host shells spawned in parallel.
+# New hosts continue the names and addresses of the existing ones, and a change that fails part
+# way is rolled back to the running graph (see TopologyDelta.rollback).
+# Changes come from an edited topology file ('reload') or edit operations, sent as JSON lines
+# to the control socket a TopologyRunner opens with control=<path>:
+#   python live_topology.py /tmp/cloud1.sock add_hosts switch=SWITCH1 count=396
+#   python live_topology.py /tmp/cloud1.sock remove nodes=h1_1_1,h1_1_2
+#   python live_topology.py /tmp/cloud1.sock reload
+# Pinning host ports in the topology file ('port') keeps the other links of a switch stable
+# when hosts are inserted in between.
+
+#Python system imports:
+import json
+import os
+import re
+import socket
+import socketserver
+import sys
+import threading
+import time
+
+#Own Imports:
+from address_plan import AddressPlan, Subnet, parse_ip
+from shaping import host_params
+from topology import HOST, SWITCH, TopologyGraph, gre_port_numbers
+
+
+
+## GRAPH EDITING ##
+###################
+
+# Linux interface names hold at most 15 characters (IFNAMSIZ - 1):
+MAX_INTF_NAME = 15
+
+class GraphEdit(object):
+    # Collects edit operations on a graph (and its gateways) and builds the changed graph at
+    # once. Kept links keep their ports, new links get the next free ones. Addresses of new
+    # nodes may be left out and are allocated from the graph's subnet then.
+
+    def __init__(self, graph, gateways=()):
+        self.graph = graph
+        self.gateways = [dict(gateway, gre_ports=dict(gateway.get('gre_ports', {}))) for gateway in gateways]
+        self.removed_nodes = set()
+        self.removed_links = set()      # frozensets of the two node names
+        self.switches = []              # (name, dpid)
+        self.hosts = []                 # (name, switch, ip, mac, port)
+        self.links = []                 # (src, dst, src_port, dst_port)
+
+    def _gateway(self, switch):
+        for gateway in self.gateways:
+            if gateway['switch'] == switch:
+                return gateway
+        raise ValueError("Switch "+ switch +" is not a gateway")
+
+    def _new_names(self):
+        return set(name for name, _ in self.switches) | set(host[0] for host in self.hosts)
+
+    def apply(self, op):
+        # op: a dict with the operation name in 'op' and its arguments, see OPERATIONS.
+        name = op.get('op')
+        if name not in OPERATIONS:
+            raise ValueError("Unknown operation %s, choose one of: %s" % (name, ', '.join(sorted(OPERATIONS))))
+        args = dict((key, value) for key, value in op.items() if key != 'op')
+        try:
+            getattr(self, OPERATIONS[name])(**args)
+        except TypeError as e:
+            raise ValueError("Invalid arguments for %s: %s" % (name, e))
+        return self
+
+    def add_switch(self, name, dpid=None, links=()):
+        self.switches.append((name, dpid))
+        for linked in links:
+            self.links.append((name, linked, None, None))
+
+    def add_host(self, name, switch, ip=None, mac=None, port=None):
+        self.hosts.append((name, switch, ip, mac, port))
+
+    def _host_prefix(self, switch):
+        # Name prefix of new hosts of switch: the one of its hosts (h1_1_ of h1_1_1), else the
+        # cloud part of the other hosts' names with the switch's number (h1_4_ for SWITCH4):
+        graph = self.graph
+        names = [name for name, host_switch, _, _, _ in self.hosts if host_switch == switch]
+        if switch in graph.index:
+            names += [graph.names[neighbour] for neighbour, _, _, _ in graph.adjacency()[graph.index[switch]]
+                      if graph.kinds[neighbour] == HOST]
+        for name in sorted(names):
+            match = re.match(r'(.*\D)\d+$', name)
+            if match:
+                return match.group(1)
+        number = re.search(r'\d+$', switch)
+        for idx in graph.hosts() if number else ():
+            match = re.match(r'(.*_)\d+_\d+$', graph.names[idx])
+            if match:
+                return '%s%s_' % (match.group(1), number.group())
+        return switch.lower() + '_'
+
+    def add_hosts(self, switch, count, prefix=None):
+        # count hosts <prefix><n> with allocated addresses, numbered after the existing ones:
+        prefix = prefix or self._host_prefix(switch)
+        taken = set(self.graph.index) | self._new_names()
+        number = 1
+        for _ in range(int(count)):
+            while prefix + str(number) in taken:
+                number += 1
+            self.hosts.append((prefix + str(number), switch, None, None, None))
+            taken.add(prefix + str(number))
+
+    def add_link(self, src, dst, src_port=None, dst_port=None):
+        self.links.append((src, dst, src_port, dst_port))
+
+    def remove(self, nodes):
+        for name in [nodes] if isinstance(nodes, str) else nodes:
+            if name not in self.graph.index:
+                raise ValueError("Node "+ name +" is not part of topology "+ self.graph.name)
+            self.removed_nodes.add(name)
+
+    def remove_link(self, src, dst):
+        self.removed_links.add(frozenset((src, dst)))
+
+    def set_gre_port(self, switch, port, remote_ip):
+        parse_ip(remote_ip)
+        self._gateway(switch)['gre_ports'][port] = remote_ip
+
+    def remove_gre_port(self, switch, port):
+        if self._gateway(switch)['gre_ports'].pop(port, None) is None:
+            raise ValueError("Gateway "+ switch +" has no GRE port "+ port)
+
+    def _address_plan(self, graph):
+        # AddressPlan of the graph's subnet (taken from its hosts, or the first explicit new ip):
+        ips = [graph.ip[idx] for idx in graph.hosts()] + \
+              [parse_ip(host[2].split('/')[0]) for host in self.hosts if host[2] and not host[2].startswith('+')]
+        return AddressPlan(Subnet(ips[0] if ips else 0, graph.prefix_len)), bool(ips)
+
+    def build(self):
+        # -> (changed graph, changed gateways)
+        old = self.graph
+        graph = TopologyGraph(old.name, old.prefix_len)
+        plan, subnet_known = self._address_plan(old)
+        old_names = old.names
+        for idx in range(old.node_count):
+            name = old_names[idx]
+            if name in self.removed_nodes:
+                continue
+            if old.kinds[idx] == SWITCH:
+                new_idx = graph.add_switch(name, plan.reserve_dpid(old.dpid[idx]))
+            else:
+                new_idx = graph.add_host(name, plan.ips.reserve(old.ip[idx]), plan.reserve_mac(old.mac[idx]))
+            # Ports of removed links are not handed out again (which also keeps GRE port numbers):
+            graph.next_port[new_idx] = old.next_port[idx]
+            graph.cpu[new_idx] = old.cpu[idx]
+
+        for l in range(old.link_count):
+            src, src_port, dst, dst_port = old.link(l)
+            if old_names[src] in self.removed_nodes or old_names[dst] in self.removed_nodes or \
+                    frozenset((old_names[src], old_names[dst])) in self.removed_links:
+                continue
+            graph.add_link(graph.index[old_names[src]], graph.index[old_names[dst]], src_port, dst_port,
+                           old.link_bw[l], old.link_delay[l], old.link_loss[l])
+
+        def node(name, want_switch=None):
+            idx = graph.index.get(name)
+            if idx is None or (want_switch is not None and graph.is_switch(idx) != want_switch):
+                raise ValueError("%s %s is not part of topology %s"
+                                 % ('Switch' if want_switch else 'Node', name, graph.name))
+            return idx
+
+        # New nodes without explicit addresses get the ones after the highest of the kept nodes,
+        # continuing the existing hosts' numbering (explicit ones are reserved first):
+        dpids = [plan.reserve_dpid(dpid) if dpid else None for _, dpid in self.switches]
+        ips = [plan.reserve_ip(ip.split('/')[0]) if ip else None for _, _, ip, _, _ in self.hosts]
+        macs = [plan.reserve_mac(mac) if mac else None for _, _, _, mac, _ in self.hosts]
+        kept_hosts, kept_switches = graph.hosts(), graph.switches()
+        if kept_hosts:
+            plan.ips.skip_to(max(graph.ip[idx] for idx in kept_hosts) + 1)
+            plan.macs.skip_to(max(graph.mac[idx] for idx in kept_hosts) + 1)
+        if kept_switches:
+            plan.dpids.skip_to(max(graph.dpid[idx] for idx in kept_switches) + 1)
+        for (name, _), dpid in zip(self.switches, dpids):
+            graph.add_switch(name, dpid if dpid is not None else plan.allocate_dpids(1)[0])
+        for (name, switch, _, _, port), ip, mac in zip(self.hosts, ips, macs):
+            if ip is None and not subnet_known:
+                raise ValueError("Topology "+ old.name +" has no hosts, host "+ name +" needs an explicit ip")
+            host_idx = graph.add_host(name, ip if ip is not None else plan.allocate_ips(1)[0],
+                                      mac if mac is not None else plan.allocate_macs(1)[0])
+            graph.add_link(host_idx, node(switch, True), dst_port=port)
+        for src, dst, src_port, dst_port in self.links:
+            graph.add_link(node(src), node(dst), src_port, dst_port)
+        for idx, name in enumerate(graph.names):
+            # Interface names of new ports (<node>-eth<port>) have to fit, as topoctl validates:
+            if name in old.index and graph.next_port[idx] <= old.next_port[old.index[name]]:
+                continue
+            intf_name = '%s-eth%d' % (name, graph.next_port[idx] - 1)
+            if len(intf_name) > MAX_INTF_NAME:
+                raise ValueError("Interface name %s exceeds %d characters" % (intf_name, MAX_INTF_NAME))
+
+        gateways = [gateway for gateway in self.gateways if gateway['switch'] not in self.removed_nodes]
+        for gateway in gateways:
+            node(gateway['switch'], True)
+        return graph, gateways
+
+
+# Operation name -> GraphEdit method:
+OPERATIONS = {
+    'add_switch': 'add_switch',
+    'add_host': 'add_host',
+    'add_hosts': 'add_hosts',
+    'add_link': 'add_link',
+    'remove': 'remove',
+    'remove_link': 'remove_link',
+    'set_gre_port': 'set_gre_port',
+    'remove_gre_port': 'remove_gre_port',
+}
+
+
+
+## TOPOLOGY DELTAS ##
+#####################
+
+def _node_table(graph):
+    # name -> (kind, dpid, ip, mac, cpu)
+    return dict((name, (graph.kinds[idx], graph.dpid[idx], graph.ip[idx], graph.mac[idx], graph.cpu[idx]))
+                for idx, name in enumerate(graph.names))
+
+
+def _link_table(graph):
+    # Links as ((name, port), (name, port)) with the ends in name order -> their shaping:
+    names = graph.names
+    table = {}
+    for l in range(graph.link_count):
+        src, src_port, dst, dst_port = graph.link(l)
+        table[tuple(sorted(((names[src], src_port), (names[dst], dst_port))))] = graph.link_shaping(l)
+    return table
+
+
+def _gre_table(graph, gateways):
+    # (gw switch, port name) -> (remote ip, local ip, port number)
+    table = {}
+    for gateway in gateways:
+        port_numbers = gre_port_numbers(gateway, graph)
+        for port_name, remote_ip in gateway.get('gre_ports', {}).items():
+            table[(gateway['switch'], port_name)] = (remote_ip, gateway.get('local_ip'), port_numbers[port_name])
+    return table
+
+
+class TopologyDelta(object):
+    # The nodes, links and GW settings to remove from the running network and to add to it.
+
+    def __init__(self, old_graph, new_graph, old_gateways=(), new_gateways=()):
+        old_nodes, new_nodes = _node_table(old_graph), _node_table(new_graph)
+        self.removed_nodes = sorted(name for name in old_nodes if new_nodes.get(name) != old_nodes[name])
+        self.added_nodes = sorted(name for name in new_nodes if old_nodes.get(name) != new_nodes[name])
+        removed, added = set(self.removed_nodes), set(self.added_nodes)
+
+        old_links, new_links = _link_table(old_graph), _link_table(new_graph)
+        self.removed_links = sorted(link for link in old_links if new_links.get(link) != old_links[link]
+                                    or link[0][0] in removed or link[1][0] in removed)
+        self.added_links = sorted(link for link in new_links if old_links.get(link) != new_links[link]
+                                  or link[0][0] in added or link[1][0] in added)
+        self.link_shaping = dict((link, new_links[link]) for link in self.added_links if new_links[link])
+
+        old_gre, new_gre = _gre_table(old_graph, old_gateways), _gre_table(new_graph, new_gateways)
+        self.removed_gre = sorted(key for key in old_gre if new_gre.get(key) != old_gre[key] or key[0] in removed)
+        self.added_gre = sorted(key for key in new_gre if old_gre.get(key) != new_gre[key] or key[0] in added)
+        old_controllers = dict((gateway['switch'], gateway.get('controllers')) for gateway in old_gateways)
+        self.changed_controllers = sorted(gateway['switch'] for gateway in new_gateways
+                                          if gateway.get('controllers') and
+                                          (gateway['switch'] in added or
+                                           old_controllers.get(gateway['switch']) != gateway.get('controllers')))
+        self.timings = {}
+
+    @classmethod
+    def rollback(cls, delta, net, old_graph, old_gateways=()):
+        # The delta bringing net back to old_graph after applying delta failed part way, from what
+        # net holds by then: every node, link and GRE port delta touched is removed (if net has
+        # it) and whatever old_graph has and net is missing then is created again.
+        rollback = cls.__new__(cls)
+        present = set(net.nameToNode)
+        rollback.removed_nodes = sorted(present & (set(delta.removed_nodes) | set(delta.added_nodes)))
+        removed = set(rollback.removed_nodes)
+        old_nodes = _node_table(old_graph)
+        rollback.added_nodes = sorted(name for name in old_nodes if name not in present or name in removed)
+        added = set(rollback.added_nodes)
+
+        touched = set(delta.removed_links) | set(delta.added_links)
+        net_links = set(tuple(sorted((intf.node.name, intf.node.ports[intf]) for intf in (link.intf1, link.intf2)))
+                        for link in net.links)
+        rollback.removed_links = sorted(link for link in net_links
+                                        if link in touched or link[0][0] in removed or link[1][0] in removed)
+        kept_links = net_links - set(rollback.removed_links)
+        old_links = _link_table(old_graph)
+        rollback.added_links = sorted(link for link in old_links if link not in kept_links)
+        rollback.link_shaping = dict((link, old_links[link]) for link in rollback.added_links if old_links[link])
+
+        touched_gre = set(delta.removed_gre) | set(delta.added_gre)
+        rollback.removed_gre = sorted(touched_gre)
+        rollback.added_gre = sorted(key for key in _gre_table(old_graph, old_gateways)
+                                    if key in touched_gre or key[0] in added)
+        rollback.changed_controllers = sorted(gateway['switch'] for gateway in old_gateways
+                                              if gateway.get('controllers') and
+                                              (gateway['switch'] in added or
+                                               gateway['switch'] in delta.changed_controllers))
+        rollback.timings = {}
+        return rollback
+
+    def __len__(self):
+        return len(self.removed_nodes) + len(self.added_nodes) + len(self.removed_links) + \
+               len(self.added_links) + len(self.removed_gre) + len(self.added_gre) + len(self.changed_controllers)
+
+    def summary(self):
+        parts = ['%s: -%d/+%d' % (kind, len(removals), len(additions)) for kind, removals, additions in
+                 (('nodes', self.removed_nodes, self.added_nodes), ('links', self.removed_links, self.added_links),
+                  ('gre', self.removed_gre, self.added_gre)) if removals or additions]
+        if self.changed_controllers:
+            parts.append('gw controllers: %d' % len(self.changed_controllers))
+        return ', '.join(parts) or 'no changes'
+
+
+def diff_topologies(old_graph, new_graph, old_gateways=(), new_gateways=()):
+    return TopologyDelta(old_graph, new_graph, old_gateways, new_gateways)
+
+
+
+## APPLYING DELTAS ##
+#####################
+
+def apply_delta(net, delta, graph, gateways=(), configure=None):
+    # Changes the running bringup.BatchMininet net into graph (and gateways), as computed by
+    # diff_topologies. configure(batch, switch names) may queue the settings of the new switches
+    # (e.g. their controllers), flushed together with the GW settings. Returns a PhaseTimer.
+    from mininet.node import OVSSwitch
+    from bringup import OVSBatch, PhaseTimer, add_gateway_config
+    timer = PhaseTimer()
+    added = set(delta.added_nodes)
+
+    with timer.phase('remove'):
+        batch = OVSBatch()
+        for switch, port_name in delta.removed_gre:
+            batch.add('--if-exists', 'del-port', switch, port_name)
+        batch.flush()
+        removed_intfs = set()
+        for (node1, port1), (node2, port2) in delta.removed_links:
+            removed_intfs.add(net[node1].intfName(port1))
+        net.delete_links([link for link in net.links
+                          if link.intf1.name in removed_intfs or link.intf2.name in removed_intfs])
+        net.delete_nodes([net[name] for name in delta.removed_nodes])
+
+    with timer.phase('add-nodes'):
+        hosts, switches = [], []
+        for name in delta.added_nodes:
+            idx = graph.index[name]
+            if graph.kinds[idx] == HOST:
+                hosts.append((name, dict(host_params(graph, idx), ip=graph.ip_cidr(idx), mac=graph.mac_str(idx))))
+            else:
+                switches.append((name, {'dpid': graph.dpid_hex(idx)}))
+        new_hosts, new_switches = net.add_nodes(hosts, switches)
+
+    with timer.phase('add-links'):
+        links = net.add_links(dict(delta.link_shaping.get(link, {}), node1=link[0][0], port1=link[0][1],
+                                   node2=link[1][0], port2=link[1][1]) for link in delta.added_links)
+        # Ports of running switches are added here, new switches add theirs when started:
+        batch = OVSBatch()
+        for link in links:
+            for intf in (link.intf1, link.intf2):
+                if intf.node.name in added:
+                    continue
+                if isinstance(intf.node, OVSSwitch):
+                    batch.add('--may-exist', 'add-port', intf.node.name, intf.name)
+                    batch.add('set', 'interface', intf.name, 'ofport_request=%d' % intf.node.ports[intf])
+                else:
+                    intf.ifconfig('up')
+        batch.flush()
+        net.shape_links(links)
+
+    with timer.phase('start'):
+        net.config_hosts(new_hosts)
+        net.start_switches(new_switches)
+
+    with timer.phase('gateway'):
+        batch = OVSBatch()
+        if configure is not None:
+            configure(batch, [switch.name for switch in new_switches])
+        gre_switches = set(switch for switch, _ in delta.added_gre)
+        for gateway in gateways:
+            if gateway['switch'] in gre_switches or gateway['switch'] in delta.changed_controllers:
+                if gateway['switch'] not in delta.changed_controllers:
+                    gateway = dict(gateway, controllers=None)
+                add_gateway_config(batch, gateway, graph)
+        batch.flush()
+
+    delta.timings = timer.as_dict()
+    return timer
+
+
+
+## CONTROL SOCKET ##
+####################
+
+class TopologyControl(object):
+    # Unix socket of a running TopologyRunner: one JSON request per line, answered by one JSON
+    # line. A request is an operation ({"op": "add_host", ...}) or a list of them ({"ops": [...]}),
+    # which are applied to the running network as one delta. 'reload' replaces the graph by the
+    # one reload() returns (with the gateway, re-reading the topology file), 'status' reports
+    # the node counts, 'snapshot' writes the switches' state to its 'path' (see snapshot.py).
+
+    def __init__(self, runner, path, reload=None):
+        self.runner = runner
+        self.path = path
+        self.reload = reload
+        self._server = None
+        self._thread = None
+
+    def handle(self, request):
+        start = time.time()
+        ops = request.get('ops') if 'ops' in request else [request]
+        graph = self.runner.graph
+        if [op.get('op') for op in ops] == ['status']:
+            return {'ok': True, 'topology': graph.name, 'switches': len(graph.switches()),
+                    'hosts': len(graph.hosts()), 'links': graph.link_count}
+        if [op.get('op') for op in ops] == ['snapshot']:
+            manifest = self.runner.snapshot(ops[0]['path'])
+            return {'ok': True, 'path': ops[0]['path'], 'switches': len(manifest['bridges']),
+                    'flows': sum(manifest['flows'].values()), 'elapsed_s': round(time.time() - start, 3)}
+        edit = GraphEdit(graph, self.runner.gateways)
+        for op in ops:
+            if op.get('op') == 'reload':
+                if self.reload is None:
+                    raise ValueError("The runner has no topology file to reload")
+                graph, gateway = self.reload()
+                edit = GraphEdit(graph, [gateway] if gateway is not None else [])
+            else:
+                edit.apply(op)
+        graph, gateways = edit.build()
+        delta = self.runner.mutate(graph, gateways)
+        return {'ok': True, 'changes': delta.summary(), 'timings': delta.timings,
+                'elapsed_s': round(time.time() - start, 3),
+                'switches': len(graph.switches()), 'hosts': len(graph.hosts()), 'links': graph.link_count}
+
+    def start(self):
+        control = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    if not line.strip():
+                        continue
+                    try:
+                        reply = control.handle(json.loads(line.decode('utf-8')))
+                    except Exception as e:
+                        # Bad requests (ValueError) as well as failed commands on the network:
+                        reply = {'ok': False, 'error': '%s: %s' % (type(e).__name__, e)}
+                    self.wfile.write((json.dumps(reply) + '\n').encode('utf-8'))
+
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = socketserver.UnixStreamServer(self.path, Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, name='topology-control')
+        self._thread.daemon = True
+        self._thread.start()
+        print("*** Topology control socket: "+ self.path)
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+
+def send_request(path, request, timeout=None):
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    connection.settimeout(timeout)
+    try:
+        connection.connect(path)
+        connection.sendall((json.dumps(request) + '\n').encode('utf-8'))
+        reply = b''
+        while not reply.endswith(b'\n'):
+            data = connection.recv(65536)
+            if not data:
+                break
+            reply += data
+    finally:
+        connection.close()
+    return json.loads(reply.decode('utf-8'))
+
+
+
+## COMMAND LINE ##
+##################
+
+# Arguments taking comma separated lists:
+LIST_ARGS = ('nodes', 'links')
+
+
+def _parse_op(name, args):
+    # 'add_host', ['name=h5', 'switch=SWITCH1', 'port=5'] -> {'op': 'add_host', 'name': 'h5', ...}
+    op = {'op': name}
+    for arg in args:
+        key, sep, value = arg.partition('=')
+        if not sep:
+            raise ValueError("Expected key=value, got "+ arg)
+        if key in LIST_ARGS:
+            op[key] = [item for item in value.split(',') if item]
+        else:
+            op[key] = int(value) if value.isdigit() else value
+    return op
+
+
+def main(argv):
+    if len(argv) < 2:
+        print("Usage: live_topology.py SOCKET status|reload|snapshot path=ARCHIVE|OPERATION [key=value ...]\n"
+              "       live_topology.py SOCKET --file OPS.json     (a JSON list of operations)\n"
+              "Operations: "+ ', '.join(sorted(OPERATIONS)))
+        return 2
+    path = argv[0]
+    try:
+        if argv[1] == '--file':
+            with open(argv[2]) as ops_file:
+                request = {'ops': json.load(ops_file)}
+        else:
+            request = _parse_op(argv[1], argv[2:])
+        reply = send_request(path, request)
+    except (ValueError, OSError, IndexError) as e:
+        print("Request failed: %s" % e)
+        return 2
+    print(json.dumps(reply, indent=1, sort_keys=True))
+    return 0 if reply.get('ok') else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,514 @@
+__author__ = 'Constantin'
+
+# Transparent OpenFlow TCP proxy, to be put in front of any controller (OVX or Floodlight):
+#   python of_proxy.py --map 16633=192.168.1.41:6633 --stats ofproxy.json
+#   python of_proxy.py --map 16642=192.168.1.42:6633 --map 16643=192.168.1.43:6633 --stats gw.json
+# Switches connect to the listen port, the proxy connects on to the controller and forwards
+# every byte unchanged. On the way through, the OpenFlow headers are parsed in place (struct
+# over a memoryview of the receive buffer) to count messages per type and DPID and to measure
+# the latency from each PACKET_IN to the FLOW_MOD/PACKET_OUT answering it. One proxy in front
+# of OVX and one in front of the tenant's Floodlight (OVX's tenant controller url) tell which
+# of both hops is the slow one. Stats are exported as JSON every --interval seconds and on exit.
+# TopologyRunner starts it via launch_proxy() (see 'topoctl.py run --of-proxy').
+
+#Python system imports:
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import time
+from collections import OrderedDict
+
+
+
+## OPENFLOW HEADERS ##
+######################
+
+OFP_HEADER = struct.Struct('!BBHI')     # version, type, length, xid
+_U16 = struct.Struct('!H')
+_U32 = struct.Struct('!I')
+_U64 = struct.Struct('!Q')
+HEADER_LEN = 8
+# Bytes of a message needed to read all fields used here (FLOW_MOD's buffer_id in OF 1.0):
+PREFIX_LEN = 68
+NO_BUFFER = 0xffffffff
+
+OFP_VERSION_1_0 = 0x01
+OFPT_FEATURES_REPLY = 6
+OFPT_PACKET_IN = 10
+OFPT_PACKET_OUT = 13
+OFPT_FLOW_MOD = 14
+
+# Message type names, the first 15 are the same in all versions:
+_COMMON_TYPES = ('HELLO', 'ERROR', 'ECHO_REQUEST', 'ECHO_REPLY', 'EXPERIMENTER', 'FEATURES_REQUEST',
+                 'FEATURES_REPLY', 'GET_CONFIG_REQUEST', 'GET_CONFIG_REPLY', 'SET_CONFIG', 'PACKET_IN',
+                 'FLOW_REMOVED', 'PORT_STATUS', 'PACKET_OUT', 'FLOW_MOD')
+_OF10_TYPES = _COMMON_TYPES + ('PORT_MOD', 'STATS_REQUEST', 'STATS_REPLY', 'BARRIER_REQUEST',
+                               'BARRIER_REPLY', 'QUEUE_GET_CONFIG_REQUEST', 'QUEUE_GET_CONFIG_REPLY')
+_OF13_TYPES = _COMMON_TYPES + ('GROUP_MOD', 'PORT_MOD', 'TABLE_MOD', 'MULTIPART_REQUEST', 'MULTIPART_REPLY',
+                               'BARRIER_REQUEST', 'BARRIER_REPLY', 'QUEUE_GET_CONFIG_REQUEST',
+                               'QUEUE_GET_CONFIG_REPLY', 'ROLE_REQUEST', 'ROLE_REPLY', 'GET_ASYNC_REQUEST',
+                               'GET_ASYNC_REPLY', 'SET_ASYNC', 'METER_MOD')
+
+
+def type_name(version, msg_type):
+    types = _OF10_TYPES if version == OFP_VERSION_1_0 else _OF13_TYPES
+    return types[msg_type] if msg_type < len(types) else 'TYPE_%d' % msg_type
+
+
+class OpenFlowStream(object):
+    # Splits one direction of a connection into OpenFlow messages and calls
+    # handler(view, pos, version, type, length, xid) with at least the first min(length, PREFIX_LEN)
+    # bytes of each message at view[pos:]. view is the memoryview of the receive buffer itself,
+    # only message prefixes split over two reads are collected (copied) first.
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.broken = False
+        self._head = bytearray()
+        self._remaining = 0
+
+    def feed(self, view):
+        pos, end = 0, len(view)
+        while pos < end and not self.broken:
+            if self._remaining:
+                # Rest of a message already handled:
+                step = min(self._remaining, end - pos)
+                pos += step
+                self._remaining -= step
+                continue
+            if not self._head and end - pos >= HEADER_LEN:
+                version, msg_type, length, xid = OFP_HEADER.unpack_from(view, pos)
+                if length < HEADER_LEN:
+                    self.broken = True
+                    break
+                if end - pos >= min(length, PREFIX_LEN):
+                    self.handler(view, pos, version, msg_type, length, xid)
+                    step = min(length, end - pos)
+                    pos += step
+                    self._remaining = length - step
+                    continue
+            # The message prefix is split over reads, collect it first:
+            head = self._head
+            want = min(_U16.unpack_from(head, 2)[0], PREFIX_LEN) if len(head) >= HEADER_LEN else HEADER_LEN
+            step = min(max(want - len(head), 0), end - pos)
+            head += view[pos:pos + step]
+            pos += step
+            if len(head) >= HEADER_LEN:
+                version, msg_type, length, xid = OFP_HEADER.unpack_from(head, 0)
+                if length < HEADER_LEN:
+                    self.broken = True
+                elif len(head) >= min(length, PREFIX_LEN):
+                    self._head = bytearray()
+                    self.handler(memoryview(head), 0, version, msg_type, length, xid)
+                    self._remaining = length - len(head)
+
+
+
+## STATISTICS ##
+################
+
+class LatencyHistogram(object):
+    # log2 buckets of microseconds: bucket 0 holds latencies below 2us, bucket i [2^i, 2^(i+1)) us.
+
+    BUCKETS = 32
+
+    def __init__(self):
+        self.buckets = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, seconds):
+        micros = int(seconds * 1e6)
+        self.buckets[min(micros.bit_length() - 1, self.BUCKETS - 1) if micros > 1 else 0] += 1
+        self.count += 1
+        self.total += seconds
+
+    def percentile_ms(self, fraction):
+        # Upper bound of the bucket holding the percentile:
+        rank, seen = fraction * self.count, 0
+        for bucket, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return (2 ** (bucket + 1)) / 1000.0
+        return None
+
+    def as_dict(self):
+        last = max([bucket for bucket, count in enumerate(self.buckets) if count] or [-1])
+        return {'count': self.count, 'mean_ms': self.total * 1000.0 / self.count if self.count else None,
+                'p50_ms': self.percentile_ms(0.5), 'p90_ms': self.percentile_ms(0.9),
+                'p99_ms': self.percentile_ms(0.99),
+                'buckets_us': dict(('<%d' % 2 ** (bucket + 1), self.buckets[bucket]) for bucket in range(last + 1))}
+
+
+TO_CONTROLLER = 0
+TO_SWITCH = 1
+_DIRECTIONS = ('to_controller', 'to_switch')
+
+
+class Counters(object):
+    # Messages per type and bytes of both directions, of one DPID (or of not yet identified channels).
+
+    def __init__(self):
+        self.messages = ([0] * 256, [0] * 256)
+        self.bytes = [0, 0]
+        self.version = None
+
+    def merge(self, other):
+        for direction in (TO_CONTROLLER, TO_SWITCH):
+            messages = self.messages[direction]
+            for msg_type, count in enumerate(other.messages[direction]):
+                messages[msg_type] += count
+            self.bytes[direction] += other.bytes[direction]
+        self.version = self.version or other.version
+
+    def total(self):
+        return sum(self.messages[TO_CONTROLLER]) + sum(self.messages[TO_SWITCH])
+
+    def as_dict(self):
+        result = {}
+        for direction, direction_name in enumerate(_DIRECTIONS):
+            result[direction_name] = {'bytes': self.bytes[direction], 'messages': dict(
+                (type_name(self.version, msg_type), count)
+                for msg_type, count in enumerate(self.messages[direction]) if count)}
+        return result
+
+
+class ProxyStats(object):
+    # Shared by all channels of all proxied controllers ('upstreams'), exported as JSON.
+
+    # PACKET_INs waiting longer than this are no longer matched by arrival order (see Channel):
+    MATCH_WINDOW = 1.0
+    MAX_PENDING = 4096
+
+    def __init__(self):
+        self.started = time.time()
+        self.counters = {}          # (upstream, dpid) -> Counters
+        self.latency = {}           # (upstream, reply type) -> LatencyHistogram
+        self.matches = {}           # (upstream, match kind) -> count
+        self.connections = {}       # upstream -> [active, total, failed]
+        self._last_export = (self.started, 0)
+
+    def dpid_counters(self, upstream, dpid):
+        key = (upstream, dpid)
+        if key not in self.counters:
+            self.counters[key] = Counters()
+        return self.counters[key]
+
+    def histogram(self, upstream, reply_type):
+        key = (upstream, reply_type)
+        if key not in self.latency:
+            self.latency[key] = LatencyHistogram()
+        return self.latency[key]
+
+    def count_match(self, upstream, kind):
+        self.matches[(upstream, kind)] = self.matches.get((upstream, kind), 0) + 1
+
+    def connection(self, upstream, event):
+        states = self.connections.setdefault(upstream, [0, 0, 0])
+        if event == 'open':
+            states[0] += 1
+            states[1] += 1
+        elif event == 'close':
+            states[0] -= 1
+        else:
+            states[2] += 1
+
+    def as_dict(self, live_channels=()):
+        # live_channels still count into channel local Counters until their DPID is known:
+        now = time.time()
+        merged = {}
+        for (upstream, dpid), counters in list(self.counters.items()):
+            merged.setdefault((upstream, dpid), Counters()).merge(counters)
+        for channel in live_channels:
+            if channel.dpid is None:
+                merged.setdefault((channel.upstream, None), Counters()).merge(channel.counters)
+        total = sum(counters.total() for counters in merged.values())
+        since, total_before = self._last_export
+        self._last_export = (now, total)
+
+        upstreams = {}
+        for upstream, states in self.connections.items():
+            upstreams[upstream] = {'connections': {'active': states[0], 'total': states[1], 'failed': states[2]},
+                                   'dpids': {}, 'latency': {}, 'matched_by': {}}
+        for (upstream, dpid), counters in merged.items():
+            if not counters.total():
+                continue
+            dpid_name = '%016x' % dpid if dpid is not None else 'unknown'
+            upstreams.setdefault(upstream, {'dpids': {}})['dpids'][dpid_name] = counters.as_dict()
+        for (upstream, reply_type), histogram in self.latency.items():
+            upstreams[upstream]['latency']['PACKET_IN->'+ reply_type] = histogram.as_dict()
+        for (upstream, kind), count in self.matches.items():
+            upstreams[upstream]['matched_by'][kind] = count
+        return {'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'uptime_s': now - self.started,
+                'messages': total, 'messages_per_s': total / (now - self.started) if now > self.started else None,
+                'recent_messages_per_s': (total - total_before) / (now - since) if now > since else None,
+                'upstreams': upstreams}
+
+    def write(self, path, live_channels=()):
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'w') as stats_file:
+            json.dump(self.as_dict(live_channels), stats_file, indent=1, sort_keys=True)
+        os.rename(tmp_path, path)
+
+
+
+## PROXY ##
+###########
+
+class Channel(object):
+    # State of one switch connection: its DPID (from the FEATURES_REPLY), its counters and the
+    # PACKET_INs waiting for an answer. Answers are matched to PACKET_INs by buffer_id, by xid,
+    # or - as OVS sends unbuffered PACKET_INs and controllers rarely echo their xid - by arrival
+    # order within ProxyStats.MATCH_WINDOW. The last kind is a heuristic (a controller may send
+    # unrelated FLOW_MODs), so the number of matches of each kind is exported as well.
+
+    def __init__(self, stats, upstream):
+        self.stats = stats
+        self.upstream = upstream
+        self.dpid = None
+        self.counters = Counters()
+        self.buffered = {}                  # buffer_id -> PACKET_IN time
+        self.unbuffered = OrderedDict()     # xid -> PACKET_IN time, oldest first
+
+    def _set_dpid(self, dpid):
+        counters = self.stats.dpid_counters(self.upstream, dpid)
+        counters.merge(self.counters)
+        self.dpid, self.counters = dpid, counters
+
+    def close(self):
+        if self.dpid is None:
+            self.stats.dpid_counters(self.upstream, None).merge(self.counters)
+            self.counters = Counters()
+
+    def from_switch(self, view, pos, version, msg_type, length, xid):
+        counters = self.counters
+        counters.messages[TO_CONTROLLER][msg_type] += 1
+        counters.bytes[TO_CONTROLLER] += length
+        if counters.version is None:
+            counters.version = version
+        if msg_type == OFPT_PACKET_IN:
+            buffer_id = _U32.unpack_from(view, pos + 8)[0] if length >= 12 else NO_BUFFER
+            if buffer_id != NO_BUFFER:
+                if len(self.buffered) >= ProxyStats.MAX_PENDING:
+                    self.buffered.clear()
+                self.buffered[buffer_id] = time.perf_counter()
+            else:
+                if len(self.unbuffered) >= ProxyStats.MAX_PENDING:
+                    self.unbuffered.popitem(last=False)
+                self.unbuffered[xid] = time.perf_counter()
+        elif msg_type == OFPT_FEATURES_REPLY and length >= 16 and self.dpid is None:
+            self._set_dpid(_U64.unpack_from(view, pos + 8)[0])
+
+    def from_controller(self, view, pos, version, msg_type, length, xid):
+        counters = self.counters
+        counters.messages[TO_SWITCH][msg_type] += 1
+        counters.bytes[TO_SWITCH] += length
+        if msg_type == OFPT_FLOW_MOD:
+            offset = 64 if version == OFP_VERSION_1_0 else 32
+        elif msg_type == OFPT_PACKET_OUT:
+            offset = 8
+        else:
+            return
+        now = time.perf_counter()
+        buffer_id = _U32.unpack_from(view, pos + offset)[0] if length >= offset + 4 else NO_BUFFER
+        started, kind = None, None
+        if buffer_id != NO_BUFFER:
+            started, kind = self.buffered.pop(buffer_id, None), 'buffer_id'
+        elif xid in self.unbuffered:
+            started, kind = self.unbuffered.pop(xid), 'xid'
+        else:
+            unbuffered = self.unbuffered
+            while unbuffered:
+                _, oldest = unbuffered.popitem(last=False)
+                if now - oldest <= ProxyStats.MATCH_WINDOW:
+                    started, kind = oldest, 'order'
+                    break
+        if started is not None:
+            self.stats.histogram(self.upstream, type_name(version, msg_type)).add(now - started)
+            self.stats.count_match(self.upstream, kind)
+
+
+class _ChannelEnd(asyncio.BufferedProtocol):
+    # One side of a proxied connection: received bytes are forwarded to the peer as they are and
+    # parsed in the same buffer afterwards. A buffer is only reused while the peer's transport holds
+    # no part of it (an empty write buffer), so neither forwarding nor parsing copies the data.
+
+    BUFFER_SIZE = 256 * 1024
+
+    def __init__(self, handler):
+        self.stream = OpenFlowStream(handler)
+        self.transport = None
+        self.peer = None
+        self._buffer = bytearray(self.BUFFER_SIZE)
+
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.get_extra_info('socket').setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def get_buffer(self, sizehint):
+        if self.peer is not None and self.peer.transport.get_write_buffer_size():
+            self._buffer = bytearray(self.BUFFER_SIZE)
+        return memoryview(self._buffer)
+
+    def buffer_updated(self, nbytes):
+        view = memoryview(self._buffer)[:nbytes]
+        self.peer.transport.write(view)
+        self.stream.feed(view)
+
+    # Flow control: a full write buffer towards the peer pauses reading from the peer's peer.
+    def pause_writing(self):
+        self.peer.transport.pause_reading()
+
+    def resume_writing(self):
+        self.peer.transport.resume_reading()
+
+    def connection_lost(self, exc):
+        if self.peer is not None and self.peer.transport is not None:
+            self.peer.transport.close()
+
+
+class _SwitchEnd(_ChannelEnd):
+    # Accepted switch connection, opens the connection to the controller before reading anything.
+
+    def __init__(self, proxy):
+        self.proxy = proxy
+        self.channel = Channel(proxy.stats, proxy.upstream)
+        super(_SwitchEnd, self).__init__(self.channel.from_switch)
+
+    def connection_made(self, transport):
+        super(_SwitchEnd, self).connection_made(transport)
+        transport.pause_reading()
+        self.proxy.channels.add(self.channel)
+        asyncio.ensure_future(self._connect())
+
+    async def _connect(self):
+        controller_end = _ChannelEnd(self.channel.from_controller)
+        try:
+            await asyncio.get_running_loop().create_connection(lambda: controller_end, *self.proxy.upstream_addr)
+        except OSError as e:
+            print("Controller %s unreachable: %s" % (self.proxy.upstream, e))
+            self.proxy.stats.connection(self.proxy.upstream, 'failed')
+            self.transport.close()
+            return
+        controller_end.peer, self.peer = self, controller_end
+        self.proxy.stats.connection(self.proxy.upstream, 'open')
+        self.transport.resume_reading()
+
+    def connection_lost(self, exc):
+        super(_SwitchEnd, self).connection_lost(exc)
+        self.proxy.channels.discard(self.channel)
+        self.channel.close()
+        if self.peer is not None:
+            self.proxy.stats.connection(self.proxy.upstream, 'close')
+
+
+class OpenFlowProxy(object):
+    # Listens on listen_addr (host, port) and proxies every switch connection to upstream_addr.
+
+    def __init__(self, listen_addr, upstream_addr, stats):
+        self.listen_addr = listen_addr
+        self.upstream_addr = upstream_addr
+        self.upstream = '%s:%d' % upstream_addr
+        self.stats = stats
+        self.channels = set()
+        self.server = None
+
+    async def start(self):
+        self.server = await asyncio.get_running_loop().create_server(lambda: _SwitchEnd(self), *self.listen_addr)
+        print("OpenFlow proxy %s:%d -> %s" % (self.listen_addr + (self.upstream,)))
+        return self
+
+
+
+## PROCESS LAUNCHER ##
+######################
+
+def _split_url(url):
+    # 'tcp:192.168.1.42:6633' -> ('192.168.1.42', 6633)
+    _, host, port = url.split(':')
+    return host, int(port)
+
+
+def launch_proxy(controllers, stats_path, listen_host='127.0.0.1', base_port=16633, interval=5.0, timeout=5.0):
+    # Starts of_proxy.py as a separate process in front of the controller urls ('tcp:ip:port')
+    # and waits for its first stats export, written once all ports listen.
+    # Returns (process, {controller url: proxied url}).
+    proxied, maps = {}, []
+    for port, url in enumerate(sorted(set(controllers)), base_port):
+        host, upstream_port = _split_url(url)
+        proxied[url] = 'tcp:%s:%d' % (listen_host, port)
+        maps.extend(['--map', '%d=%s:%d' % (port, host, upstream_port)])
+    if os.path.exists(stats_path):
+        os.remove(stats_path)
+    process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--listen', listen_host,
+                                '--stats', stats_path, '--interval', str(interval)] + maps)
+    deadline = time.time() + timeout
+    while not os.path.exists(stats_path):
+        if process.poll() is not None or time.time() > deadline:
+            process.terminate()
+            raise RuntimeError("OpenFlow proxy did not start, controllers: "+ ', '.join(sorted(proxied)))
+        time.sleep(0.05)
+    return process, proxied
+
+
+
+## COMMAND LINE ##
+##################
+
+def _parse_map(value):
+    # 'LISTEN_PORT=HOST:PORT'
+    try:
+        listen_port, upstream = value.split('=')
+        host, port = upstream.rsplit(':', 1)
+        return int(listen_port), (host, int(port))
+    except ValueError:
+        raise argparse.ArgumentTypeError("expected LISTEN_PORT=HOST:PORT, got "+ value)
+
+
+async def _serve(args, stats):
+    proxies = [await OpenFlowProxy((args.listen, listen_port), upstream, stats).start()
+               for listen_port, upstream in args.map]
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    def live_channels():
+        return [channel for proxy in proxies for channel in proxy.channels]
+    if args.stats:
+        stats.write(args.stats)
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), args.interval)
+        except asyncio.TimeoutError:
+            pass
+        if args.stats:
+            stats.write(args.stats, live_channels())
+    for proxy in proxies:
+        proxy.server.close()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='of_proxy.py', description="Transparent, instrumented OpenFlow proxy.")
+    parser.add_argument('--map', type=_parse_map, action='append', required=True,
+                        help="LISTEN_PORT=CONTROLLER_HOST:PORT (repeatable)")
+    parser.add_argument('--listen', default='127.0.0.1', help="listen address of all mapped ports")
+    parser.add_argument('--stats', help="JSON file to export the statistics to")
+    parser.add_argument('--interval', type=float, default=5.0, help="seconds between two stats exports")
+    args = parser.parse_args(argv)
+
+    stats = ProxyStats()
+    asyncio.run(_serve(args, stats))
+    if not args.stats:
+        print(json.dumps(stats.as_dict(), indent=1, sort_keys=True))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,249 @@
+__author__ = 'Constantin'
+
+#Python system imports:
+import json
+import os
+import sys
+import time
+
+#Own Imports:
+from address_plan import format_dpid, format_mac
+
+
+
+## OVX PLAN COMPILATION ##
+##########################
+
+# Plan entries are created in this order (and removed in the reverse one):
+LEVELS = ('network', 'switch', 'port', 'link', 'host')
+
+
+def _port_key(dpid, port):
+    return 'port:%s:%d' % (dpid, port)
+
+
+def compile_plan(graph, controllers, subnet, algorithm='spf', backup_num=1):
+    # Derives the one-to-one OVX mapping of a topology graph (as the map1to1-*.ovxctl.sh
+    # scripts did by hand): a virtual switch per switch, a virtual port per used switch port,
+    # a virtual link per switch-to-switch link and a connected host per host.
+    # The plan maps stable keys (derived from dpids, ports and macs) to call parameters,
+    # so that two plans can be compared entry by entry.
+    plan = {'network': {'level': 'network', 'controllers': list(controllers), 'subnet': subnet}}
+    dpids = dict((idx, format_dpid(graph.dpid[idx])) for idx in graph.switches())
+
+    for idx, dpid in dpids.items():
+        plan['switch:' + dpid] = {'level': 'switch', 'dpid': dpid}
+
+    for l in range(graph.link_count):
+        src, src_port, dst, dst_port = graph.link(l)
+        src_switch, dst_switch = src in dpids, dst in dpids
+        if src_switch:
+            plan[_port_key(dpids[src], src_port)] = {'level': 'port', 'dpid': dpids[src], 'port': src_port}
+        if dst_switch:
+            plan[_port_key(dpids[dst], dst_port)] = {'level': 'port', 'dpid': dpids[dst], 'port': dst_port}
+
+        if src_switch and dst_switch:
+            # Links are keyed independent of their direction:
+            ends = sorted([(dpids[src], src_port), (dpids[dst], dst_port)])
+            plan['link:%s:%d-%s:%d' % (ends[0] + ends[1])] = {
+                'level': 'link', 'src': list(ends[0]), 'dst': list(ends[1]),
+                'algorithm': algorithm, 'backup_num': backup_num}
+        elif src_switch or dst_switch:
+            host, switch, port = (dst, src, src_port) if src_switch else (src, dst, dst_port)
+            mac = format_mac(graph.mac[host])
+            plan['host:' + mac] = {'level': 'host', 'mac': mac, 'dpid': dpids[switch], 'port': port}
+    return plan
+
+
+
+## PLAN DIFFING ##
+##################
+
+class PlanDiff(object):
+    # Entries to remove from and to add to the applied plan, both grouped per level.
+    # A changed entry (same key, other parameters) is removed and added again.
+
+    def __init__(self, old_plan, new_plan):
+        self.rebuild = bool(old_plan) and old_plan.get('network') != new_plan.get('network')
+        if self.rebuild:
+            old_plan = {}
+        self.removals = dict((level, []) for level in LEVELS)
+        self.additions = dict((level, []) for level in LEVELS)
+
+        for key, entry in old_plan.items():
+            if new_plan.get(key) != entry:
+                self.removals[entry['level']].append(key)
+        for key, entry in new_plan.items():
+            if old_plan.get(key) != entry:
+                self.additions[entry['level']].append(key)
+        for keys in list(self.removals.values()) + list(self.additions.values()):
+            keys.sort()
+
+    def __len__(self):
+        return sum(len(keys) for keys in self.removals.values()) + \
+               sum(len(keys) for keys in self.additions.values())
+
+    def summary(self):
+        parts = ['%s: -%d/+%d' % (level, len(self.removals[level]), len(self.additions[level]))
+                 for level in LEVELS if self.removals[level] or self.additions[level]]
+        return ('rebuild, ' if self.rebuild else '') + (', '.join(parts) or 'no changes')
+
+
+def diff_plans(old_plan, new_plan):
+    return PlanDiff(old_plan, new_plan)
+
+
+
+## PLAN STATE ##
+################
+
+class PlanState(object):
+    # The applied plan together with the virtual ids OVX handed out for it
+    # (tenant id, vdpids, vports, link ids and host ids), persisted as JSON between runs.
+    # unstarted: keys of the switches and ports added to the booted network but not yet started.
+
+    def __init__(self, plan=None, tenant_id=None, ids=None, started=False, unstarted=()):
+        self.plan = plan or {}
+        self.tenant_id = tenant_id
+        self.ids = ids or {}
+        self.started = started
+        self.unstarted = set(unstarted)
+
+    def reset(self):
+        self.__init__()
+
+    @classmethod
+    def load(cls, state_path):
+        if not os.path.exists(state_path):
+            return cls()
+        with open(state_path) as state_file:
+            state = json.load(state_file)
+        return cls(state['plan'], state['tenant_id'], state['ids'], state['started'], state.get('unstarted', ()))
+
+    def save(self, state_path):
+        tmp_path = state_path + '.tmp'
+        with open(tmp_path, 'w') as state_file:
+            json.dump({'plan': self.plan, 'tenant_id': self.tenant_id, 'ids': self.ids,
+                       'started': self.started, 'unstarted': sorted(self.unstarted)}, state_file, sort_keys=True)
+        os.rename(tmp_path, state_path)
+
+
+
+## PLAN APPLICATION ##
+######################
+
+def _ovx_client_module():
+    # The OVX client lives next to ovxctl.py in OpenVirteX-Control/src:
+    ovx_src = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'OpenVirteX-Control', 'src')
+    if ovx_src not in sys.path:
+        sys.path.append(ovx_src)
+    import ovx_client
+    return ovx_client
+
+
+def connect_client(**client_args):
+    return _ovx_client_module().OVXClient(**client_args)
+
+
+def apply_plan(client, new_plan, state=None, timings=None, save=None):
+    # Brings OVX from state.plan to new_plan with the minimal set of calls.
+    # Removals run level by level in reverse creation order, additions in creation order,
+    # all calls of a level concurrently (ports in order per switch). Returns the new state.
+    # The state is updated call by call and passed to save (if given) after every phase, also
+    # a failed one, so that it always holds what OVX holds and a failed apply is continued by
+    # the next one instead of creating its entries twice.
+    state = state if state is not None else PlanState()
+    timings = timings if timings is not None else []
+    diff = diff_plans(state.plan, new_plan)
+
+    def timed(phase, tasks):
+        if tasks:
+            start = time.time()
+            try:
+                client.run_batch(tasks)
+            finally:
+                if save is not None:
+                    save(state)
+            timings.append((phase, time.time() - start))
+
+    if diff.rebuild:
+        def remove_network():
+            client.remove_network(state.tenant_id)
+            state.reset()
+        if state.tenant_id is not None:
+            timed('remove-network', [remove_network])
+        state.reset()
+
+    if state.tenant_id is None:
+        def create_network():
+            network = new_plan['network']
+            net_address, mask = network['subnet'].split('/')
+            state.tenant_id = client.create_network(network['controllers'], net_address, mask)
+            state.plan['network'] = network
+        timed('network', [create_network])
+    tenant_id, plan, ids, unstarted = state.tenant_id, state.plan, state.ids, state.unstarted
+
+    # Removals (hosts and links first, as they reference ports):
+    removers = {'host': lambda key: client.disconnect_host(tenant_id, ids[key]),
+                'link': lambda key: client.disconnect_link(tenant_id, ids[key]),
+                'port': lambda key: client.remove_port(tenant_id, *ids[key]),
+                'switch': lambda key: client.remove_switch(tenant_id, ids[key])}
+
+    def remove(key):
+        removers[plan[key]['level']](key)
+        del plan[key], ids[key]
+        unstarted.discard(key)
+    for level, phase in (('host', 'remove-hosts'), ('link', 'remove-links'),
+                         ('port', 'remove-ports'), ('switch', 'remove-switches')):
+        timed(phase, [(lambda key=key: remove(key)) for key in diff.removals[level]])
+
+    # Additions:
+    def added(key, virtual_id):
+        ids[key], plan[key] = virtual_id, new_plan[key]
+        if state.started and new_plan[key]['level'] in ('switch', 'port'):
+            unstarted.add(key)
+
+    def add_switch(key):
+        added(key, client.create_switch(tenant_id, [new_plan[key]['dpid']]))
+    timed('switches', [(lambda key=key: add_switch(key)) for key in diff.additions['switch']])
+
+    ports_per_switch = {}
+    for key in diff.additions['port']:
+        ports_per_switch.setdefault(new_plan[key]['dpid'], []).append(key)
+
+    def add_ports(keys):
+        for key in sorted(keys, key=lambda k: new_plan[k]['port']):
+            added(key, list(client.create_port(tenant_id, new_plan[key]['dpid'], new_plan[key]['port'])))
+    timed('ports', [(lambda keys=keys: add_ports(keys)) for keys in ports_per_switch.values()])
+
+    def add_link(key):
+        entry = new_plan[key]
+        src_vdpid, src_vport = ids[_port_key(*entry['src'])]
+        dst_vdpid, dst_vport = ids[_port_key(*entry['dst'])]
+        added(key, client.connect_link(tenant_id, src_vdpid, src_vport, dst_vdpid, dst_vport,
+                                       entry['algorithm'], entry['backup_num']))
+
+    def add_host(key):
+        entry = new_plan[key]
+        vdpid, vport = ids[_port_key(entry['dpid'], entry['port'])]
+        added(key, client.connect_host(tenant_id, vdpid, vport, entry['mac']))
+    timed('links+hosts', [(lambda key=key: add_link(key)) for key in diff.additions['link']] +
+                         [(lambda key=key: add_host(key)) for key in diff.additions['host']])
+
+    # A booted network only needs its new switches and ports started (also the ones a failed
+    # apply left unstarted):
+    if not state.started:
+        def start_network():
+            client.start_network(tenant_id)
+            state.started = True
+        timed('start', [start_network])
+    else:
+        def start(key):
+            if plan[key]['level'] == 'switch':
+                client.start_switch(tenant_id, ids[key])
+            else:
+                client.start_port(tenant_id, *ids[key])
+            unstarted.discard(key)
+        for level, phase in (('switch', 'start-switches'), ('port', 'start-ports')):
+            timed(phase, [(lambda key=key: start(key)) for key in sorted(unstarted) if plan[key]['level'] == level])
+    return state
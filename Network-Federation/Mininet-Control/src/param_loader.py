@@ -4,20 +4,29 @@ __author__ = 'costa'
 import getopt
 import sys
 
+#Own Imports:
+from address_plan import AddressError, Subnet, parse_ip
+from controller_pool import ControllerPool, parse_endpoint
+
 
 
 ## CALL ARGUMENT SETUP ##
 #########################
 
-def defineArgs(argv):
-    ofc_ip   = 'localhost'
+def _parseArgs(argv, net_ip):
+    # Returns the controller endpoints ('ip' or 'ip:port', -i is repeatable), the default
+    # OFC port, the controller pool policy and replicas and the (optional) net_ip.
+    ofc_ips  = []
     ofc_port = 6633
+    policy   = 'hash'
+    replicas = 2
 
     try:
-        opts, args = getopt.getopt(argv,"hi:p:",["help",
-                                                 "ofc_ip=", "ofc_port="])
+        opts, args = getopt.getopt(argv,"hi:p:n:",["help",
+                                                   "ofc_ip=", "ofc_port=", "net_ip=",
+                                                   "ofc_policy=", "ofc_replicas="])
     except getopt.GetoptError as e:
-        print ("Parsing Error of command parameters: %s", e)
+        print ("Parsing Error of command parameters: %s" % e)
         sys.exit(2)
     for opt, arg in opts:
         if opt in ('-h', "--help"):
@@ -25,10 +34,44 @@ def defineArgs(argv):
             #_printHelp()
             sys.exit(0)
         elif opt in ('-i', "--ofc_ip"):
-            ofc_ip = str(arg).replace('\'','').replace('\"','')
+            ofc_ips.append(str(arg).replace('\'','').replace('\"',''))
 
         elif opt in ('-p', "--ofc_port"):
             ofc_port = str(arg).replace('\'','').replace('\"','')
 
-    return ofc_ip, ofc_port
+        elif opt in ('-n', "--net_ip"):
+            net_ip = str(arg).replace('\'','').replace('\"','')
+
+        elif opt == "--ofc_policy":
+            policy = str(arg)
+
+        elif opt == "--ofc_replicas":
+            replicas = arg
+
+    try:
+        # Dotted OFC addresses and the (optional) net_ip are checked via the address plan,
+        # hostnames like 'localhost' are passed through:
+        for ofc_ip in ofc_ips:
+            host = ofc_ip.split(':')[0]
+            if host.replace('.', '').isdigit():
+                parse_ip(host)
+        if net_ip is not None:
+            net_ip = Subnet.parse(net_ip).cidr
+        ofc_port = int(ofc_port)
+        replicas = int(replicas)
+    except (AddressError, ValueError) as e:
+        print ("Invalid command parameter: %s" % e)
+        sys.exit(2)
+
+    return ofc_ips or ['localhost'], ofc_port, policy, replicas, net_ip
+
 
+def defineControllerArgs(argv, net_ip=None):
+    # All OFCs given (-i ip[:port], repeatable) as a ControllerPool the switches are spread over.
+    ofc_ips, ofc_port, policy, replicas, net_ip = _parseArgs(argv, net_ip)
+    try:
+        pool = ControllerPool([parse_endpoint(ofc_ip, ofc_port) for ofc_ip in ofc_ips], policy, replicas)
+    except ValueError as e:
+        print ("Invalid command parameter: %s" % e)
+        sys.exit(2)
+    return pool, net_ip
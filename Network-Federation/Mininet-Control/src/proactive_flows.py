@@ -0,0 +1,191 @@
+__author__ = 'Constantin'
+
+# Proactive forwarding: all host-to-host paths are computed from the topology graph and
+# pushed as flow batch files (one 'ovs-ofctl add-flows' run per switch, all switches in
+# parallel), so that no packet has to wait for a PACKET_IN round trip through OVX/Floodlight.
+# Per switch and destination host, flows match the host's MAC:
+# - unicast:   dl_dst=<host mac> -> next hop on the shortest path (BFS) towards the host,
+# - broadcast/multicast:          -> all ports of one spanning tree of the switches (plus host
+#                                    and GRE ports), so that ARP works without loops,
+# - unknown destinations:         -> towards the nearest GW and out of its GRE port,
+# - LLDP from GRE ports:          -> dropped (as the commented rule of the cloud scripts did).
+# Compiling only needs the graph; installing needs ovs-ofctl (and is done by TopologyRunner).
+
+#Python system imports:
+import os
+import tempfile
+import time
+from collections import deque
+
+#Own Imports:
+from topology import gre_port_numbers
+
+
+
+## FLOW COMPILATION ##
+######################
+
+# All proactive flows carry this cookie, so that they can be told apart (and deleted) later:
+FLOW_COOKIE = 0xfed1
+PRIO_LLDP_DROP = 300
+PRIO_UNICAST = 200
+PRIO_FLOOD = 100
+PRIO_DEFAULT = 10
+
+# Proactive modes of the topology runner:
+#   'assist' - install flows, keep the controllers for everything they do not match,
+#   'only'   - install flows, detach all controllers and run the switches fail-secure.
+MODES = ('assist', 'only')
+
+
+def _switch_adjacency(graph, tunnels):
+    # switch index -> list of (neighbour switch index, local port), including tunnel edges.
+    kinds_switch = graph.is_switch
+    adj = dict((idx, []) for idx in graph.switches())
+    for idx, neighbours in enumerate(graph.adjacency()):
+        if kinds_switch(idx):
+            adj[idx].extend((neighbour, port) for neighbour, port, _, _ in neighbours if kinds_switch(neighbour))
+    for (a, a_port), (b, b_port) in tunnels:
+        adj[a].append((b, a_port))
+        adj[b].append((a, b_port))
+    return adj
+
+
+def _bfs_next_hops(adj, sources):
+    # Multi-source BFS: switch -> port towards the nearest source (sources map to None).
+    next_hop = dict((source, None) for source in sources)
+    queue = deque(sources)
+    while queue:
+        switch = queue.popleft()
+        for neighbour, _ in adj[switch]:
+            if neighbour not in next_hop:
+                # The neighbour reaches the sources via its port back to switch:
+                next_hop[neighbour] = next(port for peer, port in adj[neighbour] if peer == switch)
+                queue.append(neighbour)
+    return next_hop
+
+
+def _spanning_tree_ports(adj, root, tree_ports):
+    # Adds the ports of a BFS spanning tree of root's component to tree_ports (switch -> set
+    # of ports), returns the switches of the component.
+    seen = set([root])
+    queue = deque([root])
+    while queue:
+        switch = queue.popleft()
+        for neighbour, port in adj[switch]:
+            if neighbour not in seen:
+                seen.add(neighbour)
+                tree_ports[switch].add(port)
+                tree_ports[neighbour].add(next(p for peer, p in adj[neighbour] if peer == switch))
+                queue.append(neighbour)
+    return seen
+
+
+def compile_flows(graph, gateways=(), tunnels=()):
+    # Returns {switch name: [flow, ...]} in 'ovs-ofctl add-flows' syntax.
+    # gateways are gateway definitions (their GRE ports lead out of the graph unless they
+    # are one end of a tunnel), tunnels are ((switch idx, port), (switch idx, port)) edges
+    # between GRE ports within the graph (e.g. the GWs of a federation on one box).
+    names = graph.names
+    adj = _switch_adjacency(graph, tunnels)
+    flows = dict((switch, []) for switch in adj)
+    cookie = 'cookie=%#x,' % FLOW_COOKIE
+
+    # Hosts grouped by the switch (and port) they are attached to:
+    attached = {}
+    for host in graph.hosts():
+        switch, port = graph.host_attachment(host)
+        if switch is not None:
+            attached.setdefault(switch, []).append((host, port))
+
+    # Unicast, one BFS per switch with attached hosts:
+    for dst_switch, hosts in attached.items():
+        next_hops = _bfs_next_hops(adj, [dst_switch])
+        for host, host_port in hosts:
+            mac = graph.mac_str(host)
+            flows[dst_switch].append('%spriority=%d,dl_dst=%s,actions=output:%d'
+                                     % (cookie, PRIO_UNICAST, mac, host_port))
+            for switch, port in next_hops.items():
+                if port is not None:
+                    flows[switch].append('%spriority=%d,dl_dst=%s,actions=output:%d'
+                                         % (cookie, PRIO_UNICAST, mac, port))
+
+    # External (GRE) ports of the gateways, the ones of tunnels within the graph excluded:
+    tunnel_ends = set(end for tunnel in tunnels for end in tunnel)
+    external = {}
+    for gateway in gateways:
+        gw = graph.index[gateway['switch']]
+        for port in sorted(gre_port_numbers(gateway, graph).values()):
+            if (gw, port) not in tunnel_ends:
+                external.setdefault(gw, []).append(port)
+                flows[gw].append('%spriority=%d,in_port=%d,dl_type=0x88cc,actions=drop'
+                                 % (cookie, PRIO_LLDP_DROP, port))
+
+    # Broadcast and multicast along one spanning tree (per connected component):
+    tree_ports = dict((switch, set()) for switch in adj)
+    covered = set()
+    for root in sorted(adj):
+        if root not in covered:
+            covered.update(_spanning_tree_ports(adj, root, tree_ports))
+    for switch in adj:
+        ports = tree_ports[switch] | set(port for _, port in attached.get(switch, ())) | set(external.get(switch, ()))
+        if ports:
+            flows[switch].append('%spriority=%d,dl_dst=01:00:00:00:00:00/01:00:00:00:00:00,actions=%s'
+                                 % (cookie, PRIO_FLOOD, ','.join('output:%d' % port for port in sorted(ports))))
+
+    # Unknown unicast destinations (e.g. hosts of a remote cloud) leave via the nearest GW:
+    if external:
+        for switch, port in _bfs_next_hops(adj, sorted(external)).items():
+            port = external[switch][0] if port is None else port
+            flows[switch].append('%spriority=%d,actions=output:%d' % (cookie, PRIO_DEFAULT, port))
+
+    return dict((names[switch], switch_flows) for switch, switch_flows in flows.items())
+
+
+
+## FLOW INSTALLATION ##
+#######################
+
+def write_flow_files(flows, directory):
+    # One <switch>.flows batch file per switch, returns {switch name: path}.
+    paths = {}
+    for switch, switch_flows in flows.items():
+        paths[switch] = os.path.join(directory, switch + '.flows')
+        with open(paths[switch], 'w') as flow_file:
+            flow_file.write('\n'.join(switch_flows) + '\n')
+    return paths
+
+
+def detach_controllers(batch, switches):
+    # Queues switching off reactive forwarding: no controllers, no standalone fallback.
+    for switch in switches:
+        batch.add('del-controller', switch)
+        batch.add('set-fail-mode', switch, 'secure')
+    return batch
+
+
+def install_flows(flows, workers=None, replace=()):
+    # Pushes every switch's batch file with one 'ovs-ofctl add-flows' run, all switches in
+    # parallel. The proactive flows of the switches in replace (installed before) are deleted
+    # first, flows of the controllers are kept. Returns {switch name: install seconds}.
+    from bringup import DEFAULT_WORKERS, _run_cmd, run_parallel
+    replace = set(replace)
+    with tempfile.TemporaryDirectory(prefix='mn-flows-') as directory:
+        paths = write_flow_files(flows, directory)
+
+        def install(switch):
+            start = time.time()
+            if switch in replace:
+                _run_cmd(['ovs-ofctl', 'del-flows', switch, 'cookie=0x%x/-1' % FLOW_COOKIE])
+            _run_cmd(['ovs-ofctl', 'add-flows', switch, paths[switch]])
+            return time.time() - start
+        switches = sorted(paths)
+        durations = run_parallel(install, switches, workers or DEFAULT_WORKERS)
+    return dict(zip(switches, durations))
+
+
+def report_install_times(flows, durations, top=10):
+    slowest = sorted(durations.items(), key=lambda item: -item[1])[:top]
+    lines = ["%-16s %7d flows %8.3fs" % (switch, len(flows[switch]), seconds) for switch, seconds in slowest]
+    print("\n*** Proactive flows: %d flows on %d switches, slowest switches:\n%s\n"
+          % (sum(len(switch_flows) for switch_flows in flows.values()), len(flows), '\n'.join(lines)))
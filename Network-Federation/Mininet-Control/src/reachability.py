@@ -0,0 +1,666 @@
+__author__ = 'Constantin'
+
+# Reachability of all host pairs, verified on the switches' flow tables instead of a pingall:
+#   python topoctl.py verify fattree:16                          (the compiled proactive flows)
+#   python topoctl.py verify cloud1.ovx --flows-dir flows/       (saved <switch>.flows tables)
+#   sudo python topoctl.py verify cloud1.ovx --dump              (the tables of the running switches)
+#   sudo python topoctl.py run fattree:8 --proactive only --verify 8
+# The probe packet of a host pair is an IPv4 ICMP echo request from the source host, only its
+# addresses (and the port it enters a switch on) differ between pairs. Every table 0 rule that
+# could match a probe at all is indexed by its dl_dst, and per switch and destination host, the
+# rules a probe towards it may hit form a short chain (highest priority first, up to the first
+# one without conditions on the source side, in_port, dl_src or nw_src).
+# As in header space analysis, equivalent headers are handled at once: destinations whose chains
+# behave alike on every switch (e.g. all hosts of one edge switch under proactive flows) form a
+# class, sources a class per destination class if any of its rules look at them. Per pair of
+# classes, the forwarding graph of (switch, in_port) states (switches only, where the chain does
+# not depend on the in_port) is evaluated once, with Tarjan's SCCs: its terminals (delivered,
+# table miss, drop, controller, ...) and loops. Pairs then just look up the state they enter.
+# A handful of sampled pings in the running network confirm the verdicts (confirm_pings).
+
+#Python system imports:
+import gc
+import os
+import random
+import time
+from contextlib import contextmanager
+
+#Own Imports:
+from address_plan import parse_ip
+from topology import SWITCH, gre_port_numbers
+
+
+
+## FLOW TABLE PARSING ##
+########################
+
+# Protocol shorthands of ovs-ofctl matches:
+_PROTOCOLS = {
+    'ip': (('dl_type', 0x0800),), 'icmp': (('dl_type', 0x0800), ('nw_proto', 1)),
+    'tcp': (('dl_type', 0x0800), ('nw_proto', 6)), 'udp': (('dl_type', 0x0800), ('nw_proto', 17)),
+    'sctp': (('dl_type', 0x0800), ('nw_proto', 132)), 'arp': (('dl_type', 0x0806),),
+    'rarp': (('dl_type', 0x8035),), 'ipv6': (('dl_type', 0x86dd),), 'icmp6': (('dl_type', 0x86dd), ('nw_proto', 58)),
+    'tcp6': (('dl_type', 0x86dd), ('nw_proto', 6)), 'udp6': (('dl_type', 0x86dd), ('nw_proto', 17)),
+}
+_ALIASES = {'eth_src': 'dl_src', 'eth_dst': 'dl_dst', 'eth_type': 'dl_type', 'ip_src': 'nw_src', 'ip_dst': 'nw_dst',
+            'ipv4_src': 'nw_src', 'ipv4_dst': 'nw_dst', 'ip_proto': 'nw_proto', 'icmp_type': 'tp_src',
+            'icmp_code': 'tp_dst'}
+# Flow fields and flags that are not part of the match:
+_NON_MATCH_FIELDS = ('cookie', 'duration', 'n_packets', 'n_bytes', 'idle_age', 'hard_age', 'idle_timeout',
+                     'hard_timeout', 'reset_counts', 'send_flow_rem', 'check_overlap', 'importance',
+                     'no_packet_counts', 'no_byte_counts', 'out_port', 'out_group')
+MAC_FIELDS = ('dl_src', 'dl_dst')
+MULTICAST_BIT = 0x010000000000
+IP_FIELDS = ('nw_src', 'nw_dst')
+SOURCE_FIELDS = ('in_port', 'dl_src', 'nw_src')
+# The probe's fields besides its addresses, an untagged ICMP echo request:
+PROBE_HEADER = {'dl_type': 0x0800, 'nw_proto': 1, 'tp_src': 8, 'tp_dst': 0, 'dl_vlan': 0xffff, 'vlan_tci': 0,
+                'nw_tos': 0, 'ip_dscp': 0, 'nw_ecn': 0, 'nw_ttl': 64, 'metadata': 0, 'tun_id': 0}
+# Actions leaving the probe's addresses (and so its forwarding) as they are:
+_NEUTRAL_ACTIONS = ('dec_ttl', 'mod_nw_tos', 'mod_nw_ecn', 'set_queue', 'pop_queue', 'note', 'strip_vlan', 'pop_vlan')
+# Outputs ending the verification of a path, besides ports:
+SPECIAL_OUTPUTS = ('CONTROLLER', 'NORMAL', 'LOCAL', 'UNVERIFIED')
+
+
+def _parse_mac(text):
+    return int(text.replace(':', ''), 16)
+
+
+def _parse_field(field, text):
+    # -> (value, mask or None); in_port stays a port number or (interface) name.
+    if field == 'in_port':
+        text = text.strip('"')
+        return int(text) if text.isdigit() else text, None
+    value, _, mask = text.partition('/')
+    if field in MAC_FIELDS:
+        return _parse_mac(value), _parse_mac(mask) if mask else None
+    if field in IP_FIELDS:
+        if not mask:
+            return parse_ip(value), None
+        mask = parse_ip(mask) if '.' in mask else (0xffffffff << (32 - int(mask))) & 0xffffffff
+        return parse_ip(value), mask
+    return int(value, 0), int(mask, 0) if mask else None
+
+
+def _parse_match(text, line):
+    # The match of a flow line, 'priority=200,dl_dst=...' -> (table or None, priority,
+    # ((field, value, mask), ...)), with ovs-ofctl's field names and protocol shorthands.
+    table, priority, match = None, 32768, []
+    for field in text.replace(', ', ',').replace(' ', ',').split(','):
+        name, _, value = field.partition('=')
+        if not name or name in _NON_MATCH_FIELDS:
+            continue
+        if name == 'table':
+            table = int(value)
+        elif name == 'priority':
+            priority = int(value)
+        elif not value and name in _PROTOCOLS:
+            match.extend((proto_field, proto_value, None) for proto_field, proto_value in _PROTOCOLS[name])
+        else:
+            name = _ALIASES.get(name, name)
+            try:
+                match.append((name,) + _parse_field(name, value))
+            except ValueError:
+                raise ValueError("Invalid flow match %s in: %s" % (field, line.strip()))
+    return table, priority, tuple(match)
+
+
+def _split_actions(actions):
+    # Top-level comma separated actions, e.g. 'resubmit(,1),output:2' -> ['resubmit(,1)', 'output:2']
+    parts, depth, start = [], 0, 0
+    for i, char in enumerate(actions):
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            parts.append(actions[start:i])
+            start = i + 1
+    parts.append(actions[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+
+def parse_outputs(actions):
+    # -> tuple of output port numbers or names, 'IN_PORT', 'FLOOD', 'ALL' and SPECIAL_OUTPUTS;
+    # empty for a drop. Actions rewriting headers (or jumping to other tables) are UNVERIFIED.
+    outputs = []
+    for action in _split_actions(actions):
+        name, _, arg = action.partition(':')
+        upper = action.upper()
+        if action.isdigit():
+            outputs.append(int(action))
+        elif name == 'output' and arg:
+            port = arg.strip('"')
+            outputs.append(int(port) if port.isdigit() else port)
+        elif name.startswith('enqueue'):
+            port = (arg or name.partition('(')[2]).replace(',', ':').split(':')[0].strip('"')
+            outputs.append(int(port) if port.isdigit() else port)
+        elif upper in ('IN_PORT', 'FLOOD', 'ALL', 'NORMAL', 'LOCAL'):
+            outputs.append(upper)
+        elif upper.startswith('CONTROLLER'):
+            outputs.append('CONTROLLER')
+        elif action == 'drop' or name.partition('(')[0] in _NEUTRAL_ACTIONS:
+            continue
+        else:
+            outputs.append('UNVERIFIED')
+    return tuple(outputs)
+
+
+
+## FLOW TABLE INDEX ##
+######################
+
+@contextmanager
+def _collector_paused():
+    # The index holds millions of small tuples without reference cycles, which the garbage
+    # collector would otherwise rescan over and over while it grows.
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _matches(value, rule_value, mask):
+    return value == rule_value if mask is None else value & mask == rule_value & mask
+
+
+def _port_map(graph, gateways):
+    # switch index -> {port: ('switch', switch index, port) | ('host', host index) | ('external', name)},
+    # and switch index -> {interface name: port}.
+    ports = dict((idx, {}) for idx in graph.switches())
+    names = dict((idx, {}) for idx in ports)
+    kinds = graph.kinds
+    for idx, neighbours in enumerate(graph.adjacency()):
+        if kinds[idx] != SWITCH:
+            continue
+        for neighbour, port, neighbour_port, _ in neighbours:
+            ports[idx][port] = ('switch', neighbour, neighbour_port) if kinds[neighbour] == SWITCH else ('host', neighbour)
+            names[idx]['%s-eth%d' % (graph.names[idx], port)] = port
+    for gateway in gateways:
+        gw = graph.index[gateway['switch']]
+        for port_name, port in gre_port_numbers(gateway, graph).items():
+            ports[gw][port] = ('external', port_name)
+            names[gw][port_name] = port
+    return ports, names
+
+
+def _named(outputs, conditions):
+    # Whether the outputs or the in_port condition of a rule name an interface:
+    return any(isinstance(output, str) and output not in SPECIAL_OUTPUTS and output not in ('IN_PORT', 'FLOOD', 'ALL')
+               for output in outputs) or any(not isinstance(value, int) for field, value, _ in conditions
+                                             if field == 'in_port')
+
+
+def _probe_rule(match):
+    # The match of a rule as (dl_dst, nw_dst, conditions) for probes: dl_dst and nw_dst are
+    # (value, mask) or None, conditions the rule's (field, value, mask) of SOURCE_FIELDS.
+    # False if no probe can match it, None if it matches fields a probe does not have.
+    dl_dst = nw_dst = None
+    conditions = []
+    for field, value, mask in match:
+        if field == 'dl_dst':
+            if mask is not None and value & mask & MULTICAST_BIT:
+                # Broadcast and multicast rules, probes are unicast:
+                return False
+            dl_dst = (value, mask)
+        elif field == 'nw_dst':
+            nw_dst = (value, mask)
+        elif field in SOURCE_FIELDS:
+            conditions.append((field, value, mask))
+        elif field not in PROBE_HEADER:
+            return None
+        elif not _matches(PROBE_HEADER[field], value, mask):
+            return False
+    return dl_dst, nw_dst, tuple(conditions)
+
+
+class SwitchTable(object):
+    # The table 0 rules of one switch that can match a probe at all, highest priority first, as
+    # (priority, dl_dst, nw_dst, conditions, outputs, actions), see _probe_rule and parse_outputs.
+    # caches: dicts of the parsed matches and actions, shared by all switches.
+
+    def __init__(self, lines, port_names, caches):
+        match_cache, output_cache = caches
+        self.by_mac = {}                # exact dl_dst -> rules
+        self.other = []                 # rules without an exact dl_dst
+        self.unsupported = 0            # rules matching fields a probe does not have
+        self.ip_rules = False           # rules matching nw_dst
+        rules = []
+        for line in lines:
+            # Lines of 'ovs-ofctl dump-flows' output or add-flows batch files, dump-flows puts its
+            # counters ', ' separated in front of the match. Matches repeat on many switches, every
+            # distinct one is parsed once.
+            head, found, actions = line.partition('actions=')
+            if not found:
+                continue
+            counters, _, text = head.rpartition(', ')
+            cached = match_cache.get(text)
+            if cached is None:
+                table, priority, match = _parse_match(text, line)
+                cached = match_cache[text] = (table, priority, _probe_rule(match))
+            table, priority, probe = cached
+            if table is None:
+                table = int(counters.split('table=')[1].split(',')[0]) if 'table=' in counters else 0
+            if table != 0 or not probe:
+                self.unsupported += table == 0 and probe is None
+                continue
+            actions = actions.strip()
+            cached = output_cache.get(actions)
+            if cached is None:
+                outputs = parse_outputs(actions)
+                cached = output_cache[actions] = (outputs, _named(outputs, ()))
+            outputs, named = cached
+            dl_dst, nw_dst, conditions = probe
+            if named or (conditions and _named((), conditions)):
+                # Interface names for port numbers:
+                outputs = tuple(port_names.get(output, output) for output in outputs)
+                conditions = tuple((field, port_names.get(value, value) if field == 'in_port' else value, mask)
+                                   for field, value, mask in conditions)
+            rules.append((priority, dl_dst, nw_dst, conditions, outputs, actions))
+            self.ip_rules = self.ip_rules or nw_dst is not None
+        rules.sort(key=lambda rule: -rule[0])
+        for rule in rules:
+            dl_dst = rule[1]
+            if dl_dst is not None and dl_dst[1] in (None, 0xffffffffffff):
+                self.by_mac.setdefault(dl_dst[0], []).append(rule)
+            else:
+                self.other.append(rule)
+        self.rule_count = len(rules)
+        # Without dst conditions in the other rules, their chain is the same for every destination:
+        self.shared_chain = None
+        if all(rule[1] is None and rule[2] is None for rule in self.other):
+            self.shared_chain = self._cut(self.other)
+
+    @staticmethod
+    def _cut(rules):
+        # The rules up to (and including) the first one without conditions:
+        if rules and not rules[0][3]:
+            return rules[:1]
+        for i, rule in enumerate(rules):
+            if not rule[3]:
+                return rules[:i + 1]
+        return rules
+
+    def merge(self, exact, other):
+        # The chain of exact dl_dst rules and the other rules matching a destination:
+        if not exact:
+            return self._cut(other)
+        if not other or (exact[0][0] > other[0][0] and not exact[0][3]):
+            return self._cut(exact)
+        return self._cut(sorted(exact + other, key=lambda rule: -rule[0]))
+
+    def chain(self, mac, ip):
+        # The rules a probe towards (mac, ip) may hit, in priority order.
+        exact = [rule for rule in self.by_mac.get(mac, ()) if rule[2] is None or _matches(ip, *rule[2])]
+        if self.shared_chain is not None:
+            other = self.shared_chain
+        else:
+            other = [rule for rule in self.other if (rule[1] is None or _matches(mac, *rule[1]))
+                     and (rule[2] is None or _matches(ip, *rule[2]))]
+        return self.merge(exact, other)
+
+
+class FlowTables(object):
+    # Indexed flow tables of all switches of a graph, from {switch name: flow lines}.
+
+    def __init__(self, graph, gateways, flows):
+        self.graph = graph
+        self.ports, port_names = _port_map(graph, gateways)
+        caches = ({}, {})
+        self.tables = {}
+        with _collector_paused():
+            for switch in graph.switches():
+                self.tables[switch] = SwitchTable(flows.get(graph.names[switch], ()), port_names[switch], caches)
+        self.rule_count = sum(table.rule_count for table in self.tables.values())
+        self.unsupported = sum(table.unsupported for table in self.tables.values())
+
+
+def compiled_flow_tables(graph, gateways=()):
+    # The proactive flows compile_flows would install, as {switch name: flow lines}:
+    from proactive_flows import compile_flows
+    return compile_flows(graph, gateways)
+
+
+def read_flow_tables(directory):
+    # <switch>.flows files (see proactive_flows.write_flow_files, or saved dump-flows output):
+    flows = {}
+    for file_name in sorted(os.listdir(directory)):
+        if file_name.endswith('.flows'):
+            with open(os.path.join(directory, file_name)) as flow_file:
+                flows[file_name[:-len('.flows')]] = flow_file.read().splitlines()
+    return flows
+
+
+def dump_flow_tables(switches, workers=None):
+    # 'ovs-ofctl dump-flows' of all switches, in parallel:
+    from bringup import DEFAULT_WORKERS, _run_cmd, run_parallel
+    switches = sorted(switches)
+    outputs = run_parallel(lambda switch: _run_cmd(['ovs-ofctl', 'dump-flows', switch]), switches,
+                           workers or DEFAULT_WORKERS)
+    return dict((switch, output.splitlines()) for switch, output in zip(switches, outputs))
+
+
+
+## VERIFICATION ##
+##################
+
+DELIVERED = 'delivered'
+LOOP = 'loop'
+# Verdicts of undelivered pairs, the first one found in this order names the pair's failure:
+FAILURES = (LOOP, 'table-miss', 'drop', 'dead-port', 'misdelivered', 'external', 'controller', 'normal',
+            'local', 'unverified')
+
+
+class ReachabilityReport(object):
+
+    def __init__(self, graph, tables):
+        self.graph = graph
+        self.rules = tables.rule_count
+        self.unsupported_rules = tables.unsupported
+        self.pairs = 0
+        self.verdicts = {}              # verdict -> host pairs
+        self.looping = 0                # pairs with copies in a loop (delivered or not)
+        self.blackholes = {}            # (switch, terminal) -> undelivered host pairs ending there
+        self.examples = {}              # verdict -> [(src, dst)], a few per verdict
+        self.classes = (0, 0)           # destination classes, (destination, source) class pairs
+        self.elapsed = 0.0
+
+    def add(self, verdict, terminals, count, example, examples=16):
+        # count pairs of one verdict and its terminals, example one of them (or None):
+        self.pairs += count
+        self.verdicts[verdict] = self.verdicts.get(verdict, 0) + count
+        if any(kind == LOOP for kind, _ in terminals):
+            self.looping += count
+        if verdict != DELIVERED:
+            for kind, switch in terminals:
+                key = (self.graph.names[switch], kind)
+                self.blackholes[key] = self.blackholes.get(key, 0) + count
+        pairs = self.examples.setdefault(verdict, [])
+        if example is not None and len(pairs) < examples:
+            pairs.append((self.graph.names[example[0]], self.graph.names[example[1]]))
+
+    @property
+    def unreachable(self):
+        return self.pairs - self.verdicts.get(DELIVERED, 0)
+
+    def summary(self):
+        return {'topology': self.graph.name, 'pairs': self.pairs, 'unreachable': self.unreachable,
+                'looping': self.looping, 'verdicts': self.verdicts, 'rules': self.rules,
+                'unsupported_rules': self.unsupported_rules, 'classes': list(self.classes),
+                'blackholes': [[switch, kind, count] for (switch, kind), count in sorted(self.blackholes.items())],
+                'examples': self.examples, 'elapsed_s': self.elapsed}
+
+    def lines(self, top=10):
+        lines = ["%s: %d of %d host pairs reachable, %d looping (%d rules, %d destination classes, "
+                 "%d class pairs, %.3fs)" % (self.graph.name, self.pairs - self.unreachable, self.pairs,
+                                             self.looping, self.rules, self.classes[0], self.classes[1], self.elapsed)]
+        for verdict, count in sorted(self.verdicts.items(), key=lambda item: -item[1]):
+            if verdict != DELIVERED:
+                lines.append("  %-12s %8d pairs, e.g. %s" % (verdict, count, ' -> '.join(self.examples[verdict][0])))
+        for (switch, kind), count in sorted(self.blackholes.items(), key=lambda item: -item[1])[:top]:
+            lines.append("  %-12s at %-16s %8d pairs" % (kind, switch, count))
+        if self.unsupported_rules:
+            lines.append("  %d rules match fields a probe does not have and were skipped" % self.unsupported_rules)
+        return lines
+
+
+def _strongly_connected(root, step, memo):
+    # Terminals reachable from the state root (its own and those of every state it leads to,
+    # plus a LOOP for every cycle), by an iterative Tarjan SCC search. memo keeps the result of
+    # every state, so that later searches stop at states seen before.
+    index, low, on_stack = {}, {}, set()
+    stack, info = [], {}
+    work = [(root, None)]
+    while work:
+        state, successors = work[-1]
+        if successors is None:
+            index[state] = low[state] = len(index)
+            stack.append(state)
+            on_stack.add(state)
+            terminals, next_states = step(state)
+            info[state] = (terminals, next_states)
+            successors = iter(next_states)
+            work[-1] = (state, successors)
+        descended = False
+        for successor in successors:
+            if successor in memo:
+                continue
+            if successor not in index:
+                work.append((successor, None))
+                descended = True
+                break
+            if successor in on_stack:
+                low[state] = min(low[state], index[successor])
+        if descended:
+            continue
+        work.pop()
+        if work:
+            parent = work[-1][0]
+            low[parent] = min(low[parent], low[state])
+        if low[state] == index[state]:
+            members = []
+            while True:
+                member = stack.pop()
+                on_stack.discard(member)
+                members.append(member)
+                if member == state:
+                    break
+            terminals = set()
+            for member in members:
+                member_terminals, next_states = info[member]
+                terminals.update(member_terminals)
+                for successor in next_states:
+                    if successor in memo:
+                        terminals.update(memo[successor])
+            if len(members) > 1 or state in info[state][1]:
+                switch = state[0] if isinstance(state, tuple) else state
+                terminals.add((LOOP, switch))
+            terminals = frozenset(terminals)
+            for member in members:
+                memo[member] = terminals
+    return memo[root]
+
+
+def _verdict(terminals):
+    kinds = set(kind for kind, _ in terminals)
+    if DELIVERED in kinds:
+        return DELIVERED
+    for kind in FAILURES:
+        if kind in kinds:
+            return kind
+    return 'drop'
+
+
+def _chain_token(chain, switch_ports, host):
+    # What a chain does with probes towards host (None for hosts not attached to the switch), to
+    # tell destinations apart: DELIVERED if its one unconditional rule outputs to the host itself.
+    if len(chain) == 1 and not chain[0][3]:
+        outputs = chain[0][4]
+        if host is not None and len(outputs) == 1 and switch_ports.get(outputs[0]) == ('host', host):
+            return DELIVERED
+        return chain[0][5]
+    return tuple((rule[3], rule[5]) for rule in chain)
+
+
+def _destination_classes(tables, hosts, attachment):
+    # Destinations whose chains behave alike on every switch, by refining the classes switch by
+    # switch: [[host, ...], ...]
+    graph = tables.graph
+    macs, ips = graph.mac, graph.ip
+    host_macs = [macs[host] for host in hosts]
+    attached = {}
+    for position, host in enumerate(hosts):
+        attached.setdefault(attachment[host][0], []).append(position)
+    class_of = [0] * len(hosts)
+    for switch, table in sorted(tables.tables.items()):
+        switch_ports = tables.ports[switch]
+        shared = table.shared_chain
+        if shared is not None and not table.ip_rules:
+            # Per exact dl_dst, the common case of a single rule above the shared chain inline:
+            top = shared[0][0] if shared else -1
+            mac_tokens = {}
+            for mac, exact in table.by_mac.items():
+                rule = exact[0]
+                if rule[0] > top and not rule[3]:
+                    mac_tokens[mac] = rule[5]
+                else:
+                    mac_tokens[mac] = _chain_token(table.merge(exact, shared), switch_ports, None)
+            default = _chain_token(shared, switch_ports, None)
+            tokens = [mac_tokens.get(mac, default) for mac in host_macs]
+        else:
+            tokens = [_chain_token(table.chain(macs[host], ips[host]), switch_ports, None) for host in hosts]
+        for position in attached.get(switch, ()):
+            host = hosts[position]
+            tokens[position] = _chain_token(table.chain(macs[host], ips[host]), switch_ports, host)
+        refined = {}
+        class_of = [refined.setdefault(key, len(refined)) for key in zip(class_of, tokens)]
+    classes = {}
+    for host, number in zip(hosts, class_of):
+        classes.setdefault(number, []).append(host)
+    return list(classes.values())
+
+
+def _source_classes(graph, hosts, chains):
+    # Sources alike for the source conditions (dl_src, nw_src) of the chains towards a destination:
+    source_rules = [rule for chain in chains.values() for rule in chain
+                    if any(field != 'in_port' for field, _, _ in rule[3])]
+    if not source_rules:
+        return [hosts]
+    macs, ips = graph.mac, graph.ip
+    classes = {}
+    for host in hosts:
+        key = tuple(all(_matches(macs[host] if field == 'dl_src' else ips[host], value, mask)
+                        for field, value, mask in rule[3] if field != 'in_port') for rule in source_rules)
+        classes.setdefault(key, []).append(host)
+    return list(classes.values())
+
+
+def _forwarding_step(tables, chains, port_free, src, dst):
+    # The step function of _strongly_connected for probes from src to dst: a state, the switch
+    # (or (switch, in_port)) a probe enters, -> (terminals, next states).
+    graph, ports = tables.graph, tables.ports
+    src_mac, src_ip = graph.mac[src], graph.ip[src]
+
+    def step(state):
+        switch, in_port = state if isinstance(state, tuple) else (state, None)
+        for rule in chains[switch]:
+            if all(_matches(in_port if field == 'in_port' else src_mac if field == 'dl_src' else src_ip, value, mask)
+                   for field, value, mask in rule[3]):
+                break
+        else:
+            return (('table-miss', switch),), ()
+        if not rule[4]:
+            return (('drop', switch),), ()
+        terminals, next_states = [], []
+        switch_ports = ports[switch]
+        for output in rule[4]:
+            if output in ('FLOOD', 'ALL'):
+                out_ports = [port for port in switch_ports if port != in_port]
+            elif output == 'IN_PORT':
+                out_ports = [in_port]
+            elif output in SPECIAL_OUTPUTS:
+                terminals.append((output.lower(), switch))
+                continue
+            else:
+                out_ports = [output]
+            for port in out_ports:
+                target = switch_ports.get(port)
+                if target is None:
+                    terminals.append(('dead-port', switch))
+                elif target[0] == 'switch':
+                    next_switch = target[1]
+                    next_states.append(next_switch if port_free[next_switch] else (next_switch, target[2]))
+                elif target[0] == 'host':
+                    terminals.append((DELIVERED if target[1] == dst else 'misdelivered', switch))
+                else:
+                    terminals.append(('external', switch))
+        return terminals, next_states
+    return step
+
+
+def verify_reachability(tables):
+    # Verdicts of all host pairs of tables.graph, as a ReachabilityReport.
+    start = time.perf_counter()
+    graph = tables.graph
+    report = ReachabilityReport(graph, tables)
+
+    # Hosts, and the switch (and port) they send into (as graph.host_attachment, one adjacency for all):
+    hosts, attachment = [], {}
+    adj, kinds = graph.adjacency(), graph.kinds
+    for host in graph.hosts():
+        for neighbour, _, neighbour_port, _ in adj[host]:
+            if kinds[neighbour] == SWITCH:
+                hosts.append(host)
+                attachment[host] = (neighbour, neighbour_port)
+                break
+    by_switch = {}
+    for host in hosts:
+        by_switch.setdefault(attachment[host][0], []).append(host)
+
+    with _collector_paused():
+        classes = _destination_classes(tables, hosts, attachment)
+        class_pairs = 0
+        for members in classes:
+            dst = members[0]
+            member_set = set(members)
+            member_switches = set(attachment[host][0] for host in members)
+            chains = dict((switch, table.chain(graph.mac[dst], graph.ip[dst])) for switch, table in tables.tables.items())
+            # States need their in_port where a rule or action depends on it:
+            port_free = dict((switch, not any(field == 'in_port' for rule in chain for field, _, _ in rule[3]) and
+                              not any(output in ('IN_PORT', 'FLOOD', 'ALL') for rule in chain for output in rule[4]))
+                             for switch, chain in chains.items())
+            for sources in _source_classes(graph, hosts, chains):
+                class_pairs += 1
+                step = _forwarding_step(tables, chains, port_free, sources[0], dst)
+                memo = {}
+                source_set = set(sources) if len(sources) < len(hosts) else None
+                for switch, switch_hosts in by_switch.items():
+                    senders = switch_hosts if source_set is None else [host for host in switch_hosts if host in source_set]
+                    if not senders:
+                        continue
+                    if port_free[switch]:
+                        groups = [(switch, senders)]
+                    else:
+                        groups = [((switch, attachment[host][1]), [host]) for host in senders]
+                    for state, group in groups:
+                        terminals = _strongly_connected(state, step, memo)
+                        # Pairs of the group with every member of the class, but itself:
+                        count = len(group) * len(members)
+                        if switch in member_switches:
+                            count -= sum(1 for host in group if host in member_set)
+                        if count:
+                            example = next(((group[0], host) for host in members if host != group[0]), None)
+                            report.add(_verdict(terminals), terminals, count, example)
+    report.classes = (len(classes), class_pairs)
+    report.elapsed = time.perf_counter() - start
+    return report
+
+
+
+## PING CONFIRMATION ##
+#######################
+
+def confirm_pings(net, report, samples=8, seed=0):
+    # Pings up to samples example pairs of every verdict in the running network. Returns
+    # [(src, dst, verdict, reached)]; a delivered pair should be reached, all others not
+    # (pairs left to the controller or NORMAL forwarding may go either way).
+    from benchmark import parse_ping_rtts
+    rng = random.Random(seed)
+    results = []
+    for verdict, examples in sorted(report.examples.items()):
+        for src, dst in rng.sample(examples, min(len(examples), samples)):
+            reached = bool(parse_ping_rtts(net.getNodeByName(src).cmd('ping -c1 -W1 '+ net.getNodeByName(dst).IP())))
+            results.append((src, dst, verdict, reached))
+    return results
+
+
+def confirmation_lines(results):
+    lines = []
+    for src, dst, verdict, reached in results:
+        expected = {DELIVERED: True, 'controller': None, 'normal': None}.get(verdict, False)
+        lines.append("  ping %s -> %s: %s, verified %s%s" % (src, dst, 'reached' if reached else 'lost', verdict,
+                                                             '' if expected in (None, reached) else '  MISMATCH'))
+    return lines
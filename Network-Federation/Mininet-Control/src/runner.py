@@ -0,0 +1,352 @@
+__author__ = 'Constantin'
+
+# Mininet (and everything depending on it) is imported inside of the runner only, so that
+# topology definitions can be loaded, validated and compiled on machines without mininet.
+
+#Python system imports:
+import threading
+import time
+
+
+
+## TOPOLOGY RUNNER ##
+#####################
+
+class TopologyRunner(object):
+    # Brings up a TopologyGraph in mininet, configures its gateway switch and hands the
+    # network over to the mininet CLI. Without an OpenFlow controller address, mininet's
+    # reference controller is used (as in the *.ref_topology.py setups).
+
+    # proactive: None (reactive forwarding by the controller), or one of proactive_flows.MODES
+    # to pre-install all host-to-host flows before any traffic starts.
+    # of_proxy: None, or the stats file of an of_proxy.py process put in front of all controllers.
+    # stats: None, or the keyword arguments of stats_collector.StatsCollector plus 'output', the
+    # JSON file its time series are written to when the network stops.
+    # controllers: None, or a controller_pool.ControllerPool the switches are spread over (in place
+    # of ofc_ip/ofc_port), health checked every failover_interval seconds if it has several endpoints.
+    # control: None, or the path of a unix socket accepting live topology changes (see live_topology.py),
+    # reload: a function returning the (graph, gateway) of the edited topology file for its 'reload'.
+    # arp: None, or {'remote': the remote clouds' graphs, 'responder': bool} to install static ARP entries
+    # of all known hosts (and the GWs' ARP responder flows), see static_arp.py.
+    # restore: None, or a snapshot archive (see snapshot.py) the switches' state (except their controllers)
+    # is restored from after start,
+    # snapshot: None, or the archive the switches' state is written to when the network stops.
+
+    def __init__(self, graph, gateway=None, ofc_ip=None, ofc_port=6633, proactive=None, of_proxy=None,
+                 controllers=None, failover_interval=2.0, stats=None, control=None, reload=None, arp=None,
+                 restore=None, snapshot=None):
+        self.graph = graph
+        self.gateway = gateway
+        self.gateways = [gateway] if gateway is not None else []
+        self.controllers = controllers
+        self.failover_interval = failover_interval
+        self.monitor = None
+        self.stats = stats
+        self.collector = None
+        if controllers is not None and ofc_ip is None:
+            # Mininet's controller of all switches at start, until configure() spreads them over the pool:
+            ofc_ip, ofc_port = controllers.primary
+        self.ofc_ip = ofc_ip
+        self.ofc_port = ofc_port
+        self.proactive = proactive
+        self.of_proxy = of_proxy
+        self.proxied = {}
+        self.proxy_process = None
+        self.topo = None
+        self.net = None
+        self.started_at = None
+        self.flow_timings = None
+        self.flows = None
+        self.control = control
+        self.reload = reload
+        self.control_server = None
+        self.arp = arp
+        self.arp_table = None
+        self.arp_counters = None
+        self.restore_path = restore
+        self.snapshot_path = snapshot
+        self._mutation_lock = threading.Lock()
+
+    def start(self):
+        from mininet.log import setLogLevel
+        from mininet.node import RemoteController
+        from bringup import BatchMininet, OVSBatch
+        from fabric_topo import FabricTopo
+
+        setLogLevel('info')
+        if self.of_proxy is not None:
+            self.start_proxy()
+        self.topo = FabricTopo(self.graph)
+        if self.ofc_ip is None:
+            #Create Mininet with automatic Reference Controller:
+            self.net = BatchMininet(self.topo, autoSetMacs=True, xterms=False)
+        else:
+            #Create Mininet with manual Remote Controller (OpenVirteX):
+            self.net = BatchMininet(self.topo, autoSetMacs=True, xterms=False, controller=None)
+            _, ofc_ip, ofc_port = self.proxied_url('tcp:%s:%d' % (self.ofc_ip, self.ofc_port)).split(':')
+            self.net.addController('ovxController', controller=RemoteController, ip=ofc_ip, port=int(ofc_port))
+            print("\nHosts configured with IPs, switches pointing to OpenVirteX at: "+ self.ofc_ip +
+                  " port: "+ str(self.ofc_port) +"\n")
+        self.net.start()
+        self.started_at = time.time()
+
+        # Gateway (and further switch) setup, all in one ovs-vsctl transaction:
+        batch = OVSBatch()
+        with self.net.timer.phase('gateway'):
+            self.configure(batch)
+            batch.flush()
+        if self.gateway is not None:
+            # LLDP dropping rule for the GRE-Tunnel of the GW-Switch:
+            #net.do_sh('ovs-ofctl add-flow GW dl_type=0x88CC,in_port=2,actions=drop')
+            self.net.getNodeByName(self.gateway['switch']).cmdPrint('ovs-vsctl show')
+        if self.proactive is not None:
+            with self.net.timer.phase('proactive-flows'):
+                self.install_flows()
+        if self.arp is not None:
+            from static_arp import broadcast_counters
+            with self.net.timer.phase('static-arp'):
+                self.install_arp()
+            self.arp_counters = broadcast_counters(self.graph, self.gateways)
+        if self.restore_path is not None:
+            from snapshot import restore_snapshot
+            with self.net.timer.phase('restore'):
+                restore_snapshot(self.graph, self.restore_path, controllers=False)
+        if self.controllers is not None and len(self.controllers.endpoints) > 1 and self.proactive != 'only':
+            from controller_pool import ControllerMonitor
+            self.monitor = ControllerMonitor(self.controllers, self.graph, OVSBatch, skip=self.own_controllers(),
+                                             url=self.proxied_url, interval=self.failover_interval).start()
+        if self.stats is not None:
+            from stats_collector import StatsCollector
+            options = dict((key, value) for key, value in self.stats.items() if key != 'output')
+            switches = [self.graph.names[idx] for idx in self.graph.switches()]
+            self.collector = StatsCollector(switches, **options).start()
+        if self.control is not None:
+            from live_topology import TopologyControl
+            self.control_server = TopologyControl(self, self.control, self.reload).start()
+        self.net.timer.report()
+        return self.net
+
+    def configure(self, batch):
+        # Queues the switch configuration done after the network started: the switches' share
+        # of the controller pool, the GW's managing OFCs (both OVX-Hypervisors) and its GRE-Tunnel.
+        from bringup import add_gateway_config
+        if self.controllers is not None:
+            self.controllers.configure(batch, self.graph, skip=self.own_controllers(), url=self.proxied_url)
+        if self.gateway is not None:
+            add_gateway_config(batch, self.gateway, self.graph)
+
+    def own_controllers(self):
+        # Switches with controllers of their own (GWs), left out of the controller pool:
+        return set(gateway['switch'] for gateway in self.gateways if gateway.get('controllers'))
+
+    def controller_urls(self):
+        # All OpenFlow controllers the switches connect to, as 'tcp:ip:port' urls:
+        urls = ['tcp:%s:%d' % (self.ofc_ip, self.ofc_port)] if self.ofc_ip is not None else []
+        if self.controllers is not None:
+            urls.extend(self.controllers.endpoints)
+        for gateway in self.gateways:
+            urls.extend(gateway.get('controllers', ()))
+        return urls
+
+    def proxied_url(self, url):
+        return self.proxied.get(url, url)
+
+    def start_proxy(self):
+        # Puts of_proxy.py in front of every controller; switches connect to the proxy ports instead.
+        from of_proxy import launch_proxy
+        self.proxy_process, self.proxied = launch_proxy(self.controller_urls(), self.of_proxy)
+        self.gateways = [dict(gateway, controllers=[self.proxied_url(url) for url in gateway.get('controllers', ())])
+                         for gateway in self.gateways]
+        if self.gateway is not None:
+            self.gateway = self.gateways[0]
+
+    def tunnels(self):
+        # GRE tunnels between switches of the graph itself, see proactive_flows.compile_flows:
+        return []
+
+    def install_flows(self):
+        # Pushes the precomputed flows of all switches, after detaching the controllers in 'only' mode.
+        # After a live change, only the switches whose flows changed are updated.
+        from bringup import OVSBatch
+        from proactive_flows import compile_flows, detach_controllers, install_flows, report_install_times
+        flows = compile_flows(self.graph, self.gateways, self.tunnels())
+        installed = self.flows or {}
+        changed = dict((switch, switch_flows) for switch, switch_flows in flows.items()
+                       if installed.get(switch) != switch_flows)
+        if self.proactive == 'only':
+            detach_controllers(OVSBatch(), sorted(switch for switch in changed if switch not in installed)).flush()
+        self.flow_timings = install_flows(changed, replace=[switch for switch in changed if switch in installed])
+        self.flows = flows
+        report_install_times(changed, self.flow_timings)
+
+    def install_arp(self, added_hosts=()):
+        # Installs the static neighbour entries of all known hosts on every host, and the ARP responder
+        # flows on the GWs. After a live change, the hosts in added_hosts get all entries, the other
+        # hosts only the changed and removed ones.
+        from static_arp import install_neighbours, install_responders, neighbour_table, remote_subnets, table_changes
+        remote = self.arp.get('remote', ())
+        table = neighbour_table(self.graph, remote)
+        hosts = [self.net.getNodeByName(self.graph.names[idx]) for idx in self.graph.hosts()]
+        total = len(hosts) * len(table)
+        routes = remote_subnets(self.graph, remote)
+        if self.arp_table is None:
+            install_neighbours(hosts, table, routes, total=total)
+        else:
+            changed, removed = table_changes(self.arp_table, table)
+            install_neighbours([host for host in hosts if host.name not in added_hosts], changed,
+                               removed=removed, total=total)
+            install_neighbours([host for host in hosts if host.name in added_hosts], table, routes, total=total)
+        if self.arp.get('responder'):
+            install_responders(self.gateways, table)
+        self.arp_table = table
+        print("*** Static ARP: %d entries on %d hosts%s" % (len(table), len(hosts),
+              ', answered by %d GWs' % len(self.gateways) if self.arp.get('responder') else ''))
+
+    def broadcast_traffic(self):
+        # Broadcast counters of the switches since the static ARP entries were installed:
+        from static_arp import broadcast_counters, counter_deltas
+        return counter_deltas(self.arp_counters, broadcast_counters(self.graph, self.gateways))
+
+    def configure_switches(self, batch, switches):
+        # Queues the controllers of switches added to the running network:
+        if self.controllers is not None:
+            skip = set(self.graph.names[idx] for idx in self.graph.switches()) - set(switches)
+            self.controllers.configure(batch, self.graph, skip=skip | self.own_controllers(), url=self.proxied_url)
+
+    def mutate(self, graph, gateways=None):
+        # Changes the running network into graph (and gateways, unchanged if None), touching only
+        # the nodes, links and GW ports that differ (see live_topology.py). Returns the TopologyDelta.
+        from live_topology import TopologyDelta, apply_delta, diff_topologies
+        gateways = self.gateways if gateways is None else gateways
+        with self._mutation_lock:
+            delta = diff_topologies(self.graph, graph, self.gateways, gateways)
+            if not len(delta):
+                return delta
+            old_graph = self.graph
+            self.graph = graph
+            try:
+                timer = apply_delta(self.net, delta, graph, gateways, self.configure_switches)
+            except Exception:
+                # Brings the half changed network back to the old graph before giving up:
+                self.graph = old_graph
+                rollback = TopologyDelta.rollback(delta, self.net, old_graph, self.gateways)
+                try:
+                    apply_delta(self.net, rollback, old_graph, self.gateways, self.configure_switches)
+                except Exception as e:
+                    print("*** Rolling back the topology change failed, the network differs from %s: %s"
+                          % (old_graph.name, e))
+                raise
+            self.gateways = gateways
+            if self.gateway is not None:
+                self.gateway = gateways[0] if gateways else None
+            if self.proactive is not None:
+                with timer.phase('proactive-flows'):
+                    self.install_flows()
+            if self.arp is not None:
+                with timer.phase('static-arp'):
+                    self.install_arp(set(delta.added_nodes))
+            delta.timings = timer.as_dict()
+            if self.monitor is not None:
+                self.monitor.graph = graph
+            if self.collector is not None:
+                self.collector.switches = [graph.names[idx] for idx in graph.switches()]
+            print("*** Topology changed (%s) in %.3fs" % (delta.summary(), sum(delta.timings.values())))
+            return delta
+
+    def snapshot(self, path):
+        # Writes the state of all switches to the archive at path, returns its manifest.
+        from snapshot import take_snapshot
+        with self._mutation_lock:
+            manifest = take_snapshot(self.graph, path)
+        print("*** Snapshot of %d switches with %d flows written to %s in %.3fs"
+              % (len(manifest['bridges']), sum(manifest['flows'].values()), path, manifest['snapshot_s']))
+        return manifest
+
+    def interact(self):
+        from mininet.cli import CLI
+        CLI(self.net)
+
+    def stop(self):
+        if self.control_server is not None:
+            self.control_server.stop()
+            self.control_server = None
+        if self.collector is not None:
+            self.collector.stop()
+            if self.stats.get('output'):
+                self.collector.write(self.stats['output'])
+                print("*** Switch statistics written to "+ self.stats['output'])
+            self.collector = None
+        if self.monitor is not None:
+            self.monitor.stop()
+            self.monitor = None
+        if self.arp_counters is not None and self.net is not None:
+            counters = self.broadcast_traffic()
+            print("*** Broadcast traffic since the static ARP entries:\n" +
+                  '\n'.join('%-16s %12d' % item for item in sorted(counters.items())))
+            self.arp_counters = None
+        if self.snapshot_path is not None and self.net is not None:
+            self.snapshot(self.snapshot_path)
+        if self.net is not None:
+            self.net.stop()
+            self.net = None
+        if self.proxy_process is not None:
+            # The proxy writes its final stats on SIGTERM:
+            self.proxy_process.terminate()
+            self.proxy_process.wait()
+            self.proxy_process = None
+            print("*** OpenFlow proxy stats written to "+ self.of_proxy)
+
+    def host_groups(self):
+        # Host name -> cloud, to tell intra-cloud from cross-GW host pairs (a single cloud here).
+        return dict((self.graph.names[idx], self.graph.name) for idx in self.graph.hosts())
+
+    def benchmark(self, output=None, **options):
+        # Runs the benchmark workloads (see benchmark.Benchmark for the options) on the started
+        # network and writes the results, together with the bring-up timings, to output.
+        from benchmark import Benchmark, write_results
+        results = {'topology': self.graph.name, 'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                   'controller': '%s:%d' % (self.ofc_ip, self.ofc_port) if self.ofc_ip else 'reference',
+                   'bringup_s': self.net.timer.as_dict(), 'proactive': self.proactive}
+        shaped = [l for l in range(self.graph.link_count) if self.graph.link_shaping(l)]
+        if shaped:
+            results['shaping'] = {'links': len(shaped), 'cpu_limited_hosts': sum(1 for cpu in self.graph.cpu if cpu)}
+        if self.flow_timings is not None:
+            results['flow_install_s'] = self.flow_timings
+        if self.of_proxy is not None:
+            results['of_proxy_stats'] = self.of_proxy
+        if self.controllers is not None:
+            results['controller_load'] = self.controllers.load(self.graph)
+        results.update(Benchmark(self.net, self.host_groups(), **options).run(self.started_at))
+        if self.arp_counters is not None:
+            # Including the ARP traffic of the workloads:
+            results['arp'] = dict(self.broadcast_traffic(), entries=len(self.arp_table),
+                                  responder=bool(self.arp.get('responder')))
+        if output is not None:
+            write_results(results, output)
+            print("*** Benchmark results written to "+ output)
+        return results
+
+    def verify(self, samples=8):
+        # Verifies all host pairs on the switches' current flow tables (see reachability.py) and
+        # confirms the verdicts with up to samples pings each. Returns the ReachabilityReport.
+        from reachability import FlowTables, confirm_pings, confirmation_lines, dump_flow_tables, verify_reachability
+        flows = dump_flow_tables([self.graph.names[idx] for idx in self.graph.switches()])
+        report = verify_reachability(FlowTables(self.graph, self.gateways, flows))
+        print('\n*** Reachability: ' + '\n'.join(report.lines()))
+        if samples:
+            print('\n'.join(confirmation_lines(confirm_pings(self.net, report, samples))) + '\n')
+        return report
+
+    def run(self, interactive=True, benchmark=None, verify=None):
+        # benchmark: None, or the keyword arguments of self.benchmark()
+        # verify: None, or the pings per verdict confirming self.verify()
+        self.start()
+        try:
+            if verify is not None:
+                self.verify(verify)
+            if benchmark is not None:
+                self.benchmark(**benchmark)
+            if interactive:
+                self.interact()
+        finally:
+            self.stop()
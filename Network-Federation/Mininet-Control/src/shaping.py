@@ -0,0 +1,124 @@
+__author__ = 'Constantin'
+
+# Traffic and CPU shaping of the emulated hosts, after the host descriptors of the Cloud-Agents
+# (cloudconfN/hosts/Host<n>.xml, see inventory_export.py), matched to the graph's hosts by IP:
+#   <Bandwidth> (ByteSize per second) -> 'bw' of the host's switch link, in Mbit/s,
+#   <Latency>   (ms, GW to host)      -> 'delay' of that link,
+#   <CPU>       (SMALL .. XLARGE)     -> the host's 'cpu' share, see CPU_WEIGHTS.
+# Shaping given in the topology definition itself ('bw', 'delay', 'loss' and 'cpu' of hosts and
+# links, see topology_loader.py) takes precedence over the descriptors.
+# bringup.BatchMininet applies the link shaping with the qdiscs mininet's TCIntf would set up
+# (an htb rate limit with a netem child for delay and loss), but as one 'tc -batch' run per
+# network namespace instead of several tc processes per interface. Host CPU shares are set
+# by mininet's CPULimitedHost.
+
+#Python system imports:
+import os
+import xml.etree.ElementTree as ElementTree
+
+#Own Imports:
+from address_plan import parse_ip
+from topology import SWITCH
+
+
+
+## HOST DESCRIPTORS ##
+######################
+
+# ByteUnits of the Cloud-Agents' ByteSize, in bytes:
+BYTE_UNITS = {'KB': 1000, 'KiB': 1024, 'MB': 1000 ** 2, 'MiB': 1024 ** 2, 'GB': 1000 ** 3, 'GiB': 1024 ** 3,
+              'TB': 1000 ** 4, 'TiB': 1024 ** 4, 'PB': 1000 ** 5, 'PiB': 1024 ** 5}
+
+# CPU unit -> weight. All described hosts share CPU_BUDGET (the rest of the machine is left
+# to OVS and the controllers) in proportion to their weights, as mininet's examples give
+# every host cpu=0.5/n:
+CPU_WEIGHTS = {'UNDEFINED': 0, 'SMALL': 1, 'MEDIUM': 2, 'LARGE': 4, 'XLARGE': 8}
+CPU_BUDGET = 0.5
+
+
+def parse_byte_size(text):
+    # '100.0 MB' -> bytes, as ByteSize.fromString of the Cloud-Agents reads it.
+    try:
+        size, unit = text.split()
+        return float(size) * BYTE_UNITS[unit]
+    except (ValueError, KeyError):
+        raise ValueError("Invalid byte size: %r" % text)
+
+
+def read_host_descriptor(path):
+    # -> (ip, bw in Mbit/s, delay in ms, cpu unit) of one Host XML.
+    root = ElementTree.parse(path).getroot()
+    resource = root.find('Hardware/Resource')
+    if resource is None or root.findtext('IP') is None:
+        raise ValueError(path +" is no host descriptor")
+    bw = parse_byte_size(resource.findtext('Bandwidth/ByteSize', '0 MB')) * 8 / 1e6
+    delay = float(resource.findtext('Latency', '0'))
+    cpu = resource.findtext('CPU', 'UNDEFINED').strip()
+    if cpu not in CPU_WEIGHTS:
+        raise ValueError("%s: unknown CPU unit %s" % (path, cpu))
+    return parse_ip(root.findtext('IP').strip()), bw, delay, cpu
+
+
+def read_host_descriptors(hosts_dir):
+    # ip -> (bw, delay, cpu unit) of every file in hosts_dir, as CloudConfigurator loads them.
+    descriptors = {}
+    for file_name in sorted(os.listdir(hosts_dir)):
+        path = os.path.join(hosts_dir, file_name)
+        if os.path.isfile(path):
+            ip, bw, delay, cpu = read_host_descriptor(path)
+            descriptors[ip] = (bw, delay, cpu)
+    return descriptors
+
+
+def apply_host_descriptors(graph, descriptors, cpu_budget=CPU_BUDGET):
+    # Shapes the switch links and CPU shares of the graph's hosts after their descriptors,
+    # where the topology definition left them unset. Returns the number of described hosts.
+    adj, kinds = graph.adjacency(), graph.kinds
+    described, weights = 0, {}
+    for idx in graph.hosts():
+        descriptor = descriptors.get(graph.ip[idx])
+        if descriptor is None:
+            continue
+        bw, delay, cpu = descriptor
+        described += 1
+        for neighbour, _, _, link_idx in adj[idx]:
+            if kinds[neighbour] == SWITCH:
+                graph.shape_link(link_idx, bw=None if graph.link_bw[link_idx] else bw,
+                                 delay=None if graph.link_delay[link_idx] else delay)
+                break
+        if not graph.cpu[idx] and CPU_WEIGHTS[cpu]:
+            weights[idx] = CPU_WEIGHTS[cpu]
+    total = sum(weights.values())
+    for idx, weight in weights.items():
+        graph.cpu[idx] = cpu_budget * weight / total
+    return described
+
+
+
+## MININET PARAMETERS ##
+########################
+
+def host_params(graph, idx):
+    # Mininet parameters of a host beyond its addresses: a CPULimitedHost, if it has a cpu share.
+    if not graph.cpu[idx]:
+        return {}
+    from mininet.node import CPULimitedHost
+    return {'cls': CPULimitedHost, 'cpu': graph.cpu[idx]}
+
+
+def tc_commands(intf_name, bw=None, delay=None, loss=None):
+    # 'tc -batch' lines shaping the egress of an interface, with the qdiscs of mininet's TCIntf.
+    lines = []
+    parent = 'root'
+    if bw:
+        lines.append('qdisc add dev %s root handle 5:0 htb default 1\n' % intf_name)
+        lines.append('class add dev %s parent 5:0 classid 5:1 htb rate %fMbit burst 15k\n' % (intf_name, bw))
+        parent = 'parent 5:1'
+    netem = []
+    if delay:
+        netem.append('delay %gms' % delay)
+    if loss:
+        netem.append('loss %.5f%%' % loss)
+    if netem:
+        lines.append('qdisc add dev %s %s handle 10: netem %s\n' % (intf_name, parent, ' '.join(netem)))
+    return lines
@@ -0,0 +1,477 @@
+__author__ = 'Constantin'
+
+# Sharded emulation of topologies too large for one mininet process (CPU and fd bound):
+#   sudo python topoctl.py run leafspine:8,400,40 --shards 8 --ofc_ip 192.168.1.41
+# The graph's switches are partitioned into balanced shards with few links between them
+# (partition_graph, hosts stay with their switch), and every shard is brought up by a
+# BatchMininet of its own, in a worker process owning the shard's namespaces and OVS bridges.
+# All bridges share the host's ovsdb, so the coordinator (ShardedRunner) does everything on
+# OVS level itself: it stitches the cut links as veth pairs (or GRE ports over local underlay
+# addresses, with one key per link, as long as no cut link is shaped) with the ports of the
+# graph, configures the GWs and the controller pool, installs proactive flows and polls the
+# switch stats. Node commands of the combined CLI are forwarded to the shard owning the node.
+
+#Python system imports:
+import cmd
+import os
+import resource
+import time
+import traceback
+from array import array
+
+#Own Imports:
+from address_plan import format_ip, parse_ip
+from runner import TopologyRunner
+from topology import SWITCH, TopologyGraph
+
+
+
+## PARTITIONING ##
+##################
+
+def _bfs_order(graph, switches):
+    # Switches in BFS order over the switch links, every component from a pseudo-peripheral
+    # switch (the last one reached from an arbitrary start), which makes the order's prefixes compact.
+    adj, kinds = graph.adjacency(), graph.kinds
+    seen = bytearray(graph.node_count)
+
+    def bfs(start, mark):
+        queue = [start]
+        seen[start] = mark
+        for node in queue:
+            for neighbour, _, _, _ in adj[node]:
+                if kinds[neighbour] == SWITCH and seen[neighbour] != mark:
+                    seen[neighbour] = mark
+                    queue.append(neighbour)
+        return queue
+
+    order = []
+    for switch in switches:
+        if not seen[switch]:
+            component = bfs(switch, 1)
+            order.extend(bfs(component[-1], 2))
+    return order
+
+
+def partition_graph(graph, parts, imbalance=0.1, passes=8):
+    # Node index -> shard (array), for parts balanced shards of (1 + attached hosts) per switch.
+    # Greedy graph growing (the BFS order cut into parts of equal weight) is refined by
+    # Fiduccia-Mattheyses style passes, moving boundary switches to the shard they have most
+    # links to, as long as no shard leaves imbalance around the mean weight: O(passes * links).
+    if parts < 1:
+        raise ValueError("A topology needs at least one shard, got %d" % parts)
+    switches = graph.switches()
+    if len(switches) < parts:
+        raise ValueError("%d switches can not be split into %d shards" % (len(switches), parts))
+    adj, kinds = graph.adjacency(), graph.kinds
+    shard = array('i', [0]) * graph.node_count
+    weight = array('i', [0]) * graph.node_count
+    hosts = graph.hosts()
+    attachment = []
+    for host in hosts:
+        switch, _ = graph.host_attachment(host)
+        if switch is None:
+            raise ValueError("Host "+ graph.names[host] +" is not attached to any switch")
+        attachment.append(switch)
+        weight[switch] += 1
+    for switch in switches:
+        weight[switch] += 1
+
+    order = _bfs_order(graph, switches)
+    mean = float(sum(weight[switch] for switch in switches)) / parts
+    load = [0] * parts
+    part = filled = 0
+    for position, switch in enumerate(order):
+        # On to the next shard once this one is full, or the remaining switches are needed to fill the rest:
+        if part < parts - 1 and (filled >= mean * (part + 1) or len(order) - position <= parts - 1 - part):
+            part += 1
+        shard[switch] = part
+        load[part] += weight[switch]
+        filled += weight[switch]
+
+    max_load, min_load = mean * (1 + imbalance), mean * (1 - imbalance)
+    for _ in range(passes):
+        moved = 0
+        for switch in order:
+            own, links = shard[switch], {}
+            for neighbour, _, _, _ in adj[switch]:
+                if kinds[neighbour] == SWITCH:
+                    links[shard[neighbour]] = links.get(shard[neighbour], 0) + 1
+            if len(links) < 2 and own in links:
+                continue
+            internal, best, best_gain = links.get(own, 0), own, 0
+            if load[own] - weight[switch] < min_load:
+                continue
+            for part, count in links.items():
+                if count - internal > best_gain and load[part] + weight[switch] <= max_load:
+                    best, best_gain = part, count - internal
+            if best != own:
+                shard[switch] = best
+                load[own] -= weight[switch]
+                load[best] += weight[switch]
+                moved += 1
+        if not moved:
+            break
+
+    for host, switch in zip(hosts, attachment):
+        shard[host] = shard[switch]
+    return shard
+
+
+def cut_links(graph, shard):
+    # Indices of the links between two shards:
+    link_src, link_dst = graph.link_src, graph.link_dst
+    return [l for l in range(graph.link_count) if shard[link_src[l]] != shard[link_dst[l]]]
+
+
+def shard_graphs(graph, shard, parts):
+    # The graph of every shard: its nodes with their addresses, cpu shares and port counters, and
+    # the links within the shard with their ports and shaping (cut links are left to the coordinator).
+    graphs = [TopologyGraph('%s.shard%d' % (graph.name, part), graph.prefix_len) for part in range(parts)]
+    local = array('i', [0]) * graph.node_count
+    for idx, name in enumerate(graph.names):
+        sub = graphs[shard[idx]]
+        if graph.kinds[idx] == SWITCH:
+            local[idx] = sub.add_switch(name, graph.dpid[idx])
+        else:
+            local[idx] = sub.add_host(name, graph.ip[idx], graph.mac[idx])
+        sub.next_port[local[idx]] = graph.next_port[idx]
+        sub.cpu[local[idx]] = graph.cpu[idx]
+    for l in range(graph.link_count):
+        src, src_port, dst, dst_port = graph.link(l)
+        if shard[src] == shard[dst]:
+            graphs[shard[src]].add_link(local[src], local[dst], src_port, dst_port,
+                                        graph.link_bw[l], graph.link_delay[l], graph.link_loss[l])
+    return graphs
+
+
+
+## SHARD WORKERS ##
+###################
+
+def _shard_main(conn, graph, controller, listen_port, inherited=()):
+    # Worker process of one shard: brings up its graph and serves the coordinator's requests
+    # ('cmd', node, command), ('status',) and ('stop',) until stopped, or the coordinator is gone.
+    # The forked coordinator ends of the other workers' pipes are closed, so that they see it go, too.
+    for other_conn in inherited:
+        other_conn.close()
+    try:
+        from mininet.log import setLogLevel
+        from mininet.node import RemoteController
+        from bringup import BatchMininet
+        from fabric_topo import FabricTopo
+        setLogLevel('warning')
+        if controller is None:
+            net = BatchMininet(FabricTopo(graph), autoSetMacs=True, xterms=False, listenPort=listen_port)
+        else:
+            net = BatchMininet(FabricTopo(graph), autoSetMacs=True, xterms=False, listenPort=listen_port,
+                               controller=None)
+            net.addController('c-'+ graph.name, controller=RemoteController, ip=controller[0], port=controller[1])
+        net.start()
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+        return
+    conn.send(('ready', os.getpid(), net.timer.as_dict()))
+
+    while True:
+        try:
+            request = conn.recv()
+        except EOFError:
+            request = ('stop',)
+        try:
+            if request[0] == 'cmd':
+                reply = ('ok', net[request[1]].cmd(request[2]))
+            elif request[0] == 'status':
+                usage = resource.getrusage(resource.RUSAGE_SELF)
+                reply = ('ok', {'pid': os.getpid(), 'hosts': len(net.hosts), 'switches': len(net.switches),
+                                'links': len(net.links), 'cpu_s': usage.ru_utime + usage.ru_stime,
+                                'max_rss_kb': usage.ru_maxrss, 'fds': len(os.listdir('/proc/self/fd'))})
+            elif request[0] == 'stop':
+                net.stop()
+                conn.send(('ok', None))
+                return
+            else:
+                reply = ('error', "Unknown request %r" % (request,))
+        except Exception:
+            reply = ('error', traceback.format_exc())
+        conn.send(reply)
+
+
+class ShardWorker(object):
+    # Coordinator side of a worker process.
+
+    def __init__(self, number, graph, controller, listen_port, others=()):
+        import multiprocessing
+        self.number = number
+        self.graph = graph
+        self.conn, self._child_conn = multiprocessing.Pipe()
+        # Forked, so that the shard graph is not pickled and mininet is imported in the worker only:
+        self.process = multiprocessing.get_context('fork').Process(
+            target=_shard_main, args=(self._child_conn, graph, controller, listen_port,
+                                      [other.conn for other in others]), name='shard%d' % number)
+        self.pid = None
+        self.timings = {}
+
+    def start(self):
+        self.process.start()
+        self._child_conn.close()
+        return self
+
+    def wait_ready(self):
+        reply = self.conn.recv()
+        if reply[0] != 'ready':
+            raise RuntimeError("Shard %d failed to start:\n%s" % (self.number, reply[1]))
+        _, self.pid, self.timings = reply
+        return self
+
+    def request(self, *request):
+        self.conn.send(request)
+        status, result = self.conn.recv()
+        if status != 'ok':
+            raise RuntimeError("Shard %d: %s" % (self.number, result))
+        return result
+
+    def stop(self):
+        if self.process.is_alive():
+            try:
+                self.request('stop')
+            except (EOFError, OSError, RuntimeError) as e:
+                print("*** Shard %d did not stop cleanly: %s" % (self.number, e))
+        self.process.join()
+
+
+
+## SHARDED RUNNER ##
+####################
+
+LINK_MODES = ('veth', 'gre')
+
+# GRE stitching underlay: shard i (from 0 on) gets UNDERLAY_BASE + i + 1 on the dummy device UNDERLAY_DEV.
+UNDERLAY_BASE = parse_ip('172.30.0.0')
+UNDERLAY_DEV = 'shards0'
+# Every shard's switches get their own range of mininet listen ports:
+LISTEN_PORT_BASE = 6654
+
+
+def underlay_ip(shard):
+    return format_ip(UNDERLAY_BASE + shard + 1)
+
+
+class ShardedRunner(TopologyRunner):
+    # A TopologyRunner bringing up its graph in shards worker processes, see above. Live changes
+    # (control) and the benchmark workloads need the single process TopologyRunner.
+
+    def __init__(self, graph, gateway=None, shards=2, link_mode='veth', imbalance=0.1, **options):
+        if link_mode not in LINK_MODES:
+            raise ValueError("Unknown link mode "+ link_mode +", choose one of: "+ ', '.join(LINK_MODES))
+        super(ShardedRunner, self).__init__(graph, gateway, **options)
+        self.shards = shards
+        self.link_mode = link_mode
+        self.shard = partition_graph(graph, shards, imbalance)
+        self.cut = cut_links(graph, self.shard)
+        if link_mode == 'gre':
+            # OVS tunnel ports have no netdev of their own, which tc could shape:
+            shaped = [l for l in self.cut if graph.link_shaping(l)]
+            if shaped:
+                src, _, dst, _ = graph.link(shaped[0])
+                raise ValueError("%d cut links are shaped (e.g. %s-%s), which GRE stitching cannot emulate, use "
+                                 "veth links" % (len(shaped), graph.names[src], graph.names[dst]))
+        self.workers = []
+        self.timer = None
+
+    def describe(self):
+        names = self.graph.names
+        lines = ["%s: %d shards, %d of %d links cut (stitched by %s)"
+                 % (self.graph.name, self.shards, len(self.cut), self.graph.link_count, self.link_mode)]
+        for part in range(self.shards):
+            nodes = [idx for idx in range(self.graph.node_count) if self.shard[idx] == part]
+            switches = [idx for idx in nodes if self.graph.is_switch(idx)]
+            lines.append("  shard%-3d %5d switches, %6d hosts, e.g. %s"
+                         % (part, len(switches), len(nodes) - len(switches),
+                            ', '.join(names[idx] for idx in switches[:3])))
+        return '\n'.join(lines)
+
+    def _intf_names(self, l):
+        src, src_port, dst, dst_port = self.graph.link(l)
+        names = self.graph.names
+        return '%s-eth%d' % (names[src], src_port), '%s-eth%d' % (names[dst], dst_port)
+
+    def start(self):
+        from bringup import OVSBatch, PhaseTimer
+        self.timer = PhaseTimer()
+        print(self.describe())
+        if self.of_proxy is not None:
+            self.start_proxy()
+        if self.ofc_ip is None:
+            # Mininet's reference controller runs in shard 0, the other shards connect to it:
+            controllers = [None] + [('127.0.0.1', 6633)] * (self.shards - 1)
+        else:
+            _, ofc_ip, ofc_port = self.proxied_url('tcp:%s:%d' % (self.ofc_ip, self.ofc_port)).split(':')
+            controllers = [(ofc_ip, int(ofc_port))] * self.shards
+
+        with self.timer.phase('shards'):
+            listen_port = LISTEN_PORT_BASE
+            for part, shard_graph in enumerate(shard_graphs(self.graph, self.shard, self.shards)):
+                self.workers.append(ShardWorker(part, shard_graph, controllers[part], listen_port,
+                                                self.workers).start())
+                listen_port += len(shard_graph.switches())
+            try:
+                for worker in self.workers:
+                    worker.wait_ready()
+            except Exception:
+                self.stop()
+                raise
+        self.started_at = time.time()
+
+        with self.timer.phase('stitch'):
+            self.stitch()
+        batch = OVSBatch()
+        with self.timer.phase('gateway'):
+            self.configure(batch)
+            batch.flush()
+        if self.proactive is not None:
+            with self.timer.phase('proactive-flows'):
+                self.install_flows()
+        if self.controllers is not None and len(self.controllers.endpoints) > 1 and self.proactive != 'only':
+            from controller_pool import ControllerMonitor
+            self.monitor = ControllerMonitor(self.controllers, self.graph, OVSBatch, skip=self.own_controllers(),
+                                             url=self.proxied_url, interval=self.failover_interval).start()
+        if self.stats is not None:
+            from stats_collector import StatsCollector
+            options = dict((key, value) for key, value in self.stats.items() if key != 'output')
+            self.collector = StatsCollector([self.graph.names[idx] for idx in self.graph.switches()],
+                                            **options).start()
+
+        # The bring-up phases of every shard, run in parallel within the 'shards' phase:
+        for worker in self.workers:
+            print("*** shard%d (pid %d): %s" % (worker.number, worker.pid, ', '.join(
+                '%s %.3fs' % (phase, seconds) for phase, seconds in sorted(worker.timings.items()))))
+        self.timer.report()
+
+    def stitch(self):
+        # Connects the switch ports of all cut links: veth pairs created by one 'ip -batch' run
+        # (and shaped by one 'tc -batch' run), or GRE ports keyed by link, in one ovs-vsctl transaction.
+        from bringup import OVSBatch, _run_cmd
+        from shaping import tc_commands
+        graph, names = self.graph, self.graph.names
+        batch, lines, tc_lines = OVSBatch(), [], []
+        if self.link_mode == 'gre':
+            lines = ['link add %s type dummy\n' % UNDERLAY_DEV, 'link set %s up\n' % UNDERLAY_DEV]
+            lines.extend('addr add %s/32 dev %s\n' % (underlay_ip(part), UNDERLAY_DEV) for part in range(self.shards))
+        for l in self.cut:
+            src, src_port, dst, dst_port = graph.link(l)
+            intf1, intf2 = self._intf_names(l)
+            if self.link_mode == 'veth':
+                lines.append('link add name %s type veth peer name %s\n' % (intf1, intf2))
+                lines.extend('link set %s up\n' % intf for intf in (intf1, intf2))
+                for intf in (intf1, intf2):
+                    tc_lines.extend(tc_commands(intf, **graph.link_shaping(l)))
+            for node, port, intf, peer in ((src, src_port, intf1, dst), (dst, dst_port, intf2, src)):
+                settings = ['ofport_request=%d' % port]
+                if self.link_mode == 'gre':
+                    settings = ['type=gre', 'options:remote_ip=' + underlay_ip(self.shard[peer]),
+                                'options:local_ip=' + underlay_ip(self.shard[node]), 'options:key=%d' % (l + 1)] \
+                               + settings
+                batch.add('--may-exist', 'add-port', names[node], intf)
+                batch.add('set', 'interface', intf, *settings)
+        if lines:
+            _run_cmd(['ip', '-force', '-batch', '-'], ''.join(lines))
+        batch.flush()
+        if tc_lines:
+            _run_cmd(['tc', '-force', '-batch', '-'], ''.join(tc_lines))
+
+    def owner(self, node_name):
+        idx = self.graph.index.get(node_name)
+        if idx is None:
+            raise ValueError("Node "+ node_name +" is not part of topology "+ self.graph.name)
+        return self.workers[self.shard[idx]]
+
+    def node_cmd(self, node_name, command):
+        return self.owner(node_name).request('cmd', node_name, command)
+
+    def shard_status(self):
+        return [dict(worker.request('status'), shard=worker.number) for worker in self.workers]
+
+    def interact(self):
+        ShardCLI(self).cmdloop()
+
+    def stop(self):
+        # Controller monitor and stats collector stop first, while the shards' bridges still exist:
+        super(ShardedRunner, self).stop()
+        for worker in self.workers:
+            worker.stop()
+        self.workers = []
+        if self.cut:
+            import subprocess
+            # The shards removed their bridges, the veths (or tunnel underlay) of the cut links are left:
+            if self.link_mode == 'veth':
+                lines = ''.join('link del dev %s\n' % self._intf_names(l)[0] for l in self.cut)
+                subprocess.run(['ip', '-force', '-batch', '-'], input=lines, universal_newlines=True,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            else:
+                subprocess.call(['ip', 'link', 'del', UNDERLAY_DEV], stderr=subprocess.DEVNULL)
+
+
+
+## COMBINED CLI ##
+##################
+
+class ShardCLI(cmd.Cmd):
+    # Mininet CLI style console over all shards: '<node> <command>' runs the command on the node
+    # in its shard, with node names in the command replaced by their IPs (as in 'h1 ping -c1 h2').
+
+    prompt = 'sharded> '
+
+    def __init__(self, runner):
+        cmd.Cmd.__init__(self)
+        self.runner = runner
+        graph = runner.graph
+        self.ips = dict((graph.names[idx], graph.ip_str(idx)) for idx in graph.hosts())
+
+    def emptyline(self):
+        pass
+
+    def do_shards(self, _):
+        "Shard sizes and worker processes (cpu time, peak rss, open fds)."
+        print(self.runner.describe())
+        for status in self.runner.shard_status():
+            print("  shard%(shard)-3d pid %(pid)-7d %(switches)5d switches %(hosts)6d hosts %(links)6d links  "
+                  "cpu %(cpu_s)8.2fs  rss %(max_rss_kb)8d kB  fds %(fds)d" % status)
+
+    def do_nodes(self, _):
+        "All nodes, by shard."
+        runner = self.runner
+        for part in range(runner.shards):
+            print("shard%d: %s" % (part, ' '.join(runner.graph.names[idx] for idx in range(runner.graph.node_count)
+                                                  if runner.shard[idx] == part)))
+
+    def do_stats(self, _):
+        "Busiest links of the last samples (with run --stats)."
+        collector = self.runner.collector
+        if collector is None:
+            print("No switch statistics, start with --stats")
+            return
+        throughput = sorted(collector.link_throughput(self.runner.graph).items(), key=lambda item: -item[1])
+        for (src, src_port, dst, dst_port), bps in throughput[:20]:
+            print("%s:%d -> %s:%d %12.0f bit/s" % (src, src_port, dst, dst_port, bps))
+
+    def do_sh(self, line):
+        "Runs a shell command on the host (root namespace, all OVS bridges)."
+        os.system(line)
+
+    def do_exit(self, _):
+        "Stops all shards."
+        return True
+
+    do_EOF = do_exit
+
+    def default(self, line):
+        node, _, command = line.partition(' ')
+        if node not in self.runner.graph.index:
+            print("*** Unknown command or node: "+ line)
+            return
+        command = ' '.join(self.ips.get(word, word) for word in command.split())
+        try:
+            print(self.runner.node_cmd(node, command), end='')
+        except RuntimeError as e:
+            print("*** %s" % e)
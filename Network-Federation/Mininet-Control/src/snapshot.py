@@ -0,0 +1,243 @@
+__author__ = 'Constantin'
+
+# Snapshots of the OVS state of a running topology, so that a warmed-up network (provisioned by
+# OVX, with the controllers' and proactive flows installed) can be brought back after a restart
+# in seconds, instead of provisioning and warming it up again:
+#   sudo python topoctl.py snapshot cloud1.ovx --out cloud1.snap.tgz
+#   sudo python topoctl.py run cloud1.ovx --restore cloud1.snap.tgz
+# A snapshot is one gzipped tar archive: manifest.json (format version, topology name and
+# fingerprint, and per bridge its controllers, fail mode, protocols, other_config and virtual
+# ports, e.g. the GW's GRE tunnels, with their port numbers) and flows/<bridge>.flows, the
+# bridge's flow table as 'ovs-ofctl add-flows' lines (dump-flows without the counters).
+# All bridges are read with one ovs-vsctl run and one dump-flows per bridge, in parallel.
+# Restoring reapplies the configuration in one ovs-vsctl transaction and every flow table with
+# one 'ovs-ofctl replace-flows' run per bridge (which only touches differing flows), in parallel,
+# and then the snapshot's controllers. 'run --restore' keeps the controllers of the current run
+# instead (its --ofc_ip, controller pool or proxy), as the snapshot's ones may be gone by now.
+# Controllers connected during the restore see the flow tables change under them.
+# Group and meter tables are not part of a snapshot (no topology of this directory uses them).
+
+#Python system imports:
+import hashlib
+import io
+import json
+import os
+import tarfile
+import tempfile
+import time
+
+
+
+## SNAPSHOT FORMAT ##
+#####################
+
+SNAPSHOT_FORMAT = 1
+MANIFEST = 'manifest.json'
+FLOWS_DIR = 'flows'
+
+# Counters and ages of dumped flows, which add-flows does not take:
+_FLOW_STAT_FIELDS = ('duration', 'n_packets', 'n_bytes', 'idle_age', 'hard_age')
+
+# Interface types of the ports mininet creates itself (veth links, the bridge's own port):
+_MININET_PORT_TYPES = ('', 'system', 'internal')
+
+
+def graph_fingerprint(graph):
+    # Hash of the nodes, addresses and links of a graph, to tell whether a snapshot was
+    # taken of the same topology:
+    digest = hashlib.sha256('\n'.join(graph.names).encode('utf-8'))
+    for values in (graph.kinds, graph.dpid, graph.ip, graph.mac, graph.link_src, graph.link_src_port,
+                   graph.link_dst, graph.link_dst_port):
+        digest.update(bytes(values))
+    return digest.hexdigest()[:16]
+
+
+def flow_lines(output):
+    # 'ovs-ofctl dump-flows' output -> 'ovs-ofctl add-flows' lines, in table and priority order:
+    lines = []
+    for line in output.splitlines():
+        line = line.strip()
+        if ' actions=' not in line:
+            continue
+        head, _, actions = line.partition(' actions=')
+        fields = [field for field in head.split(', ') if field.partition('=')[0] not in _FLOW_STAT_FIELDS]
+        lines.append(','.join(fields) +' actions='+ actions +'\n')
+    return lines
+
+
+def _ovsdb_value(value):
+    # A value of 'ovs-vsctl --format=json' output: ["set", [...]], ["map", [[key, value], ...]],
+    # ["uuid", "..."] or an atom.
+    if isinstance(value, list):
+        kind, data = value
+        if kind == 'set':
+            return [_ovsdb_value(item) for item in data]
+        if kind == 'map':
+            return dict((_ovsdb_value(key), _ovsdb_value(item)) for key, item in data)
+        return data
+    return value
+
+
+def _as_list(value):
+    # Sets with a single element are printed as that element:
+    return value if isinstance(value, list) else [value]
+
+
+def _ovsdb_tables(output):
+    # The tables of several 'list' commands of one 'ovs-vsctl --format=json' run -> lists of row dicts:
+    decoder, tables, pos = json.JSONDecoder(), [], 0
+    output = output.strip()
+    while pos < len(output):
+        table, pos = decoder.raw_decode(output, pos)
+        tables.append([dict(zip(table['headings'], [_ovsdb_value(value) for value in row]))
+                       for row in table['data']])
+        while pos < len(output) and output[pos].isspace():
+            pos += 1
+    return tables
+
+
+def _ofctl_args(bridge):
+    # OpenFlow versions of a bridge restricted to some (e.g. OpenFlow13 only), for ovs-ofctl:
+    return ['-O', ','.join(bridge['protocols'])] if bridge.get('protocols') else []
+
+
+
+## SNAPSHOT ##
+##############
+
+def read_bridges(run, switches):
+    # -> {bridge name: {controllers, fail_mode, protocols, other_config, ports}} of the switches,
+    # from one ovs-vsctl run over the Bridge, Controller, Port and Interface tables.
+    output = run(['ovs-vsctl', '--format=json',
+                  '--', '--columns=name,controller,fail_mode,protocols,other_config,ports', 'list', 'Bridge',
+                  '--', '--columns=_uuid,target', 'list', 'Controller',
+                  '--', '--columns=_uuid,interfaces', 'list', 'Port',
+                  '--', '--columns=_uuid,name,type,options,ofport', 'list', 'Interface'])
+    bridges, controllers, ports, interfaces = _ovsdb_tables(output)
+    targets = dict((row['_uuid'], row['target']) for row in controllers)
+    port_interfaces = dict((row['_uuid'], _as_list(row['interfaces'])) for row in ports)
+    interfaces = dict((row['_uuid'], row) for row in interfaces)
+    wanted, state = set(switches), {}
+    for row in bridges:
+        if row['name'] not in wanted:
+            continue
+        virtual_ports = []
+        for port in _as_list(row['ports']):
+            for interface in (interfaces[uuid] for uuid in port_interfaces[port]):
+                if interface['type'] not in _MININET_PORT_TYPES:
+                    virtual_ports.append({'name': interface['name'], 'type': interface['type'],
+                                          'options': interface['options'], 'ofport': interface['ofport']})
+        state[row['name']] = {'controllers': sorted(targets[uuid] for uuid in _as_list(row['controller'])),
+                              'fail_mode': ''.join(_as_list(row['fail_mode'])),
+                              'protocols': sorted(_as_list(row['protocols'])),
+                              'other_config': row['other_config'],
+                              'ports': sorted(virtual_ports, key=lambda port: port['name'])}
+    missing = wanted - set(state)
+    if missing:
+        raise ValueError("%d switches are no OVS bridges, e.g. %s" % (len(missing), sorted(missing)[0]))
+    return state
+
+
+def take_snapshot(graph, path, workers=None):
+    # Writes the state of all switches of the running graph to the archive at path.
+    # Returns the manifest.
+    from bringup import DEFAULT_WORKERS, _run_cmd, run_parallel
+    start = time.time()
+    switches = [graph.names[idx] for idx in graph.switches()]
+    bridges = read_bridges(_run_cmd, switches)
+
+    def dump(switch):
+        return flow_lines(_run_cmd(['ovs-ofctl'] + _ofctl_args(bridges[switch]) + ['dump-flows', switch]))
+    flows = dict(zip(switches, run_parallel(dump, switches, workers or DEFAULT_WORKERS)))
+    manifest = {'format': SNAPSHOT_FORMAT, 'topology': graph.name, 'fingerprint': graph_fingerprint(graph),
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'), 'bridges': bridges,
+                'flows': dict((switch, len(lines)) for switch, lines in flows.items())}
+
+    def add(archive, name, data):
+        info = tarfile.TarInfo(name)
+        info.size, info.mtime = len(data), int(start)
+        archive.addfile(info, io.BytesIO(data))
+    with tarfile.open(path, 'w:gz') as archive:
+        add(archive, MANIFEST, json.dumps(manifest, indent=1, sort_keys=True).encode('utf-8'))
+        for switch in switches:
+            add(archive, '%s/%s.flows' % (FLOWS_DIR, switch), ''.join(flows[switch]).encode('utf-8'))
+    manifest['snapshot_s'] = time.time() - start
+    return manifest
+
+
+def read_manifest(archive):
+    manifest = json.loads(archive.extractfile(MANIFEST).read().decode('utf-8'))
+    if manifest.get('format') != SNAPSHOT_FORMAT:
+        raise ValueError("Snapshot format %s is not supported (expected %d)" % (manifest.get('format'), SNAPSHOT_FORMAT))
+    return manifest
+
+
+
+## RESTORE ##
+#############
+
+def add_bridge_config(batch, switch, bridge):
+    # Queues a bridge's configuration (without its controllers) and virtual ports:
+    if bridge['fail_mode']:
+        batch.add('set-fail-mode', switch, bridge['fail_mode'])
+    else:
+        batch.add('del-fail-mode', switch)
+    batch.add('set', 'bridge', switch, 'protocols=[%s]' % ','.join(bridge['protocols']))
+    for key, value in sorted(bridge['other_config'].items()):
+        batch.add('set', 'bridge', switch, 'other_config:%s="%s"' % (key, value))
+    for port in bridge['ports']:
+        settings = ['type=' + port['type']]
+        settings.extend('options:%s="%s"' % item for item in sorted(port['options'].items()))
+        if isinstance(port['ofport'], int) and port['ofport'] > 0:
+            settings.append('ofport_request=%d' % port['ofport'])
+        batch.add('--may-exist', 'add-port', switch, port['name'])
+        batch.add('set', 'interface', port['name'], *settings)
+    return batch
+
+
+def restore_snapshot(graph, path, controllers=True, workers=None):
+    # Restores the snapshot at path onto the running switches of graph: configuration and
+    # virtual ports, then the flow tables, then (unless controllers is False) the controllers.
+    # Returns {phase: seconds}.
+    from bringup import DEFAULT_WORKERS, OVSBatch, PhaseTimer, _run_cmd, run_parallel
+    timer = PhaseTimer()
+    switches = set(graph.names[idx] for idx in graph.switches())
+    with tarfile.open(path, 'r:gz') as archive, tempfile.TemporaryDirectory(prefix='mn-snapshot-') as flow_dir:
+        manifest = read_manifest(archive)
+        bridges = manifest['bridges']
+        unknown = sorted(set(bridges) - switches)
+        if unknown:
+            raise ValueError("The snapshot has %d switches which %s does not, e.g. %s"
+                             % (len(unknown), graph.name, unknown[0]))
+        if manifest['fingerprint'] != graph_fingerprint(graph):
+            print("WARNING: the snapshot was taken of another version of %s (%s)" % (manifest['topology'], path))
+
+        with timer.phase('config'):
+            batch = OVSBatch()
+            for switch in sorted(bridges):
+                add_bridge_config(batch, switch, bridges[switch])
+            batch.flush()
+
+        with timer.phase('flows'):
+            for switch in bridges:
+                member = archive.getmember('%s/%s.flows' % (FLOWS_DIR, switch))
+                with open(os.path.join(flow_dir, switch + '.flows'), 'wb') as flow_file:
+                    flow_file.write(archive.extractfile(member).read())
+
+            def replace(switch):
+                _run_cmd(['ovs-ofctl'] + _ofctl_args(bridges[switch]) +
+                         ['replace-flows', switch, os.path.join(flow_dir, switch + '.flows')])
+            run_parallel(replace, sorted(bridges), workers or DEFAULT_WORKERS)
+
+    if controllers:
+        with timer.phase('controllers'):
+            batch = OVSBatch()
+            for switch in sorted(bridges):
+                if bridges[switch]['controllers']:
+                    batch.add('set-controller', switch, *bridges[switch]['controllers'])
+                else:
+                    batch.add('del-controller', switch)
+            batch.flush()
+    print("*** Restored %d switches with %d flows from %s"
+          % (len(bridges), sum(manifest['flows'].values()), path))
+    return timer.as_dict()
@@ -0,0 +1,187 @@
+__author__ = 'Constantin'
+
+# Static neighbour (ARP) entries for every known host, so that no host has to broadcast ARP
+# requests, which would otherwise be flooded over the GW's GRE tunnel(s) into the remote clouds:
+#   sudo python topoctl.py run cloud1.ovx --static-arp --arp-remote cloud2.ovx --arp-responder
+# The known hosts are those of the topology and of the remote clouds' topologies (their HOSTS
+# ip/mac tables). Remote subnets outside of the local one are routed on-link, through the host's
+# interface, so that remote hosts are reached over the GRE tunnel without a router.
+# All entries are written to one template 'ip -batch' file, which every host runs in its own
+# network namespace (with its interface filled in), all hosts in parallel. Every host holds an
+# entry per known host, so n hosts need n*n kernel neighbour entries in total.
+# The optional ARP responder answers the ARP requests for all known hosts at the GWs, by flows
+# that turn a request into its reply (as OVS' ARP responder of OpenStack Neutron does), for
+# requests of hosts without static entries and requests coming in through the tunnels.
+# The counters of broadcast traffic (requests answered by the GWs, packets through their GRE
+# ports, packets of the proactive flood flows) are taken after the install and at stop.
+
+#Python system imports:
+import os
+import tempfile
+
+#Own Imports:
+from address_plan import Subnet, format_ip, parse_ip
+from topology import gre_port_numbers
+
+
+
+## NEIGHBOUR TABLES ##
+######################
+
+def neighbour_table(graph, remote_graphs=()):
+    # ip -> mac of all hosts of graph and of the remote clouds' graphs:
+    table = {}
+    for source in [graph] + list(remote_graphs):
+        for idx in source.hosts():
+            ip, mac = source.ip_str(idx), source.mac_str(idx)
+            if table.setdefault(ip, mac) != mac:
+                raise ValueError("Host %s of %s has the ip %s of another host (mac %s)"
+                                 % (source.names[idx], source.name, ip, table[ip]))
+    return table
+
+
+def remote_subnets(graph, remote_graphs):
+    # CIDRs of the remote clouds' subnets which the local hosts do not reach on-link:
+    hosts = graph.hosts()
+    local = Subnet(graph.ip[hosts[0]], graph.prefix_len) if hosts else None
+    subnets = set()
+    for remote in remote_graphs:
+        for idx in remote.hosts()[:1]:
+            subnet = Subnet(remote.ip[idx], remote.prefix_len)
+            if local is None or subnet.network not in local or subnet.prefix_len < local.prefix_len:
+                subnets.add(format_ip(subnet.network) +'/'+ str(subnet.prefix_len))
+    return sorted(subnets)
+
+
+def table_changes(old_table, new_table):
+    # -> (entries added or changed, ips removed) between two neighbour tables:
+    changed = dict((ip, mac) for ip, mac in new_table.items() if old_table.get(ip) != mac)
+    return changed, sorted(ip for ip in old_table if ip not in new_table)
+
+
+
+## HOST ENTRIES ##
+##################
+
+# Placeholder of the host's interface in the batch file:
+DEV = '@DEV@'
+
+# Default gc_thresh3 of the kernel's neighbour table, shared by all network namespaces (kernels
+# before 4.19 count permanent entries against it, too):
+NEIGH_TABLE_LIMIT = 1024
+
+
+def neighbour_commands(table, routes=(), removed=()):
+    # 'ip -batch' lines of the routes and entries, DEV standing for the host's interface:
+    lines = ['route replace %s dev %s\n' % (cidr, DEV) for cidr in routes]
+    # (flush, unlike del, does not fail on hosts without the entry:)
+    lines.extend('neigh flush to %s dev %s nud permanent\n' % (ip, DEV) for ip in removed)
+    lines.extend('neigh replace %s lladdr %s dev %s nud permanent\n' % (ip, mac, DEV) for ip, mac in table.items())
+    return lines
+
+
+def install_neighbours(hosts, table, routes=(), removed=(), total=None, workers=None):
+    # Installs the entries (without a host's own one) and routes on the mininet hosts with one
+    # 'ip -batch' run per host, all hosts in parallel. total: the entries of all hosts in the
+    # end, the neighbour table limit is raised for (default: every host holds all of table).
+    from bringup import DEFAULT_WORKERS, _run_cmd, run_parallel
+    hosts = list(hosts)
+    if not hosts or not (table or routes or removed):
+        return
+    total = len(hosts) * len(table) if total is None else total
+    if total > NEIGH_TABLE_LIMIT:
+        _run_cmd(['sysctl', '-q', '-w', 'net.ipv4.neigh.default.gc_thresh3=%d' % (total + NEIGH_TABLE_LIMIT),
+                  'net.ipv4.neigh.default.gc_thresh2=%d' % (total + NEIGH_TABLE_LIMIT // 2)])
+    with tempfile.TemporaryDirectory(prefix='mn-arp-') as batch_dir:
+        path = os.path.join(batch_dir, 'neigh.batch')
+        with open(path, 'w') as batch_file:
+            batch_file.writelines(neighbour_commands(table, routes, removed))
+
+        # ip prints nothing, unless a command failed:
+        def install(host):
+            own_entry = '/^neigh replace %s /d' % host.IP().replace('.', '\\.')
+            return host.name, host.cmd("sed -e '%s' -e 's/%s/%s/' %s | ip -force -batch -"
+                                       % (own_entry, DEV, host.defaultIntf().name, path)).strip()
+        errors = [(name, output) for name, output in run_parallel(install, hosts, workers or DEFAULT_WORKERS)
+                  if output]
+    if errors:
+        raise RuntimeError("ip failed on %d hosts, e.g. %s: %s" % (len(errors), errors[0][0], errors[0][1]))
+
+
+
+## GW ARP RESPONDER ##
+######################
+
+# The responder flows carry a cookie of their own (not the proactive flows' one), and take
+# precedence over all proactive flows:
+ARP_COOKIE = 0xa4b
+PRIO_ARP_RESPONDER = 400
+
+
+def responder_flows(table):
+    # 'ovs-ofctl add-flows' lines replying to ARP requests for every ip of table out of the
+    # request's in_port, with the mac of table as sender:
+    flows = []
+    for ip, mac in table.items():
+        flows.append('cookie=0x%x,priority=%d,arp,arp_op=1,arp_tpa=%s,actions='
+                     'move:NXM_OF_ETH_SRC[]->NXM_OF_ETH_DST[],mod_dl_src:%s,load:0x2->NXM_OF_ARP_OP[],'
+                     'move:NXM_NX_ARP_SHA[]->NXM_NX_ARP_THA[],move:NXM_OF_ARP_SPA[]->NXM_OF_ARP_TPA[],'
+                     'load:0x%s->NXM_NX_ARP_SHA[],load:0x%08x->NXM_OF_ARP_SPA[],in_port\n'
+                     % (ARP_COOKIE, PRIO_ARP_RESPONDER, ip, mac, mac.replace(':', ''), parse_ip(ip)))
+    return flows
+
+
+def install_responders(gateways, table, workers=None):
+    # Replaces the responder flows of all GW switches by the ones of table, GWs in parallel.
+    from bringup import DEFAULT_WORKERS, _run_cmd, run_parallel
+    switches = sorted(set(gateway['switch'] for gateway in gateways))
+    if not switches:
+        return
+    with tempfile.TemporaryDirectory(prefix='mn-arp-') as flow_dir:
+        path = os.path.join(flow_dir, 'responder.flows')
+        with open(path, 'w') as flow_file:
+            flow_file.writelines(responder_flows(table))
+
+        def install(switch):
+            _run_cmd(['ovs-ofctl', 'del-flows', switch, 'cookie=0x%x/-1' % ARP_COOKIE])
+            _run_cmd(['ovs-ofctl', 'add-flows', switch, path])
+        run_parallel(install, switches, workers or DEFAULT_WORKERS)
+
+
+
+## BROADCAST COUNTERS ##
+########################
+
+FLOOD_MATCH = 'dl_dst=01:00:00:00:00:00/01:00:00:00:00:00'
+COUNTERS = ('arp_answered', 'gre_tx_packets', 'gre_rx_packets', 'flooded_packets')
+
+
+def broadcast_counters(graph, gateways, workers=None):
+    # Current counters of the running switches:
+    #   arp_answered    - ARP requests answered by the responder flows of the GWs,
+    #   gre_*_packets   - packets through the GRE ports of the GWs,
+    #   flooded_packets - packets of the proactive broadcast/multicast flows, on all switches.
+    from bringup import DEFAULT_WORKERS, run_parallel
+    from proactive_flows import FLOW_COOKIE
+    from stats_collector import _run_ofctl, parse_flow_stats, parse_port_stats
+    counters = dict((name, 0) for name in COUNTERS)
+    for gateway in gateways:
+        switch = gateway['switch']
+        counters['arp_answered'] += sum(packets for packets, _ in parse_flow_stats(
+            _run_ofctl(['dump-flows', switch, 'cookie=0x%x/-1' % ARP_COOKIE])).values())
+        ports = parse_port_stats(_run_ofctl(['dump-ports', switch]))
+        for port_name, number in gre_port_numbers(gateway, graph).items():
+            stats = ports.get(port_name, ports.get(str(number), {}))
+            counters['gre_tx_packets'] += stats.get('tx_packets', 0)
+            counters['gre_rx_packets'] += stats.get('rx_packets', 0)
+
+    def flooded(switch):
+        flows = parse_flow_stats(_run_ofctl(['dump-flows', switch, 'cookie=0x%x/-1' % FLOW_COOKIE]))
+        return sum(packets for key, (packets, _) in flows.items() if FLOOD_MATCH in key)
+    switches = [graph.names[idx] for idx in graph.switches()]
+    counters['flooded_packets'] = sum(run_parallel(flooded, switches, workers or DEFAULT_WORKERS))
+    return counters
+
+
+def counter_deltas(before, after):
+    return dict((name, after[name] - before[name]) for name in COUNTERS)
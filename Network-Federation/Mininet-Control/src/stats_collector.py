@@ -0,0 +1,354 @@
+__author__ = 'Constantin'
+
+# Polls 'ovs-ofctl dump-ports' and 'dump-flows' of all switches (concurrently, every interval
+# seconds) while a topology runs, and keeps the counter deltas in a TimeSeriesStore:
+# - one series per (switch, 'port', port, metric) and (switch, 'flow', match, metric),
+# - ring buffers of fixed capacity per resolution level, level l holding sums of factor^l polls,
+#   so a long run keeps e.g. 2 min at 1s, 20 min at 10s and 3h at 100s in bounded memory,
+# - no packet capture: only OpenFlow counters are read.
+# TopologyRunner starts it with stats={...} (see 'topoctl.py run --stats'), the store is written
+# as JSON when the network stops.
+
+#Python system imports:
+import json
+import re
+import subprocess
+import threading
+import time
+from array import array
+
+
+
+## TIME SERIES STORE ##
+#######################
+
+class _Level(object):
+    # One resolution of all series: column-major chunks of CHUNK_ROWS series x capacity samples,
+    # so that the column of a sample is one slice per chunk (cleared and copied at C speed).
+
+    def __init__(self, capacity, ticks_per_sample):
+        self.capacity = capacity
+        self.ticks_per_sample = ticks_per_sample
+        self.chunks = []
+        self.accumulators = []          # sums of the running sample (levels > 0 only)
+        self.timestamps = array('d', [0.0] * capacity)
+        self.samples = 0                # samples written so far
+
+
+class TimeSeriesStore(object):
+    # Ring buffered, array backed series of float values, all sampled at the same ticks.
+    # Memory: levels x capacity x max_series x 4 bytes at most, allocated CHUNK_ROWS series at a time.
+    # Series without a value for stale_ticks ticks are dropped and their rows reused.
+
+    CHUNK_ROWS = 1024
+
+    def __init__(self, capacity=120, levels=3, factor=10, max_series=200000, stale_ticks=None):
+        self.capacity = capacity
+        self.factor = factor
+        self.max_series = max_series
+        self.stale_ticks = stale_ticks or capacity
+        self.levels = [_Level(capacity, factor ** level) for level in range(levels)]
+        self.rows = {}                  # series key -> row
+        self.keys = []                  # row -> series key (None if free)
+        self.free_rows = []
+        self.last_tick = array('l')     # row -> last tick written
+        self.tick = -1
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    ## Rows ##
+    def _add_chunk(self):
+        size = self.CHUNK_ROWS * self.capacity
+        for level_no, level in enumerate(self.levels):
+            level.chunks.append(array('f', bytes(4 * size)))
+            if level_no:
+                level.accumulators.append(array('f', bytes(4 * self.CHUNK_ROWS)))
+        self.last_tick.extend([-1] * self.CHUNK_ROWS)
+
+    def _row(self, key):
+        row = self.rows.get(key)
+        if row is not None:
+            return row
+        if self.free_rows:
+            row = self.free_rows.pop()
+        elif len(self.keys) < self.max_series:
+            row = len(self.keys)
+            if row % self.CHUNK_ROWS == 0:
+                self._add_chunk()
+            self.keys.append(None)
+        else:
+            self.dropped += 1
+            return None
+        self.rows[key] = row
+        self.keys[row] = key
+        return row
+
+    def _clear_row(self, row):
+        chunk, offset = divmod(row, self.CHUNK_ROWS)
+        for level in self.levels:
+            data = level.chunks[chunk]
+            for slot in range(self.capacity):
+                data[slot * self.CHUNK_ROWS + offset] = 0.0
+            if level.accumulators:
+                level.accumulators[chunk][offset] = 0.0
+
+    def _expire(self):
+        # Frees the rows of series without values for stale_ticks ticks.
+        oldest = self.tick - self.stale_ticks
+        for row, key in enumerate(self.keys):
+            if key is not None and self.last_tick[row] < oldest:
+                del self.rows[key]
+                self.keys[row] = None
+                self._clear_row(row)
+                self.free_rows.append(row)
+
+    ## Writing ##
+    def begin_tick(self, timestamp=None):
+        # Starts the next sample of all series (values not written in this tick are 0).
+        with self._lock:
+            self.tick += 1
+            raw = self.levels[0]
+            slot = self.tick % self.capacity
+            zeros = array('f', bytes(4 * self.CHUNK_ROWS))
+            for data in raw.chunks:
+                data[slot * self.CHUNK_ROWS:(slot + 1) * self.CHUNK_ROWS] = zeros
+            raw.timestamps[slot] = timestamp if timestamp is not None else time.time()
+            raw.samples += 1
+            if self.tick and self.tick % self.stale_ticks == 0:
+                self._expire()
+
+    def add(self, key, value):
+        with self._lock:
+            row = self._row(key)
+            if row is None:
+                return
+            chunk, offset = divmod(row, self.CHUNK_ROWS)
+            self.last_tick[row] = self.tick
+            raw = self.levels[0]
+            raw.chunks[chunk][(self.tick % self.capacity) * self.CHUNK_ROWS + offset] += value
+            for level in self.levels[1:]:
+                level.accumulators[chunk][offset] += value
+
+    def end_tick(self):
+        # Completes the downsampled samples whose last tick this was.
+        with self._lock:
+            zeros = array('f', bytes(4 * self.CHUNK_ROWS))
+            timestamp = self.levels[0].timestamps[self.tick % self.capacity]
+            for level in self.levels[1:]:
+                if (self.tick + 1) % level.ticks_per_sample:
+                    continue
+                slot = level.samples % self.capacity
+                for data, accumulator in zip(level.chunks, level.accumulators):
+                    data[slot * self.CHUNK_ROWS:(slot + 1) * self.CHUNK_ROWS] = accumulator
+                    accumulator[:] = zeros
+                level.timestamps[slot] = timestamp
+                level.samples += 1
+
+    ## Reading ##
+    def series(self, key, level=0):
+        # [(timestamp, value), ...] of the samples in the ring, oldest first.
+        with self._lock:
+            row = self.rows.get(key)
+            resolution = self.levels[level]
+            count = min(resolution.samples, self.capacity)
+            if row is None or not count:
+                return []
+            chunk, offset = divmod(row, self.CHUNK_ROWS)
+            data = resolution.chunks[chunk]
+            first = resolution.samples - count
+            return [(resolution.timestamps[sample % self.capacity],
+                     data[(sample % self.capacity) * self.CHUNK_ROWS + offset])
+                    for sample in range(first, resolution.samples)]
+
+    def latest(self, key, samples=1, level=0):
+        # Mean of the last samples values of a series, None if unknown.
+        values = [value for _, value in self.series(key, level)[-samples:]]
+        return sum(values) / len(values) if values else None
+
+    def series_keys(self, prefix=()):
+        with self._lock:
+            return [key for key in self.rows if key[:len(prefix)] == prefix]
+
+    def memory_bytes(self):
+        return sum(data.itemsize * len(data) for level in self.levels for data in level.chunks + level.accumulators)
+
+    def as_dict(self, interval=None):
+        levels = {}
+        for level_no, level in enumerate(self.levels):
+            series = {}
+            for key in sorted(self.series_keys(), key=str):
+                values = self.series(key, level_no)
+                if any(value for _, value in values):
+                    series['/'.join(str(part) for part in key)] = [value for _, value in values]
+            count = min(level.samples, self.capacity)
+            timestamps = [level.timestamps[sample % self.capacity]
+                          for sample in range(level.samples - count, level.samples)]
+            levels[str(level_no)] = {'seconds_per_sample': interval * level.ticks_per_sample if interval else None,
+                                     'timestamps': timestamps, 'series': series}
+        return {'ticks': self.tick + 1, 'series': len(self.rows), 'dropped_series': self.dropped,
+                'memory_bytes': self.memory_bytes(), 'levels': levels}
+
+
+
+## OVS-OFCTL PARSING ##
+#######################
+
+PORT_METRICS = ('rx_packets', 'rx_bytes', 'rx_dropped', 'rx_errors',
+                'tx_packets', 'tx_bytes', 'tx_dropped', 'tx_errors')
+
+_PORT_STATS = re.compile(r'port\s+"?([\w.-]+)"?:\s+rx pkts=(\S+), bytes=(\S+), drop=(\S+), errs=(\S+),.*?'
+                         r'tx pkts=(\S+), bytes=(\S+), drop=(\S+), errs=(\S+),', re.S)
+# Flow fields that are counters or ages rather than part of the flow's identity:
+_FLOW_STAT_FIELDS = ('cookie', 'duration', 'n_packets', 'n_bytes', 'idle_age', 'hard_age',
+                     'idle_timeout', 'hard_timeout', 'reset_counts', 'send_flow_rem')
+
+
+def _counter(value):
+    # ovs-ofctl prints '?' for counters a port does not support:
+    return int(value) if value.isdigit() else 0
+
+
+def parse_port_stats(output):
+    # 'ovs-ofctl dump-ports' output -> {port: {metric: counter}}
+    ports = {}
+    for match in _PORT_STATS.finditer(output):
+        ports[match.group(1)] = dict(zip(PORT_METRICS, [_counter(value) for value in match.groups()[1:]]))
+    return ports
+
+
+def parse_flow_stats(output):
+    # 'ovs-ofctl dump-flows' output -> {flow key: (packets, bytes)}, the key being the flow's
+    # table, priority and match (the identity of an OpenFlow flow).
+    flows = {}
+    for line in output.splitlines():
+        line = line.strip()
+        if ' actions=' not in line:
+            continue
+        fields = line.split(' actions=')[0].replace(', ', ',').replace(' ', ',').split(',')
+        packets = octets = 0
+        key = []
+        for field in fields:
+            name, _, value = field.partition('=')
+            if name == 'n_packets':
+                packets = _counter(value)
+            elif name == 'n_bytes':
+                octets = _counter(value)
+            elif name and name not in _FLOW_STAT_FIELDS:
+                key.append(field)
+        flows[','.join(key)] = (packets, octets)
+    return flows
+
+
+
+## COLLECTOR ##
+###############
+
+def _run_ofctl(args):
+    try:
+        return subprocess.run(['ovs-ofctl'] + args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              universal_newlines=True).stdout
+    except OSError:
+        return ''
+
+
+class StatsCollector(object):
+    # Background thread polling the port (and optionally flow) counters of switches every interval
+    # seconds into store. Counter deltas are stored, a counter going backwards (a re-added flow or
+    # port) counts from 0 again.
+
+    def __init__(self, switches, interval=1.0, store=None, flows=True, workers=None, run=_run_ofctl):
+        self.switches = list(switches)
+        self.interval = interval
+        self.store = store or TimeSeriesStore()
+        self.flows = flows
+        self.workers = workers
+        self.run = run
+        self.poll_seconds = []          # duration of every poll, to tell an overloaded interval
+        self._last = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _poll_switch(self, switch):
+        ports = parse_port_stats(self.run(['dump-ports', switch]))
+        flows = parse_flow_stats(self.run(['dump-flows', switch])) if self.flows else {}
+        return switch, ports, flows
+
+    def _delta(self, key, counter):
+        last = self._last.get(key)
+        self._last[key] = counter
+        if last is None:
+            return None
+        return counter - last if counter >= last else counter
+
+    def poll(self):
+        from bringup import DEFAULT_WORKERS, run_parallel
+        start = time.time()
+        results = run_parallel(self._poll_switch, self.switches, self.workers or DEFAULT_WORKERS)
+        store = self.store
+        store.begin_tick(start)
+        for switch, ports, flows in results:
+            for port, counters in ports.items():
+                for metric, counter in counters.items():
+                    key = (switch, 'port', port, metric)
+                    delta = self._delta(key, counter)
+                    # Idle ports are kept (as 0), idle flows are not, as flows come and go:
+                    if delta is not None:
+                        store.add(key, delta)
+            for flow, counters in flows.items():
+                for metric, counter in zip(('packets', 'bytes'), counters):
+                    key = (switch, 'flow', flow, metric)
+                    delta = self._delta(key, counter)
+                    if delta:
+                        store.add(key, delta)
+        store.end_tick()
+        if len(self._last) > 2 * store.max_series:
+            # Forget the counters of flows gone long ago:
+            self._last = dict((key, counter) for key, counter in self._last.items() if key in store.rows)
+        self.poll_seconds.append(time.time() - start)
+        return results
+
+    def _run(self):
+        next_poll = time.time()
+        while not self._stop.is_set():
+            self.poll()
+            next_poll += self.interval
+            # An overloaded poll skips the missed intervals instead of polling back to back:
+            while next_poll < time.time():
+                next_poll += self.interval
+            self._stop.wait(next_poll - time.time())
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='stats-collector')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def link_throughput(self, graph, samples=5, level=0):
+        # Bits per second of every link of the graph and direction, from the transmitting port's
+        # tx_bytes of the last samples: {(src, src_port, dst, dst_port): bps}.
+        seconds = self.interval * self.store.levels[level].ticks_per_sample
+        names, throughput = graph.names, {}
+        for link in range(graph.link_count):
+            src, src_port, dst, dst_port = graph.link(link)
+            for a, a_port, b, b_port in ((src, src_port, dst, dst_port), (dst, dst_port, src, src_port)):
+                if graph.is_switch(a):
+                    tx_bytes = self.store.latest((names[a], 'port', str(a_port), 'tx_bytes'), samples, level)
+                    if tx_bytes is not None:
+                        throughput[(names[a], a_port, names[b], b_port)] = tx_bytes * 8 / seconds
+        return throughput
+
+    def write(self, path):
+        results = self.store.as_dict(self.interval)
+        results['interval_s'] = self.interval
+        results['switches'] = len(self.switches)
+        results['poll_s'] = {'count': len(self.poll_seconds),
+                             'max': max(self.poll_seconds) if self.poll_seconds else None,
+                             'mean': sum(self.poll_seconds) / len(self.poll_seconds) if self.poll_seconds else None}
+        with open(path, 'w') as stats_file:
+            json.dump(results, stats_file, sort_keys=True)
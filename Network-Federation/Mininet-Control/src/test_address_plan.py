@@ -0,0 +1,76 @@
+__author__ = 'Constantin'
+
+#Python system imports:
+import pytest
+
+#Own Imports:
+from address_plan import (AddressCollision, AddressError, AddressExhausted, AddressPlan, Subnet,
+                          format_ip, format_macs, parse_ip)
+
+
+
+## SUBNETS ##
+#############
+
+def test_subnet_parse():
+    subnet = Subnet.parse('10.1.0.0/16')
+    assert (subnet.network, subnet.prefix_len, subnet.size) == (parse_ip('10.1.0.0'), 16, 65534)
+    assert parse_ip('10.1.255.254') in subnet and parse_ip('10.2.0.1') not in subnet
+    assert Subnet.parse('10.1.0.0').cidr == '10.1.0.0/16'
+    assert Subnet.parse('10.1.0.0', default_prefix_len=24).cidr == '10.1.0.0/24'
+
+
+@pytest.mark.parametrize('net_ip', ['10.0.0.0/7', '10.0.0.0/31', '10.0.0.0/33', '10.0.0.0/x', '10.0.0/16', '10.0.0.256/16'])
+def test_subnet_invalid(net_ip):
+    with pytest.raises(AddressError):
+        Subnet.parse(net_ip)
+
+
+
+## ALLOCATION ##
+################
+
+def test_allocation_skips_reserved():
+    plan = AddressPlan('10.0.0.0/24')
+    assert plan.reserve_ip('+2') == parse_ip('10.0.0.2')
+    assert plan.reserve_ip('10.0.0.4') == parse_ip('10.0.0.4')
+    assert [format_ip(ip) for ip in plan.allocate_ips(3)] == ['10.0.0.1', '10.0.0.3', '10.0.0.5']
+    assert format_macs(plan.allocate_macs(2)) == ['00:00:00:00:00:01', '00:00:00:00:00:02']
+
+
+def test_allocation_skip_to():
+    plan = AddressPlan('10.0.0.0/24')
+    plan.reserve_ip('10.0.0.11')
+    plan.reserve_ip('10.0.0.30')
+    plan.ips.skip_to(parse_ip('10.0.0.12'))
+    assert [format_ip(ip) for ip in plan.allocate_ips(1)] == ['10.0.0.12']
+    with pytest.raises(AddressCollision):
+        plan.reserve_ip('10.0.0.5')
+    assert parse_ip('10.0.0.30') not in plan.allocate_ips(20)
+
+
+def test_collision():
+    plan = AddressPlan('10.0.0.0/24')
+    plan.allocate_ips(10)
+    with pytest.raises(AddressCollision):
+        plan.reserve_ip('10.0.0.5')
+    plan.reserve_mac('00:00:00:00:01:11')
+    with pytest.raises(AddressCollision):
+        plan.reserve_mac(0x111)
+
+
+@pytest.mark.parametrize('ip', ['10.0.1.1', '10.0.0.0', '10.0.0.255', '+300'])
+def test_ip_outside_of_subnet(ip):
+    with pytest.raises(AddressError):
+        AddressPlan('10.0.0.0/24').reserve_ip(ip)
+
+
+def test_overflow():
+    plan = AddressPlan('10.0.0.0/30')
+    assert len(plan.allocate_ips(2)) == 2
+    with pytest.raises(AddressExhausted):
+        plan.allocate_ips(1)
+    plan = AddressPlan('10.0.0.0/29')
+    plan.reserve_ip('10.0.0.3')
+    with pytest.raises(AddressExhausted):
+        plan.allocate_ips(6)
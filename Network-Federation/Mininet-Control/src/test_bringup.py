@@ -0,0 +1,154 @@
+__author__ = 'Constantin'
+
+#Python system imports:
+import os
+
+import pytest
+
+#Own Imports:
+from bringup import OVSBatch, PhaseTimer, TCBatch, add_gateway_config, run_parallel
+from shaping import tc_commands
+from topology_loader import TOPOLOGY_DIR, FileTopology
+
+
+
+## PARALLEL EXECUTION ##
+########################
+
+def test_run_parallel_keeps_order():
+    assert run_parallel(lambda item: item * 2, range(100), workers=8) == [item * 2 for item in range(100)]
+    assert run_parallel(lambda item: item, [], workers=8) == []
+
+
+def test_run_parallel_raises_first_error():
+    def work(item):
+        if item == 3:
+            raise ValueError("item 3 failed")
+        return item
+    for workers in (1, 8):
+        with pytest.raises(ValueError, match='item 3'):
+            run_parallel(work, range(10), workers)
+
+
+def test_phase_timer_records_failed_phases():
+    timer = PhaseTimer()
+    with timer.phase('ok'):
+        pass
+    with pytest.raises(RuntimeError):
+        with timer.phase('failed'):
+            raise RuntimeError()
+    assert [name for name, _ in timer.phases] == ['ok', 'failed']
+
+
+
+## OVS-VSCTL BATCHING ##
+########################
+
+def test_ovs_batch_one_transaction():
+    chains = []
+    batch = OVSBatch(run=chains.append)
+    batch.add('add-br', 's1').add('set-fail-mode', 's1', 'secure')
+    assert len(batch) == 2
+    batch.flush()
+    assert chains == [['ovs-vsctl', '--', 'add-br', 's1', '--', 'set-fail-mode', 's1', 'secure']]
+    assert len(batch) == 0 and batch.flush() == []
+
+
+def test_ovs_batch_splits_at_arg_max():
+    batch = OVSBatch(run=lambda chain: chain)
+    for number in range(10000):
+        batch.add('--may-exist', 'add-port', 'SWITCH%d' % (number % 7), 'SWITCH%d-eth%d' % (number % 7, number))
+    commands = list(batch.commands)
+    chains = batch.flush()
+    assert len(chains) > 1
+    for chain in chains:
+        assert chain[:2] == ['ovs-vsctl', '--']
+        assert sum(len(arg) + 1 for arg in chain) <= OVSBatch.ARG_MAX + len('ovs-vsctl ')
+    # All commands, in order, each one whole in one chain:
+    joined = [arg for chain in chains for arg in chain[1:]]
+    assert joined == [arg for command in commands for arg in ['--'] + command]
+
+
+def test_ovs_batch_oversized_command():
+    # A single command beyond the limit still runs, in a chain of its own:
+    batch = OVSBatch(run=lambda chain: chain)
+    batch.ARG_MAX = 64
+    batch.add('add-br', 's1').add('set', 'bridge', 's1', 'other_config:x=' + 'y' * 100).add('add-br', 's2')
+    assert [len(chain) for chain in batch.flush()] == [4, 6, 4]
+
+
+def test_gateway_config():
+    topology = FileTopology(os.path.join(TOPOLOGY_DIR, 'cloud1.ovx.json'))
+    gateway = dict(topology.gateway, local_ip='10.1.1.20')
+    batch = add_gateway_config(OVSBatch(run=None), gateway, topology.build_graph())
+    assert batch.commands == [
+        ['set-controller', 'GW', 'tcp:192.168.1.42:6633', 'tcp:192.168.1.43:6633'],
+        ['--may-exist', 'add-port', 'GW', 'GW-gre1'],
+        ['set', 'interface', 'GW-gre1', 'type=gre', 'options:remote_ip=10.1.1.30', 'options:local_ip=10.1.1.20',
+         'ofport_request=2']]
+    # Without the graph, OVS picks the port numbers; without controllers, they are left alone:
+    batch = add_gateway_config(OVSBatch(run=None), dict(topology.gateway, controllers=None))
+    assert batch.commands == [['--may-exist', 'add-port', 'GW', 'GW-gre1'],
+                              ['set', 'interface', 'GW-gre1', 'type=gre', 'options:remote_ip=10.1.1.30']]
+
+
+
+## TC BATCHING ##
+#################
+
+def test_tc_commands():
+    assert tc_commands('s1-eth1') == []
+    assert tc_commands('s1-eth1', bw=10) == [
+        'qdisc add dev s1-eth1 root handle 5:0 htb default 1\n',
+        'class add dev s1-eth1 parent 5:0 classid 5:1 htb rate 10.000000Mbit burst 15k\n']
+    assert tc_commands('s1-eth1', delay=5, loss=1) == ['qdisc add dev s1-eth1 root handle 10: netem delay 5ms loss 1.00000%\n']
+    assert tc_commands('s1-eth1', bw=10, delay=2.5)[-1] == 'qdisc add dev s1-eth1 parent 5:1 handle 10: netem delay 2.5ms\n'
+
+
+class _Node(object):
+    # Stands in for a mininet node: its shell runs 'tc -batch FILE' and answers with output.
+
+    def __init__(self, name, in_namespace, output=''):
+        self.name = name
+        self.inNamespace = in_namespace
+        self.output = output
+        self.batches = []
+
+    def cmd(self, *args):
+        with open(args[-1]) as batch_file:
+            self.batches.append(batch_file.read())
+        return self.output
+
+
+class _Intf(object):
+
+    def __init__(self, node, name):
+        self.node = node
+        self.name = name
+
+
+def test_tc_batch_per_namespace():
+    root_batches = []
+
+    def run(args):
+        assert args[:3] == ['tc', '-force', '-batch']
+        with open(args[3]) as batch_file:
+            root_batches.append(batch_file.read())
+    switch, h1, h2 = _Node('s1', False), _Node('h1', True), _Node('h2', True)
+    batch = TCBatch(run=run, workers=4)
+    batch.shape(_Intf(switch, 's1-eth1'), bw=10).shape(_Intf(switch, 's1-eth2'), delay=5)
+    batch.shape(_Intf(h1, 'h1-eth0'), loss=1).shape(_Intf(h2, 'h2-eth0'), delay=1)
+    assert len(batch) == 5
+    batch.flush()
+    assert root_batches == [''.join(tc_commands('s1-eth1', bw=10) + tc_commands('s1-eth2', delay=5))]
+    assert h1.batches == [''.join(tc_commands('h1-eth0', loss=1))]
+    assert h2.batches == [''.join(tc_commands('h2-eth0', delay=1))]
+    assert len(batch) == 0
+
+
+def test_tc_batch_errors():
+    batch = TCBatch(run=None)
+    batch.shape(_Intf(_Node('h1', True, 'RTNETLINK answers: File exists'), 'h1-eth0'), delay=1)
+    batch.shape(_Intf(_Node('h2', True), 'h2-eth0'), delay=1)
+    with pytest.raises(RuntimeError, match='1 nodes, e.g. h1: RTNETLINK'):
+        batch.flush()
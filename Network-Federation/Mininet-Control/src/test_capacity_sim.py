@@ -0,0 +1,76 @@
+__author__ = 'Constantin'
+
+#Python system imports:
+import pytest
+
+numpy = pytest.importorskip('numpy')
+
+#Own Imports:
+from capacity_sim import CapacityModel, TrafficMatrix, simulate
+from topology import fat_tree, linear
+
+
+
+## PATHS AND OFFERED LOAD ##
+############################
+
+def path(model, src, dst):
+    _, edges, routable = model.paths([model.endpoint_index[src]], [model.endpoint_index[dst]])
+    assert routable.all()
+    return [model.edge_name(edge) for edge in edges]
+
+
+def test_fat_tree_paths():
+    model = CapacityModel(fat_tree(4))
+    # Between pods, via the lowest-numbered aggregation and core switches:
+    assert path(model, 'h1_1_1', 'h4_2_2') == ['h1_1_1->e1_1', 'e1_1->a1_1', 'a1_1->c1', 'c1->a4_1',
+                                               'a4_1->e4_2', 'e4_2->h4_2_2']
+    assert path(model, 'h1_1_1', 'h1_2_1') == ['h1_1_1->e1_1', 'e1_1->a1_1', 'a1_1->e1_2', 'e1_2->h1_2_1']
+    assert path(model, 'h1_1_1', 'h1_1_2') == ['h1_1_1->e1_1', 'e1_1->h1_1_2']
+
+
+def test_fat_tree_offered_utilisation():
+    model = CapacityModel(fat_tree(4), default_bw=100)
+    traffic = TrafficMatrix()
+    traffic.add('h1_1_1', 'h4_2_2', 30)
+    traffic.add('h1_1_2', 'h4_2_1', 30)
+    traffic.add('h2_1_1', 'h4_2_1', 50)
+    result = simulate(model, traffic)
+    # Both flows of e1_1 share its path to pod 4, from c1 on all three take the same one:
+    top = dict((name, utilisation) for name, _, _, utilisation in result.top_edges(count=100))
+    assert top['e1_1->a1_1'] == top['a1_1->c1'] == pytest.approx(0.6)
+    assert top['a2_1->c1'] == pytest.approx(0.5)
+    assert top['c1->a4_1'] == top['a4_1->e4_2'] == pytest.approx(1.1)
+    assert top['e4_2->h4_2_1'] == pytest.approx(0.8)
+    summary = result.summary()
+    assert (summary['overloaded_edges'], summary['max_offered_utilisation']) == (2, pytest.approx(1.1))
+    assert (summary['satisfied'], summary['throttled']) == (2, 1)
+
+
+
+## MAX-MIN FAIR RATES ##
+########################
+
+def test_linear_max_min_rates():
+    # s1 - s2 - s3 with hosts h<switch>_1, h<switch>_2 and 10 Mbit/s links:
+    model = CapacityModel(linear(3, 2), default_bw=10)
+    traffic = TrafficMatrix()
+    traffic.add('h1_1', 'h3_1', None)     # s1-s2 and s2-s3
+    traffic.add('h1_2', 'h2_1', 2)        # s1-s2, limited by its demand
+    traffic.add('h2_2', 'h3_2', None)     # s2-s3
+    traffic.add('h1_1', 'h2_2', None)     # s1-s2, sharing the host link of h1_1
+    result = simulate(model, traffic)
+    # s1-s2 is full at 4 + 2 + 4, the rest of s2-s3 goes to the third flow:
+    assert result.rates.tolist() == pytest.approx([4, 2, 6, 4])
+    assert result.routable.all() and result.summary()['throughput_mbps'] == pytest.approx(16)
+    top = dict((name, load) for name, load, _, _ in result.top_edges(count=100, by='carried'))
+    assert top['s1->s2'] == top['s2->s3'] == pytest.approx(10)
+
+
+def test_unroutable_flows():
+    model = CapacityModel(linear(2, 1), default_bw=10)
+    result = simulate(model, TrafficMatrix(['h1_1', 'h1_1'], ['h2_1', 'h1_1'], [float('inf')] * 2))
+    assert result.routable.tolist() == [True, False]
+    assert result.rates.tolist() == pytest.approx([10, 0])
+    with pytest.raises(ValueError):
+        simulate(model, TrafficMatrix(['h1_1'], ['h9_1'], [1]))
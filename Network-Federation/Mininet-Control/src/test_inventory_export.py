@@ -0,0 +1,47 @@
+__author__ = 'Constantin'
+
+#Python system imports:
+import os
+
+import pytest
+
+#Own Imports:
+from inventory_export import INDEX_FILE, export_inventory, host_records
+from topology_loader import TOPOLOGY_DIR, FileTopology
+
+
+
+## COMMITTED INVENTORIES ##
+###########################
+
+RESOURCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..',
+                         'Cloud-Federation', 'Cloud-Agents', 'src', 'main', 'resources')
+PROFILES = ('SMALL', 'SMALL', 'MEDIUM', 'LARGE')
+
+
+def read(path):
+    with open(path, encoding='utf-8') as xml_file:
+        return xml_file.read()
+
+
+@pytest.mark.parametrize('cloud', [1, 2])
+def test_regenerates_cloudconf(cloud, tmpdir):
+    topology = FileTopology(os.path.join(TOPOLOGY_DIR, 'cloud%d.ovx.json' % cloud))
+    out_dir = str(tmpdir)
+    count = export_inventory(topology.build_graph(), out_dir, PROFILES, topology.net_ip)
+    conf_dir = os.path.join(RESOURCES, 'cloudconf%d' % cloud)
+    host_files = sorted(os.listdir(os.path.join(conf_dir, 'hosts')))
+    assert count == len(host_files)
+    assert sorted(os.listdir(os.path.join(out_dir, 'hosts'))) == host_files
+    for file_name in host_files:
+        assert read(os.path.join(out_dir, 'hosts', file_name)) == read(os.path.join(conf_dir, 'hosts', file_name))
+    assert read(os.path.join(out_dir, INDEX_FILE)) == read(os.path.join(conf_dir, INDEX_FILE))
+
+
+def test_ids_are_net_ip_offsets():
+    # The reference topologies' hosts (10.0.1.11, ...) are offsets from 10.0.1.0, not 10.0.0.0:
+    topology = FileTopology(os.path.join(TOPOLOGY_DIR, 'cloud1.ref.json'))
+    records = dict((record[0], record[1]) for record in host_records(topology.build_graph(), PROFILES, topology.net_ip))
+    assert (records['hdhcp'], records['h1_1_1'], records['h1_3_1']) == (1, 11, 14)
+    with pytest.raises(ValueError):
+        list(host_records(topology.build_graph(), PROFILES, '10.5.0.0/16'))
@@ -0,0 +1,109 @@
+__author__ = 'Constantin'
+
+#Python system imports:
+import os
+
+import pytest
+
+#Own Imports:
+import ovx_compiler
+from address_plan import format_dpid
+from topology_loader import TOPOLOGY_DIR, FileTopology
+
+
+
+## MOCK OVX ##
+##############
+
+# Loading the OVX client puts OpenVirteX-Control/src on the path, which ovx_mock lives in, too:
+ovx_client = ovx_compiler._ovx_client_module()
+
+CONTROLLERS = ['tcp:192.168.1.41:10000']
+SUBNET = '10.1.0.0/16'
+
+
+@pytest.fixture
+def graph():
+    return FileTopology(os.path.join(TOPOLOGY_DIR, 'cloud1.ovx.json')).build_graph()
+
+
+@pytest.fixture
+def server(graph):
+    import ovx_mock
+    server = ovx_mock.MockOVXServer(physical_switches=[format_dpid(graph.dpid[idx]) for idx in graph.switches()])
+    server.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(server):
+    client = ovx_client.OVXClient(*server.server_address)
+    yield client
+    client.close()
+
+
+def calls(server, *methods):
+    return [method for method, _ in server.ovx.calls if method in methods]
+
+
+
+## PLAN APPLICATION ##
+######################
+
+def test_apply_plan(graph, server, client):
+    plan = ovx_compiler.compile_plan(graph, CONTROLLERS, SUBNET)
+    state = ovx_compiler.apply_plan(client, plan)
+    assert state.plan == plan and state.started
+    tenant = server.ovx.tenants[state.tenant_id]
+    assert tenant['started'] and tenant['controllers'] == CONTROLLERS
+    assert len(tenant['switches']) == len(graph.switches())
+    assert len(tenant['hosts']) == len(graph.hosts())
+    assert len(tenant['links']) == sum(1 for entry in plan.values() if entry['level'] == 'link')
+
+    # Applying the same plan again is a no-op:
+    count = len(server.ovx.calls)
+    ovx_compiler.apply_plan(client, plan, state)
+    assert len(server.ovx.calls) == count
+
+
+def test_apply_change(graph, server, client):
+    plan = ovx_compiler.compile_plan(graph, CONTROLLERS, SUBNET)
+    state = ovx_compiler.apply_plan(client, plan)
+    host_key = sorted(key for key in plan if key.startswith('host:'))[0]
+    changed = dict((key, entry) for key, entry in plan.items() if key != host_key)
+    del server.ovx.calls[:]
+    state = ovx_compiler.apply_plan(client, changed, state)
+    assert calls(server, 'disconnectHost') == ['disconnectHost'] and len(server.ovx.calls) == 1
+    assert state.plan == changed and host_key not in state.ids
+
+    # Other controllers need a new network:
+    rebuilt = ovx_compiler.compile_plan(graph, ['tcp:192.168.1.42:10000'], SUBNET)
+    state = ovx_compiler.apply_plan(client, rebuilt, state)
+    assert list(server.ovx.tenants) == [state.tenant_id] and state.plan == rebuilt
+
+
+def test_failed_apply_continues(graph, server, client, tmpdir):
+    # A failing call leaves the state of what OVX holds, the next apply only adds the rest:
+    plan = ovx_compiler.compile_plan(graph, CONTROLLERS, SUBNET)
+    state_path = str(tmpdir.join('plan.json'))
+    connect_host = client.connect_host
+
+    def failing_connect_host(tenant_id, vdpid, vport, mac):
+        if mac == plan[sorted(key for key in plan if key.startswith('host:'))[-1]]['mac']:
+            raise ovx_client.OVXError("connectHost failed")
+        return connect_host(tenant_id, vdpid, vport, mac)
+    client.connect_host = failing_connect_host
+    with pytest.raises(ovx_client.OVXError):
+        ovx_compiler.apply_plan(client, plan, ovx_compiler.PlanState(),
+                                save=lambda state: state.save(state_path))
+    client.connect_host = connect_host
+
+    state = ovx_compiler.PlanState.load(state_path)
+    assert len(state.plan) == len(plan) - 1 and not state.started
+    del server.ovx.calls[:]
+    state = ovx_compiler.apply_plan(client, plan, state)
+    assert calls(server, 'createNetwork', 'createSwitch', 'createPort', 'connectLink') == []
+    assert calls(server, 'connectHost', 'startNetwork') == ['connectHost', 'startNetwork']
+    assert state.plan == plan and len(server.ovx.tenants) == 1
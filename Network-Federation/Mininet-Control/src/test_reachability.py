@@ -0,0 +1,79 @@
+__author__ = 'Constantin'
+
+#Python system imports:
+import os
+
+#Own Imports:
+from reachability import DELIVERED, LOOP, FlowTables, compiled_flow_tables, verify_reachability
+from topology import TopologyGraph
+from topology_loader import TOPOLOGY_DIR, FileTopology
+
+
+
+## TEST TOPOLOGY ##
+###################
+
+def line_graph():
+    # h1 - s1 - s2 - h2, s1 port 2 and s2 port 2 facing each other:
+    graph = TopologyGraph('line', 24)
+    s1, s2 = graph.add_switch('s1', 1), graph.add_switch('s2', 2)
+    h1, h2 = graph.add_host('h1', 0x0a000001, 1), graph.add_host('h2', 0x0a000002, 2)
+    graph.add_link(h1, s1)
+    graph.add_link(h2, s2)
+    graph.add_link(s1, s2)
+    return graph
+
+
+def flow(dst_mac, *ports):
+    return 'priority=200,dl_dst=%s,actions=%s' % (dst_mac, ','.join('output:%d' % port for port in ports))
+
+
+H1, H2 = '00:00:00:00:00:01', '00:00:00:00:00:02'
+
+
+def verify(graph, flows):
+    return verify_reachability(FlowTables(graph, [], flows))
+
+
+
+## VERDICTS ##
+##############
+
+def test_compiled_flows_deliver():
+    graph = line_graph()
+    report = verify(graph, compiled_flow_tables(graph))
+    assert report.verdicts == {DELIVERED: 2}
+    assert (report.unreachable, report.looping, report.blackholes) == (0, 0, {})
+
+
+def test_cloud_topology_delivers():
+    graph = FileTopology(os.path.join(TOPOLOGY_DIR, 'cloud1.ovx.json')).build_graph()
+    report = verify(graph, compiled_flow_tables(graph))
+    hosts = len(graph.hosts())
+    assert report.pairs == hosts * (hosts - 1)
+    assert report.unreachable == 0
+
+
+def test_loop():
+    # s2 sends the traffic to h2 back to s1, which forwards it to s2 again:
+    graph = line_graph()
+    report = verify(graph, {'s1': [flow(H1, 1), flow(H2, 2)], 's2': [flow(H1, 2), flow(H2, 2)]})
+    assert report.verdicts == {DELIVERED: 1, LOOP: 1}
+    assert report.examples[LOOP] == [('h1', 'h2')]
+    assert report.looping == 1
+
+
+def test_blackhole():
+    # s2 has no rule for h2, so h1's packets end in its table miss:
+    graph = line_graph()
+    report = verify(graph, {'s1': [flow(H1, 1), flow(H2, 2)], 's2': [flow(H1, 2)]})
+    assert report.verdicts == {DELIVERED: 1, 'table-miss': 1}
+    assert report.blackholes == {('s2', 'table-miss'): 1}
+    assert report.unreachable == 1
+
+
+def test_drop():
+    graph = line_graph()
+    report = verify(graph, {'s1': [flow(H1, 1), 'priority=200,dl_dst=%s,actions=drop' % H2],
+                            's2': [flow(H1, 2), flow(H2, 1)]})
+    assert report.blackholes == {('s1', 'drop'): 1}
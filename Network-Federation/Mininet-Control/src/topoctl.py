@@ -0,0 +1,611 @@
+__author__ = 'Constantin'
+
+# Unified entry point for all topologies of this directory:
+#   python topoctl.py validate cloud1.ovx
+#   python topoctl.py dump fattree:8 --format json
+#   python topoctl.py plan cloud1.ovx --ctrl tcp:192.168.1.41:10000 --state cloud1.plan.json --apply
+#   sudo python topoctl.py run cloud1.ovx --ofc_ip 192.168.1.41
+#   python topoctl.py flows cloud1.ovx --out flows/
+#   python topoctl.py inventory cloud1.ovx --out cloudconf1 --profiles SMALL,SMALL,MEDIUM,LARGE
+#   sudo python topoctl.py run fattree:4 --benchmark results.json --proactive only
+#   sudo python topoctl.py run cloud1.ovx --control /tmp/cloud1.sock     (see live_topology.py)
+#   sudo python topoctl.py run leafspine:8,400,40 --shards 8 --ofc_ip 192.168.1.41   (see sharding.py)
+#   sudo python topoctl.py run cloud1.ovx --hosts-dir <cloud-agents resources>/cloudconf1/hosts   (see shaping.py)
+#   sudo python topoctl.py run cloud1.ovx --static-arp --arp-remote cloud2.ovx --arp-responder   (see static_arp.py)
+#   sudo python topoctl.py snapshot cloud1.ovx --out cloud1.snap.tgz    (see snapshot.py)
+#   sudo python topoctl.py run cloud1.ovx --restore cloud1.snap.tgz
+#   python topoctl.py verify fattree:16 --dump    (see reachability.py)
+#   python topoctl.py simulate leafspine:4,32,20 --traffic random:2000:0 --scenarios whatif.json  (see capacity_sim.py)
+# Only 'run' imports mininet. Own modules are imported lazily as well, so that
+# '--profile-imports' sees (and reports) every import of the chosen subcommand.
+
+#Python system imports:
+import argparse
+import builtins
+import json
+import os
+import sys
+import time
+
+
+
+## IMPORT PROFILING ##
+######################
+
+class ImportProfiler(object):
+    # Wraps builtins.__import__ and records the inclusive and self time of every module's
+    # first import (like 'python -X importtime', but selectable per subcommand).
+
+    def __init__(self):
+        self.records = []       # (module name, inclusive secs, self secs, nesting depth)
+        self._stack = []
+        self._orig_import = None
+
+    def _import(self, name, *args, **kwargs):
+        if name in sys.modules:
+            return self._orig_import(name, *args, **kwargs)
+        self._stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._orig_import(name, *args, **kwargs)
+        finally:
+            inclusive = time.perf_counter() - start
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += inclusive
+            self.records.append((name, inclusive, inclusive - children, len(self._stack)))
+
+    def install(self):
+        self._orig_import = builtins.__import__
+        builtins.__import__ = self._import
+        return self
+
+    def uninstall(self):
+        if self._orig_import is not None:
+            builtins.__import__ = self._orig_import
+            self._orig_import = None
+
+    def report(self, top=15, out=sys.stderr):
+        total = sum(inclusive for _, inclusive, _, depth in self.records if depth == 0)
+        lines = ["%-32s %9.2fms %9.2fms" % (name, inclusive * 1000, self_time * 1000)
+                 for name, inclusive, self_time, _ in sorted(self.records, key=lambda r: -r[2])[:top]]
+        mininet = any(name.startswith('mininet') for name in sys.modules)
+        out.write("\n*** Import times (%d modules, %.2fms, mininet %s):\n%-32s %11s %11s\n%s\n"
+                  % (len(self.records), total * 1000, 'imported' if mininet else 'not imported',
+                     'module', 'inclusive', 'self', '\n'.join(lines)))
+
+
+
+## TOPOLOGY RESOLUTION ##
+#########################
+
+SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT_SUFFIX = '_topology.py'
+
+
+class TopologySource(object):
+    # A resolved topology: its graph, gateway definition (if any) and base network.
+
+    def __init__(self, graph, gateway, net_ip):
+        self.graph = graph
+        self.gateway = gateway
+        self.net_ip = net_ip
+
+
+def topology_scripts():
+    # Topology name ('cloud1.ovx') -> script path, for every *_topology.py next to this file:
+    return dict((file_name[:-len(SCRIPT_SUFFIX)], os.path.join(SRC_DIR, file_name))
+                for file_name in sorted(os.listdir(SRC_DIR)) if file_name.endswith(SCRIPT_SUFFIX))
+
+
+def _load_script(path):
+    import importlib.util
+    module_name = os.path.basename(path)[:-3].replace('.', '_')
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def resolve_topology(topology, net_ip=None, cache=None):
+    # Accepts a topology script name ('cloud1.ovx'), a topology file name from topologies/
+    # (scripts take precedence), a script or topology file path, or a generated fabric
+    # with its parameters ('fattree:8', 'leafspine:4,32,20', 'linear:10,2').
+    # With a TopologyCache, graphs are only built if their definition changed.
+    def build(key, build_graph):
+        return cache.cached(key, build_graph) if cache is not None else build_graph()
+
+    fabric, _, fabric_args = topology.partition(':')
+    if fabric_args or fabric in ('linear', 'leafspine', 'fattree'):
+        from topology import FABRICS
+        if fabric not in FABRICS:
+            raise ValueError("Unknown fabric "+ fabric +", choose one of: "+ ', '.join(sorted(FABRICS)))
+        args = [int(arg) for arg in fabric_args.split(',') if arg]
+        net_ip = net_ip or '10.0.0.0/8'
+        key = _cache_keys().definition_key('fabric', [fabric, args, net_ip]) if cache is not None else None
+        return TopologySource(build(key, lambda: FABRICS[fabric](*args, net_ip=net_ip)), None, net_ip)
+
+    if topology.endswith(('.json', '.yaml', '.yml')) or \
+            (topology in _topology_files() and topology not in topology_scripts()):
+        from topology_loader import FileTopology
+        description = FileTopology(_topology_files().get(topology, topology))
+        net_ip = net_ip or description.net_ip
+        key = _cache_keys().file_key('file', description.paths, net_ip) if cache is not None else None
+        return TopologySource(build(key, lambda: description.build_graph(net_ip)), description.gateway, net_ip)
+
+    path = topology if topology.endswith('.py') else topology_scripts().get(topology)
+    if path is None or not os.path.exists(path):
+        raise ValueError("Unknown topology "+ topology +", choose one of: "
+                         + ', '.join(sorted(set(topology_scripts()) | set(_topology_files())))
+                         +" or a fabric like fattree:4")
+    module = _load_script(path)
+    net_ip = net_ip or module.NET_IP
+    # Scripts may be driven by topology files, which are part of the cache key then:
+    from topology_loader import FileTopology
+    paths = [path] + [topo_path for value in vars(module).values() if isinstance(value, FileTopology)
+                      for topo_path in value.paths]
+    key = _cache_keys().file_key('script', paths, net_ip) if cache is not None else None
+    return TopologySource(build(key, lambda: module.build_graph(net_ip)), getattr(module, 'GATEWAY', None), net_ip)
+
+
+def _topology_files():
+    from topology_loader import topology_files
+    return topology_files()
+
+
+def _cache_keys():
+    import topology_cache
+    return topology_cache
+
+
+
+## SUBCOMMANDS ##
+#################
+
+# Linux interface names hold at most 15 characters (IFNAMSIZ - 1), mininet names them <node>-eth<port>:
+MAX_INTF_NAME = 15
+
+
+def validate_topology(source, check_connectivity=True):
+    # Returns a list of error strings, empty for a valid topology.
+    from address_plan import AddressError, parse_ip
+    from topology import SWITCH
+    graph, errors = source.graph, []
+    names, kinds, adj = graph.names, graph.kinds, graph.adjacency()
+
+    for idx, name in enumerate(names):
+        if adj[idx]:
+            max_port = max(local_port for _, local_port, _, _ in adj[idx])
+            if len(name) + len('-eth') + len(str(max_port)) > MAX_INTF_NAME:
+                errors.append("Interface name %s-eth%d exceeds %d characters" % (name, max_port, MAX_INTF_NAME))
+        if kinds[idx] != SWITCH and not any(kinds[n] == SWITCH for n, _, _, _ in adj[idx]):
+            errors.append("Host "+ name +" is not attached to any switch")
+
+    for kind, addrs in (('DPID', [graph.dpid[idx] for idx in graph.switches()]),
+                        ('IP', [graph.ip[idx] for idx in graph.hosts()]),
+                        ('MAC', [graph.mac[idx] for idx in graph.hosts()])):
+        if len(set(addrs)) != len(addrs):
+            errors.append("Duplicate %s addresses in topology" % kind)
+
+    # Connectivity (BFS from the first node over the cached adjacency):
+    if names and check_connectivity:
+        seen = bytearray(len(names))
+        seen[0] = 1
+        queue = [0]
+        for node in queue:
+            for neighbour, _, _, _ in adj[node]:
+                if not seen[neighbour]:
+                    seen[neighbour] = 1
+                    queue.append(neighbour)
+        if len(queue) != len(names):
+            unreachable = [names[idx] for idx in range(len(names)) if not seen[idx]]
+            errors.append("%d nodes are not connected to %s, e.g. %s"
+                          % (len(unreachable), names[0], ', '.join(unreachable[:5])))
+
+    gateway = source.gateway
+    if gateway is not None:
+        gw_idx = graph.index.get(gateway['switch'])
+        if gw_idx is None or kinds[gw_idx] != SWITCH:
+            errors.append("Gateway "+ gateway['switch'] +" is not a switch of the topology")
+        for port_name, remote_ip in sorted(gateway.get('gre_ports', {}).items()):
+            if len(port_name) > MAX_INTF_NAME:
+                errors.append("GRE port name %s exceeds %d characters" % (port_name, MAX_INTF_NAME))
+            try:
+                parse_ip(remote_ip)
+            except AddressError as e:
+                errors.append("GRE port %s: %s" % (port_name, e))
+    return errors
+
+
+def dump_topology(graph, output_format='text'):
+    hosts, switches = graph.hosts(), graph.switches()
+    names = graph.names
+    links = [graph.link(l) for l in range(graph.link_count)]
+    if output_format == 'json':
+        return json.dumps({
+            'name': graph.name, 'prefix_len': graph.prefix_len,
+            'switches': [{'name': names[idx], 'dpid': graph.dpid_str(idx)} for idx in switches],
+            'hosts': [{'name': names[idx], 'ip': ip, 'mac': graph.mac_str(idx)}
+                      for idx, ip in zip(hosts, graph.host_ips(hosts))],
+            'links': [[names[src], src_port, names[dst], dst_port] for src, src_port, dst, dst_port in links],
+        }, indent=1)
+
+    lines = ["# %s: %d switches, %d hosts, %d links" % (graph.name, len(switches), len(hosts), len(links))]
+    lines.extend("switch %-16s %s" % (names[idx], graph.dpid_str(idx)) for idx in switches)
+    lines.extend("host   %-16s %s/%d %s" % (names[idx], ip, graph.prefix_len, graph.mac_str(idx))
+                 for idx, ip in zip(hosts, graph.host_ips(hosts)))
+    lines.extend("link   %s:%d <-> %s:%d" % (names[src], src_port, names[dst], dst_port)
+                 for src, src_port, dst, dst_port in links)
+    return '\n'.join(lines)
+
+
+def cmd_validate(args, source):
+    errors = validate_topology(source)
+    for error in errors:
+        print("ERROR: "+ error)
+    graph = source.graph
+    print("%s: %d switches, %d hosts, %d links - %s"
+          % (graph.name, len(graph.switches()), len(graph.hosts()), graph.link_count,
+             'invalid (%d errors)' % len(errors) if errors else 'valid'))
+    return 1 if errors else 0
+
+
+def cmd_dump(args, source):
+    print(dump_topology(source.graph, args.format))
+    return 0
+
+
+def cmd_plan(args, source):
+    from address_plan import Subnet
+    import ovx_compiler
+    subnet = Subnet.parse(args.subnet or source.net_ip).cidr
+    plan = ovx_compiler.compile_plan(source.graph, args.ctrl or ['tcp:localhost:10000'], subnet)
+    state = ovx_compiler.PlanState.load(args.state) if args.state else ovx_compiler.PlanState()
+    diff = ovx_compiler.diff_plans(state.plan, plan)
+    if args.json:
+        print(json.dumps(plan, indent=1, sort_keys=True))
+    print("%s: %d plan entries, %s" % (source.graph.name, len(plan), diff.summary()))
+
+    if args.apply:
+        client = ovx_compiler.connect_client(host=args.ovx_host, port=args.ovx_port,
+                                             user=args.user, password=args.password)
+        timings = []
+        # The state is saved after every phase, so that a failed apply can be rerun:
+        save = (lambda state: state.save(args.state)) if args.state else None
+        state = ovx_compiler.apply_plan(client, plan, state, timings, save)
+        print("Applied to tenant %s with %d calls (%s)"
+              % (state.tenant_id, client.call_count,
+                 ', '.join('%s %.3fs' % timing for timing in timings)))
+    return 0
+
+
+def cmd_flows(args, source):
+    from proactive_flows import compile_flows, write_flow_files
+    start = time.perf_counter()
+    flows = compile_flows(source.graph, [source.gateway] if source.gateway is not None else [])
+    elapsed = time.perf_counter() - start
+    counts = sorted(len(switch_flows) for switch_flows in flows.values())
+    print("%s: %d flows on %d switches (max %d per switch), compiled in %.3fs"
+          % (source.graph.name, sum(counts), len(counts), counts[-1] if counts else 0, elapsed))
+    if args.out:
+        os.makedirs(args.out, exist_ok=True)
+        write_flow_files(flows, args.out)
+        print("Flow batch files written to "+ args.out)
+    return 0
+
+
+def cmd_inventory(args, source):
+    from inventory_export import export_inventory
+    start = time.perf_counter()
+    count = export_inventory(source.graph, args.out, [profile.strip().upper() for profile in args.profiles.split(',')],
+                             source.net_ip)
+    print("%s: %d host inventory files written to %s in %.3fs"
+          % (source.graph.name, count, os.path.join(args.out, 'hosts'), time.perf_counter() - start))
+    return 0
+
+
+def cmd_verify(args, source):
+    from reachability import FlowTables, compiled_flow_tables, dump_flow_tables, read_flow_tables, verify_reachability
+    gateways = [source.gateway] if source.gateway is not None else []
+    if args.dump:
+        flows = dump_flow_tables([source.graph.names[idx] for idx in source.graph.switches()])
+    elif args.flows_dir:
+        flows = read_flow_tables(args.flows_dir)
+    else:
+        flows = compiled_flow_tables(source.graph, gateways)
+    try:
+        report = verify_reachability(FlowTables(source.graph, gateways, flows))
+    except ValueError as e:
+        print("Invalid flow tables: %s" % e)
+        return 2
+    print('\n'.join(report.lines()))
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(report.summary(), json_file, indent=1, sort_keys=True)
+    return 1 if report.unreachable else 0
+
+
+def cmd_simulate(args, source):
+    import capacity_sim
+    gateways = [source.gateway] if source.gateway is not None else []
+    prepare = None
+    if args.hosts_dir:
+        from shaping import apply_host_descriptors, read_host_descriptors
+        descriptors = read_host_descriptors(args.hosts_dir)
+        prepare = lambda graph: apply_host_descriptors(graph, descriptors)
+        prepare(source.graph)
+    options = dict(default_bw=args.default_bw, tunnel_bw=args.tunnel_bw, efficiency=args.efficiency)
+    try:
+        if args.scenarios:
+            with open(args.scenarios) as scenario_file:
+                description = json.load(scenario_file)
+            if args.traffic:
+                description.setdefault('traffic', args.traffic)
+            scenarios = capacity_sim.expand_scenarios(description)
+            start = time.perf_counter()
+            summaries = capacity_sim.run_scenarios(source.graph, gateways, scenarios, seed=args.seed,
+                                                   prepare=prepare, **options)
+            for summary in summaries:
+                print("%(scenario)s: %(throughput_mbps).1f of %(demand_mbps).1f Mbit/s, %(throttled)d throttled, "
+                      "%(overloaded_edges)d overloaded edges (max %(max_offered_utilisation).2f)" % summary)
+            print("%d scenarios simulated in %.3fs" % (len(summaries), time.perf_counter() - start))
+            result = summaries
+        else:
+            model = capacity_sim.CapacityModel(source.graph, gateways, **options)
+            if args.calibrate:
+                with open(args.calibrate) as results_file:
+                    rows, ratio = capacity_sim.calibrate(model, json.load(results_file))
+                for src, dst, measured, simulated, pair_ratio in rows:
+                    print("%s -> %s: measured %.1f, simulated %.1f Mbit/s" % (src, dst, measured, simulated))
+                print("Median measured/simulated ratio: %s (use as --efficiency)"
+                      % ('%.3f' % ratio if ratio is not None else 'no iperf pairs'))
+                result = {'pairs': rows, 'efficiency': ratio}
+            else:
+                if not args.traffic:
+                    print("Give a --traffic matrix, --scenarios or --calibrate")
+                    return 2
+                simulation = capacity_sim.simulate(model, args.traffic, args.seed)
+                result = simulation.summary()
+                print("%(topology)s: %(flows)d flows, %(throughput_mbps).1f of %(demand_mbps).1f Mbit/s, "
+                      "%(throttled)d throttled, %(unroutable)d unroutable, simulated in %(elapsed_s).3fs" % result)
+                for name, load, capacity, utilisation in simulation.top_edges(args.top):
+                    print("  %-32s %10.1f / %8.1f Mbit/s  %6.1f%%" % (name, load, capacity, utilisation * 100))
+                result['top_edges'] = simulation.top_edges(args.top)
+    except (ValueError, KeyError) as e:
+        print("Invalid simulation: %s" % e)
+        return 2
+    except ImportError as e:
+        print(e)
+        return 2
+    if args.json:
+        with open(args.json, 'w') as json_file:
+            json.dump(result, json_file, indent=1, sort_keys=True)
+    return 0
+
+
+def cmd_snapshot(args, source):
+    from snapshot import take_snapshot
+    try:
+        manifest = take_snapshot(source.graph, args.out)
+    except ValueError as e:
+        print("Snapshot failed: %s" % e)
+        return 2
+    print("%s: %d switches with %d flows written to %s in %.3fs" % (source.graph.name, len(manifest['bridges']),
+          sum(manifest['flows'].values()), args.out, manifest['snapshot_s']))
+    return 0
+
+
+def cmd_restore(args, source):
+    from snapshot import restore_snapshot
+    try:
+        timings = restore_snapshot(source.graph, args.archive, controllers=not args.no_controllers)
+    except ValueError as e:
+        print("Restore failed: %s" % e)
+        return 2
+    print(', '.join('%s %.3fs' % item for item in sorted(timings.items())))
+    return 0
+
+
+def cmd_run(args, source):
+    from runner import TopologyRunner
+    controllers = None
+    if args.ofc:
+        from controller_pool import ControllerPool, parse_endpoint
+        try:
+            controllers = ControllerPool([parse_endpoint(ofc, args.ofc_port) for ofc in args.ofc],
+                                         args.ofc_policy, args.ofc_replicas, args.ofc_connect)
+        except ValueError as e:
+            print("Invalid controller pool: %s" % e)
+            return 2
+    benchmark = None
+    if args.benchmark:
+        benchmark = {'output': args.benchmark, 'ping_count': args.ping_count, 'ping_pairs': args.ping_pairs,
+                     'flow_pairs': args.flow_pairs, 'iperf_pairs': args.iperf_pairs, 'iperf_time': args.iperf_time}
+
+    descriptors = None
+    if args.hosts_dir:
+        from shaping import apply_host_descriptors, read_host_descriptors
+        descriptors = read_host_descriptors(args.hosts_dir)
+        print("%s: %d hosts shaped after the host descriptors in %s"
+              % (source.graph.name, apply_host_descriptors(source.graph, descriptors), args.hosts_dir))
+
+    def reload():
+        # The edited topology (re-read from its file or script) for live changes:
+        changed = resolve_topology(args.topology, args.net_ip)
+        if descriptors is not None:
+            apply_host_descriptors(changed.graph, descriptors)
+        return changed.graph, changed.gateway
+    arp = None
+    if args.static_arp or args.arp_remote or args.arp_responder:
+        arp = {'remote': [resolve_topology(remote).graph for remote in args.arp_remote or ()],
+               'responder': args.arp_responder}
+    options = dict(ofc_ip=args.ofc_ip, ofc_port=args.ofc_port, proactive=args.proactive, of_proxy=args.of_proxy,
+                   controllers=controllers, stats={'output': args.stats, 'interval': args.stats_interval,
+                                                   'flows': not args.stats_no_flows} if args.stats else None)
+    if args.shards > 1:
+        if args.control or args.benchmark or args.verify is not None or arp is not None or \
+                args.restore or args.snapshot_on_stop:
+            print("--control, --benchmark, --verify, the static ARP and the snapshot options need a single "
+                  "process network, leave out --shards (or use the snapshot and restore commands)")
+            return 2
+        from sharding import ShardedRunner
+        try:
+            runner = ShardedRunner(source.graph, source.gateway, args.shards, args.shard_links, **options)
+        except ValueError as e:
+            print("Invalid sharding: %s" % e)
+            return 2
+    else:
+        runner = TopologyRunner(source.graph, source.gateway, control=args.control, reload=reload, arp=arp,
+                                restore=args.restore, snapshot=args.snapshot_on_stop, **options)
+    runner.run(interactive=not (args.benchmark or args.no_cli), benchmark=benchmark, verify=args.verify)
+    return 0
+
+
+
+## COMMAND LINE ##
+##################
+
+def _arg_parser():
+    parser = argparse.ArgumentParser(prog='topoctl.py', description="Validate, dump, plan and run topologies.")
+    parser.add_argument('--profile-imports', action='store_true', help="report the import time of every module")
+    parser.add_argument('--no-cache', action='store_true', help="always rebuild the topology graph")
+    parser.add_argument('--cache-dir', help="topology graph cache directory (default: $TOPOLOGY_CACHE_DIR "
+                                            "or ~/.cache/cloud-federation/topologies)")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    def add_command(name, function, help_text):
+        subparser = subparsers.add_parser(name, help=help_text)
+        subparser.add_argument('topology', help="script or topology file name (e.g. cloud1.ovx), path, or fabric (e.g. fattree:4)")
+        subparser.add_argument('-n', '--net_ip', help="override the base IP network of the topology")
+        subparser.set_defaults(function=function)
+        return subparser
+
+    add_command('validate', cmd_validate, "check names, addresses, connectivity and the gateway")
+
+    dump = add_command('dump', cmd_dump, "print switches, hosts and links")
+    dump.add_argument('--format', choices=('text', 'json'), default='text')
+
+    plan = add_command('plan', cmd_plan, "compile (and apply) the OVX virtual network plan")
+    plan.add_argument('--ctrl', action='append', help="tenant controller url (repeatable)")
+    plan.add_argument('--subnet', help="tenant network (default: the topology network)")
+    plan.add_argument('--state', help="JSON file of the applied plan, to diff against and update")
+    plan.add_argument('--json', action='store_true', help="print the compiled plan")
+    plan.add_argument('--apply', action='store_true', help="apply the plan difference via OVX's JSON-RPC API")
+    plan.add_argument('--ovx_host', default='localhost')
+    plan.add_argument('--ovx_port', type=int, default=8080)
+    plan.add_argument('--user', default='admin')
+    plan.add_argument('--password', default='')
+
+    flows = add_command('flows', cmd_flows, "compile the proactive flows of every switch")
+    flows.add_argument('--out', help="directory to write one ovs-ofctl add-flows batch file per switch to")
+
+    inventory = add_command('inventory', cmd_inventory, "export the Cloud-Agent host inventory (hosts/Host<n>.xml)")
+    inventory.add_argument('--out', required=True, help="cloudconf directory to write hosts/ and hosts.xml to")
+    inventory.add_argument('--profiles', default='SMALL', help="hardware profiles (SMALL, MEDIUM, LARGE), "
+                                                               "assigned round-robin in host order")
+
+    verify = add_command('verify', cmd_verify, "verify the reachability of all host pairs on the flow tables "
+                                               "(default: the compiled proactive flows)")
+    verify.add_argument('--dump', action='store_true', help="dump the flow tables of the running switches (needs root)")
+    verify.add_argument('--flows-dir', help="read the flow tables from <switch>.flows files (e.g. of 'flows --out')")
+    verify.add_argument('--json', help="write the report to this JSON file")
+
+    simulate = add_command('simulate', cmd_simulate, "simulate link utilisation and fair-share rates of a "
+                                                     "traffic matrix offline (needs NumPy)")
+    simulate.add_argument('--traffic', help="traffic file (.json, .csv) or all-to-all:MBPS, random:PAIRS:MBPS, "
+                                            "gateway:MBPS, permutation:MBPS (MBPS 0 for elastic flows)")
+    simulate.add_argument('--scenarios', help="JSON file of what-if scenarios, see capacity_sim.expand_scenarios")
+    simulate.add_argument('--calibrate', metavar='RESULTS', help="compare with the iperf matrix of a --benchmark "
+                                                                 "JSON result")
+    simulate.add_argument('--hosts-dir', help="shape the host links after the Cloud-Agent host descriptors")
+    simulate.add_argument('--default-bw', type=float, default=1000.0, help="Mbit/s of unshaped links")
+    simulate.add_argument('--tunnel-bw', type=float, help="Mbit/s of GRE tunnels (default: --default-bw)")
+    simulate.add_argument('--efficiency', type=float, default=1.0, help="share of the capacities reached")
+    simulate.add_argument('--seed', type=int, default=0, help="seed of generated traffic")
+    simulate.add_argument('--top', type=int, default=10, help="most utilised edges to print")
+    simulate.add_argument('--json', help="write the results to this JSON file")
+
+    snapshot = add_command('snapshot', cmd_snapshot, "write the OVS configuration and flow tables of the running "
+                                                     "switches to an archive (needs root)")
+    snapshot.add_argument('--out', required=True, help="snapshot archive (.tgz) to write")
+
+    restore = add_command('restore', cmd_restore, "restore the running switches from a snapshot archive (needs root)")
+    restore.add_argument('archive', help="snapshot archive of the topology")
+    restore.add_argument('--no-controllers', action='store_true', help="keep the switches' current controllers")
+
+    run = add_command('run', cmd_run, "bring the topology up in mininet (needs root)")
+    run.add_argument('-i', '--ofc_ip', help="remote OpenFlow controller (default: mininet's reference controller)")
+    run.add_argument('-p', '--ofc_port', type=int, default=6633)
+    run.add_argument('--proactive', choices=('assist', 'only'),
+                     help="pre-install all host-to-host flows; 'only' also detaches the controllers")
+    run.add_argument('--ofc', action='append', help="controller pool endpoint ip[:port] the switches are "
+                                                    "spread over, instead of --ofc_ip (repeatable)")
+    run.add_argument('--ofc-policy', default='hash', help="switch to controller policy: hash (consistent "
+                                                          "hashing of DPIDs) or modulo")
+    run.add_argument('--ofc-replicas', type=int, default=2, help="controllers per switch, master and slaves")
+    run.add_argument('--ofc-connect', choices=('master', 'all'), default='master',
+                     help="connect switches to their master only (slaves as standbys) or to all replicas")
+    run.add_argument('--of-proxy', metavar='STATS', help="proxy all controller connections through of_proxy.py "
+                                                          "and write its statistics to STATS")
+    run.add_argument('--stats', metavar='FILE', help="poll the port and flow counters of all switches and "
+                                                     "write their time series to FILE when stopping")
+    run.add_argument('--stats-interval', type=float, default=1.0, help="seconds between two counter polls")
+    run.add_argument('--stats-no-flows', action='store_true', help="poll port counters only")
+    run.add_argument('--control', metavar='SOCKET', help="accept live topology changes (and 'reload' of the "
+                                                         "edited topology) on this unix socket, see live_topology.py")
+    run.add_argument('--hosts-dir', help="shape the host links (bandwidth, latency) and CPUs after the "
+                     "Cloud-Agent host descriptors in this directory, e.g. cloudconf1/hosts")
+    run.add_argument('--static-arp', action='store_true', help="install static ARP entries of all hosts on every "
+                                                               "host, see static_arp.py")
+    run.add_argument('--arp-remote', action='append', metavar='TOPOLOGY', help="also install the entries of the "
+                     "hosts of this remote cloud behind the GRE tunnel (repeatable, implies --static-arp)")
+    run.add_argument('--arp-responder', action='store_true', help="answer the ARP requests for all known hosts "
+                                                                  "at the GW (implies --static-arp)")
+    run.add_argument('--restore', metavar='ARCHIVE', help="restore the switches' configuration and flows from "
+                     "this snapshot after start (keeping this run's controllers), see snapshot.py")
+    run.add_argument('--snapshot-on-stop', metavar='ARCHIVE', help="write a snapshot of the switches to ARCHIVE "
+                                                                   "when the network stops")
+    run.add_argument('--shards', type=int, default=1, help="partition the topology over this many mininet "
+                                                           "worker processes, see sharding.py")
+    run.add_argument('--shard-links', choices=('veth', 'gre'), default='veth',
+                     help="stitch the links between shards by veth pairs or GRE tunnels")
+    run.add_argument('--verify', type=int, metavar='PINGS', help="verify the reachability of all host pairs on the "
+                     "switches' flow tables after start, confirmed by up to PINGS pings per verdict")
+    run.add_argument('--no-cli', action='store_true', help="stop the network again instead of opening the CLI")
+    run.add_argument('--benchmark', metavar='RESULTS', help="run the benchmark workloads and write their "
+                                                            "results to RESULTS (.json or .csv), then exit")
+    run.add_argument('--ping-count', type=int, default=20, help="pings per latency pair")
+    run.add_argument('--ping-pairs', type=int, default=32, help="sampled host pairs for ping latencies")
+    run.add_argument('--flow-pairs', type=int, default=64, help="sampled host pairs for the flow setup rate")
+    run.add_argument('--iperf-pairs', type=int, default=4, help="sampled host pairs for the iperf matrix")
+    run.add_argument('--iperf-time', type=int, default=5, help="seconds per iperf measurement")
+    return parser
+
+
+def main(argv):
+    args = _arg_parser().parse_args(argv)
+    profiler = ImportProfiler().install() if args.profile_imports else None
+    try:
+        start = time.perf_counter()
+        try:
+            cache = None
+            if not args.no_cache:
+                from topology_cache import DEFAULT_CACHE_DIR, TopologyCache
+                cache = TopologyCache(args.cache_dir or DEFAULT_CACHE_DIR)
+            source = resolve_topology(args.topology, args.net_ip, cache)
+        except ValueError as e:
+            print("Invalid topology: %s" % e)
+            return 2
+        if args.command != 'run':
+            sys.stderr.write("*** Loaded %s in %.2fms%s\n" % (args.topology, (time.perf_counter() - start) * 1000,
+                                                               ' (cached)' if cache is not None and cache.hits else ''))
+        return args.function(args, source)
+    finally:
+        if profiler is not None:
+            profiler.uninstall()
+            profiler.report()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
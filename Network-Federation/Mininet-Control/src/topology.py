@@ -0,0 +1,317 @@
+__author__ = 'Constantin'
+
+#Python system imports:
+from array import array
+
+#Own Imports:
+from address_plan import AddressPlan, dpid_to_hex, format_dpid, format_ip, format_ips, format_mac
+
+
+
+## TOPOLOGY GRAPH ##
+####################
+
+# Node kinds, stored per node index in TopologyGraph.kinds:
+SWITCH = 0
+HOST = 1
+
+
+class TopologyGraph(object):
+    # Index based topology graph, shared by all mininet topologies.
+    # Every node (switch or host) gets an integer index on insertion. Names, kinds and
+    # addresses are kept in flat per-index arrays, links in four parallel arrays
+    # (src-node, src-port, dst-node, dst-port), so that building and walking the graph
+    # stays O(nodes + links) even for generated fabrics with thousands of hosts.
+
+    def __init__(self, name='topology', prefix_len=8):
+        self.name = name
+        self.prefix_len = prefix_len    # subnet prefix of all host ips
+        self.names = []                 # node index -> node name
+        self.index = {}                 # node name  -> node index
+        self.kinds = bytearray()        # node index -> SWITCH | HOST
+        self.dpid = array('Q')          # node index -> dpid (0 for hosts)
+        self.ip = array('I')            # node index -> ipv4 addr as int (0 for switches)
+        self.mac = array('Q')           # node index -> mac addr as int (0 for switches)
+        self.next_port = array('H')     # node index -> next free port number
+        self.cpu = array('d')           # node index -> cpu share of a host (0 for unlimited)
+
+        self.link_src = array('i')
+        self.link_src_port = array('H')
+        self.link_dst = array('i')
+        self.link_dst_port = array('H')
+        # Traffic shaping per link and direction, as TCLink takes it (0 for unshaped):
+        self.link_bw = array('d')       # link index -> bandwidth in Mbit/s
+        self.link_delay = array('d')    # link index -> delay in ms
+        self.link_loss = array('d')     # link index -> loss in percent
+
+        self._adjacency = None
+
+    def _add_node(self, name, kind, dpid, ip, mac, first_port):
+        if name in self.index:
+            raise ValueError("Node "+ name +" is already part of topology "+ self.name)
+        idx = len(self.names)
+        self.names.append(name)
+        self.index[name] = idx
+        self.kinds.append(kind)
+        self.dpid.append(dpid)
+        self.ip.append(ip)
+        self.mac.append(mac)
+        self.next_port.append(first_port)
+        self.cpu.append(0.0)
+        self._adjacency = None
+        return idx
+
+    def add_switch(self, name, dpid):
+        # Switch ports are numbered from 1 on, as OpenFlow ports are:
+        return self._add_node(name, SWITCH, dpid, 0, 0, 1)
+
+    def add_host(self, name, ip, mac):
+        # Host ports map to their interface number (h-eth0, h-eth1, ...):
+        return self._add_node(name, HOST, 0, ip, mac, 0)
+
+    def add_link(self, src, dst, src_port=None, dst_port=None, bw=0.0, delay=0.0, loss=0.0):
+        # src and dst are node indices. Unless given explicitly, ports are handed out in link
+        # insertion order, the same way mininet would number them. Returns the link index.
+        if src_port is None:
+            src_port = self.next_port[src]
+        if dst_port is None:
+            dst_port = self.next_port[dst]
+        self.next_port[src] = max(self.next_port[src], src_port + 1)
+        self.next_port[dst] = max(self.next_port[dst], dst_port + 1)
+
+        self.link_src.append(src)
+        self.link_src_port.append(src_port)
+        self.link_dst.append(dst)
+        self.link_dst_port.append(dst_port)
+        self.link_bw.append(bw)
+        self.link_delay.append(delay)
+        self.link_loss.append(loss)
+        self._adjacency = None
+        return len(self.link_src) - 1
+
+    def shape_link(self, link_idx, bw=None, delay=None, loss=None):
+        # Sets the given shaping parameters of a link, None keeps the current value.
+        if bw is not None:
+            self.link_bw[link_idx] = bw
+        if delay is not None:
+            self.link_delay[link_idx] = delay
+        if loss is not None:
+            self.link_loss[link_idx] = loss
+
+    def link_shaping(self, link_idx):
+        # The link's TCLink parameters (bw, delay, loss), only those set:
+        shaping = {}
+        for param, values in (('bw', self.link_bw), ('delay', self.link_delay), ('loss', self.link_loss)):
+            if values[link_idx]:
+                shaping[param] = values[link_idx]
+        return shaping
+
+    @property
+    def node_count(self):
+        return len(self.names)
+
+    @property
+    def link_count(self):
+        return len(self.link_src)
+
+    def switches(self):
+        kinds = self.kinds
+        return [idx for idx in range(len(kinds)) if kinds[idx] == SWITCH]
+
+    def hosts(self):
+        kinds = self.kinds
+        return [idx for idx in range(len(kinds)) if kinds[idx] == HOST]
+
+    def is_switch(self, idx):
+        return self.kinds[idx] == SWITCH
+
+    def link(self, link_idx):
+        return (self.link_src[link_idx], self.link_src_port[link_idx],
+                self.link_dst[link_idx], self.link_dst_port[link_idx])
+
+    def adjacency(self):
+        # node index -> list of (neighbour index, local port, neighbour port, link index).
+        # Built once in O(nodes + links) and cached until the graph changes.
+        if self._adjacency is None:
+            adj = [[] for _ in range(len(self.names))]
+            for l in range(len(self.link_src)):
+                src, src_port = self.link_src[l], self.link_src_port[l]
+                dst, dst_port = self.link_dst[l], self.link_dst_port[l]
+                adj[src].append((dst, src_port, dst_port, l))
+                adj[dst].append((src, dst_port, src_port, l))
+            self._adjacency = adj
+        return self._adjacency
+
+    def host_attachment(self, host_idx):
+        # Returns (switch index, switch port) of the first switch the host is linked to:
+        for neighbour, _, neighbour_port, _ in self.adjacency()[host_idx]:
+            if self.kinds[neighbour] == SWITCH:
+                return neighbour, neighbour_port
+        return None, None
+
+    # Address formatting of single nodes:
+    def dpid_str(self, idx):
+        return format_dpid(self.dpid[idx])
+
+    def dpid_hex(self, idx):
+        return dpid_to_hex(self.dpid[idx])
+
+    def ip_str(self, idx):
+        return format_ip(self.ip[idx])
+
+    def ip_cidr(self, idx):
+        return format_ip(self.ip[idx]) +'/'+ str(self.prefix_len)
+
+    def mac_str(self, idx):
+        return format_mac(self.mac[idx])
+
+    def host_ips(self, host_indices):
+        # Bulk formatted ips for a list of host indices (e.g. graph.hosts()):
+        ip = self.ip
+        return format_ips([ip[idx] for idx in host_indices])
+
+
+
+## TOPOLOGY CONSTRUCTION ##
+###########################
+
+def from_tables(hosts, switches, net_ip, name='topology'):
+    # Builds a TopologyGraph out of the HOSTS and SWITCHES tables of a topology script.
+    # Host links are added per switch (in table order) before the switch-to-switch links
+    # of the 'links' table, which keeps the port numbering of the former hand-written
+    # addLink chain (and thereby of the .ovxctl.sh mappings) intact. A host may pin its
+    # switch port via an optional 'port' entry, which keeps the other ports stable when
+    # hosts are added later on.
+    # All addresses are reserved in an AddressPlan for net_ip, so duplicate IPs, MACs or
+    # DPIDs in the tables raise an AddressCollision.
+    plan = net_ip if isinstance(net_ip, AddressPlan) else AddressPlan(net_ip)
+    graph = TopologyGraph(name, plan.prefix_len)
+    index = graph.index
+
+    for switch, switch_def in switches.items():
+        switch_idx = graph.add_switch(switch, plan.reserve_dpid(switch_def['dpid']))
+        for host in switch_def['hosts']:
+            if host not in hosts:
+                raise ValueError("Switch "+ switch +" references undefined host "+ host)
+            host_def = hosts[host]
+            host_idx = graph.add_host(host, plan.reserve_ip(host_def['ip']), plan.reserve_mac(host_def['mac']))
+            graph.add_link(host_idx, switch_idx, dst_port=host_def.get('port'))
+
+    # Switch links may be declared on either end (or both), but are only added once:
+    known_links = set()
+    for switch, switch_def in switches.items():
+        switch_idx = index[switch]
+        for linked_switch in switch_def['links']:
+            linked_idx = index.get(linked_switch)
+            if linked_idx is None or not graph.is_switch(linked_idx):
+                raise ValueError("Switch "+ switch +" links to undefined switch "+ linked_switch)
+            link_key = (min(switch_idx, linked_idx), max(switch_idx, linked_idx))
+            if link_key in known_links:
+                continue
+            known_links.add(link_key)
+            graph.add_link(switch_idx, linked_idx)
+
+    return graph
+
+
+class _FabricAddresses(object):
+    # Address source for generated fabrics. All host IPs/MACs and switch DPIDs are
+    # allocated from the AddressPlan in two bulk calls up front, and handed out by index.
+
+    def __init__(self, plan, switch_count, host_count):
+        self.dpids = plan.allocate_dpids(switch_count)
+        self.ips, self.macs = plan.allocate_hosts(host_count)
+        self.next_switch = 0
+        self.next_host = 0
+
+    def add_switch(self, graph, name):
+        s = self.next_switch
+        self.next_switch = s + 1
+        return graph.add_switch(name, self.dpids[s])
+
+    def add_host(self, graph, name):
+        h = self.next_host
+        self.next_host = h + 1
+        return graph.add_host(name, self.ips[h], self.macs[h])
+
+
+def _fabric_plan(net_ip, dpid_base, mac_base):
+    if isinstance(net_ip, AddressPlan):
+        return net_ip
+    return AddressPlan(net_ip, dpid_base=dpid_base, mac_base=mac_base)
+
+
+def linear(switch_count, hosts_per_switch=1, net_ip='10.0.0.0/8', dpid_base=0, mac_base=0):
+    # s1 - s2 - ... - sN, with hosts_per_switch hosts h<switch>_<n> on every switch.
+    plan = _fabric_plan(net_ip, dpid_base, mac_base)
+    graph = TopologyGraph('linear-%d-%d' % (switch_count, hosts_per_switch), plan.prefix_len)
+    addrs = _FabricAddresses(plan, switch_count, switch_count * hosts_per_switch)
+    prev_idx = None
+    for s in range(1, switch_count + 1):
+        switch_idx = addrs.add_switch(graph, 's%d' % s)
+        for h in range(1, hosts_per_switch + 1):
+            graph.add_link(addrs.add_host(graph, 'h%d_%d' % (s, h)), switch_idx)
+        if prev_idx is not None:
+            graph.add_link(prev_idx, switch_idx)
+        prev_idx = switch_idx
+    return graph
+
+
+def leaf_spine(spine_count, leaf_count, hosts_per_leaf, net_ip='10.0.0.0/8', dpid_base=0, mac_base=0):
+    # Every leaf lf<n> connects to every spine sp<n> and to hosts_per_leaf hosts h<leaf>_<n>.
+    plan = _fabric_plan(net_ip, dpid_base, mac_base)
+    graph = TopologyGraph('leafspine-%d-%d-%d' % (spine_count, leaf_count, hosts_per_leaf), plan.prefix_len)
+    addrs = _FabricAddresses(plan, spine_count + leaf_count, leaf_count * hosts_per_leaf)
+    spines = [addrs.add_switch(graph, 'sp%d' % s) for s in range(1, spine_count + 1)]
+    for l in range(1, leaf_count + 1):
+        leaf_idx = addrs.add_switch(graph, 'lf%d' % l)
+        for h in range(1, hosts_per_leaf + 1):
+            graph.add_link(addrs.add_host(graph, 'h%d_%d' % (l, h)), leaf_idx)
+        for spine_idx in spines:
+            graph.add_link(leaf_idx, spine_idx)
+    return graph
+
+
+def fat_tree(k, net_ip='10.0.0.0/8', dpid_base=0, mac_base=0):
+    # Classic k-ary fat-tree: (k/2)^2 core switches, k pods of k/2 aggregation and
+    # k/2 edge switches each, and k/2 hosts per edge switch (k^3/4 hosts in total).
+    if k < 2 or k % 2 != 0:
+        raise ValueError("Fat-tree arity k has to be an even number >= 2, got %d" % k)
+    half = k // 2
+    plan = _fabric_plan(net_ip, dpid_base, mac_base)
+    graph = TopologyGraph('fattree-%d' % k, plan.prefix_len)
+    addrs = _FabricAddresses(plan, half * half + k * k, k * half * half)
+
+    cores = [addrs.add_switch(graph, 'c%d' % c) for c in range(1, half * half + 1)]
+    for pod in range(1, k + 1):
+        aggs = [addrs.add_switch(graph, 'a%d_%d' % (pod, a)) for a in range(1, half + 1)]
+        for e in range(1, half + 1):
+            edge_idx = addrs.add_switch(graph, 'e%d_%d' % (pod, e))
+            for h in range(1, half + 1):
+                graph.add_link(addrs.add_host(graph, 'h%d_%d_%d' % (pod, e, h)), edge_idx)
+            for agg_idx in aggs:
+                graph.add_link(edge_idx, agg_idx)
+        # Aggregation switch a connects to the a-th group of k/2 core switches:
+        for a, agg_idx in enumerate(aggs):
+            for core_idx in cores[a * half:(a + 1) * half]:
+                graph.add_link(agg_idx, core_idx)
+    return graph
+
+
+# Generator registry, used to build fabrics by name from a few parameters:
+FABRICS = {
+    'linear': linear,
+    'leafspine': leaf_spine,
+    'fattree': fat_tree,
+}
+
+
+
+## GATEWAYS ##
+##############
+
+def gre_port_numbers(gateway, graph):
+    # GRE port name -> OpenFlow port number, as requested by add_gateway_config:
+    # the GW's next free ports after its graph links, in port name order.
+    next_port = graph.next_port[graph.index[gateway['switch']]]
+    return dict((port_name, next_port + i) for i, port_name in enumerate(sorted(gateway.get('gre_ports', {}))))
@@ -0,0 +1,232 @@
+__author__ = 'Constantin'
+
+#Python system imports:
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+
+#Own Imports:
+from topology import TopologyGraph
+
+
+
+## CACHE KEYS ##
+################
+
+# Bumped whenever the file layout changes:
+CACHE_FORMAT = 2
+
+# The graph builders themselves are part of every key, so that a changed numbering, address
+# allocation or shaping never loads graphs of the old code: the builder modules together with
+# every module of this directory they import at module level.
+_BUILDER_MODULES = ('topology_loader.py', 'topology.py', 'shaping.py')
+_SRC_DIR = os.path.dirname(os.path.abspath(__file__))
+_MODULE_IMPORT = re.compile(r'^(?:from\s+(\w+)[\w.]*\s+import|import\s+([\w., ]+))', re.M)
+_builder_digest = None
+
+
+def _own_imports(source):
+    # Paths of the modules of this directory, which a module's source imports at module level:
+    names = set()
+    for from_name, import_names in _MODULE_IMPORT.findall(source):
+        names.update([from_name] if from_name else [name.strip().split('.')[0] for name in import_names.split(',')])
+    candidates = (os.path.join(_SRC_DIR, name + '.py') for name in names if name)
+    return [candidate for candidate in candidates if os.path.isfile(candidate)]
+
+
+def source_digest(paths):
+    # Content hash of the modules at paths and of all modules of this directory they import, transitively:
+    sources, pending = {}, [os.path.abspath(path) for path in paths]
+    while pending:
+        path = pending.pop()
+        if path not in sources:
+            with open(path, 'rb') as source_file:
+                sources[path] = source_file.read()
+            pending.extend(_own_imports(sources[path].decode('utf-8')))
+    digest = hashlib.sha256()
+    for path in sorted(sources):
+        digest.update(os.path.basename(path).encode('utf-8') + b'\0' + hashlib.sha256(sources[path]).digest())
+    return digest.hexdigest()
+
+
+def _builder_hash():
+    global _builder_digest
+    if _builder_digest is None:
+        _builder_digest = source_digest([os.path.join(_SRC_DIR, module) for module in _BUILDER_MODULES])
+    return _builder_digest
+
+
+def definition_key(kind, definition):
+    # Content hash of a topology definition (any JSON serialisable value, e.g. the
+    # HOSTS/SWITCHES tables or fabric parameters) together with its address plan inputs.
+    blob = json.dumps([CACHE_FORMAT, _builder_hash(), kind, definition], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()[:32]
+
+
+def file_key(kind, paths, *params):
+    # Content hash of topology files (a script or description and its templates) plus their build parameters.
+    # Scripts count with the modules they import.
+    file_digests = []
+    for path in [paths] if isinstance(paths, str) else paths:
+        if path.endswith('.py'):
+            file_digests.append(source_digest([path]))
+            continue
+        with open(path, 'rb') as topo_file:
+            file_digests.append(hashlib.sha256(topo_file.read()).hexdigest())
+    return definition_key(kind, file_digests + list(params))
+
+
+
+## GRAPH FILE FORMAT ##
+#######################
+
+# File layout: MAGIC, header length (u32), JSON header, then all sections 8 byte aligned.
+# The header holds name, prefix_len, byte order and (offset, length) of every section,
+# the sections are the raw bytes of the TopologyGraph arrays plus the '\n' joined node names.
+MAGIC = b'TOPOGRPH'
+_ARRAY_SECTIONS = ('kinds', 'dpid', 'ip', 'mac', 'next_port', 'cpu',
+                   'link_src', 'link_src_port', 'link_dst', 'link_dst_port', 'link_bw', 'link_delay', 'link_loss')
+
+
+def _align(offset):
+    return (offset + 7) & ~7
+
+
+def write_graph(path, graph):
+    sections = [('names', '\n'.join(graph.names).encode('utf-8'))]
+    sections.extend((section, getattr(graph, section)) for section in _ARRAY_SECTIONS)
+
+    layout, offset = {}, 0
+    for section, data in sections:
+        size = len(data) * getattr(data, 'itemsize', 1)
+        layout[section] = (offset, size)
+        offset = _align(offset + size)
+    header = json.dumps({'name': graph.name, 'prefix_len': graph.prefix_len, 'byteorder': sys.byteorder,
+                         'nodes': len(graph.names), 'sections': layout}).encode('utf-8')
+    data_start = _align(len(MAGIC) + 4 + len(header))
+
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    try:
+        with open(tmp_path, 'wb') as graph_file:
+            graph_file.write(MAGIC + struct.pack('<I', len(header)) + header)
+            for section, data in sections:
+                graph_file.seek(data_start + layout[section][0])
+                graph_file.write(data)
+            graph_file.truncate(data_start + offset)
+        os.rename(tmp_path, path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def read_graph(path):
+    # Maps the file and copies every section straight into the graph's arrays,
+    # without rebuilding the graph or allocating any addresses.
+    with open(path, 'rb') as graph_file:
+        with mmap.mmap(graph_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if mapped[:len(MAGIC)] != MAGIC:
+                raise ValueError("Not a topology graph file: "+ path)
+            header_len, = struct.unpack_from('<I', mapped, len(MAGIC))
+            header_start = len(MAGIC) + 4
+            header = json.loads(mapped[header_start:header_start + header_len].decode('utf-8'))
+            data_start = _align(header_start + header_len)
+
+            def section_bytes(section):
+                offset, size = header['sections'][section]
+                return mapped[data_start + offset:data_start + offset + size]
+
+            graph = TopologyGraph(header['name'], header['prefix_len'])
+            names = section_bytes('names').decode('utf-8')
+            graph.names = names.split('\n') if header['nodes'] else []
+            graph.index = dict((name, idx) for idx, name in enumerate(graph.names))
+            graph.kinds = bytearray(section_bytes('kinds'))
+            swap = header['byteorder'] != sys.byteorder
+            for section in _ARRAY_SECTIONS[1:]:
+                values = array(getattr(graph, section).typecode)
+                values.frombytes(section_bytes(section))
+                if swap:
+                    values.byteswap()
+                setattr(graph, section, values)
+    return graph
+
+
+
+## LRU CACHE ##
+###############
+
+DEFAULT_CACHE_DIR = os.environ.get('TOPOLOGY_CACHE_DIR',
+                                   os.path.join(os.path.expanduser('~'), '.cache', 'cloud-federation', 'topologies'))
+
+
+class TopologyCache(object):
+    # Directory of graph files named by their definition key. Every hit refreshes the
+    # file's mtime, every store evicts the least recently used files beyond max_entries
+    # or max_bytes, so old topology versions drop out by themselves.
+
+    SUFFIX = '.graph'
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_entries=32, max_bytes=512 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + self.SUFFIX)
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            graph = read_graph(path)
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        os.utime(path, None)
+        self.hits += 1
+        return graph
+
+    def put(self, key, graph):
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            write_graph(self._path(key), graph)
+            self.evict()
+        except OSError as e:
+            # A read-only or full cache directory only costs the rebuild:
+            print("Topology cache not written: %s" % e)
+        return graph
+
+    def cached(self, key, build):
+        # Returns the cached graph of key, or builds, stores and returns it.
+        graph = self.get(key)
+        return graph if graph is not None else self.put(key, build())
+
+    def entries(self):
+        # (mtime, size, path) of all cache files, least recently used first:
+        entries = []
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith(self.SUFFIX):
+                stat = os.stat(os.path.join(self.cache_dir, file_name))
+                entries.append((stat.st_mtime, stat.st_size, os.path.join(self.cache_dir, file_name)))
+        return sorted(entries)
+
+    def evict(self):
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        while entries and (len(entries) > self.max_entries or total > self.max_bytes):
+            _, size, path = entries.pop(0)
+            os.remove(path)
+            total -= size
+            evicted += 1
+        return evicted
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
@@ -0,0 +1,454 @@
+__author__ = 'Constantin'
+
+# Declarative topology files (JSON, or YAML if PyYAML is installed):
+#
+#   {"name": "cloud1", "net_ip": "10.1.0.0/16",
+#    "gateway":  {"switch": "GW", "controllers": [...], "gre_ports": {"GW-gre1": "10.1.1.30"}},
+#    "switches": [{"name": "GW", "dpid": "00:00:00:00:00:01:10:00"}, ...],
+#    "hosts":    [{"name": "h1_1_1", "ip": "+11", "mac": "00:00:00:00:01:11", "switch": "SWITCH1"}, ...],
+#    "links":    [["GW", "SWITCH1"], {"src": "SWITCH1", "dst": "SWITCH2", "dst_port": 5}, ...]}
+#
+# 'host_prefix_len' optionally widens the prefix the hosts' interfaces get beyond the one of
+# 'net_ip' (from which the addresses are allocated), as the cloud topologies keep the /8 of the
+# former mininet scripts, so that the hosts of all clouds are on-link through the GRE tunnels.
+#
+# Links may be shaped by 'bw' (Mbit/s), 'delay' (ms) and 'loss' (%), per direction as TCLink does;
+# on hosts these apply to their switch link, next to 'cpu' (the host's share of the CPU). They
+# override the values of the host descriptors (see shaping.py).
+#
+# Files are read section by section and list sections record by record, so the graph of a
+# file with hundreds of thousands of hosts is built without ever holding all records at once.
+# Records are processed in file order, which also defines the port numbering: 'net_ip' has
+# to precede the node sections, switches have to precede the hosts and links using them.
+#
+# A file starting with "$ref" is an overlay of another (template) file: its "vars" replace
+# every ${var} in the template's strings and its other sections replace the template's ones.
+# Overlays may refer to overlays; the template at the end of the chain is streamed.
+
+#Python system imports:
+import json
+import os
+import re
+
+#Own Imports:
+from address_plan import MIN_PREFIX_LEN, AddressPlan
+from topology import TopologyGraph
+
+
+
+## FORMAT ERRORS ##
+###################
+
+class TopologyFormatError(ValueError):
+    pass
+
+
+
+## SCHEMA ##
+############
+
+# Section -> (type, record fields) with record fields as field -> (type, required),
+# where the type may also be a tuple of types (as for numbers):
+_NUMBER = (int, float)
+_SHAPING_FIELDS = {'bw': (_NUMBER, False), 'delay': (_NUMBER, False), 'loss': (_NUMBER, False)}
+_SWITCH_FIELDS = {'name': (str, True), 'dpid': (str, True)}
+_HOST_FIELDS = dict(_SHAPING_FIELDS, name=(str, True), ip=(str, True), mac=(str, True),
+                    switch=(str, True), port=(int, False), cpu=(_NUMBER, False))
+_LINK_FIELDS = dict(_SHAPING_FIELDS, src=(str, True), dst=(str, True), src_port=(int, False), dst_port=(int, False))
+_GATEWAY_FIELDS = {'switch': (str, True), 'controllers': (list, False), 'gre_ports': (dict, False)}
+
+SCHEMA = {
+    '$ref':     (str, None),
+    'name':     (str, None),
+    'net_ip':   (str, None),
+    'host_prefix_len': (int, None),
+    'vars':     (dict, None),
+    'gateway':  (dict, _GATEWAY_FIELDS),
+    'switches': (list, _SWITCH_FIELDS),
+    'hosts':    (list, _HOST_FIELDS),
+    'links':    (list, _LINK_FIELDS),
+}
+
+
+def _check_fields(where, record, fields):
+    if not isinstance(record, dict):
+        raise TopologyFormatError("%s: expected an object, got %r" % (where, record))
+    for field, value in record.items():
+        spec = fields.get(field)
+        if spec is None:
+            raise TopologyFormatError("%s: unknown field '%s'" % (where, field))
+        types = spec[0] if isinstance(spec[0], tuple) else (spec[0],)
+        if type(value) not in types:        # exact types, so that true/false are no ports
+            raise TopologyFormatError("%s: '%s' has to be of type %s"
+                                      % (where, field, ' or '.join(t.__name__ for t in types)))
+    if len(record) < len(fields):
+        for field, (_, required) in fields.items():
+            if required and field not in record:
+                raise TopologyFormatError("%s: missing field '%s'" % (where, field))
+    for field in _SHAPING_FIELDS:
+        if field in record and record[field] < 0:
+            raise TopologyFormatError("%s: '%s' must not be negative" % (where, field))
+    if not 0 <= record.get('cpu', 0) <= 1:
+        raise TopologyFormatError("%s: 'cpu' has to be a share between 0 and 1" % where)
+    return record
+
+
+def check_record(section, index, record):
+    # Validates one record of a list section, links may also be given as [src, dst] pairs.
+    if section == 'links' and isinstance(record, list):
+        if len(record) != 2:
+            raise TopologyFormatError("links[%d]: a link pair needs exactly two nodes" % index)
+        record = {'src': record[0], 'dst': record[1]}
+    return _check_fields('%s[%d]' % (section, index), record, SCHEMA[section][1])
+
+
+def check_section(section, value, is_list):
+    if section not in SCHEMA:
+        raise TopologyFormatError("Unknown section '%s', expected one of: %s" % (section, ', '.join(sorted(SCHEMA))))
+    section_type, fields = SCHEMA[section]
+    if is_list != (section_type is list) or (not is_list and not isinstance(value, section_type)):
+        raise TopologyFormatError("Section '%s' has to be of type %s" % (section, section_type.__name__))
+    if section == 'gateway':
+        _check_fields('gateway', value, fields)
+    return value
+
+
+
+## STREAMING READERS ##
+#######################
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class _JSONSections(object):
+    # Incremental reader of a top-level JSON object: yields (key, is_list, value) per member,
+    # with value being an iterator over the elements for array members. Every element
+    # (or non-array member) is decoded by itself from a sliding buffer.
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.decoder = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        chunk = self.stream.read(self.CHUNK_SIZE)
+        if chunk:
+            self.buf = self.buf[self.pos:] + chunk
+            self.pos = 0
+        else:
+            self.eof = True
+
+    def _peek(self):
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return ''
+            self._fill()
+
+    def _expect(self, chars):
+        char = self._peek()
+        if not char or char not in chars:
+            raise TopologyFormatError("Malformed JSON: expected %s, got %r at offset %d of the buffer"
+                                      % (' or '.join(chars), char or 'end of file', self.pos))
+        self.pos += 1
+        return char
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except ValueError as e:
+                if self.eof:
+                    raise TopologyFormatError("Malformed JSON: %s" % e)
+                self._fill()
+                continue
+            # A number (or literal) ending at the buffer end might continue in the next chunk:
+            if end == len(self.buf) and not self.eof:
+                self._fill()
+                continue
+            self.pos = end
+            return value
+
+    def _items(self):
+        if self._peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield self._value()
+            if self._expect(',]') == ']':
+                return
+
+    def __iter__(self):
+        self._expect('{')
+        if self._peek() == '}':
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            if self._peek() == '[':
+                self.pos += 1
+                items = self._items()
+                yield key, True, items
+                for _ in items:     # skip whatever the consumer left over
+                    pass
+            else:
+                yield key, False, self._value()
+            if self._expect(',}') == '}':
+                return
+
+
+def _yaml_sections(stream):
+    # The same section/record stream for YAML, composed node by node from the parser events.
+    try:
+        import yaml
+    except ImportError:
+        raise TopologyFormatError("YAML topology files need PyYAML (pip install pyyaml), or use JSON")
+    loader = yaml.SafeLoader(stream)
+
+    def value():
+        return loader.construct_document(loader.compose_node(None, None))
+
+    def items():
+        while not loader.check_event(yaml.SequenceEndEvent):
+            yield value()
+        loader.get_event()
+
+    try:
+        loader.get_event()                                      # StreamStart
+        if not loader.check_event(yaml.DocumentStartEvent):
+            return
+        loader.get_event()
+        if not loader.check_event(yaml.MappingStartEvent):
+            raise TopologyFormatError("A YAML topology file has to be a mapping")
+        loader.get_event()
+        while not loader.check_event(yaml.MappingEndEvent):
+            key = value()
+            if loader.check_event(yaml.SequenceStartEvent):
+                loader.get_event()
+                section_items = items()
+                yield key, True, section_items
+                for _ in section_items:
+                    pass
+            else:
+                yield key, False, value()
+    except yaml.YAMLError as e:
+        raise TopologyFormatError("Malformed YAML: %s" % e)
+    finally:
+        loader.dispose()
+
+
+def read_sections(path):
+    # Yields (key, is_list, value) for every top-level section of a topology file.
+    with open(path) as topo_file:
+        if path.endswith(('.yaml', '.yml')):
+            for section in _yaml_sections(topo_file):
+                yield section
+        else:
+            for section in _JSONSections(topo_file):
+                yield section
+
+
+
+## TEMPLATES ##
+###############
+
+_VARIABLE = re.compile(r'\$\{(\w+)\}')
+
+
+def substitute(value, variables):
+    # Replaces ${var} in all strings of a (nested) record.
+    if not variables:
+        return value
+    if isinstance(value, str):
+        if '${' not in value:
+            return value
+        try:
+            return _VARIABLE.sub(lambda match: str(variables[match.group(1)]), value)
+        except KeyError as e:
+            raise TopologyFormatError("Undefined template variable %s in %r" % (e, value))
+    if isinstance(value, dict):
+        return dict((key, substitute(item, variables)) for key, item in value.items())
+    if isinstance(value, list):
+        return [substitute(item, variables) for item in value]
+    return value
+
+
+
+## LOADER ##
+############
+
+TOPOLOGY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'topologies')
+TEMPLATE_SUFFIXES = ('.template.json', '.template.yaml', '.template.yml')
+
+
+class FileTopology(object):
+    # A topology described by a topology file (and its templates). Instances stand in for the
+    # former per-cloud Topo classes: calling one returns the mininet topology, while
+    # build_graph() and the metadata (name, net_ip, gateway) work without mininet.
+
+    def __init__(self, path, **variables):
+        self.path = path
+        self.variables = variables      # take precedence over the vars of all files
+        self.paths = [path]             # the file and its templates, filled by sections()
+        self._metadata = None
+
+    def sections(self):
+        # Yields the validated (key, is_list, value) sections of the resolved file chain,
+        # with all template variables substituted and list records checked one by one.
+        overlay, variables, path = {}, dict(self.variables), self.path
+        paths = []
+        while True:
+            if path in paths:
+                raise TopologyFormatError("Template cycle: "+ ' -> '.join(paths + [path]))
+            paths.append(path)
+            file_sections = read_sections(path)
+            first = next(file_sections, None)
+            if first is None or first[0] != '$ref':
+                break
+            # Overlays are small, their sections are kept until the template is streamed:
+            for key, is_list, value in file_sections:
+                value = check_section(key, list(value) if is_list else value, is_list)
+                if key == 'vars':
+                    for name, default in value.items():
+                        variables.setdefault(name, default)
+                else:
+                    overlay.setdefault(key, (is_list, value))
+            path = os.path.join(os.path.dirname(path), check_section('$ref', first[2], first[1]))
+        self.paths = paths
+
+        sections = [first] if first is not None else []
+        for key, is_list, value in _chain(sections, file_sections):
+            if key == 'vars':
+                for name, default in check_section(key, value, is_list).items():
+                    variables.setdefault(name, default)
+            if key in overlay:
+                is_list, value = overlay.pop(key)
+            yield self._checked(key, is_list, value, variables)
+        for key, (is_list, value) in sorted(overlay.items()):
+            yield self._checked(key, is_list, value, variables)
+
+    @staticmethod
+    def _checked(key, is_list, value, variables):
+        if not is_list:
+            return key, False, check_section(key, substitute(value, variables), False)
+        check_section(key, None, True)
+        return key, True, (check_record(key, index, substitute(record, variables))
+                           for index, record in enumerate(value))
+
+    def metadata(self):
+        # name, net_ip and gateway; stops reading once all three were found.
+        if self._metadata is None:
+            metadata = {'name': self.default_name(), 'net_ip': None, 'gateway': None}
+            found = set()
+            for key, is_list, value in self.sections():
+                if key in metadata:
+                    metadata[key] = value
+                    found.add(key)
+                    if len(found) == len(metadata):
+                        break
+            if metadata['net_ip'] is None:
+                raise TopologyFormatError(self.path +" defines no 'net_ip'")
+            self._metadata = metadata
+        return self._metadata
+
+    def default_name(self):
+        # 'cloud1.ovx' for .../cloud1.ovx.json, used for files without a 'name' section:
+        return os.path.splitext(os.path.basename(self.path))[0]
+
+    @property
+    def name(self):
+        return self.metadata()['name']
+
+    @property
+    def net_ip(self):
+        return self.metadata()['net_ip']
+
+    @property
+    def gateway(self):
+        return self.metadata()['gateway']
+
+    def build_graph(self, net_ip=None):
+        # Streams the file chain into a TopologyGraph, net_ip overrides the file's 'net_ip'.
+        graph = plan = index = host_prefix_len = None
+        name = self.default_name()
+        known_links = set()
+
+        def node(where, name, want_switch):
+            idx = index.get(name) if index is not None else None
+            if idx is None or graph.is_switch(idx) != want_switch:
+                raise TopologyFormatError("%s references undefined %s %s"
+                                          % (where, 'switch' if want_switch else 'node', name))
+            return idx
+
+        for key, is_list, value in self.sections():
+            if key == 'name':
+                name = value
+                if graph is not None:
+                    graph.name = name
+            elif key == 'net_ip':
+                plan = AddressPlan(net_ip or value)
+                graph = TopologyGraph(name, plan.prefix_len)
+                index = graph.index
+            elif key == 'host_prefix_len':
+                host_prefix_len = value
+            elif key in ('switches', 'hosts', 'links'):
+                if graph is None:
+                    raise TopologyFormatError("Section 'net_ip' has to precede section '%s'" % key)
+                for record in value:
+                    if key == 'switches':
+                        graph.add_switch(record['name'], plan.reserve_dpid(record['dpid']))
+                    elif key == 'hosts':
+                        switch_idx = node('Host '+ record['name'], record['switch'], True)
+                        host_idx = graph.add_host(record['name'], plan.reserve_ip(record['ip']),
+                                                  plan.reserve_mac(record['mac']))
+                        graph.add_link(host_idx, switch_idx, dst_port=record.get('port'), **_shaping(record))
+                        graph.cpu[host_idx] = record.get('cpu', 0.0)
+                    else:
+                        where = 'Link %s-%s' % (record['src'], record['dst'])
+                        src_idx = node(where, record['src'], True)
+                        dst_idx = node(where, record['dst'], True)
+                        link_key = (min(src_idx, dst_idx), max(src_idx, dst_idx))
+                        if link_key in known_links:
+                            continue
+                        known_links.add(link_key)
+                        graph.add_link(src_idx, dst_idx, record.get('src_port'), record.get('dst_port'),
+                                       **_shaping(record))
+        if graph is None:
+            raise TopologyFormatError(self.path +" defines no 'net_ip'")
+        if host_prefix_len is not None:
+            if not MIN_PREFIX_LEN <= host_prefix_len <= plan.prefix_len:
+                raise TopologyFormatError("%s: 'host_prefix_len' has to be between /%d and the /%d of its net_ip"
+                                          % (self.path, MIN_PREFIX_LEN, plan.prefix_len))
+            graph.prefix_len = host_prefix_len
+        return graph
+
+    def __call__(self, net_ip=None):
+        # Mininet is only imported, once the mininet topology is actually needed:
+        from fabric_topo import FabricTopo
+        return FabricTopo(self.build_graph(net_ip))
+
+
+def _shaping(record):
+    return dict((field, float(record[field])) for field in _SHAPING_FIELDS if field in record)
+
+
+def _chain(*iterables):
+    for iterable in iterables:
+        for item in iterable:
+            yield item
+
+
+def topology_files(topology_dir=TOPOLOGY_DIR):
+    # Topology name ('cloud1.ovx') -> file path, for every non-template file in topology_dir:
+    files = {}
+    for file_name in sorted(os.listdir(topology_dir)) if os.path.isdir(topology_dir) else ():
+        if file_name.endswith(('.json', '.yaml', '.yml')) and not file_name.endswith(TEMPLATE_SUFFIXES):
+            files[file_name.rsplit('.', 1)[0]] = os.path.join(topology_dir, file_name)
+    return files
@@ -0,0 +1,372 @@
+__author__ = 'Constantin'
+
+#Python system imports:
+import base64
+import getopt
+import http.client
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+
+## OVX JSON-RPC SESSION ##
+##########################
+
+class OVXError(Exception):
+    pass
+
+
+# Read-only calls, which may be sent again after a lost reply. All others (createPort, connectLink, ...)
+# would be applied twice, if OVX had received them already:
+IDEMPOTENT_METHODS = ('getPhysicalTopology', 'getPhysicalHosts', 'getPhysicalFlowtable', 'listVirtualNetworks',
+                      'getVirtualTopology', 'getVirtualHosts', 'getVirtualFlowtable', 'getVirtualAddressMapping',
+                      'getVirtualSwitchMapping', 'getVirtualLinkMapping')
+
+
+def dpid_to_int(dpid):
+    # OVX expects dpids as integers, the same way ovxctl.py converts them:
+    return dpid if isinstance(dpid, int) else int(dpid.replace(':', ''), 16)
+
+
+def int_to_dpid(dpid_int):
+    hex_str = '%016x' % dpid_int
+    return ':'.join([hex_str[i:i+2] for i in range(0, 16, 2)])
+
+
+class OVXSession(object):
+    # One persistent (keep-alive) HTTP connection to the OVX JSON-RPC API.
+    # This replaces the ovxctl.py call-per-process model: the connection and the basic auth
+    # header are set up once and reused for every call.
+
+    def __init__(self, host='localhost', port=8080, user='admin', password='', timeout=30):
+        self.host = host
+        self.port = int(port)
+        self.timeout = timeout
+        credentials = ('%s:%s' % (user, password)).encode('utf-8')
+        self.headers = {'Content-Type': 'application/json-rpc',
+                        'Authorization': 'Basic ' + base64.b64encode(credentials).decode('ascii')}
+        self.conn = None
+        self.call_id = 0
+
+    def _connect(self):
+        self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def call(self, method, params=None, path='tenant'):
+        self.call_id += 1
+        request = {'id': self.call_id, 'method': method, 'jsonrpc': '2.0'}
+        if params is not None:
+            request['params'] = params
+        body = json.dumps(request)
+
+        # A keep-alive connection may have been dropped by OVX meanwhile, retry once on a new one.
+        # Once the request was sent, only idempotent calls are retried:
+        for attempt in (1, 2):
+            if self.conn is None:
+                self._connect()
+            sent = False
+            try:
+                self.conn.request('POST', '/' + path, body, self.headers)
+                sent = True
+                response = self.conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                self.close()
+                if attempt == 2 or (sent and method not in IDEMPOTENT_METHODS):
+                    raise
+        if response.status != 200:
+            raise OVXError("%s failed with HTTP %d: %s" % (method, response.status, data[:200]))
+
+        reply = json.loads(data.decode('utf-8'))
+        if reply.get('error') is not None:
+            raise OVXError("%s failed: %s" % (method, reply['error']))
+        return reply.get('result')
+
+
+
+## OVX TENANT CLIENT ##
+#######################
+
+class OVXClient(object):
+    # Tenant API of OpenVirteX on top of per-thread persistent sessions.
+    # Independent calls can be issued concurrently via run_batch(), each worker thread
+    # keeps its own keep-alive connection to OVX.
+
+    def __init__(self, host='localhost', port=8080, user='admin', password='', workers=8, timeout=30):
+        self.session_args = (host, port, user, password, timeout)
+        self.workers = workers
+        self._local = threading.local()
+        self._sessions = []
+        self._lock = threading.Lock()
+        self.call_count = 0
+
+    def session(self):
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = OVXSession(*self.session_args)
+            self._local.session = session
+            with self._lock:
+                self._sessions.append(session)
+        return session
+
+    def close(self):
+        with self._lock:
+            for session in self._sessions:
+                session.close()
+
+    def call(self, method, params=None, path='tenant'):
+        with self._lock:
+            self.call_count += 1
+        return self.session().call(method, params, path)
+
+    def run_batch(self, tasks):
+        # Runs independent tasks (callables without arguments) concurrently and returns
+        # their results in task order. The first failing task aborts the batch.
+        if self.workers <= 1 or len(tasks) <= 1:
+            return [task() for task in tasks]
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(tasks))) as pool:
+            return list(pool.map(lambda task: task(), tasks))
+
+    # Tenant network API (parameters as in ovxctl.py):
+    def create_network(self, controllers, network_address, mask):
+        reply = self.call('createNetwork', {'controllerUrls': list(controllers),
+                                            'networkAddress': network_address, 'mask': int(mask)})
+        return reply['tenantId']
+
+    def create_switch(self, tenant_id, dpids, vdpid=0):
+        reply = self.call('createSwitch', {'tenantId': tenant_id, 'dpids': [dpid_to_int(d) for d in dpids],
+                                           'dpid': dpid_to_int(vdpid)})
+        return reply['vdpid']
+
+    def set_internal_routing(self, tenant_id, vdpid, algorithm='spf', backup_num=1):
+        return self.call('setInternalRouting', {'tenantId': tenant_id, 'vdpid': dpid_to_int(vdpid),
+                                                'algorithm': algorithm, 'backup_num': int(backup_num)})
+
+    def create_port(self, tenant_id, dpid, port):
+        reply = self.call('createPort', {'tenantId': tenant_id, 'dpid': dpid_to_int(dpid), 'port': int(port)})
+        return reply['vdpid'], reply['vport']
+
+    def connect_link(self, tenant_id, src_vdpid, src_vport, dst_vdpid, dst_vport, algorithm='spf', backup_num=1):
+        reply = self.call('connectLink', {'tenantId': tenant_id,
+                                          'srcDpid': dpid_to_int(src_vdpid), 'srcPort': int(src_vport),
+                                          'dstDpid': dpid_to_int(dst_vdpid), 'dstPort': int(dst_vport),
+                                          'algorithm': algorithm, 'backup_num': int(backup_num)})
+        return reply['linkId']
+
+    def connect_host(self, tenant_id, vdpid, vport, mac):
+        reply = self.call('connectHost', {'tenantId': tenant_id, 'vdpid': dpid_to_int(vdpid),
+                                          'vport': int(vport), 'mac': mac})
+        return reply['hostId']
+
+    def start_network(self, tenant_id):
+        return self.call('startNetwork', {'tenantId': tenant_id})
+
+    def start_switch(self, tenant_id, vdpid):
+        return self.call('startSwitch', {'tenantId': tenant_id, 'vdpid': dpid_to_int(vdpid)})
+
+    def start_port(self, tenant_id, vdpid, vport):
+        return self.call('startPort', {'tenantId': tenant_id, 'vdpid': dpid_to_int(vdpid), 'vport': int(vport)})
+
+    def stop_network(self, tenant_id):
+        return self.call('stopNetwork', {'tenantId': tenant_id})
+
+    def remove_network(self, tenant_id):
+        return self.call('removeNetwork', {'tenantId': tenant_id})
+
+    def remove_switch(self, tenant_id, vdpid):
+        return self.call('removeSwitch', {'tenantId': tenant_id, 'vdpid': dpid_to_int(vdpid)})
+
+    def remove_port(self, tenant_id, vdpid, vport):
+        return self.call('removePort', {'tenantId': tenant_id, 'vdpid': dpid_to_int(vdpid), 'vport': int(vport)})
+
+    def disconnect_link(self, tenant_id, link_id):
+        return self.call('disconnectLink', {'tenantId': tenant_id, 'linkId': int(link_id)})
+
+    def disconnect_host(self, tenant_id, host_id):
+        return self.call('disconnectHost', {'tenantId': tenant_id, 'hostId': int(host_id)})
+
+    def physical_topology(self):
+        return self.call('getPhysicalTopology', path='status')
+
+
+
+## DECLARATIVE NETWORK SPECS ##
+###############################
+
+def load_spec(spec_path):
+    # Reads a network spec in the embedder format of bigswitch-cloud1.json, either as a full
+    # createNetwork request ({"method": ..., "params": {"network": ...}}) or as the bare
+    # {"network": ...} object.
+    with open(spec_path) as spec_file:
+        spec = json.load(spec_file)
+    if 'params' in spec:
+        spec = spec['params']
+    network = spec.get('network')
+    if network is None:
+        raise OVXError("No 'network' definition found in "+ spec_path)
+    if network.get('type', 'bigswitch') not in ('bigswitch', 'physical'):
+        raise OVXError("Unsupported network type: %s" % network.get('type'))
+    for key in ('controller', 'subnet', 'hosts'):
+        if key not in network:
+            raise OVXError("Network spec "+ spec_path +" is missing '"+ key +"'")
+    return network
+
+
+class _PortMap(object):
+    # Physical (dpid, port) -> virtual (vdpid, vport), filled from the createPort replies.
+
+    def __init__(self):
+        self.ports = {}
+
+    def add(self, dpid, port, vdpid, vport):
+        self.ports[(dpid_to_int(dpid), int(port))] = (vdpid, vport)
+
+    def __getitem__(self, dpid_port):
+        return self.ports[(dpid_to_int(dpid_port[0]), int(dpid_port[1]))]
+
+
+def provision(client, network, timings=None):
+    # Provisions one tenant network in dependency ordered batches:
+    #   createNetwork -> createSwitch(es) -> createPort(s) -> connectLink(s) + connectHost(s) -> startNetwork
+    # Ports are created concurrently across virtual switches, but one after the other (in physical
+    # dpid and port order) per virtual switch, as OVX numbers the vports of a switch in creation order.
+    # A big switch thereby gets all its ports serially. Links and hosts are connected concurrently.
+    timings = timings if timings is not None else []
+
+    def timed(phase, function):
+        start = time.time()
+        result = function()
+        timings.append((phase, time.time() - start))
+        return result
+
+    net_address, mask = network['subnet'].split('/')
+    routing = network.get('routing', {})
+    algorithm, backup_num = routing.get('algorithm', 'spf'), routing.get('backup_num', 1)
+    hosts = network['hosts']
+    links = network.get('links', [])
+
+    tenant_id = timed('network', lambda: client.create_network(network['controller']['ctrls'], net_address, mask))
+
+    # Virtual switches: one big switch over all physical switches, or one per physical switch:
+    switches = network.get('switches')
+    if switches is None:
+        switches = client.physical_topology()['switches']
+    switches = [int_to_dpid(dpid_to_int(dpid)) for dpid in switches]
+    if network.get('type', 'bigswitch') == 'bigswitch':
+        def create_bigswitch():
+            vdpid = client.create_switch(tenant_id, switches)
+            client.set_internal_routing(tenant_id, vdpid, algorithm, backup_num)
+            return {dpid: vdpid for dpid in switches}
+        vswitches = timed('switches', create_bigswitch)
+    else:
+        vdpids = timed('switches', lambda: client.run_batch(
+            [(lambda dpid=dpid: client.create_switch(tenant_id, [dpid])) for dpid in switches]))
+        vswitches = dict(zip(switches, vdpids))
+
+    # Ports of all host attachments and link ends, grouped per virtual switch:
+    vswitch_of = dict((dpid_to_int(dpid), vdpid) for dpid, vdpid in vswitches.items())
+    vswitch_ports = {}
+    for end in hosts + [end for link in links for end in (link['src'], link['dst'])]:
+        dpid = dpid_to_int(end['dpid'])
+        vswitch_ports.setdefault(vswitch_of.get(dpid, dpid), set()).add((dpid, int(end['port'])))
+
+    port_map = _PortMap()
+
+    def create_switch_ports(ports):
+        for dpid, port in sorted(ports):
+            vdpid, vport = client.create_port(tenant_id, dpid, port)
+            port_map.add(dpid, port, vdpid, vport)
+
+    timed('ports', lambda: client.run_batch(
+        [(lambda ports=ports: create_switch_ports(ports)) for ports in vswitch_ports.values()]))
+
+    # Links and hosts only depend on the ports and not on each other:
+    link_tasks = [(lambda link=link: client.connect_link(
+        tenant_id, *(port_map[(link['src']['dpid'], link['src']['port'])] +
+                     port_map[(link['dst']['dpid'], link['dst']['port'])]), algorithm=algorithm, backup_num=backup_num))
+        for link in links]
+    host_tasks = [(lambda host=host: client.connect_host(
+        tenant_id, *(port_map[(host['dpid'], host['port'])] + (host['mac'],))))
+        for host in hosts]
+    ids = timed('links+hosts', lambda: client.run_batch(link_tasks + host_tasks))
+
+    timed('start', lambda: client.start_network(tenant_id))
+
+    return {'tenantId': tenant_id,
+            'vswitches': dict((dpid, int_to_dpid(vdpid)) for dpid, vdpid in vswitches.items()),
+            'linkIds': ids[:len(link_tasks)],
+            'hostIds': ids[len(link_tasks):]}
+
+
+
+## MAIN ##
+##########
+
+def _print_help():
+    print("Usage: python3 ovx_client.py [OPTIONS] SPEC.json\n"
+          "Provisions the tenant network of SPEC.json (e.g. bigswitch-cloud1.json) on OpenVirteX.\n\n"
+          "  --ovx_host HOST    OVX API host (default: localhost)\n"
+          "  --ovx_port PORT    OVX API port (default: 8080)\n"
+          "  -u | --user USER   OVX API user (default: admin)\n"
+          "  -p | --password PW OVX API password (default: empty)\n"
+          "  -c | --ctrl URL    Tenant controller, overrides the spec's ctrls (may be repeated)\n"
+          "  -w | --workers N   Concurrent API calls (default: 8)\n"
+          "  -h | --help        Prints this help.")
+
+
+if __name__ == '__main__':
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "hu:p:c:w:", ["help", "ovx_host=", "ovx_port=",
+                                                                "user=", "password=", "ctrl=", "workers="])
+    except getopt.GetoptError as e:
+        print("Parsing Error of command parameters: %s" % e)
+        sys.exit(2)
+
+    client_args = {}
+    ctrls = []
+    for opt, arg in opts:
+        if opt in ('-h', '--help'):
+            _print_help()
+            sys.exit(0)
+        elif opt == '--ovx_host':
+            client_args['host'] = arg
+        elif opt == '--ovx_port':
+            client_args['port'] = int(arg)
+        elif opt in ('-u', '--user'):
+            client_args['user'] = arg
+        elif opt in ('-p', '--password'):
+            client_args['password'] = arg
+        elif opt in ('-c', '--ctrl'):
+            ctrls.append(arg)
+        elif opt in ('-w', '--workers'):
+            client_args['workers'] = int(arg)
+    if len(args) != 1:
+        _print_help()
+        sys.exit(2)
+
+    network = load_spec(args[0])
+    if ctrls:
+        network['controller']['ctrls'] = ctrls
+
+    client = OVXClient(**client_args)
+    timings = []
+    try:
+        result = provision(client, network, timings)
+    except OVXError as e:
+        print("Provisioning failed: %s" % e)
+        sys.exit(1)
+    finally:
+        client.close()
+
+    print("Virtual network has been created and started (tenant_id %s)." % result['tenantId'])
+    for phase, duration in timings:
+        print("  %-12s %8.3fs" % (phase, duration))
+    print("  %-12s %8d calls" % ('total', client.call_count))
@@ -0,0 +1,201 @@
+__author__ = 'Constantin'
+
+#Python system imports:
+import json
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+
+## MOCK OVX STATE ##
+####################
+
+# OVX virtual dpids carry the 00:a4:23:05 prefix (see the .ovxctl.sh mappings):
+VDPID_PREFIX = 0x00a4230500000000
+
+
+class MockOVX(object):
+    # In-memory model of the OVX tenant API, enough to check provisioning clients:
+    # every call is validated against the tenant state and recorded in self.calls.
+
+    def __init__(self, physical_switches=()):
+        self.lock = threading.Lock()
+        self.physical_switches = [int(str(dpid).replace(':', ''), 16) if isinstance(dpid, str) else dpid
+                                  for dpid in physical_switches]
+        self.tenants = {}
+        self.calls = []
+
+    def _tenant(self, params):
+        tenant = self.tenants.get(params.get('tenantId'))
+        if tenant is None:
+            raise ValueError("Unknown tenant %s" % params.get('tenantId'))
+        return tenant
+
+    def _vswitch(self, tenant, vdpid):
+        vswitch = tenant['switches'].get(vdpid)
+        if vswitch is None:
+            raise ValueError("Unknown virtual switch %#x" % vdpid)
+        return vswitch
+
+    def handle(self, method, params):
+        with self.lock:
+            self.calls.append((method, params))
+            handler = getattr(self, 'do_' + method, None)
+            if handler is None:
+                raise ValueError("Unknown method " + method)
+            return handler(params)
+
+    def do_getPhysicalTopology(self, params):
+        return {'switches': ['%016x' % dpid for dpid in self.physical_switches], 'links': []}
+
+    def do_createNetwork(self, params):
+        tenant_id = len(self.tenants) + 1
+        self.tenants[tenant_id] = {'controllers': params['controllerUrls'], 'started': False,
+                                   'switches': {}, 'physical': {}, 'links': {}, 'hosts': {},
+                                   'next_vdpid': VDPID_PREFIX + 1, 'next_link': 1, 'next_host': 1}
+        return {'tenantId': tenant_id}
+
+    def do_createSwitch(self, params):
+        tenant = self._tenant(params)
+        # Ids are never handed out twice, also not after a removal (as in OVX):
+        vdpid = params.get('dpid')
+        if not vdpid:
+            vdpid = tenant['next_vdpid']
+            tenant['next_vdpid'] += 1
+        if vdpid in tenant['switches']:
+            raise ValueError("Virtual switch %#x already exists" % vdpid)
+        for dpid in params['dpids']:
+            if dpid in tenant['physical']:
+                raise ValueError("Physical switch %#x is already mapped" % dpid)
+            tenant['physical'][dpid] = vdpid
+        tenant['switches'][vdpid] = {'dpids': params['dpids'], 'ports': {}, 'next_vport': 1}
+        return {'tenantId': params['tenantId'], 'vdpid': vdpid}
+
+    def do_setInternalRouting(self, params):
+        self._vswitch(self._tenant(params), params['vdpid'])
+        return {'tenantId': params['tenantId'], 'vdpid': params['vdpid']}
+
+    def do_createPort(self, params):
+        tenant = self._tenant(params)
+        vdpid = tenant['physical'].get(params['dpid'])
+        if vdpid is None:
+            raise ValueError("Physical switch %#x is not mapped" % params['dpid'])
+        vswitch = tenant['switches'][vdpid]
+        ports = vswitch['ports']
+        if (params['dpid'], params['port']) in ports.values():
+            raise ValueError("Port %d of %#x is already mapped" % (params['port'], params['dpid']))
+        vport = vswitch['next_vport']
+        vswitch['next_vport'] += 1
+        ports[vport] = (params['dpid'], params['port'])
+        return {'tenantId': params['tenantId'], 'vdpid': vdpid, 'vport': vport}
+
+    def do_connectLink(self, params):
+        tenant = self._tenant(params)
+        for dpid_key, port_key in (('srcDpid', 'srcPort'), ('dstDpid', 'dstPort')):
+            if params[port_key] not in self._vswitch(tenant, params[dpid_key])['ports']:
+                raise ValueError("Unknown virtual port %d on %#x" % (params[port_key], params[dpid_key]))
+        link_id = tenant['next_link']
+        tenant['next_link'] += 1
+        tenant['links'][link_id] = params
+        return {'tenantId': params['tenantId'], 'linkId': link_id}
+
+    def do_connectHost(self, params):
+        tenant = self._tenant(params)
+        if params['vport'] not in self._vswitch(tenant, params['vdpid'])['ports']:
+            raise ValueError("Unknown virtual port %d on %#x" % (params['vport'], params['vdpid']))
+        host_id = tenant['next_host']
+        tenant['next_host'] += 1
+        tenant['hosts'][host_id] = params
+        return {'tenantId': params['tenantId'], 'hostId': host_id}
+
+    def do_startNetwork(self, params):
+        self._tenant(params)['started'] = True
+        return {'tenantId': params['tenantId'], 'isBooted': True}
+
+    def do_startSwitch(self, params):
+        self._vswitch(self._tenant(params), params['vdpid'])
+        return {'tenantId': params['tenantId'], 'vdpid': params['vdpid']}
+
+    def do_startPort(self, params):
+        if params['vport'] not in self._vswitch(self._tenant(params), params['vdpid'])['ports']:
+            raise ValueError("Unknown virtual port %d on %#x" % (params['vport'], params['vdpid']))
+        return {'tenantId': params['tenantId'], 'vdpid': params['vdpid'], 'vport': params['vport']}
+
+    def do_stopNetwork(self, params):
+        self._tenant(params)['started'] = False
+        return {'tenantId': params['tenantId'], 'isBooted': False}
+
+    def do_removeNetwork(self, params):
+        self._tenant(params)
+        del self.tenants[params['tenantId']]
+        return None
+
+    def do_removeSwitch(self, params):
+        tenant = self._tenant(params)
+        vswitch = self._vswitch(tenant, params['vdpid'])
+        for dpid in vswitch['dpids']:
+            del tenant['physical'][dpid]
+        del tenant['switches'][params['vdpid']]
+        return None
+
+    def do_removePort(self, params):
+        del self._vswitch(self._tenant(params), params['vdpid'])['ports'][params['vport']]
+        return None
+
+    def do_disconnectLink(self, params):
+        del self._tenant(params)['links'][params['linkId']]
+        return None
+
+    def do_disconnectHost(self, params):
+        del self._tenant(params)['hosts'][params['hostId']]
+        return None
+
+
+
+## MOCK JSON-RPC SERVER ##
+##########################
+
+class _RPCHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'     # keep-alive, like the jetty server of OVX
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers['Content-Length'])).decode('utf-8'))
+        reply = {'id': request.get('id'), 'jsonrpc': '2.0'}
+        try:
+            reply['result'] = self.server.ovx.handle(request['method'], request.get('params', {}))
+        except (ValueError, KeyError) as e:
+            reply['error'] = {'code': -32602, 'message': str(e)}
+        body = json.dumps(reply).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json-rpc')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MockOVXServer(ThreadingMixIn, HTTPServer):
+    # Local JSON-RPC server speaking the OVX tenant/status API on /tenant and /status.
+    # Port 0 picks a free port, see self.server_address.
+    daemon_threads = True
+
+    def __init__(self, host='localhost', port=0, physical_switches=()):
+        HTTPServer.__init__(self, (host, port), _RPCHandler)
+        self.ovx = MockOVX(physical_switches)
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever)
+        thread.daemon = True
+        thread.start()
+        return self
+
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8080
+    server = MockOVXServer('localhost', port, physical_switches=sys.argv[2:])
+    print("Mock OVX JSON-RPC API listening on %s:%d..." % server.server_address)
+    server.serve_forever()
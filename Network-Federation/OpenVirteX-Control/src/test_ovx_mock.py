@@ -0,0 +1,69 @@
+__author__ = 'Constantin'
+
+#Python system imports:
+import pytest
+
+#Own Imports:
+from ovx_client import OVXClient, OVXError
+from ovx_mock import VDPID_PREFIX, MockOVX, MockOVXServer
+
+
+
+## MOCK OVX STATE ##
+####################
+
+DPIDS = [0x1100, 0x1200]
+
+
+def tenant_with_switch(ovx):
+    tenant_id = ovx.handle('createNetwork', {'controllerUrls': ['tcp:localhost:6633'],
+                                             'networkAddress': '10.0.0.0', 'mask': 16})['tenantId']
+    vdpid = ovx.handle('createSwitch', {'tenantId': tenant_id, 'dpids': DPIDS})['vdpid']
+    return tenant_id, vdpid
+
+
+def create_port(ovx, tenant_id, dpid, port):
+    return ovx.handle('createPort', {'tenantId': tenant_id, 'dpid': dpid, 'port': port})['vport']
+
+
+def test_vports_are_not_reused():
+    ovx = MockOVX(DPIDS)
+    tenant_id, vdpid = tenant_with_switch(ovx)
+    assert [create_port(ovx, tenant_id, 0x1100, port) for port in (1, 2, 3)] == [1, 2, 3]
+    ovx.handle('removePort', {'tenantId': tenant_id, 'vdpid': vdpid, 'vport': 1})
+    assert create_port(ovx, tenant_id, 0x1200, 1) == 4
+    assert ovx.tenants[tenant_id]['switches'][vdpid]['ports'] == {2: (0x1100, 2), 3: (0x1100, 3), 4: (0x1200, 1)}
+    # The removed physical port can be mapped again, to a new vport:
+    assert create_port(ovx, tenant_id, 0x1100, 1) == 5
+    with pytest.raises(ValueError):
+        create_port(ovx, tenant_id, 0x1100, 1)
+
+
+def test_vdpids_are_not_reused():
+    ovx = MockOVX(DPIDS)
+    tenant_id, vdpid = tenant_with_switch(ovx)
+    assert vdpid == VDPID_PREFIX + 1
+    ovx.handle('removeSwitch', {'tenantId': tenant_id, 'vdpid': vdpid})
+    assert ovx.handle('createSwitch', {'tenantId': tenant_id, 'dpids': [0x1100]})['vdpid'] == VDPID_PREFIX + 2
+    assert ovx.handle('createSwitch', {'tenantId': tenant_id, 'dpids': [0x1200]})['vdpid'] == VDPID_PREFIX + 3
+
+
+
+## JSON-RPC ##
+##############
+
+def test_client_against_server():
+    server = MockOVXServer(physical_switches=['00:00:00:00:00:00:11:00']).start()
+    client = OVXClient(*server.server_address)
+    try:
+        tenant_id = client.create_network(['tcp:localhost:6633'], '10.0.0.0', 16)
+        vdpid = client.create_switch(tenant_id, ['00:00:00:00:00:00:11:00'])
+        assert client.create_port(tenant_id, '00:00:00:00:00:00:11:00', 1) == (vdpid, 1)
+        client.remove_port(tenant_id, vdpid, 1)
+        assert client.create_port(tenant_id, '00:00:00:00:00:00:11:00', 1) == (vdpid, 2)
+        with pytest.raises(OVXError):
+            client.start_port(tenant_id, vdpid, 1)
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()